@@ -28,6 +28,9 @@ from Routes.API import api_bp
 
 # --- Imports Banco de Dados e Logs ---
 from Db.Connections import PG_DATABASE_URL, CheckConnections
+from Modules.RAZAO.Services.AgendadorSincronizacaoConsolidado import AgendadorSincronizacaoConsolidado
+from Modules.BUDGET.Services.AgendadorReplicacaoBudget import AgendadorReplicacaoBudget
+from Modules.SISTEMA.Services.GravadorLogAcesso import GravadorLogAcesso
 from Models.Postgress.CTL_Dre_Estrutura import Base as DreBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from Utils.Logger import ConfigurarLogger, RegistrarLog
@@ -110,6 +113,17 @@ app.register_blueprint(security_bp)
 app.register_blueprint(centro_custo_config_bp)
 app.register_blueprint(importacao_dados_razao_bp)
 
+# --- Agendador da Sincronização Consolidada ---
+# Roda dentro do processo (Waitress ou dev server); o advisory lock no Postgres
+# garante uma única execução mesmo com vários processos ou o reloader do Flask.
+AgendadorSincronizacaoConsolidado.Iniciar()
+
+# --- Agendador da réplica do Budget (ERP -> PostgreSQL) ---
+AgendadorReplicacaoBudget.Iniciar()
+
+# --- Gravador assíncrono do log de acesso (Tb_LogAcesso) ---
+GravadorLogAcesso.Iniciar()
+
 @app.route('/')
 def Index(): # Até o index merece um PascalCase
     return redirect(url_for('Principal.MenuPrincipal'))
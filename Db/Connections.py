@@ -1,11 +1,12 @@
 import sys
 import os
 import time
+import threading
 from decimal import Decimal, InvalidOperation
 
 from sqlalchemy import create_engine, event, or_, text
 from sqlalchemy.orm import Session, sessionmaker, with_loader_criteria
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
 
 # ==========================================
 # SETUP (Settings da Raiz)
@@ -22,19 +23,21 @@ from Settings import settings, ProductionConfig
 PG_DATABASE_URL = settings.get_postgres_uri()
 SQL_DATABASE_URL = settings.get_sqlserver_uri()
 
+# Réplica local (PostgreSQL) das tabelas de Budget/Contas a Pagar do ERP
+SCHEMA_SNAPSHOT_BUDGET = "Budget_Snapshot"
+
 
 class SqlServerSession(Session):
     pass
 
 
-def _obter_codigos_centros_off():
-    try:
-        from Modules.SISTEMA.Services.CentroCustoConfigService import CentroCustoConfigService
+# Filtro de centros OFF pré-montado por versão da configuração. O dicionário inteiro é
+# substituído (nunca alterado) quando a versão muda, então leitores sem lock veem um estado coerente.
+_FILTRO_CENTROS_OFF = {'versao': None, 'codigos': (), 'opcoes': ()}
+_LOCK_FILTRO_CENTROS_OFF = threading.Lock()
 
-        codigos = CentroCustoConfigService.listarCodigosCentrosOff()
-    except Exception:
-        return ()
 
+def _normalizar_codigos_centros_off(codigos):
     codigos_normalizados = []
     for codigo in codigos:
         try:
@@ -45,32 +48,27 @@ def _obter_codigos_centros_off():
     return tuple(codigos_normalizados)
 
 
-@event.listens_for(SqlServerSession, 'do_orm_execute')
-def _aplicar_filtro_centros_off(execute_state):
-    if not execute_state.is_select:
-        return
-
-    if execute_state.session.info.get('ignore_centro_custo_off'):
-        return
-
-    codigos_off = _obter_codigos_centros_off()
-    if not codigos_off:
-        return
-
+def _montar_opcoes_centros_off(codigos_off):
+    """
+    Monta as opções with_loader_criteria uma única vez por versão da configuração.
+    O critério é um lambda recebendo a entidade, para que o SQLAlchemy o reaplique sobre cada
+    aliased() da consulta; os códigos entram como variável rastreada da closure (parâmetro
+    vinculado), então o SQL compilado continua reaproveitado entre versões.
+    """
     from Models.SqlServer.Budget import BudgetItem
     from Models.SqlServer.ContaPagar import CentroCusto, ContaPagar
 
-    execute_state.statement = execute_state.statement.options(
+    return (
         with_loader_criteria(
             CentroCusto,
-            lambda cls: cls.Codigo_CentroCusto.notin_(codigos_off),
+            lambda cls: cls.Codigo_CentroCusto.not_in(codigos_off),
             include_aliases=True,
         ),
         with_loader_criteria(
             BudgetItem,
             lambda cls: or_(
                 cls.Codigo_CentroCusto.is_(None),
-                cls.Codigo_CentroCusto.notin_(codigos_off),
+                cls.Codigo_CentroCusto.not_in(codigos_off),
             ),
             include_aliases=True,
         ),
@@ -78,25 +76,182 @@ def _aplicar_filtro_centros_off(execute_state):
             ContaPagar,
             lambda cls: or_(
                 cls.Codigo_CentroCusto.is_(None),
-                cls.Codigo_CentroCusto.notin_(codigos_off),
+                cls.Codigo_CentroCusto.not_in(codigos_off),
             ),
             include_aliases=True,
         ),
     )
 
+
+def _obter_filtro_centros_off():
+    global _FILTRO_CENTROS_OFF
+
+    try:
+        from Modules.SISTEMA.Services.CentroCustoConfigService import CentroCustoConfigService
+
+        versao, codigos = CentroCustoConfigService.obterCodigosCentrosOffVersionados()
+    except Exception:
+        return _FILTRO_CENTROS_OFF
+
+    filtro = _FILTRO_CENTROS_OFF
+    if filtro['versao'] == versao:
+        return filtro
+
+    with _LOCK_FILTRO_CENTROS_OFF:
+        if _FILTRO_CENTROS_OFF['versao'] != versao:
+            codigos_off = _normalizar_codigos_centros_off(codigos)
+            _FILTRO_CENTROS_OFF = {
+                'versao': versao,
+                'codigos': codigos_off,
+                'opcoes': _montar_opcoes_centros_off(codigos_off) if codigos_off else (),
+            }
+        return _FILTRO_CENTROS_OFF
+
+
+@event.listens_for(SqlServerSession, 'do_orm_execute')
+def _aplicar_filtro_centros_off(execute_state):
+    if not execute_state.is_select:
+        return
+
+    if execute_state.session.info.get('ignore_centro_custo_off'):
+        return
+
+    opcoes = _obter_filtro_centros_off()['opcoes']
+    if not opcoes:
+        return
+
+    execute_state.statement = execute_state.statement.options(*opcoes)
+
+# ==========================================
+# REGISTRO DE ENGINES (Pool compartilhado)
+# ==========================================
+# Uma engine por (banco, ambiente) viva durante todo o processo.
+# Antes cada chamada criava uma engine nova (handshake TCP + autenticação por requisição).
+_REGISTRO_ENGINES = {}
+_REGISTRO_SESSIONMAKERS = {}
+_ESTATISTICAS_POOL = {}
+_LOCK_REGISTRO = threading.Lock()
+
+
+def _RegistrarEventosPool(chave, engine):
+    """Acompanha checkouts do pool para permitir o dimensionamento pelas threads do Waitress."""
+    estatisticas = {'checkouts_total': 0, 'checkouts_ativos': 0, 'pico_checkouts': 0, 'conexoes_criadas': 0}
+    lock_estatisticas = threading.Lock()
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(dbapi_conn, conn_record):
+        with lock_estatisticas:
+            estatisticas['conexoes_criadas'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def _ao_retirar(dbapi_conn, conn_record, conn_proxy):
+        with lock_estatisticas:
+            estatisticas['checkouts_total'] += 1
+            estatisticas['checkouts_ativos'] += 1
+            if estatisticas['checkouts_ativos'] > estatisticas['pico_checkouts']:
+                estatisticas['pico_checkouts'] = estatisticas['checkouts_ativos']
+
+    @event.listens_for(engine, 'checkin')
+    def _ao_devolver(dbapi_conn, conn_record):
+        with lock_estatisticas:
+            estatisticas['checkouts_ativos'] = max(estatisticas['checkouts_ativos'] - 1, 0)
+
+    _ESTATISTICAS_POOL[chave] = estatisticas
+
+
+def _ObterEngineRegistrada(chave, url, pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping, **kwargs):
+    """
+    Retorna a engine registrada para a chave (banco, ambiente), criando-a na primeira chamada.
+    Criação protegida por lock (double-checked) para ser segura com várias threads do Waitress.
+    """
+    engine = _REGISTRO_ENGINES.get(chave)
+    if engine is not None:
+        return engine
+
+    with _LOCK_REGISTRO:
+        engine = _REGISTRO_ENGINES.get(chave)
+        if engine is None:
+            engine = create_engine(
+                url,
+                poolclass=QueuePool,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=pool_pre_ping,
+                **kwargs
+            )
+            _RegistrarEventosPool(chave, engine)
+            _REGISTRO_ENGINES[chave] = engine
+        return engine
+
+
+def _ObterSessionMaker(chave, engine, **kwargs):
+    """Reaproveita o sessionmaker da engine registrada (evita reconfigurar a fábrica a cada requisição)."""
+    fabrica = _REGISTRO_SESSIONMAKERS.get(chave)
+    if fabrica is None:
+        with _LOCK_REGISTRO:
+            fabrica = _REGISTRO_SESSIONMAKERS.get(chave)
+            if fabrica is None:
+                fabrica = sessionmaker(bind=engine, **kwargs)
+                _REGISTRO_SESSIONMAKERS[chave] = fabrica
+    return fabrica
+
+
+def _ObterEnginePostgresPorConfig(config, echo=False):
+    return _ObterEngineRegistrada(
+        ('POSTGRES', config.PG_HOST, config.PG_DB),
+        config.get_postgres_uri(),
+        pool_size=config.PG_POOL_SIZE,
+        max_overflow=config.PG_POOL_MAX_OVERFLOW,
+        pool_timeout=config.PG_POOL_TIMEOUT,
+        pool_recycle=config.PG_POOL_RECYCLE,
+        pool_pre_ping=config.PG_POOL_PRE_PING,
+        echo=echo,
+    )
+
+
+def ObterEstatisticasPool():
+    """
+    Retorna um retrato dos pools registrados (tamanho, conexões em uso, overflow e picos).
+    Útil para dimensionar POOL_SIZE/MAX_OVERFLOW de acordo com as threads do Waitress.
+    """
+    resultado = {}
+    for chave, engine in list(_REGISTRO_ENGINES.items()):
+        pool = engine.pool
+        nome = ':'.join(str(parte) for parte in chave)
+        resultado[nome] = {
+            'tamanho_pool': pool.size(),
+            'conexoes_livres': pool.checkedin(),
+            'conexoes_em_uso': pool.checkedout(),
+            'overflow_atual': pool.overflow(),
+            'max_overflow': getattr(pool, '_max_overflow', None),
+            **dict(_ESTATISTICAS_POOL.get(chave, {})),
+        }
+    return resultado
+
+
+def DescartarEngines():
+    """Fecha todas as conexões dos pools registrados (uso em shutdown ou troca de credenciais)."""
+    with _LOCK_REGISTRO:
+        for engine in _REGISTRO_ENGINES.values():
+            engine.dispose()
+        _REGISTRO_ENGINES.clear()
+        _REGISTRO_SESSIONMAKERS.clear()
+        _ESTATISTICAS_POOL.clear()
+
 # ==========================================
 # FUNÇÕES DE ENGINE E SESSÃO (Core)
 # ==========================================
 
 def GetPostgresEngine():
     """
-    Retorna a engine do PostgreSQL padrão.
+    Retorna a engine do PostgreSQL padrão (compartilhada pelo processo).
     Utiliza 'pool_pre_ping' para verificar se a conexão está viva antes de usar.
     """
     try:
         # pool_pre_ping=True é o 'ping' cardíaco da conexão. Evita erros de "server closed connection unexpectedly".
-        engine = create_engine(PG_DATABASE_URL, pool_pre_ping=True, echo=settings.DEBUG) 
-        return engine
+        return _ObterEnginePostgresPorConfig(settings, echo=settings.DEBUG)
     except Exception as e:
         print(f"Erro ao criar engine Postgres: {e}")
         return None
@@ -105,7 +260,7 @@ def GetPostgresSession():
     """Retorna uma Sessão ORM pronta para o PostgreSQL"""
     engine = GetPostgresEngine()
     if engine:
-        return sessionmaker(bind=engine)()
+        return _ObterSessionMaker(('POSTGRES', settings.PG_HOST, settings.PG_DB), engine)()
     return None
 
 def GetPostgresEngineRobust():
@@ -117,7 +272,7 @@ def GetPostgresEngineRobust():
     Retorna: (engine, nome_do_banco, is_fallback)
     """
     # 1. Tentativa Principal (O que está no .env)
-    engine = create_engine(PG_DATABASE_URL, pool_pre_ping=True, echo=False)
+    engine = _ObterEnginePostgresPorConfig(settings)
     try:
         with engine.connect() as conn:
             conn.execute(text("SELECT 1")) # Teste real de conexão
@@ -127,9 +282,8 @@ def GetPostgresEngineRobust():
         # Se falhou e a gente NÃO estava tentando conectar na produção...
         if settings.PG_DB != ProductionConfig.PG_DB:
             prod_config = ProductionConfig()
-            prod_url = prod_config.get_postgres_uri()
             
-            fallback_engine = create_engine(prod_url, pool_pre_ping=True, echo=False)
+            fallback_engine = _ObterEnginePostgresPorConfig(prod_config)
             try:
                 with fallback_engine.connect() as conn:
                     conn.execute(text("SELECT 1"))
@@ -142,16 +296,50 @@ def GetPostgresEngineRobust():
 
 def GetSqlServerEngine():
     """
-    Retorna a engine do SQL Server (Legado/ERP).
-    Usa NullPool porque o SQL Server gerencia conexões de forma diferente e 
-    queremos fechar a conexão explicitamente após o uso para não travar o ERP.
+    Retorna a engine do SQL Server (Legado/ERP), compartilhada pelo processo.
+    Pool pequeno e limitado (SQL_POOL_SIZE, sem overflow por padrão) para não
+    estourar o limite de conexões do ERP; conexões ociosas são recicladas.
     """
-    return create_engine(SQL_DATABASE_URL, pool_pre_ping=True, poolclass=NullPool)
+    return _ObterEngineRegistrada(
+        ('SQLSERVER', settings.SQL_HOST, settings.SQL_DB),
+        SQL_DATABASE_URL,
+        pool_size=settings.SQL_POOL_SIZE,
+        max_overflow=settings.SQL_POOL_MAX_OVERFLOW,
+        pool_timeout=settings.SQL_POOL_TIMEOUT,
+        pool_recycle=settings.SQL_POOL_RECYCLE,
+        pool_pre_ping=settings.SQL_POOL_PRE_PING,
+    )
 
 def GetSqlServerSession(ignore_centro_custo_off=False):
     """Retorna uma Sessão ORM pronta para o SQL Server (LuftInforma)"""
     engine = GetSqlServerEngine()
-    sessao = sessionmaker(bind=engine, class_=SqlServerSession)()
+    fabrica = _ObterSessionMaker(('SQLSERVER', settings.SQL_HOST, settings.SQL_DB), engine, class_=SqlServerSession)
+    sessao = fabrica()
+    if ignore_centro_custo_off:
+        sessao.info['ignore_centro_custo_off'] = True
+    return sessao
+
+def GetBudgetSnapshotSession(ignore_centro_custo_off=False):
+    """
+    Retorna uma Sessão ORM dos models do ERP apontada para a réplica do Budget no PostgreSQL.
+    As tabelas replicadas têm os mesmos nomes e colunas do LuftInforma; o schema_translate_map
+    troca só o schema, então as consultas do RelatorioBudget rodam sem alteração nos dois bancos.
+    Mesma classe de sessão do SQL Server para manter o filtro de centros de custo OFF.
+    """
+    from Models.SqlServer.Base import SQLSERVER_SCHEMA
+    from Models.SqlServer.Empresa import TbFilial
+
+    engine = GetPostgresEngine()
+    if engine is None:
+        return None
+    engine_snapshot = engine.execution_options(schema_translate_map={
+        SQLSERVER_SCHEMA: SCHEMA_SNAPSHOT_BUDGET,
+        TbFilial.__table__.schema: SCHEMA_SNAPSHOT_BUDGET,
+    })
+    fabrica = _ObterSessionMaker(
+        ('BUDGET_SNAPSHOT', settings.PG_HOST, settings.PG_DB), engine_snapshot, class_=SqlServerSession
+    )
+    sessao = fabrica()
     if ignore_centro_custo_off:
         sessao.info['ignore_centro_custo_off'] = True
     return sessao
@@ -1,4 +1,5 @@
 # Models/POSTGRESS/CTL_Razao.py
+from datetime import datetime
 from sqlalchemy import Column, Integer, String, Text, DateTime, Float, BigInteger, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -29,6 +30,8 @@ class CtlRazaoConsolidado(Base):
     Data_Criacao = Column('Data_Criacao', DateTime)
     Aprovado_Por = Column('Aprovado_Por', String(100))
     Data_Aprovacao = Column('Data_Aprovacao', DateTime)
+    # Última alteração feita pela aplicação (ajustes/intergrupos); lida pela sincronização incremental
+    Data_Alteracao = Column('Data_Alteracao', DateTime, default=datetime.now, onupdate=datetime.now)
 
     # --- COLUNAS EXISTENTES DE DADOS ---
     origem = Column('origem', Text)
@@ -115,4 +118,45 @@ class CtlRazaoIntec(Base):
     Item = Column('Item', String(50))
     Cod_Cl_Valor = Column('Cod Cl. Valor', Text)
     Debito = Column('Debito', Float)
-    Credito = Column('Credito', Float)
\ No newline at end of file
+    Credito = Column('Credito', Float)
+
+class CtlRazaoFatoMensal(Base):
+    """
+    Fato mensal pré-agregado da Consolidada (somente lançamentos válidos).
+    Mantido pela sincronização e lido pelos motores do DRE no lugar das linhas brutas.
+    Grão: origem, conta, título, centro de custo, ano/mês, item, filial cliente e flags.
+    """
+    __tablename__ = 'Tb_CTL_Razao_Fato_Mensal'
+    __table_args__ = {'schema': 'Dre_Schema'}
+
+    Id = Column('Id', BigInteger, primary_key=True, autoincrement=True)
+    Ano = Column('Ano', Integer)
+    Mes = Column('Mes', Integer)
+    origem = Column('origem', Text)
+    Conta = Column('Conta', Text)
+    Titulo_Conta = Column('Título Conta', Text)
+    Centro_Custo = Column('Centro de Custo', BigInteger)
+    Item = Column('Item', String(50))
+    Filial_Cliente = Column('Filial Cliente', Text)
+    Is_Nao_Operacional = Column('Is_Nao_Operacional', Boolean)
+    Is_Intergrupo_Auto = Column('Is_Intergrupo_Auto', Boolean)
+    Is_Aprovado = Column('Is_Aprovado', Boolean)
+    Saldo = Column('Saldo', Float)
+    Qtd_Lancamentos = Column('Qtd_Lancamentos', Integer)
+
+class CtlRazaoResumoMensal(Base):
+    """
+    Totais do grid do Razão por visão ('original' ou 'adjusted') e competência.
+    Mantido pela sincronização e lido pelo cabeçalho do Razão no lugar de somar o razão inteiro.
+    """
+    __tablename__ = 'Tb_CTL_Razao_Resumo_Mensal'
+    __table_args__ = {'schema': 'Dre_Schema'}
+
+    Id = Column('Id', BigInteger, primary_key=True, autoincrement=True)
+    Visao = Column('Visao', String(20))
+    Ano = Column('Ano', Integer)
+    Mes = Column('Mes', Integer)
+    Qtd_Lancamentos = Column('Qtd_Lancamentos', BigInteger)
+    Debito = Column('Debito', Float)
+    Credito = Column('Credito', Float)
+    Saldo = Column('Saldo', Float)
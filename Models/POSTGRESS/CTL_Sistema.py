@@ -43,4 +43,29 @@ class CtlSysConfigImportacao(Base):
 
     def get_transforms(self):
         if not self.Transforms_Json: return {}
-        return json.loads(self.Transforms_Json)
\ No newline at end of file
+        return json.loads(self.Transforms_Json)
+
+class CtlSysControleSincronizacao(Base):
+    """
+    Marcas d'água (high-water marks) da sincronização incremental da Consolidada.
+    Uma linha por Fonte de origem (FARMA, FARMADIST, INTEC) e uma linha 'GERAL'
+    com a data da última execução e o retrato dos cadastros de domínio.
+    Também guarda as marcas da réplica do Budget (chaves 'BUDGET*', ver ReplicacaoBudgetService)
+    e a pendência de atualização da visão original do Razão (chave 'RAZAO_ORIGINAL').
+    """
+    __tablename__ = 'Tb_CTL_Sys_Controle_Sincronizacao'
+    __table_args__ = {"schema": "Dre_Schema"}
+
+    Chave = Column(String(50), primary_key=True)
+    Ultimo_Id = Column(Integer, default=0)
+    Ultima_Importacao_Id = Column(Integer, default=0)
+    Data_Referencia = Column(DateTime, nullable=True)
+    Snapshot_Json = Column(Text, nullable=True)
+    Data_Atualizacao = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def get_snapshot(self):
+        if not self.Snapshot_Json: return {}
+        return json.loads(self.Snapshot_Json)
+
+    def set_snapshot(self, snapshot_dict):
+        self.Snapshot_Json = json.dumps(snapshot_dict)
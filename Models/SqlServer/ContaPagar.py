@@ -102,4 +102,16 @@ class ContaPagarNotaFiscal(SqlServerModel):
     Valor_NotaFiscal = Column(MONEY)
     Data_Importacao = Column(DateTime)
 
-    contaPagar = relationship("ContaPagar", back_populates="notasFiscais")
\ No newline at end of file
+    contaPagar = relationship("ContaPagar", back_populates="notasFiscais")
+
+class ContaPagarDataEfetiva(SqlServerModel):
+    """
+    Data efetiva de digitação por conta a pagar (última digitação de nota fiscal ou, sem nota,
+    a digitação da própria conta), materializada e indexada. Objeto opcional no ERP
+    (Scripts/Code/CriarDataEfetivaContaPagar.py); na réplica do Budget é mantido pela replicação.
+    """
+
+    __tablename__ = 'ContaPagarDataEfetiva'
+
+    Codigo_ContaPagar = Column(Integer, primary_key=True)
+    Data_DigitacaoEfetiva = Column(DateTime)
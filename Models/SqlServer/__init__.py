@@ -1,6 +1,6 @@
 from .Base import Base, SQLSERVER_SCHEMA, SqlServerModel, TemporarySqlServerModel
 from .Budget import Budget, BudgetClienteGrupo, BudgetGrupo, BudgetItem, BudgetItemRecHistorico
-from .ContaPagar import CentroCusto, ContaPagar, ContaPagarNotaFiscal, PlanoConta
+from .ContaPagar import CentroCusto, ContaPagar, ContaPagarDataEfetiva, ContaPagarNotaFiscal, PlanoConta
 from .Empresa import Empresa, TbFilial
 from .Fornecedor import Fornecedor, FornecedorIntegracaoSistema
 from .TabelasTemporarias import (
@@ -28,6 +28,7 @@ __all__ = [
 	"PlanoConta",
 	"CentroCusto",
 	"ContaPagar",
+	"ContaPagarDataEfetiva",
 	"ContaPagarNotaFiscal",
 	"Empresa",
 	"TbFilial",
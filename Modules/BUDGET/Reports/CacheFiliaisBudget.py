@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from Models.SqlServer.Empresa import Empresa, TbFilial
+from Utils.Logger import RegistrarLog
+
+
+class CacheFiliaisBudget:
+    """
+    Cache em memória (por processo) da dimensão empresa → filial do RelatorioBudget.
+    A ligação Empresa ↔ tb_filial é feita pelo CNPJ sem pontuação; antes ela era um JOIN com
+    REPLACE/COLLATE repetido dentro de cada consulta do analítico. Agora as duas tabelas
+    (pequenas) são lidas uma vez, casadas em Python e as consultas filtram por listas de
+    códigos de empresa. Recarrega pelo TTL e sempre que a réplica do Budget é atualizada.
+    """
+
+    TTL_SEGUNDOS = int(os.getenv("BUDGET_FILIAIS_CACHE_TTL", "3600"))
+    ROTULO_MULTIPLAS_FILIAIS = 'Multiplas filiais'
+
+    _lock = threading.Lock()
+    _versao = 0
+    _snapshot = None
+    _metricas = {'acertos': 0, 'reconstrucoes': 0, 'invalidacoes': 0, 'ultimo_motivo': None}
+
+    @classmethod
+    def Obter(cls, session):
+        """Retorna o snapshot vigente, reconstruindo-o se a versão mudou ou o TTL expirou."""
+        snapshot = cls._snapshot
+        if cls._SnapshotValido(snapshot):
+            cls._metricas['acertos'] += 1
+            return snapshot
+
+        with cls._lock:
+            snapshot = cls._snapshot
+            if cls._SnapshotValido(snapshot):
+                cls._metricas['acertos'] += 1
+                return snapshot
+
+            versao = cls._versao
+            t0 = time.time()
+            snapshot = cls._Carregar(session, versao)
+            cls._snapshot = snapshot
+            cls._metricas['reconstrucoes'] += 1
+            RegistrarLog(
+                f"Filiais do Budget recarregadas ({len(snapshot['filiais_por_empresa'])} empresas, "
+                f"{round((time.time() - t0) * 1000, 2)}ms)", "SYSTEM"
+            )
+            return snapshot
+
+    @classmethod
+    def ObterFiliaisEmpresa(cls, session, codigoEmpresa):
+        """Filiais (ordenadas) vinculadas à empresa; tupla vazia quando não há vínculo."""
+        if codigoEmpresa is None:
+            return ()
+        return cls.Obter(session)['filiais_por_empresa'].get(int(codigoEmpresa), ())
+
+    @classmethod
+    def ObterNomeFilialConsolidado(cls, session, codigoEmpresa):
+        """Nome da filial da empresa, 'Multiplas filiais' quando há mais de uma, ou None."""
+        filiais = cls.ObterFiliaisEmpresa(session, codigoEmpresa)
+        if not filiais:
+            return None
+        return filiais[0] if len(filiais) == 1 else cls.ROTULO_MULTIPLAS_FILIAIS
+
+    @classmethod
+    def ObterEmpresasDasFiliais(cls, session, filiais):
+        """Códigos das empresas que possuem alguma das filiais informadas."""
+        empresas_por_filial = cls.Obter(session)['empresas_por_filial']
+        codigos = set()
+        for filial in filiais:
+            codigos.update(empresas_por_filial.get(filial, ()))
+        return sorted(codigos)
+
+    @classmethod
+    def Invalidar(cls, motivo='manual'):
+        with cls._lock:
+            cls._versao += 1
+            cls._metricas['invalidacoes'] += 1
+            cls._metricas['ultimo_motivo'] = motivo
+
+    @classmethod
+    def ObterStatus(cls):
+        snapshot = cls._snapshot
+        status = dict(cls._metricas)
+        status.update({
+            'versao': cls._versao,
+            'versao_carregada': snapshot['versao'] if snapshot else None,
+            'carregado_em': snapshot['carregado_em'].strftime('%d/%m/%Y %H:%M:%S') if snapshot else None,
+            'ttl_segundos': cls.TTL_SEGUNDOS,
+        })
+        return status
+
+    @classmethod
+    def _SnapshotValido(cls, snapshot):
+        if snapshot is None or snapshot['versao'] != cls._versao:
+            return False
+        return (time.time() - snapshot['carregado_ts']) < cls.TTL_SEGUNDOS
+
+    @staticmethod
+    def _NormalizarDocumento(documento):
+        # Mesma limpeza do antigo JOIN (pontos, barras e hífens); espaços de preenchimento do char também saem
+        return str(documento or '').replace('.', '').replace('/', '').replace('-', '').strip()
+
+    @classmethod
+    def _Carregar(cls, session, versao):
+        filiais_por_cnpj = defaultdict(set)
+        for cgc, nome in session.query(TbFilial.cgc, TbFilial.nomefilial).all():
+            cnpj = cls._NormalizarDocumento(cgc)
+            if cnpj and nome:
+                filiais_por_cnpj[cnpj].add(str(nome).strip())
+
+        filiais_por_empresa = {}
+        empresas_por_filial = defaultdict(set)
+        for codigo, cnpj in session.query(Empresa.Codigo_Empresa, Empresa.CNPJ_Empresa).all():
+            filiais = filiais_por_cnpj.get(cls._NormalizarDocumento(cnpj))
+            if codigo is None or not filiais:
+                continue
+            filiais_por_empresa[int(codigo)] = tuple(sorted(filiais))
+            for filial in filiais:
+                empresas_por_filial[filial].add(int(codigo))
+
+        return {
+            'versao': versao,
+            'carregado_em': datetime.now(),
+            'carregado_ts': time.time(),
+            'filiais_por_empresa': filiais_por_empresa,
+            'empresas_por_filial': {filial: tuple(sorted(codigos)) for filial, codigos in empresas_por_filial.items()},
+        }
@@ -1,9 +1,11 @@
-from sqlalchemy import and_, case, collate, extract, func, literal, or_
+from datetime import datetime
+
+from sqlalchemy import and_, case, extract, func, literal_column, or_, select, union_all
 
 from Models.SqlServer.Budget import BudgetItem, Budget, BudgetGrupo
-from Models.SqlServer.ContaPagar import ContaPagar, ContaPagarNotaFiscal, CentroCusto, PlanoConta
-from Models.SqlServer.Empresa import Empresa, TbFilial
+from Models.SqlServer.ContaPagar import ContaPagar, ContaPagarDataEfetiva, ContaPagarNotaFiscal, CentroCusto, PlanoConta
 from Models.SqlServer.Fornecedor import Fornecedor
+from Modules.BUDGET.Reports.CacheFiliaisBudget import CacheFiliaisBudget
 
 
 class RelatorioBudget:
@@ -23,6 +25,24 @@ class RelatorioBudget:
     STATUS_EM_APROVACAO = (1, 2)
     STATUS_APROVADO = (3, 5)
     STATUS_CONSIDERADOS = STATUS_EM_APROVACAO + STATUS_APROVADO
+    COLUNAS_REALIZADO_GERENCIAL = (
+        'emAprovacao',
+        'aprovado',
+        'total',
+        'emAprovacaoComBudget',
+        'aprovadoComBudget',
+        'totalComBudget',
+    )
+    DIMENSOES_CADASTRAIS_GERENCIAL = (
+        'codigoCentroCusto',
+        'numeroCentroCusto',
+        'nomeCentroCusto',
+        'codigoContaContabil',
+        'numeroContaContabil',
+        'descricaoContaContabil',
+        'codigoFornecedor',
+        'nomeFornecedor',
+    )
     CONTAS_EXCLUIDAS = ('6.03.01.02.02.79',)
 
     MESES_RELATORIO = (
@@ -50,9 +70,14 @@ class RelatorioBudget:
         for numero, nome, abreviacao, _, coluna in MESES_RELATORIO
     }
 
-    def __init__(self, session):
-        """Inicializa o serviço de relatório com a sessão de banco ativa."""
+    def __init__(self, session, dataEfetivaMaterializada=False):
+        """
+        Inicializa o serviço de relatório com a sessão de banco ativa.
+        dataEfetivaMaterializada: lê a data efetiva de ContaPagarDataEfetiva em vez de calculá-la
+        sobre as notas fiscais (a réplica do PostgreSQL sempre a mantém; no ERP é opcional).
+        """
         self.session = session
+        self.dataEfetivaMaterializada = dataEfetivaMaterializada
 
     def _resolverCodigoEmpresaMatriz(self, filtroEmpresa):
         """Converte o filtro lógico de empresa para o código da empresa matriz."""
@@ -146,73 +171,15 @@ class RelatorioBudget:
 
         return textos or None
 
-    def _obterDocumentoNormalizadoSql(self, campo):
-        """Gera expressão SQL para normalizar documentos removendo pontuações."""
-        return func.replace(
-            # Remove pontos e barras, substituindo por string vazia, e depois remove hífens
-            func.replace(
-                func.replace(func.coalesce(campo, ''), '.', ''),
-                '/',
-                '',
-            ),
-            '-',
-            '',
-        )
-
-    def _obterSubconsultaFiliais(self):
-        """Monta subconsulta de filiais por empresa a partir do CNPJ normalizado."""
-        cnpjNormalizado = self._obterDocumentoNormalizadoSql(Empresa.CNPJ_Empresa)
-
-        return (
-            # SELECT que traz o código da empresa e o nome da filial, juntando as tabelas Empresa e 
-            # TbFilial pelo CNPJ normalizado
-            self.session.query(
-                Empresa.Codigo_Empresa.label('codigoEmpresa'),
-                TbFilial.nomefilial.label('nomeFilial'),
-            )
-            .select_from(Empresa)
-            .join(
-                TbFilial,
-                cnpjNormalizado == collate(TbFilial.cgc, 'SQL_Latin1_General_CP1_CI_AS'),
-            )
-            .distinct()
-            .subquery()
-        )
-
-    def _obterSubconsultaFiliaisConsolidadas(self):
-        """Consolida filiais por empresa, marcando múltiplas ocorrências quando necessário."""
-        subconsultaFiliais = self._obterSubconsultaFiliais()
-        quantidadeFiliais = func.count(subconsultaFiliais.c.nomeFilial)
-
-        # AQUI É FEITA A CONSOLIDAÇÃO: SE HOUVER MAIS DE UMA FILIAL PARA A MESMA EMPRESA, O NOME VIRA 'Multiplas filiais', 
-        # SENÃO FICA O NOME DA FILIAL
-        nomeFilialConsolidado = case(
-            (quantidadeFiliais > 1, literal('Multiplas filiais')),
-            else_=func.min(subconsultaFiliais.c.nomeFilial),
-        )
-
-        return (
-            # SELECT que traz o código da empresa e o nome da filial consolidado, agrupando por código da empresa para 
-            # identificar múltiplas filiais
-            self.session.query(
-                subconsultaFiliais.c.codigoEmpresa.label('codigoEmpresa'),
-                nomeFilialConsolidado.label('nomeFilial'),
-            )
-            .group_by(subconsultaFiliais.c.codigoEmpresa)
-            .subquery()
-        )
+    def _obterNomeFilialEmpresa(self, codigoEmpresa):
+        """Nome da filial da empresa ('Multiplas filiais' quando há mais de uma), pela dimensão em cache."""
+        return CacheFiliaisBudget.ObterNomeFilialConsolidado(self.session, codigoEmpresa)
 
     def _aplicarFiltroFilial(self, query, campoCodigoEmpresa, filiaisSelecionadas):
         """Aplica o filtro de filial em uma consulta com base no código de empresa."""
         if filiaisSelecionadas:
-            subconsultaFiliais = self._obterSubconsultaFiliais()
-            # SELECT que traz os códigos das empresas que possuem as filiais selecionadas, filtrando pela lista de filiais e 
-            # garantindo que sejam distintas
-            empresasFiltradas = (
-                self.session.query(subconsultaFiliais.c.codigoEmpresa)
-                .filter(subconsultaFiliais.c.nomeFilial.in_(filiaisSelecionadas))
-                .distinct()
-            )
+            # As empresas de cada filial vêm da dimensão em cache: o banco recebe só a lista de códigos
+            empresasFiltradas = CacheFiliaisBudget.ObterEmpresasDasFiliais(self.session, filiaisSelecionadas)
             query = query.filter(campoCodigoEmpresa.in_(empresasFiltradas))
         return query
 
@@ -236,7 +203,19 @@ class RelatorioBudget:
         )
 
     def _obterSubconsultaDataDigitacaoNotaFiscal(self):
-        """Monta subconsulta com a última data de digitação por conta a pagar."""
+        """
+        Monta subconsulta com a última data de digitação por conta a pagar.
+        Com a data efetiva materializada (ContaPagarDataEfetiva), lê a data pronta e indexada.
+        """
+        if self.dataEfetivaMaterializada:
+            return (
+                self.session.query(
+                    ContaPagarDataEfetiva.Codigo_ContaPagar.label('codigoContaPagar'),
+                    ContaPagarDataEfetiva.Data_DigitacaoEfetiva.label('dataDigitacaoEfetiva'),
+                )
+                .subquery()
+            )
+
         return (
             # Agrupa por conta a pagar para obter a data mais recente de digitação da nota fiscal.
             # Essa data é usada como prioridade no cálculo de competência do realizado.
@@ -250,11 +229,55 @@ class RelatorioBudget:
 
     def _obterDataDigitacaoEfetivaContaPagar(self, subconsultaDataDigitacaoNotaFiscal):
         """Retorna expressão SQL da data efetiva de digitação da conta a pagar."""
+        if self.dataEfetivaMaterializada:
+            return subconsultaDataDigitacaoNotaFiscal.c.dataDigitacaoEfetiva
+
         return func.coalesce(
             subconsultaDataDigitacaoNotaFiscal.c.dataDigitacaoNotaFiscal,
             ContaPagar.Data_Digitacao,
         )
 
+    def _obterIntervalosCompetencia(self, ano, meses=None):
+        """Converte ano e meses em intervalos semiabertos [início, fim), unindo meses consecutivos."""
+        ano = int(ano)
+        intervalos = []
+        for mes in sorted({int(mes) for mes in meses}) if meses else range(1, 13):
+            inicio = datetime(ano, mes, 1)
+            fim = datetime(ano + 1, 1, 1) if mes == 12 else datetime(ano, mes + 1, 1)
+            if intervalos and intervalos[-1][1] == inicio:
+                intervalos[-1] = (intervalos[-1][0], fim)
+            else:
+                intervalos.append((inicio, fim))
+        return intervalos
+
+    def _obterCondicaoIntervalos(self, coluna, intervalos):
+        return or_(*(and_(coluna >= inicio, coluna < fim) for inicio, fim in intervalos))
+
+    def _obterCondicaoPeriodoEfetivo(self, dataEfetiva, ano, meses=None):
+        """
+        Filtra a data efetiva por intervalos de datas em vez de extract(year/month), o que permite
+        uso de índice. Sem a data materializada, a data efetiva é um COALESCE sobre a subconsulta
+        agrupada de notas: a pré-seleção pelas colunas de origem (digitação da conta ou de alguma
+        nota no período) é indexável e não perde títulos, e a comparação com a data efetiva
+        descarta os falsos positivos.
+        """
+        intervalos = self._obterIntervalosCompetencia(ano, meses)
+        condicaoDataEfetiva = self._obterCondicaoIntervalos(dataEfetiva, intervalos)
+        if self.dataEfetivaMaterializada:
+            return condicaoDataEfetiva
+
+        contasComNotaNoPeriodo = (
+            select(ContaPagarNotaFiscal.Codigo_ContaPagar)
+            .where(self._obterCondicaoIntervalos(ContaPagarNotaFiscal.Data_Digitacao, intervalos))
+        )
+        return and_(
+            or_(
+                self._obterCondicaoIntervalos(ContaPagar.Data_Digitacao, intervalos),
+                ContaPagar.Codigo_ContaPagar.in_(contasComNotaNoPeriodo),
+            ),
+            condicaoDataEfetiva,
+        )
+
     def _obterValorEfetivoContaPagar(self):
         """Retorna expressão SQL do valor efetivo da conta a pagar."""
         return func.coalesce(
@@ -343,24 +366,57 @@ class RelatorioBudget:
 
         return f"{len(mesesInfo)} meses selecionados"
 
-    def _obterConsultaOrcadoMensal(self, ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz):
-        """Monta consulta SQL de valores orçados agrupados por dimensão contábil."""
-        query = (
-            # Consulta base do orçamento: agrega os 12 meses por centro, conta e fornecedor.
-            # joins com CentroCusto/PlanoConta/Fornecedor são left join para não perder linhas sem vínculo cadastral.
-            self.session.query(
-                CentroCusto.Codigo_CentroCusto.label('codigoCentroCusto'),
-                CentroCusto.Numero_CentroCusto.label('numeroCentroCusto'),
-                CentroCusto.Nome_CentroCusto.label('nomeCentroCusto'),
-                PlanoConta.Codigo_ContaContabil.label('codigoContaContabil'),
-                PlanoConta.Numero_ContaContabil.label('numeroContaContabil'),
-                PlanoConta.Descricao_ContaContabil.label('descricaoContaContabil'),
-                Fornecedor.Codigo_Fornecedor.label('codigoFornecedor'),
-                Fornecedor.Nome_Fornecedor.label('nomeFornecedor'),
+    def _obterColunasDimensaoGerencial(self, campoCentroCusto, campoContaContabil):
+        """
+        Colunas de dimensão (rotuladas) e de agrupamento da consulta gerencial combinada.
+        Além dos dados cadastrais, traz os códigos do próprio lançamento (idCentroCusto/idContaContabil),
+        usados para recortar em memória o mesmo resultado pelos filtros da tela.
+        """
+        colunasAgrupamento = [
+            campoCentroCusto,
+            campoContaContabil,
+            CentroCusto.Codigo_CentroCusto,
+            CentroCusto.Numero_CentroCusto,
+            CentroCusto.Nome_CentroCusto,
+            PlanoConta.Codigo_ContaContabil,
+            PlanoConta.Numero_ContaContabil,
+            PlanoConta.Descricao_ContaContabil,
+            Fornecedor.Codigo_Fornecedor,
+            Fornecedor.Nome_Fornecedor,
+        ]
+        rotulos = ('idCentroCusto', 'idContaContabil') + self.DIMENSOES_CADASTRAIS_GERENCIAL
+        colunas = [coluna.label(rotulo) for coluna, rotulo in zip(colunasAgrupamento, rotulos)]
+        return colunas, colunasAgrupamento
+
+    def _obterConsultaGerencialCombinada(self, ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz):
+        """
+        Monta em uma única instrução (UNION ALL de dois agrupamentos) o orçado e o realizado por status,
+        por mês, centro, conta e fornecedor. Alimenta o consolidado mensal e as opções de filtro.
+
+        As duas partes têm as mesmas colunas:
+        - orçado: mesCompetencia = 0 e os 12 meses em colunas (orcadoJaneiro..orcadoDezembro);
+        - realizado: mês da data efetiva e os valores por status (emAprovacao, aprovado, total e *ComBudget).
+        itensComValor conta os itens/títulos com valor diferente de zero (mesma regra das antigas
+        consultas de relacionamento dos filtros).
+        """
+        zero = literal_column('0')
+
+        # Parte do ORÇADO: agrega os 12 meses por centro, conta e fornecedor.
+        # joins com CentroCusto/PlanoConta/Fornecedor são left join para não perder linhas sem vínculo cadastral.
+        colunasOrcado, agrupamentoOrcado = self._obterColunasDimensaoGerencial(
+            BudgetItem.Codigo_CentroCusto,
+            BudgetItem.Codigo_ContaContabil,
+        )
+        consultaOrcado = (
+            select(
+                zero.label('mesCompetencia'),
+                *colunasOrcado,
                 *[
                     func.sum(coluna).label(rotulo)
                     for _, _, _, rotulo, coluna in self.MESES_RELATORIO
                 ],
+                *[zero.label(rotulo) for rotulo in self.COLUNAS_REALIZADO_GERENCIAL],
+                func.sum(case((self._obterCondicaoValorOrcado(), 1), else_=0)).label('itensComValor'),
             )
             .select_from(BudgetItem)
             .join(Budget, BudgetItem.Codigo_Budget == Budget.Codigo_Budget)
@@ -369,89 +425,44 @@ class RelatorioBudget:
             .outerjoin(Fornecedor, BudgetItem.Codigo_Fornecedor == Fornecedor.Codigo_Fornecedor)
             .filter(Budget.Ano_Vigencia == ano)
         )
-
-        # Aplica os filtros de centro, conta e empresa matriz de forma padronizada.
-        query = self._aplicarFiltrosComuns(
-            query,
+        consultaOrcado = self._aplicarFiltrosComuns(
+            consultaOrcado,
             BudgetItem.Codigo_CentroCusto,
             BudgetItem.Codigo_ContaContabil,
             BudgetItem.Codigo_EmpresaMatriz,
             idsCentros,
             idsContasContabeis,
             codigoEmpresaMatriz,
-        )
-
-        return query.group_by(
-            CentroCusto.Codigo_CentroCusto,
-            CentroCusto.Numero_CentroCusto,
-            CentroCusto.Nome_CentroCusto,
-            PlanoConta.Codigo_ContaContabil,
-            PlanoConta.Numero_ContaContabil,
-            PlanoConta.Descricao_ContaContabil,
-            Fornecedor.Codigo_Fornecedor,
-            Fornecedor.Nome_Fornecedor,
-        )
+        ).group_by(*agrupamentoOrcado)
 
-    def _obterConsultaStatusMensal(self, ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz):
-        """Monta consulta SQL de realizado mensal por status e vínculo com budget."""
+        # Parte do REALIZADO:
+        # - usa data efetiva (nota fiscal quando existir, senão data da conta);
+        # - separa valores por status (em aprovação/aprovado);
+        # - calcula também os totais vinculados a budget.
         subconsultaDataDigitacaoNotaFiscal = self._obterSubconsultaDataDigitacaoNotaFiscal()
         dataDigitacaoEfetiva = self._obterDataDigitacaoEfetivaContaPagar(subconsultaDataDigitacaoNotaFiscal)
         valorEfetivoContaPagar = self._obterValorEfetivoContaPagar()
         mesCompetencia = extract('month', dataDigitacaoEfetiva)
-        valorEmAprovacao = case(
-            (ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_EM_APROVACAO), valorEfetivoContaPagar),
-            else_=0,
-        )
-        valorAprovado = case(
-            (ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_APROVADO), valorEfetivoContaPagar),
-            else_=0,
-        )
-        valorComBudget = case(
-            (ContaPagar.Codigo_BudgetItem.isnot(None), valorEfetivoContaPagar),
-            else_=0,
-        )
-        valorEmAprovacaoComBudget = case(
-            (
-                and_(
-                    ContaPagar.Codigo_BudgetItem.isnot(None),
-                    ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_EM_APROVACAO),
-                ),
-                valorEfetivoContaPagar,
-            ),
-            else_=0,
-        )
-        valorAprovadoComBudget = case(
-            (
-                and_(
-                    ContaPagar.Codigo_BudgetItem.isnot(None),
-                    ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_APROVADO),
-                ),
-                valorEfetivoContaPagar,
-            ),
-            else_=0,
-        )
+        emAprovacao = ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_EM_APROVACAO)
+        aprovado = ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_APROVADO)
+        comBudget = ContaPagar.Codigo_BudgetItem.isnot(None)
 
-        query = (
-            # Consulta base do realizado:
-            # - usa data efetiva (nota fiscal quando existir, senão data da conta);
-            # - separa valores por status (em aprovação/aprovado);
-            # - calcula também os totais vinculados a budget.
-            self.session.query(
+        colunasRealizado, agrupamentoRealizado = self._obterColunasDimensaoGerencial(
+            ContaPagar.Codigo_CentroCusto,
+            ContaPagar.Codigo_ContaContabil,
+        )
+        consultaRealizado = (
+            select(
                 mesCompetencia.label('mesCompetencia'),
-                CentroCusto.Codigo_CentroCusto.label('codigoCentroCusto'),
-                CentroCusto.Numero_CentroCusto.label('numeroCentroCusto'),
-                CentroCusto.Nome_CentroCusto.label('nomeCentroCusto'),
-                PlanoConta.Codigo_ContaContabil.label('codigoContaContabil'),
-                PlanoConta.Numero_ContaContabil.label('numeroContaContabil'),
-                PlanoConta.Descricao_ContaContabil.label('descricaoContaContabil'),
-                Fornecedor.Codigo_Fornecedor.label('codigoFornecedor'),
-                Fornecedor.Nome_Fornecedor.label('nomeFornecedor'),
-                func.sum(valorEmAprovacao).label('emAprovacao'),
-                func.sum(valorAprovado).label('aprovado'),
+                *colunasRealizado,
+                *[zero.label(rotulo) for _, _, _, rotulo, _ in self.MESES_RELATORIO],
+                func.sum(case((emAprovacao, valorEfetivoContaPagar), else_=0)).label('emAprovacao'),
+                func.sum(case((aprovado, valorEfetivoContaPagar), else_=0)).label('aprovado'),
                 func.sum(valorEfetivoContaPagar).label('total'),
-                func.sum(valorEmAprovacaoComBudget).label('emAprovacaoComBudget'),
-                func.sum(valorAprovadoComBudget).label('aprovadoComBudget'),
-                func.sum(valorComBudget).label('totalComBudget'),
+                func.sum(case((and_(comBudget, emAprovacao), valorEfetivoContaPagar), else_=0)).label('emAprovacaoComBudget'),
+                func.sum(case((and_(comBudget, aprovado), valorEfetivoContaPagar), else_=0)).label('aprovadoComBudget'),
+                func.sum(case((comBudget, valorEfetivoContaPagar), else_=0)).label('totalComBudget'),
+                func.sum(case((valorEfetivoContaPagar != 0, 1), else_=0)).label('itensComValor'),
             )
             .select_from(ContaPagar)
             .outerjoin(
@@ -461,32 +472,39 @@ class RelatorioBudget:
             .outerjoin(CentroCusto, ContaPagar.Codigo_CentroCusto == CentroCusto.Codigo_CentroCusto)
             .outerjoin(PlanoConta, ContaPagar.Codigo_ContaContabil == PlanoConta.Codigo_ContaContabil)
             .outerjoin(Fornecedor, ContaPagar.Codigo_Fornecedor == Fornecedor.Codigo_Fornecedor)
-            .filter(extract('year', dataDigitacaoEfetiva) == ano)
+            .filter(self._obterCondicaoPeriodoEfetivo(dataDigitacaoEfetiva, ano))
             .filter(ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_CONSIDERADOS))
         )
-
         # Reaproveita a mesma regra de filtros do orçamento para manter coerência entre visões.
-        query = self._aplicarFiltrosComuns(
-            query,
+        consultaRealizado = self._aplicarFiltrosComuns(
+            consultaRealizado,
             ContaPagar.Codigo_CentroCusto,
             ContaPagar.Codigo_ContaContabil,
             ContaPagar.Codigo_EmpresaMatriz,
             idsCentros,
             idsContasContabeis,
             codigoEmpresaMatriz,
-        )
+        ).group_by(mesCompetencia, *agrupamentoRealizado)
 
-        return query.group_by(
-            mesCompetencia,
-            CentroCusto.Codigo_CentroCusto,
-            CentroCusto.Numero_CentroCusto,
-            CentroCusto.Nome_CentroCusto,
-            PlanoConta.Codigo_ContaContabil,
-            PlanoConta.Numero_ContaContabil,
-            PlanoConta.Descricao_ContaContabil,
-            Fornecedor.Codigo_Fornecedor,
-            Fornecedor.Nome_Fornecedor,
-        )
+        return union_all(consultaOrcado, consultaRealizado)
+
+    def _obterLinhasGerenciais(self, ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz):
+        """Executa a consulta gerencial combinada (uma ida ao banco)."""
+        return self.session.execute(
+            self._obterConsultaGerencialCombinada(ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz)
+        ).all()
+
+    def _filtrarLinhasGerenciais(self, linhas, idsCentros, idsContasContabeis, somenteComValor=False):
+        """Recorta em memória as linhas gerenciais com a mesma semântica de _aplicarFiltrosComuns."""
+        centros = set(idsCentros) if idsCentros is not None else None
+        contas = set(idsContasContabeis) if idsContasContabeis else None
+        return [
+            linha
+            for linha in linhas
+            if (centros is None or linha.idCentroCusto in centros)
+            and (contas is None or linha.idContaContabil in contas)
+            and (not somenteComValor or linha.itensComValor)
+        ]
 
     def _obterSubconsultaMapeamentoGrupoAnalitico(self, ano, idsCentros, codigoEmpresaMatriz, filiaisSelecionadas):
         """Monta mapeamento auxiliar para vincular contas realizadas a grupo orçamentário."""
@@ -532,16 +550,15 @@ class RelatorioBudget:
         """Monta consulta do orçamento analítico consolidado por grupo/conta/filial."""
         colunasMes = [mes['coluna'] for mes in mesesInfo]
         expressaoOrcado = self._construirExpressaoSomaColunas(colunasMes)
-        subconsultaFiliaisConsolidadas = self._obterSubconsultaFiliaisConsolidadas()
 
         query = (
             # Orçado analítico:
-            # soma os meses selecionados e agrupa por grupo orçamentário, filial, centro e conta.
-            # A filial vem da subconsulta consolidada para refletir "Multiplas filiais" quando aplicável.
+            # soma os meses selecionados e agrupa por grupo orçamentário, empresa, centro e conta.
+            # A filial ("Multiplas filiais" quando aplicável) sai da dimensão em cache pelo código da empresa.
             self.session.query(
                 BudgetGrupo.Codigo_BudgetGrupo.label('codigoGrupo'),
                 BudgetGrupo.Descricao_BudgetGrupo.label('descricaoGrupo'),
-                subconsultaFiliaisConsolidadas.c.nomeFilial.label('nomeFilial'),
+                BudgetItem.Codigo_Empresa.label('codigoEmpresa'),
                 CentroCusto.Codigo_CentroCusto.label('codigoCentroCusto'),
                 CentroCusto.Numero_CentroCusto.label('numeroCentroCusto'),
                 CentroCusto.Nome_CentroCusto.label('nomeCentroCusto'),
@@ -553,7 +570,6 @@ class RelatorioBudget:
             .select_from(BudgetItem)
             .join(Budget, BudgetItem.Codigo_Budget == Budget.Codigo_Budget)
             .outerjoin(BudgetGrupo, BudgetItem.Codigo_BudgetGrupo == BudgetGrupo.Codigo_BudgetGrupo)
-            .outerjoin(subconsultaFiliaisConsolidadas, BudgetItem.Codigo_Empresa == subconsultaFiliaisConsolidadas.c.codigoEmpresa)
             .outerjoin(CentroCusto, BudgetItem.Codigo_CentroCusto == CentroCusto.Codigo_CentroCusto)
             .outerjoin(PlanoConta, BudgetItem.Codigo_ContaContabil == PlanoConta.Codigo_ContaContabil)
             .filter(Budget.Ano_Vigencia == ano)
@@ -574,7 +590,7 @@ class RelatorioBudget:
         return query.group_by(
             BudgetGrupo.Codigo_BudgetGrupo,
             BudgetGrupo.Descricao_BudgetGrupo,
-            subconsultaFiliaisConsolidadas.c.nomeFilial,
+            BudgetItem.Codigo_Empresa,
             CentroCusto.Codigo_CentroCusto,
             CentroCusto.Numero_CentroCusto,
             CentroCusto.Nome_CentroCusto,
@@ -588,7 +604,6 @@ class RelatorioBudget:
         subconsultaDataDigitacaoNotaFiscal = self._obterSubconsultaDataDigitacaoNotaFiscal()
         dataDigitacaoEfetiva = self._obterDataDigitacaoEfetivaContaPagar(subconsultaDataDigitacaoNotaFiscal)
         valorEfetivoContaPagar = self._obterValorEfetivoContaPagar()
-        subconsultaFiliaisConsolidadas = self._obterSubconsultaFiliaisConsolidadas()
         subconsultaMapeamentoGrupo = self._obterSubconsultaMapeamentoGrupoAnalitico(
             ano,
             idsCentros,
@@ -611,7 +626,7 @@ class RelatorioBudget:
             self.session.query(
                 grupoCodigo.label('codigoGrupo'),
                 grupoDescricao.label('descricaoGrupo'),
-                subconsultaFiliaisConsolidadas.c.nomeFilial.label('nomeFilial'),
+                ContaPagar.Codigo_Empresa.label('codigoEmpresa'),
                 CentroCusto.Codigo_CentroCusto.label('codigoCentroCusto'),
                 CentroCusto.Numero_CentroCusto.label('numeroCentroCusto'),
                 CentroCusto.Nome_CentroCusto.label('nomeCentroCusto'),
@@ -638,11 +653,9 @@ class RelatorioBudget:
                     subconsultaMapeamentoGrupo.c.codigoContaContabil == ContaPagar.Codigo_ContaContabil,
                 ),
             )
-            .outerjoin(subconsultaFiliaisConsolidadas, ContaPagar.Codigo_Empresa == subconsultaFiliaisConsolidadas.c.codigoEmpresa)
             .outerjoin(CentroCusto, ContaPagar.Codigo_CentroCusto == CentroCusto.Codigo_CentroCusto)
             .outerjoin(PlanoConta, ContaPagar.Codigo_ContaContabil == PlanoConta.Codigo_ContaContabil)
-            .filter(extract('year', dataDigitacaoEfetiva) == ano)
-            .filter(extract('month', dataDigitacaoEfetiva).in_(mesesSelecionados))
+            .filter(self._obterCondicaoPeriodoEfetivo(dataDigitacaoEfetiva, ano, mesesSelecionados))
             .filter(ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_CONSIDERADOS))
             .filter(valorEfetivoContaPagar != 0)
         )
@@ -662,7 +675,7 @@ class RelatorioBudget:
         return query.group_by(
             grupoCodigo,
             grupoDescricao,
-            subconsultaFiliaisConsolidadas.c.nomeFilial,
+            ContaPagar.Codigo_Empresa,
             CentroCusto.Codigo_CentroCusto,
             CentroCusto.Numero_CentroCusto,
             CentroCusto.Nome_CentroCusto,
@@ -717,7 +730,7 @@ class RelatorioBudget:
     def _obterRegistroAnalitico(self, acumulador, linha):
         """Obtém/cria registro acumulador para o relatório analítico por grupo e conta."""
         grupo = (str(getattr(linha, 'descricaoGrupo', '') or '').strip()) or 'Sem grupo orçamentário'
-        filial = (str(getattr(linha, 'nomeFilial', '') or '').strip()) or 'Sem filial vinculada'
+        filial = self._obterNomeFilialEmpresa(getattr(linha, 'codigoEmpresa', None)) or 'Sem filial vinculada'
         numeroConta = str(getattr(linha, 'numeroContaContabil', '') or '').strip()
         descricaoConta = str(getattr(linha, 'descricaoContaContabil', '') or '').strip()
         contaContabil = self._montarDescricaoComposta(
@@ -752,15 +765,13 @@ class RelatorioBudget:
 
     def _obterOpcoesFiliaisAnalitico(self, ano, idsCentros, codigoEmpresaMatriz):
         """Lista filiais disponíveis no analítico com base em orçamento e realizado."""
-        subconsultaFiliais = self._obterSubconsultaFiliais()
-        filiais = set()
+        empresas = set()
 
         queryOrcado = (
-            # Busca filiais que aparecem no ORÇADO dentro do recorte informado.
-            self.session.query(subconsultaFiliais.c.nomeFilial.label('nomeFilial'))
+            # Busca empresas que aparecem no ORÇADO dentro do recorte informado (as filiais vêm da dimensão em cache).
+            self.session.query(BudgetItem.Codigo_Empresa.label('codigoEmpresa'))
             .select_from(BudgetItem)
             .join(Budget, BudgetItem.Codigo_Budget == Budget.Codigo_Budget)
-            .join(subconsultaFiliais, BudgetItem.Codigo_Empresa == subconsultaFiliais.c.codigoEmpresa)
             .filter(Budget.Ano_Vigencia == ano)
         )
 
@@ -775,23 +786,20 @@ class RelatorioBudget:
             codigoEmpresaMatriz,
         )
 
-        for linha in queryOrcado.distinct().all():
-            if linha.nomeFilial:
-                filiais.add(str(linha.nomeFilial).strip())
+        empresas.update(linha.codigoEmpresa for linha in queryOrcado.distinct().all())
 
         subconsultaDataDigitacaoNotaFiscal = self._obterSubconsultaDataDigitacaoNotaFiscal()
         dataDigitacaoEfetiva = self._obterDataDigitacaoEfetivaContaPagar(subconsultaDataDigitacaoNotaFiscal)
 
         queryStatus = (
-            # Busca filiais que aparecem no REALIZADO (contas a pagar) para o mesmo recorte.
-            self.session.query(subconsultaFiliais.c.nomeFilial.label('nomeFilial'))
+            # Busca empresas que aparecem no REALIZADO (contas a pagar) para o mesmo recorte.
+            self.session.query(ContaPagar.Codigo_Empresa.label('codigoEmpresa'))
             .select_from(ContaPagar)
             .outerjoin(
                 subconsultaDataDigitacaoNotaFiscal,
                 ContaPagar.Codigo_ContaPagar == subconsultaDataDigitacaoNotaFiscal.c.codigoContaPagar,
             )
-            .join(subconsultaFiliais, ContaPagar.Codigo_Empresa == subconsultaFiliais.c.codigoEmpresa)
-            .filter(extract('year', dataDigitacaoEfetiva) == ano)
+            .filter(self._obterCondicaoPeriodoEfetivo(dataDigitacaoEfetiva, ano))
             .filter(ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_CONSIDERADOS))
         )
 
@@ -806,10 +814,11 @@ class RelatorioBudget:
             codigoEmpresaMatriz,
         )
 
-        for linha in queryStatus.distinct().all():
-            if linha.nomeFilial:
-                filiais.add(str(linha.nomeFilial).strip())
+        empresas.update(linha.codigoEmpresa for linha in queryStatus.distinct().all())
 
+        filiais = set()
+        for codigoEmpresa in empresas:
+            filiais.update(CacheFiliaisBudget.ObterFiliaisEmpresa(self.session, codigoEmpresa))
         return sorted(filiais, key=lambda valor: valor.lower())
 
     def _obterConsultaRelacionamentosOrcados(self, ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz):
@@ -869,7 +878,7 @@ class RelatorioBudget:
             )
             .outerjoin(CentroCusto, ContaPagar.Codigo_CentroCusto == CentroCusto.Codigo_CentroCusto)
             .outerjoin(PlanoConta, ContaPagar.Codigo_ContaContabil == PlanoConta.Codigo_ContaContabil)
-            .filter(extract('year', dataDigitacaoEfetiva) == ano)
+            .filter(self._obterCondicaoPeriodoEfetivo(dataDigitacaoEfetiva, ano))
             .filter(ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_CONSIDERADOS))
             .filter(valorEfetivoContaPagar != 0)
         )
@@ -950,44 +959,41 @@ class RelatorioBudget:
 
         return self._construirOpcoesFiltros(relacionamentos)
 
-    def _consolidarDetalhesMensais(self, ano, idsCentros, idsContasContabeis, codigoEmpresaMatriz):
-        """Consolida os detalhes mensais do relatório base em memória."""
+    def _consolidarDetalhesMensais(self, linhasGerenciais):
+        """Consolida em memória os detalhes mensais a partir das linhas da consulta gerencial combinada."""
         detalhesPorMes = {
             numero: {}
             for numero, _, _, _, _ in self.MESES_RELATORIO
         }
 
-        for linha in self._obterConsultaOrcadoMensal(
-            ano,
-            idsCentros,
-            idsContasContabeis,
-            codigoEmpresaMatriz,
-        ).all():
-            for numeroMes, _, _, rotulo, _ in self.MESES_RELATORIO:
-                valorOrcado = float(getattr(linha, rotulo) or 0.0)
+        # Linhas do orçado (mesCompetencia = 0) trazem os 12 meses em colunas. Como também vêm separadas pelo
+        # código do lançamento (idCentroCusto/idContaContabil), são somadas por dimensão cadastral antes de
+        # descartar os meses zerados, do mesmo jeito que o agrupamento só por cadastro fazia.
+        orcadoPorDimensao = {}
+        for linha in linhasGerenciais:
+            if int(linha.mesCompetencia or 0) != 0:
+                continue
+            dimensao = tuple(getattr(linha, rotulo) for rotulo in self.DIMENSOES_CADASTRAIS_GERENCIAL)
+            linhaBase, valores = orcadoPorDimensao.setdefault(dimensao, (linha, [0.0] * len(self.MESES_RELATORIO)))
+            for indice, (_, _, _, rotulo, _) in enumerate(self.MESES_RELATORIO):
+                valores[indice] += float(getattr(linha, rotulo) or 0.0)
+
+        for linhaBase, valores in orcadoPorDimensao.values():
+            for (numeroMes, _, _, _, _), valorOrcado in zip(self.MESES_RELATORIO, valores):
                 if valorOrcado == 0:
                     continue
 
-                registro = self._obterRegistroConsolidado(detalhesPorMes[numeroMes], linha)
+                registro = self._obterRegistroConsolidado(detalhesPorMes[numeroMes], linhaBase)
                 registro['orcado'] += valorOrcado
 
-        for linha in self._obterConsultaStatusMensal(
-            ano,
-            idsCentros,
-            idsContasContabeis,
-            codigoEmpresaMatriz,
-        ).all():
-            numeroMes = int(linha.mesCompetencia or 0)
-            if numeroMes not in detalhesPorMes:
+        for linha in linhasGerenciais:
+            numeroMesLinha = int(linha.mesCompetencia or 0)
+            if numeroMesLinha not in detalhesPorMes:
                 continue
 
-            registro = self._obterRegistroConsolidado(detalhesPorMes[numeroMes], linha)
-            registro['emAprovacao'] += float(linha.emAprovacao or 0.0)
-            registro['aprovado'] += float(linha.aprovado or 0.0)
-            registro['total'] += float(linha.total or 0.0)
-            registro['emAprovacaoComBudget'] += float(linha.emAprovacaoComBudget or 0.0)
-            registro['aprovadoComBudget'] += float(linha.aprovadoComBudget or 0.0)
-            registro['totalComBudget'] += float(linha.totalComBudget or 0.0)
+            registro = self._obterRegistroConsolidado(detalhesPorMes[numeroMesLinha], linha)
+            for rotulo in self.COLUNAS_REALIZADO_GERENCIAL:
+                registro[rotulo] += float(getattr(linha, rotulo) or 0.0)
 
         return detalhesPorMes
 
@@ -1101,6 +1107,29 @@ class RelatorioBudget:
         )
         return query.filter(campoContaContabil.notin_(subconsulta))
 
+    def _montarFiltrosDisponiveis(self, linhasGerenciais, idsCentrosRestritos, idsContas):
+        """
+        Deriva as opções de centro de custo e conta contábil das linhas gerenciais já carregadas
+        (consultadas com os CCs visíveis ao usuário e sem filtro de conta).
+        Os centros respeitam as contas selecionadas; as contas respeitam os centros selecionados.
+        """
+        centrosDisponiveis, _ = self._construirOpcoesFiltros(
+            self._filtrarLinhasGerenciais(linhasGerenciais, None, idsContas, somenteComValor=True)
+        )
+        _, contasDisponiveis = self._construirOpcoesFiltros(
+            self._filtrarLinhasGerenciais(linhasGerenciais, idsCentrosRestritos, None, somenteComValor=True)
+        )
+
+        return {
+            'empresas': [
+                {'id': 'Todos', 'nome': 'Todas as Empresas'},
+                {'id': '1', 'nome': 'Intec'},
+                {'id': '2', 'nome': 'Farma'}
+            ],
+            'centrosCusto': centrosDisponiveis,
+            'contasContabeis': contasDisponiveis,
+        }
+
     def obterFiltrosDisponiveis(self, ano, filtroCentroCusto='Todos', filtroContaContabil='Todos', filtroEmpresa='Todos', centrosPermitidos=None):
         """
         Busca as opções válidas de Centros de Custo e Contas Contábeis conforme
@@ -1118,28 +1147,9 @@ class RelatorioBudget:
         # CCs para filtrar contas (intersecta com a seleção do usuário)
         idsCentrosRestritos = self._resolverIdsCentrosPermitidos(idsCentros, centrosPermitidos)
 
-        centrosDisponiveis, _ = self._obterOpcoesFiltros(
-            ano,
-            idsCentrosParaLista,
-            idsContas,
-            codigoEmpresaMatriz,
-        )
-        _, contasDisponiveis = self._obterOpcoesFiltros(
-            ano,
-            idsCentrosRestritos,
-            None,
-            codigoEmpresaMatriz,
-        )
-
-        return {
-            'empresas': [
-                {'id': 'Todos', 'nome': 'Todas as Empresas'},
-                {'id': '1', 'nome': 'Intec'},
-                {'id': '2', 'nome': 'Farma'}
-            ],
-            'centrosCusto': centrosDisponiveis,
-            'contasContabeis': contasDisponiveis,
-        }
+        # Uma única consulta no escopo mais amplo (CCs visíveis, todas as contas); os dois recortes saem em memória.
+        linhasGerenciais = self._obterLinhasGerenciais(ano, idsCentrosParaLista, None, codigoEmpresaMatriz)
+        return self._montarFiltrosDisponiveis(linhasGerenciais, idsCentrosRestritos, idsContas)
 
     def obterFiltrosAnalitico(self, ano, filtroEmpresa='Todos', filtroCentroCusto='Todos', centrosPermitidos=None):
         """Retorna filtros disponíveis para a visão analítica do orçamento."""
@@ -1208,14 +1218,59 @@ class RelatorioBudget:
             centrosPermitidos,
         )
         idsContasContabeis = self._extrairIdsNumericos(filtroContaContabil)
-        detalhesPorMes = self._consolidarDetalhesMensais(
+        linhasGerenciais = self._obterLinhasGerenciais(
             ano,
             idsCentros,
             idsContasContabeis,
             codigoEmpresaMatriz,
         )
 
-        return self._montarRetornoMensal(detalhesPorMes)
+        return self._montarRetornoMensal(self._consolidarDetalhesMensais(linhasGerenciais))
+
+    def gerarRelatorioBudgetComFiltros(
+        self,
+        ano,
+        filtroCentroCusto='Todos',
+        filtroContaContabil='Todos',
+        filtroEmpresa='Todos',
+        centrosPermitidos=None,
+        filtroCentroCustoOpcoes=None,
+        filtroContaContabilOpcoes=None,
+    ):
+        """
+        Gera o consolidado gerencial e as opções de filtro da tela com uma única consulta.
+        A consulta combinada roda no escopo mais amplo (CCs visíveis ao usuário, todas as contas);
+        o relatório e as listas de filtro são recortes em memória do mesmo resultado.
+
+        Args:
+            filtroCentroCustoOpcoes/filtroContaContabilOpcoes: seleção usada para montar as opções de filtro,
+                quando difere da seleção do relatório (a tela trata seleção vazia como 'Todos' nos filtros).
+                Sem valor, usa os próprios filtros do relatório.
+
+        Returns:
+            dict: Mesmo payload de gerarRelatorioBudget com a chave 'filtros' (payload de obterFiltrosDisponiveis).
+        """
+        codigoEmpresaMatriz = self._resolverCodigoEmpresaMatriz(filtroEmpresa)
+        if filtroCentroCustoOpcoes is None:
+            filtroCentroCustoOpcoes = filtroCentroCusto
+        if filtroContaContabilOpcoes is None:
+            filtroContaContabilOpcoes = filtroContaContabil
+
+        idsCentrosParaLista = self._resolverIdsCentrosPermitidos(None, centrosPermitidos)
+        linhasGerenciais = self._obterLinhasGerenciais(ano, idsCentrosParaLista, None, codigoEmpresaMatriz)
+
+        linhasRelatorio = self._filtrarLinhasGerenciais(
+            linhasGerenciais,
+            self._resolverIdsCentrosPermitidos(self._extrairIdsNumericos(filtroCentroCusto), centrosPermitidos),
+            self._extrairIdsNumericos(filtroContaContabil),
+        )
+        dados = self._montarRetornoMensal(self._consolidarDetalhesMensais(linhasRelatorio))
+        dados['filtros'] = self._montarFiltrosDisponiveis(
+            linhasGerenciais,
+            self._resolverIdsCentrosPermitidos(self._extrairIdsNumericos(filtroCentroCustoOpcoes), centrosPermitidos),
+            self._extrairIdsNumericos(filtroContaContabilOpcoes),
+        )
+        return dados
 
     def gerarRelatorioBudgetAnalitico(self, ano, mes, filtroCentroCusto='Todos', filtroEmpresa='Todos', filtroFilial='Todos', centrosPermitidos=None):
         """
@@ -1409,8 +1464,7 @@ class RelatorioBudget:
             )
             .select_from(ContaPagar)
             .outerjoin(subconsultaNF, ContaPagar.Codigo_ContaPagar == subconsultaNF.c.codigoContaPagar)
-            .filter(extract('year', dataEfetiva) == int(ano))
-            .filter(extract('month', dataEfetiva) <= mesAtual)
+            .filter(self._obterCondicaoPeriodoEfetivo(dataEfetiva, ano, range(1, mesAtual + 1)))
             .filter(ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_CONSIDERADOS))
             .group_by(extract('month', dataEfetiva))
         )
@@ -1522,8 +1576,7 @@ class RelatorioBudget:
             .outerjoin(CentroCusto, ContaPagar.Codigo_CentroCusto == CentroCusto.Codigo_CentroCusto)
             .outerjoin(PlanoConta, ContaPagar.Codigo_ContaContabil == PlanoConta.Codigo_ContaContabil)
             .outerjoin(Fornecedor, ContaPagar.Codigo_Fornecedor == Fornecedor.Codigo_Fornecedor)
-            .filter(extract('year', dataEfetiva) == int(ano))
-            .filter(extract('month', dataEfetiva) == int(mes))
+            .filter(self._obterCondicaoPeriodoEfetivo(dataEfetiva, ano, [mes]))
             .filter(ContaPagar.Opcao_StatusContaPagar.in_(self.STATUS_CONSIDERADOS))
         )
 
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from Db.Connections import GetPostgresEngine, GetPostgresSession
+from Modules.BUDGET.Services.ReplicacaoBudgetService import ReplicacaoBudgetService
+from Utils.Logger import RegistrarLog
+
+
+class AgendadorReplicacaoBudget:
+    """
+    Agendador em background da replicação do Budget/Contas a Pagar do ERP para o PostgreSQL.
+    Mesmo desenho do AgendadorSincronizacaoConsolidado: uma thread por processo em intervalo fixo
+    e um advisory lock próprio garantindo uma única replicação no cluster.
+    Desligado por padrão: só faz sentido com a réplica criada (Scripts/Code/CriarSnapshotBudget.py).
+    """
+
+    CHAVE_ADVISORY_LOCK = 718_204_002
+    INTERVALO_SEGUNDOS = int(os.getenv("BUDGET_REPLICACAO_INTERVALO", "300"))
+    ATIVO = os.getenv("BUDGET_REPLICACAO_AGENDADOR", "False").lower() == "true"
+
+    _thread = None
+    _evento_parada = threading.Event()
+    _lock_estado = threading.Lock()
+    _status = {
+        'status': 'aguardando',
+        'ultima_execucao': None,
+        'ultima_conclusao': None,
+        'duracao_ms': None,
+        'resumo': None,
+        'erro': None,
+        'execucoes': 0,
+        'ignoradas_lock': 0,
+    }
+
+    @classmethod
+    def Iniciar(cls):
+        """Sobe a thread do agendador (idempotente)."""
+        if not cls.ATIVO:
+            RegistrarLog("Agendador da replicação do Budget desativado (BUDGET_REPLICACAO_AGENDADOR).", "SYSTEM")
+            return
+        with cls._lock_estado:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._evento_parada.clear()
+            cls._thread = threading.Thread(target=cls._Loop, name="AgendadorReplicacaoBudget", daemon=True)
+            cls._thread.start()
+        RegistrarLog(f"Agendador da replicação do Budget iniciado (intervalo: {cls.INTERVALO_SEGUNDOS}s).", "SYSTEM")
+
+    @classmethod
+    def Parar(cls, timeout=10):
+        cls._evento_parada.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout)
+
+    @classmethod
+    def ObterStatus(cls):
+        with cls._lock_estado:
+            status = dict(cls._status)
+        for campo in ('ultima_execucao', 'ultima_conclusao'):
+            if status[campo] is not None:
+                status[campo] = status[campo].strftime('%d/%m/%Y %H:%M:%S')
+        return status
+
+    @classmethod
+    def _Loop(cls):
+        # Primeira execução logo na subida: a réplica pode estar parada há horas
+        while not cls._evento_parada.is_set():
+            try:
+                cls.ExecutarComLock()
+            except Exception as e:
+                # A thread nunca deve morrer: o erro fica registrado no status e no log
+                RegistrarLog("Falha inesperada no agendador da replicação do Budget", "ERROR", e)
+            cls._evento_parada.wait(cls.INTERVALO_SEGUNDOS)
+
+    @classmethod
+    def ExecutarComLock(cls, completo=None):
+        """
+        Executa a replicação somente se conseguir o advisory lock do cluster.
+        Também serve à carga manual (completo=True). Retorna False se outra execução estiver em andamento.
+        """
+        engine = GetPostgresEngine()
+        if engine is None:
+            return False
+
+        with engine.connect() as conn_lock:
+            obteve_lock = conn_lock.execute(
+                text("SELECT pg_try_advisory_lock(:chave)"), {"chave": cls.CHAVE_ADVISORY_LOCK}
+            ).scalar()
+            conn_lock.commit()
+
+            if not obteve_lock:
+                with cls._lock_estado:
+                    cls._status['ignoradas_lock'] += 1
+                return False
+
+            try:
+                cls._Executar(completo)
+            finally:
+                conn_lock.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": cls.CHAVE_ADVISORY_LOCK})
+                conn_lock.commit()
+        return True
+
+    @classmethod
+    def _Executar(cls, completo=None):
+        t0 = time.time()
+        with cls._lock_estado:
+            cls._status.update({'status': 'executando', 'ultima_execucao': datetime.now()})
+
+        session_db = GetPostgresSession()
+        try:
+            resumo = ReplicacaoBudgetService(session_db).replicarDados(completo)
+            with cls._lock_estado:
+                cls._status.update({'status': 'success', 'resumo': resumo, 'erro': None})
+        except Exception as e:
+            with cls._lock_estado:
+                cls._status.update({'status': 'error', 'erro': str(e)})
+            if completo:
+                raise
+        finally:
+            session_db.close()
+            with cls._lock_estado:
+                cls._status['ultima_conclusao'] = datetime.now()
+                cls._status['duracao_ms'] = round((time.time() - t0) * 1000, 2)
+                cls._status['execucoes'] += 1
@@ -1,15 +1,67 @@
-from Db.Connections import GetSqlServerSession
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from Db.Connections import GetBudgetSnapshotSession, GetPostgresSession, GetSqlServerSession
 from Modules.BUDGET.Reports.RelatorioBudget import RelatorioBudget
+from Modules.BUDGET.Services.ReplicacaoBudgetService import ReplicacaoBudgetService
 from Modules.SISTEMA.Services.CentroCustoConfigService import CentroCustoConfigService
+from Utils.Logger import RegistrarLog
 
 class RelatoriosService:
     """
     Serviço fachada para os relatórios do módulo de Budget.
     Centraliza o ciclo de vida da sessão e delega para as classes de report.
+    A origem dos dados é 'erp' (SQL Server ao vivo) ou 'snapshot' (réplica no PostgreSQL,
+    ver ReplicacaoBudgetService); todo payload informa a origem e a data de referência.
     """
 
+    ORIGEM_DADOS = os.getenv("BUDGET_ORIGEM_DADOS", "erp").lower()
+    # No ERP a data efetiva materializada é opcional (Scripts/Code/CriarDataEfetivaContaPagar.py)
+    DATA_EFETIVA_MATERIALIZADA_ERP = os.getenv("BUDGET_DATA_EFETIVA_MATERIALIZADA_ERP", "False").lower() == "true"
+
+    # Cache de resultados: vários gestores abrem a mesma visão (ano/empresa) no mesmo minuto.
+    # TTL curto porque o ERP muda ao longo do dia; LRU limitado em número de payloads.
+    TTL_CACHE_RESULTADOS = int(os.getenv("BUDGET_RESULTADOS_CACHE_TTL", "120"))
+    MAX_ENTRADAS_CACHE_RESULTADOS = int(os.getenv("BUDGET_RESULTADOS_CACHE_MAX", "200"))
+
+    _cache_resultados = OrderedDict()
+    _geracao_cache = 0
+    _lock_cache = threading.Lock()
+    _metricas_cache = {
+        'acertos': 0,
+        'faltas': 0,
+        'expiradas': 0,
+        'despejadas': 0,
+        'limpezas': 0,
+        'ultima_limpeza': None,
+        'ultimo_motivo': None,
+    }
+
     def _ObterSessao(self):
-        return GetSqlServerSession()
+        """Retorna (sessão, atualizacaoDados). Sem réplica disponível, cai para o ERP."""
+        if self.ORIGEM_DADOS == 'snapshot':
+            try:
+                session_db = GetPostgresSession()
+                try:
+                    data_referencia = ReplicacaoBudgetService.ObterDataReferencia(session_db)
+                finally:
+                    session_db.close()
+                if data_referencia is not None:
+                    return GetBudgetSnapshotSession(), self._MontarAtualizacao('snapshot', data_referencia)
+            except Exception as e:
+                RegistrarLog("Réplica do Budget indisponível, consultando o ERP", "WARNING", e)
+        return GetSqlServerSession(), self._MontarAtualizacao('erp', datetime.now())
+
+    def _CriarRelatorio(self, sessao, atualizacao):
+        materializada = atualizacao['origem'] == 'snapshot' or self.DATA_EFETIVA_MATERIALIZADA_ERP
+        return RelatorioBudget(sessao, dataEfetivaMaterializada=materializada)
+
+    @staticmethod
+    def _MontarAtualizacao(origem, data_referencia):
+        return {'origem': origem, 'dataReferencia': data_referencia.strftime('%d/%m/%Y %H:%M:%S')}
 
     def _resolverCentrosPermitidos(self, codigo_usuario):
         """Retorna a lista de CCs permitidos para o usuário, ou None quando não há restrição."""
@@ -17,41 +69,185 @@ class RelatoriosService:
             return None
         return CentroCustoConfigService().obterCentrosCustoDoGestor(codigo_usuario)
 
-    def obterFiltrosDisponiveis(self, ano, filtroCentroCusto='Todos', filtroContaContabil='Todos', filtroEmpresa='Todos', codigo_usuario=None):
-        centrosPermitidos = self._resolverCentrosPermitidos(codigo_usuario)
-        sessao = self._ObterSessao()
+    def _ExecutarRelatorio(self, centrosPermitidos, gerar):
+        """Abre a sessão da origem vigente, executa gerar(relatorio, centrosPermitidos) e anexa atualizacaoDados."""
+        sessao, atualizacao = self._ObterSessao()
         try:
-            relatorio = RelatorioBudget(sessao)
-            return relatorio.obterFiltrosDisponiveis(ano, filtroCentroCusto, filtroContaContabil, filtroEmpresa, centrosPermitidos)
+            dados = gerar(self._CriarRelatorio(sessao, atualizacao), centrosPermitidos)
         finally:
             sessao.close()
+        dados['atualizacaoDados'] = atualizacao
+        return dados
 
-    def obterFiltrosAnalitico(self, ano, filtroEmpresa='Todos', filtroCentroCusto='Todos', codigo_usuario=None):
+    # ==========================================
+    # CACHE DE RESULTADOS (por processo)
+    # ==========================================
+    @staticmethod
+    def _NormalizarFiltro(valor):
+        """
+        Mesma leitura dos filtros no RelatorioBudget: itens separados por vírgula, sem vazios,
+        repetições nem 'Todos'. Nada restante equivale a 'Todos'. A ordem é mantida (ela aparece no payload).
+        """
+        if valor is None:
+            return None
+        partes = valor if isinstance(valor, (list, tuple, set)) else str(valor).split(',')
+        itens = []
+        for parte in partes:
+            texto = str(parte).strip()
+            if texto and texto.upper() != 'TODOS' and texto not in itens:
+                itens.append(texto)
+        if not itens:
+            return 'TODOS'
+        return itens[0] if len(itens) == 1 else tuple(itens)
+
+    def _MontarChaveCache(self, operacao, filtros, centrosPermitidos):
+        # A versão da lista de CCs OFF entra na chave: alterá-la muda o resultado de todas as consultas
+        versao_centros_off, _ = CentroCustoConfigService.obterCodigosCentrosOffVersionados()
+        centros = None if centrosPermitidos is None else tuple(sorted({str(codigo).strip() for codigo in centrosPermitidos}))
+        filtros_normalizados = tuple(self._NormalizarFiltro(filtro) for filtro in filtros)
+        return (self.ORIGEM_DADOS, operacao, filtros_normalizados, centros, versao_centros_off)
+
+    @classmethod
+    def _ObterDoCache(cls, chave):
+        """Retorna (dados ou None, geração do cache no momento da consulta)."""
+        agora = time.time()
+        with cls._lock_cache:
+            entrada = cls._cache_resultados.get(chave)
+            if entrada is not None and entrada['expira_em'] > agora:
+                cls._cache_resultados.move_to_end(chave)
+                cls._metricas_cache['acertos'] += 1
+                return entrada['dados'], cls._geracao_cache
+            if entrada is not None:
+                del cls._cache_resultados[chave]
+                cls._metricas_cache['expiradas'] += 1
+            cls._metricas_cache['faltas'] += 1
+            return None, cls._geracao_cache
+
+    @classmethod
+    def _GuardarNoCache(cls, chave, dados, geracao):
+        with cls._lock_cache:
+            # Uma limpeza durante o cálculo torna o resultado suspeito: devolve, mas não guarda
+            if geracao != cls._geracao_cache:
+                return
+            cls._cache_resultados[chave] = {'dados': dados, 'expira_em': time.time() + cls.TTL_CACHE_RESULTADOS}
+            cls._cache_resultados.move_to_end(chave)
+            while len(cls._cache_resultados) > cls.MAX_ENTRADAS_CACHE_RESULTADOS:
+                cls._cache_resultados.popitem(last=False)
+                cls._metricas_cache['despejadas'] += 1
+
+    def _ExecutarComCache(self, operacao, filtros, codigo_usuario, gerar):
+        """
+        Igual a _ExecutarRelatorio, mas guardando o payload por (origem dos dados, operação, filtros
+        normalizados, CCs permitidos do usuário, versão dos CCs OFF). Um resultado lido do ERP por
+        queda da réplica não é guardado, para não ser servido como se viesse da origem configurada.
+        O payload devolvido é compartilhado entre requisições: quem o recebe não deve alterá-lo.
+        """
         centrosPermitidos = self._resolverCentrosPermitidos(codigo_usuario)
-        sessao = self._ObterSessao()
-        try:
-            relatorio = RelatorioBudget(sessao)
+        if self.TTL_CACHE_RESULTADOS <= 0:
+            return self._ExecutarRelatorio(centrosPermitidos, gerar)
+
+        chave = self._MontarChaveCache(operacao, filtros, centrosPermitidos)
+        dados, geracao = self._ObterDoCache(chave)
+        if dados is not None:
+            return dados
+
+        dados = self._ExecutarRelatorio(centrosPermitidos, gerar)
+        origem_configurada = 'snapshot' if self.ORIGEM_DADOS == 'snapshot' else 'erp'
+        if dados['atualizacaoDados']['origem'] == origem_configurada:
+            self._GuardarNoCache(chave, dados, geracao)
+        return dados
+
+    @classmethod
+    def LimparCacheResultados(cls, motivo='manual'):
+        """Descarta todos os resultados em cache (ex.: depois de um lote de aprovações no ERP). Retorna quantos saíram."""
+        with cls._lock_cache:
+            removidos = len(cls._cache_resultados)
+            cls._cache_resultados.clear()
+            cls._geracao_cache += 1
+            cls._metricas_cache['limpezas'] += 1
+            cls._metricas_cache['ultima_limpeza'] = datetime.now()
+            cls._metricas_cache['ultimo_motivo'] = motivo
+        RegistrarLog(f"Cache de resultados do Budget limpo ({removidos} entradas, motivo: {motivo})", "SYSTEM")
+        return removidos
+
+    @classmethod
+    def ObterStatusCache(cls):
+        with cls._lock_cache:
+            status = dict(cls._metricas_cache)
+            status['entradas'] = len(cls._cache_resultados)
+        consultas = status['acertos'] + status['faltas']
+        if status['ultima_limpeza'] is not None:
+            status['ultima_limpeza'] = status['ultima_limpeza'].strftime('%d/%m/%Y %H:%M:%S')
+        status.update({
+            'taxa_acerto': round(status['acertos'] / consultas, 4) if consultas else None,
+            'ttl_segundos': cls.TTL_CACHE_RESULTADOS,
+            'max_entradas': cls.MAX_ENTRADAS_CACHE_RESULTADOS,
+            'origem_dados': cls.ORIGEM_DADOS,
+        })
+        return status
+
+    # ==========================================
+    # RELATÓRIOS
+    # ==========================================
+    def obterFiltrosDisponiveis(self, ano, filtroCentroCusto='Todos', filtroContaContabil='Todos', filtroEmpresa='Todos', codigo_usuario=None):
+        def gerar(relatorio, centrosPermitidos):
+            return relatorio.obterFiltrosDisponiveis(ano, filtroCentroCusto, filtroContaContabil, filtroEmpresa, centrosPermitidos)
+        return self._ExecutarComCache(
+            'filtros', (ano, filtroCentroCusto, filtroContaContabil, filtroEmpresa), codigo_usuario, gerar
+        )
+
+    def obterFiltrosAnalitico(self, ano, filtroEmpresa='Todos', filtroCentroCusto='Todos', codigo_usuario=None):
+        def gerar(relatorio, centrosPermitidos):
             return relatorio.obterFiltrosAnalitico(ano, filtroEmpresa, filtroCentroCusto, centrosPermitidos)
-        finally:
-            sessao.close()
+        return self._ExecutarComCache(
+            'filtros_analitico', (ano, filtroEmpresa, filtroCentroCusto), codigo_usuario, gerar
+        )
 
     def gerarRelatorioBudget(self, ano, filtroCentroCusto='Todos', filtroContaContabil='Todos', filtroEmpresa='Todos', codigo_usuario=None):
-        centrosPermitidos = self._resolverCentrosPermitidos(codigo_usuario)
-        sessao = self._ObterSessao()
-        try:
-            relatorio = RelatorioBudget(sessao)
+        def gerar(relatorio, centrosPermitidos):
             return relatorio.gerarRelatorioBudget(int(ano), filtroCentroCusto, filtroContaContabil, filtroEmpresa, centrosPermitidos)
-        finally:
-            sessao.close()
+        return self._ExecutarComCache(
+            'gerencial', (ano, filtroCentroCusto, filtroContaContabil, filtroEmpresa), codigo_usuario, gerar
+        )
+
+    def gerarRelatorioBudgetComFiltros(
+        self,
+        ano,
+        filtroCentroCusto='Todos',
+        filtroContaContabil='Todos',
+        filtroEmpresa='Todos',
+        filtroCentroCustoOpcoes=None,
+        filtroContaContabilOpcoes=None,
+        codigo_usuario=None,
+    ):
+        """Relatório gerencial e opções de filtro da tela numa única consulta (carga da página)."""
+        def gerar(relatorio, centrosPermitidos):
+            return relatorio.gerarRelatorioBudgetComFiltros(
+                int(ano),
+                filtroCentroCusto,
+                filtroContaContabil,
+                filtroEmpresa,
+                centrosPermitidos,
+                filtroCentroCustoOpcoes,
+                filtroContaContabilOpcoes,
+            )
+        # Sem seleção própria para as opções, valem os filtros do relatório (mesma regra do RelatorioBudget)
+        filtros = (
+            ano,
+            filtroCentroCusto,
+            filtroContaContabil,
+            filtroEmpresa,
+            filtroCentroCusto if filtroCentroCustoOpcoes is None else filtroCentroCustoOpcoes,
+            filtroContaContabil if filtroContaContabilOpcoes is None else filtroContaContabilOpcoes,
+        )
+        return self._ExecutarComCache('gerencial_filtros', filtros, codigo_usuario, gerar)
 
     def gerarRelatorioBudgetAnalitico(self, ano, mes, filtroCentroCusto='Todos', filtroEmpresa='Todos', filtroFilial='Todos', codigo_usuario=None):
-        centrosPermitidos = self._resolverCentrosPermitidos(codigo_usuario)
-        sessao = self._ObterSessao()
-        try:
-            relatorio = RelatorioBudget(sessao)
+        def gerar(relatorio, centrosPermitidos):
             return relatorio.gerarRelatorioBudgetAnalitico(ano, mes, filtroCentroCusto, filtroEmpresa, filtroFilial, centrosPermitidos)
-        finally:
-            sessao.close()
+        return self._ExecutarComCache(
+            'analitico', (ano, mes, filtroCentroCusto, filtroEmpresa, filtroFilial), codigo_usuario, gerar
+        )
 
     def obterDetalhesBudget(
         self,
@@ -64,10 +260,7 @@ class RelatoriosService:
         filtroEmpresa='Todos',
         codigo_usuario=None,
     ):
-        centrosPermitidos = self._resolverCentrosPermitidos(codigo_usuario)
-        sessao = self._ObterSessao()
-        try:
-            relatorio = RelatorioBudget(sessao)
+        def gerar(relatorio, centrosPermitidos):
             return relatorio.obterDetalhesBudget(
                 ano,
                 mes,
@@ -78,5 +271,4 @@ class RelatoriosService:
                 filtroEmpresa,
                 centrosPermitidos,
             )
-        finally:
-            sessao.close()
\ No newline at end of file
+        return self._ExecutarRelatorio(self._resolverCentrosPermitidos(codigo_usuario), gerar)
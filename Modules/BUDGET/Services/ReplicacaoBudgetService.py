@@ -0,0 +1,276 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, MetaData, Numeric, Table, or_, select, text
+from sqlalchemy.dialects.mssql import MONEY
+
+from Db.Connections import GetSqlServerSession, SCHEMA_SNAPSHOT_BUDGET
+from Models.Postgress.CTL_Sistema import CtlSysControleSincronizacao
+from Models.SqlServer.Budget import Budget, BudgetGrupo, BudgetItem
+from Models.SqlServer.ContaPagar import CentroCusto, ContaPagar, ContaPagarDataEfetiva, ContaPagarNotaFiscal, PlanoConta
+from Models.SqlServer.Empresa import Empresa, TbFilial
+from Models.SqlServer.Fornecedor import Fornecedor
+from Modules.BUDGET.Reports.CacheFiliaisBudget import CacheFiliaisBudget
+from Utils.Logger import RegistrarLog
+
+
+class ReplicacaoBudgetService:
+    """
+    Replica no PostgreSQL (schema Budget_Snapshot) as tabelas do ERP lidas pelo RelatorioBudget.
+    Contas a pagar e notas fiscais são puxadas de forma incremental pelas marcas d'água
+    Data_Importacao/Data_Aprovacao; cadastros e itens de budget, que não têm data de alteração
+    no ERP, são recarregados (os itens apenas dos anos de vigência em aberto).
+    Tudo roda em uma única transação: o relatório nunca enxerga uma réplica pela metade.
+    """
+
+    CHAVE_CONTROLE = 'BUDGET'
+    CHAVE_CP_IMPORTACAO = 'BUDGET_CP_IMPORTACAO'
+    CHAVE_CP_APROVACAO = 'BUDGET_CP_APROVACAO'
+    CHAVE_NF_IMPORTACAO = 'BUDGET_NF_IMPORTACAO'
+
+    TAMANHO_LOTE = int(os.getenv("BUDGET_REPLICACAO_LOTE", "5000"))
+    ANOS_BUDGET_ABERTOS = int(os.getenv("BUDGET_REPLICACAO_ANOS_ABERTOS", "1"))
+    # Exclusões e mudanças de status sem nova data no ERP só são capturadas pela recarga completa
+    HORAS_ENTRE_RECARGAS = int(os.getenv("BUDGET_REPLICACAO_COMPLETA_HORAS", "24"))
+
+    # Cadastros sem data de alteração: recarga integral a cada execução
+    MODELOS_RECARGA = (Budget, BudgetGrupo, PlanoConta, CentroCusto, Fornecedor, Empresa, TbFilial)
+    # Tabelas com marca d'água: upsert pela chave primária
+    MODELOS_INCREMENTAIS = (ContaPagar, ContaPagarNotaFiscal)
+    # Calculadas na própria réplica a partir das tabelas acima
+    MODELOS_DERIVADOS = (ContaPagarDataEfetiva,)
+
+    def __init__(self, session_db):
+        """
+        Parâmetros:
+            session_db (Session): Sessão do PostgreSQL onde fica a réplica e o controle de sincronização.
+        """
+        self.session = session_db
+
+    # =========================================================================
+    # ESTRUTURA DA RÉPLICA
+    # =========================================================================
+    @classmethod
+    def MontarTabelasSnapshot(cls, metadata=None):
+        """
+        Tabelas da réplica com os mesmos nomes e colunas dos models do ERP (requisito do
+        schema_translate_map de GetBudgetSnapshotSession). MONEY vira NUMERIC(19,4), pois o money
+        do PostgreSQL volta como texto formatado; só as tabelas incrementais têm chave primária
+        (usada no ON CONFLICT), as de recarga espelham o ERP sem restrições.
+        """
+        metadata = metadata if metadata is not None else MetaData()
+        tabelas = []
+        for modelo in cls.MODELOS_RECARGA + (BudgetItem,) + cls.MODELOS_INCREMENTAIS + cls.MODELOS_DERIVADOS:
+            origem = modelo.__table__
+            incremental = modelo in cls.MODELOS_INCREMENTAIS + cls.MODELOS_DERIVADOS
+            colunas = [
+                Column(
+                    coluna.name,
+                    Numeric(19, 4) if isinstance(coluna.type, MONEY) else coluna.type,
+                    primary_key=incremental and coluna.primary_key,
+                    autoincrement=False,
+                )
+                for coluna in origem.columns
+            ]
+            tabelas.append(Table(origem.name, metadata, *colunas, schema=SCHEMA_SNAPSHOT_BUDGET))
+        return tabelas
+
+    @staticmethod
+    def _nomeSnapshot(tabela):
+        return f'"{SCHEMA_SNAPSHOT_BUDGET}"."{tabela.name}"'
+
+    @staticmethod
+    def _listaColunas(nomes):
+        return ', '.join(f'"{nome}"' for nome in nomes)
+
+    def _sqlInsert(self, tabela, atualizar=False):
+        colunas = [coluna.name for coluna in tabela.columns]
+        parametros = ', '.join(f':{nome}' for nome in colunas)
+        sql = f'INSERT INTO {self._nomeSnapshot(tabela)} ({self._listaColunas(colunas)}) VALUES ({parametros})'
+        if atualizar:
+            chaves = [coluna.name for coluna in tabela.primary_key.columns]
+            atualizacoes = ', '.join(f'"{nome}" = EXCLUDED."{nome}"' for nome in colunas if nome not in chaves)
+            sql += f' ON CONFLICT ({self._listaColunas(chaves)}) DO UPDATE SET {atualizacoes}'
+        return text(sql)
+
+    # =========================================================================
+    # MARCAS D'ÁGUA
+    # =========================================================================
+    def _obterControle(self, chave):
+        controle = self.session.get(CtlSysControleSincronizacao, chave)
+        if controle is None:
+            controle = CtlSysControleSincronizacao(Chave=chave, Ultimo_Id=0)
+            self.session.add(controle)
+        return controle
+
+    @classmethod
+    def ObterDataReferencia(cls, session_db):
+        """Início da última replicação concluída (os dados da réplica são ao menos desse instante), ou None."""
+        controle = session_db.get(CtlSysControleSincronizacao, cls.CHAVE_CONTROLE)
+        return controle.Data_Referencia if controle is not None else None
+
+    def _precisaRecargaCompleta(self, controle):
+        if controle.Data_Referencia is None:
+            return True
+        ultima_completa = controle.get_snapshot().get('ultima_recarga_completa')
+        if not ultima_completa:
+            return True
+        return datetime.now() - datetime.fromisoformat(ultima_completa) >= timedelta(hours=self.HORAS_ENTRE_RECARGAS)
+
+    # =========================================================================
+    # REPLICAÇÃO
+    # =========================================================================
+    def _lerLotes(self, sessao_erp, consulta):
+        resultado = sessao_erp.execute(consulta.execution_options(yield_per=self.TAMANHO_LOTE))
+        for particao in resultado.mappings().partitions():
+            yield [dict(linha) for linha in particao]
+
+    def _recarregarTabela(self, sessao_erp, tabela, consulta=None, filtro_exclusao='', params=None):
+        """Substitui o conteúdo da réplica (ou o recorte de filtro_exclusao) pelo retrato atual do ERP."""
+        self.session.execute(text(f'DELETE FROM {self._nomeSnapshot(tabela)} {filtro_exclusao}'), params or {})
+        sql = self._sqlInsert(tabela)
+        total = 0
+        for lote in self._lerLotes(sessao_erp, consulta if consulta is not None else select(tabela)):
+            self.session.execute(sql, lote)
+            total += len(lote)
+        return total
+
+    def _recarregarItensBudget(self, sessao_erp, completo):
+        tabela = BudgetItem.__table__
+        if completo:
+            return self._recarregarTabela(sessao_erp, tabela)
+
+        # Orçamentos de anos encerrados não mudam: recarrega só as vigências em aberto
+        ano_inicial = datetime.now().year - self.ANOS_BUDGET_ABERTOS
+        budgets_abertos = select(Budget.__table__.c.Codigo_Budget).where(Budget.__table__.c.Ano_Vigencia >= ano_inicial)
+        return self._recarregarTabela(
+            sessao_erp,
+            tabela,
+            select(tabela).where(tabela.c.Codigo_Budget.in_(budgets_abertos)),
+            f'WHERE "Codigo_Budget" IN (SELECT "Codigo_Budget" FROM {self._nomeSnapshot(Budget.__table__)} '
+            f'WHERE "Ano_Vigencia" >= :ano_inicial)',
+            {'ano_inicial': ano_inicial},
+        )
+
+    def _replicarIncremental(self, sessao_erp, tabela, marcas, completo):
+        """
+        Upsert das linhas alteradas desde as marcas d'água ({coluna de data: chave de controle}).
+        Usa >= na marca: linhas com o mesmo instante gravadas depois da última leitura não se perdem
+        (o upsert torna a releitura inofensiva). Retorna (linhas gravadas, contas a pagar afetadas).
+        """
+        controles = {coluna: self._obterControle(chave) for coluna, chave in marcas.items()}
+        consulta = select(tabela)
+        if completo:
+            self.session.execute(text(f'DELETE FROM {self._nomeSnapshot(tabela)}'))
+        else:
+            condicoes = [
+                tabela.c[coluna] >= controle.Data_Referencia
+                for coluna, controle in controles.items()
+                if controle.Data_Referencia is not None
+            ]
+            if condicoes:
+                consulta = consulta.where(or_(*condicoes))
+
+        maximos = {coluna: None if completo else controle.Data_Referencia for coluna, controle in controles.items()}
+        sql = self._sqlInsert(tabela, atualizar=True)
+        total = 0
+        contas = set()
+        for lote in self._lerLotes(sessao_erp, consulta):
+            self.session.execute(sql, lote)
+            total += len(lote)
+            contas.update(linha['Codigo_ContaPagar'] for linha in lote)
+            for coluna in maximos:
+                maior_lote = max((linha[coluna] for linha in lote if linha[coluna] is not None), default=None)
+                if maior_lote is not None and (maximos[coluna] is None or maior_lote > maximos[coluna]):
+                    maximos[coluna] = maior_lote
+
+        for coluna, controle in controles.items():
+            controle.Data_Referencia = maximos[coluna]
+        return total, contas
+
+    def _atualizarDataEfetiva(self, contas=None):
+        """
+        Recalcula a data efetiva materializada (ContaPagarDataEfetiva) com a mesma regra do
+        RelatorioBudget: última digitação de nota fiscal ou, sem nota, a digitação da conta.
+        contas=None recalcula tudo; senão só as contas a pagar tocadas nesta execução.
+        """
+        tabela = self._nomeSnapshot(ContaPagarDataEfetiva.__table__)
+        filtro_notas = filtro_contas = ''
+        params = {}
+        if contas is None:
+            self.session.execute(text(f'DELETE FROM {tabela}'))
+        else:
+            if not contas:
+                return 0
+            filtro_notas = 'WHERE "Codigo_ContaPagar" = ANY(:contas)'
+            filtro_contas = 'WHERE cp."Codigo_ContaPagar" = ANY(:contas)'
+            params = {'contas': sorted(contas)}
+
+        resultado = self.session.execute(text(f"""
+            INSERT INTO {tabela} ("Codigo_ContaPagar", "Data_DigitacaoEfetiva")
+            SELECT cp."Codigo_ContaPagar", COALESCE(nf."Data_Digitacao", cp."Data_Digitacao")
+            FROM {self._nomeSnapshot(ContaPagar.__table__)} cp
+            LEFT JOIN (
+                SELECT "Codigo_ContaPagar", MAX("Data_Digitacao") AS "Data_Digitacao"
+                FROM {self._nomeSnapshot(ContaPagarNotaFiscal.__table__)}
+                {filtro_notas}
+                GROUP BY "Codigo_ContaPagar"
+            ) nf ON nf."Codigo_ContaPagar" = cp."Codigo_ContaPagar"
+            {filtro_contas}
+            ON CONFLICT ("Codigo_ContaPagar") DO UPDATE SET "Data_DigitacaoEfetiva" = EXCLUDED."Data_DigitacaoEfetiva"
+        """), params)
+        return resultado.rowcount
+
+    def replicarDados(self, completo=None):
+        """
+        Executa a replicação. Com completo=None a recarga completa acontece na primeira execução
+        e a cada BUDGET_REPLICACAO_COMPLETA_HORAS; nas demais, só o incremental.
+        Retorna o resumo de linhas gravadas por tabela.
+        """
+        inicio = datetime.now()
+        controle = self._obterControle(self.CHAVE_CONTROLE)
+        if completo is None:
+            completo = self._precisaRecargaCompleta(controle)
+
+        resumo = {'modo': 'completo' if completo else 'incremental'}
+        sessao_erp = GetSqlServerSession(ignore_centro_custo_off=True)
+        try:
+            for modelo in self.MODELOS_RECARGA:
+                resumo[modelo.__tablename__] = self._recarregarTabela(sessao_erp, modelo.__table__)
+            resumo['BudgetItem'] = self._recarregarItensBudget(sessao_erp, completo)
+            resumo['ContaPagar'], contas_pagar = self._replicarIncremental(
+                sessao_erp,
+                ContaPagar.__table__,
+                {'Data_Importacao': self.CHAVE_CP_IMPORTACAO, 'Data_Aprovacao': self.CHAVE_CP_APROVACAO},
+                completo,
+            )
+            resumo['ContaPagarNotaFiscal'], contas_notas = self._replicarIncremental(
+                sessao_erp,
+                ContaPagarNotaFiscal.__table__,
+                {'Data_Importacao': self.CHAVE_NF_IMPORTACAO},
+                completo,
+            )
+            resumo['ContaPagarDataEfetiva'] = self._atualizarDataEfetiva(None if completo else contas_pagar | contas_notas)
+
+            controle.Data_Referencia = inicio
+            if completo:
+                snapshot = controle.get_snapshot()
+                snapshot['ultima_recarga_completa'] = inicio.isoformat()
+                controle.set_snapshot(snapshot)
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            RegistrarLog("Falha na replicação do Budget", "ERROR", e)
+            raise
+        finally:
+            sessao_erp.close()
+
+        # Empresa/tb_filial acabaram de ser recarregadas na réplica
+        CacheFiliaisBudget.Invalidar('replicacao_budget')
+        # Import tardio: RelatoriosService importa este módulo
+        from Modules.BUDGET.Services.RelatoriosService import RelatoriosService
+        if RelatoriosService.ORIGEM_DADOS == 'snapshot':
+            # Os resultados em cache foram calculados sobre a réplica anterior
+            RelatoriosService.LimparCacheResultados('replicacao_budget')
+        RegistrarLog(f"Replicação do Budget concluída: {resumo}", "SYSTEM")
+        return resumo
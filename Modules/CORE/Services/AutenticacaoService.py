@@ -50,6 +50,11 @@ class UsuarioWrapper(UserMixin):
         finally:
             session_pg.close()
 
+    @property
+    def permissoes_sistema(self):
+        """Permissões efetivas (chaves normalizadas) do sistema, servidas pelo cache do PermissaoService."""
+        return PermissaoService.ObterPermissoesEfetivas(self.id) or frozenset()
+
     def has_permission(self, slug):
         if 'admin.master' in self.all_permissions:
             return True
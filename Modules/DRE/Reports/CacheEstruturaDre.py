@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, text
+
+from Utils.Logger import RegistrarLog
+
+
+class CacheEstruturaDre:
+    """
+    Cache em memória (por processo) da estrutura do DRE, compartilhado por DreGerencial,
+    DreConsolidado e DreOperacao: hierarquia (CTE recursiva), definições por conta,
+    ordenamento, ordem por contexto, CSS dos nós virtuais e títulos das contas.
+
+    O cache é versionado: qualquer escrita de ConfiguracaoDreService/OrdenamentoDreService
+    incrementa a versão (via RegistrarInvalidacao na sessão) e a próxima requisição reconstrói
+    a estrutura uma única vez. O TTL é apenas uma rede de segurança para escritas feitas por
+    outros processos (vários workers/servidores), que não enxergam a versão local.
+    """
+
+    TTL_SEGUNDOS = int(os.getenv("DRE_ESTRUTURA_CACHE_TTL", "600"))
+
+    _lock = threading.Lock()
+    _versao = 0
+    _snapshot = None
+    _metricas = {'acertos': 0, 'reconstrucoes': 0, 'invalidacoes': 0, 'ultimo_motivo': None}
+
+    @classmethod
+    def Obter(cls, session):
+        """Retorna o snapshot vigente, reconstruindo-o se a versão mudou ou o TTL expirou."""
+        snapshot = cls._snapshot
+        if cls._SnapshotValido(snapshot):
+            cls._metricas['acertos'] += 1
+            return snapshot
+
+        with cls._lock:
+            # Outra thread pode ter reconstruído enquanto esperávamos o lock
+            snapshot = cls._snapshot
+            if cls._SnapshotValido(snapshot):
+                cls._metricas['acertos'] += 1
+                return snapshot
+
+            versao = cls._versao
+            t0 = time.time()
+            snapshot = cls._Carregar(session, versao)
+            cls._snapshot = snapshot
+            cls._metricas['reconstrucoes'] += 1
+            RegistrarLog(f"Estrutura do DRE recarregada (versão {versao}, {round((time.time() - t0) * 1000, 2)}ms)", "SYSTEM")
+            return snapshot
+
+    @classmethod
+    def ObterMotor(cls, session, agrupar_por_cc=False):
+        """Retorna o MotorAgregacaoDre do snapshot vigente (as regras já vêm pré-computadas)."""
+        from Modules.DRE.Reports.MotorAgregacaoDre import MotorAgregacaoDre
+
+        snapshot = cls.Obter(session)
+        chave = bool(agrupar_por_cc)
+        motor = snapshot['motores'].get(chave)
+        if motor is None:
+            motor = MotorAgregacaoDre(
+                snapshot['definitions'], snapshot['ordem_map'], snapshot['ordem_subgrupos_contexto'],
+                snapshot['css_map'], snapshot['mapa_titulos'], chave
+            )
+            snapshot['motores'][chave] = motor
+        return motor
+
+    @classmethod
+    def Invalidar(cls, motivo='manual'):
+        with cls._lock:
+            cls._versao += 1
+            cls._metricas['invalidacoes'] += 1
+            cls._metricas['ultimo_motivo'] = motivo
+
+    @classmethod
+    def RegistrarInvalidacao(cls, sessao, motivo):
+        """Invalida o cache a cada commit da sessão informada (sessões dos serviços de configuração)."""
+        event.listen(sessao, 'after_commit', lambda _sessao: cls.Invalidar(motivo))
+        return sessao
+
+    @classmethod
+    def ObterStatus(cls):
+        snapshot = cls._snapshot
+        status = dict(cls._metricas)
+        status.update({
+            'versao': cls._versao,
+            'versao_carregada': snapshot['versao'] if snapshot else None,
+            'carregado_em': snapshot['carregado_em'].strftime('%d/%m/%Y %H:%M:%S') if snapshot else None,
+            'ttl_segundos': cls.TTL_SEGUNDOS,
+        })
+        return status
+
+    @classmethod
+    def _SnapshotValido(cls, snapshot):
+        if snapshot is None or snapshot['versao'] != cls._versao:
+            return False
+        return (time.time() - snapshot['carregado_ts']) < cls.TTL_SEGUNDOS
+
+    @classmethod
+    def _Carregar(cls, session, versao):
+        # Import tardio: DreGerencial também depende deste módulo
+        from Modules.DRE.Reports.DreGerencial import DreGerencial
+
+        dre_base = DreGerencial(session)
+        tree_map, definitions = dre_base._ObterEstruturaHierarquia()
+
+        sql_css = text('SELECT "Id", "Estilo_CSS" FROM "Dre_Schema"."Tb_CTL_Dre_No_Virtual"')
+        css_map = {row.Id: row.Estilo_CSS for row in session.execute(sql_css).fetchall() if row.Estilo_CSS}
+
+        # O fato mensal tem uma linha por conta/mês, bem menor que a consolidada
+        sql_nomes = text('SELECT DISTINCT "Conta", "Título Conta" FROM "Dre_Schema"."Tb_CTL_Razao_Fato_Mensal"')
+        mapa_titulos = {row[0]: row[1] for row in session.execute(sql_nomes).fetchall()}
+
+        return {
+            'versao': versao,
+            'carregado_em': datetime.now(),
+            'carregado_ts': time.time(),
+            'tree_map': tree_map,
+            'definitions': dict(definitions),
+            'ordem_map': dre_base._ObterOrdenamento(),
+            'ordem_subgrupos_contexto': dre_base._ObterOrdemSubgruposPorContexto(),
+            'css_map': css_map,
+            'mapa_titulos': mapa_titulos,
+            'motores': {},
+        }
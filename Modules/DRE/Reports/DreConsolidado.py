@@ -1,12 +1,16 @@
 import json
 import math
 from collections import defaultdict
+import numpy as np
+import pandas as pd
 from sqlalchemy import text
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
 from Utils.Utils import ReportUtils
 from Utils.Logger import RegistrarLog
+from Modules.DRE.Reports.MotorAgregacaoDre import MotorAgregacaoDre
+from Modules.DRE.Reports.CacheEstruturaDre import CacheEstruturaDre
 
 class DreConsolidado:
     def __init__(self, session):
@@ -16,21 +20,6 @@ class DreConsolidado:
             'CABREUVA', 'NAO_OPER_INTEC', 'NAO_OPER_FARMA', 'INTERGRUPO', 'Total_Geral'
         ]
 
-    def _ObterEstruturaHierarquia(self):
-        from Modules.DRE.Reports.DreGerencial import DreGerencial
-        dre_base = DreGerencial(self.session)
-        return dre_base._ObterEstruturaHierarquia()
-
-    def _ObterOrdenamento(self):
-        from Modules.DRE.Reports.DreGerencial import DreGerencial
-        dre_base = DreGerencial(self.session)
-        return dre_base._ObterOrdenamento()
-
-    def _ObterOrdemSubgruposPorContexto(self):
-        from Modules.DRE.Reports.DreGerencial import DreGerencial
-        dre_base = DreGerencial(self.session)
-        return dre_base._ObterOrdemSubgruposPorContexto()
-
     # PASSO 2: Adicionado o parâmetro 'item_cod'
     def _DeterminarColuna(self, origem, centro_custo, conta, is_nao_operacional, is_intergrupo, filial_cliente=None, item_cod=None):
         origem = str(origem).upper().strip() if origem else ''
@@ -62,6 +51,29 @@ class DreConsolidado:
             
         return None
 
+    def _DeterminarColunaVetorizada(self, df):
+        """Mesmas regras de _DeterminarColuna aplicadas ao frame inteiro por máscaras ('' = sem coluna)."""
+        origem = MotorAgregacaoDre.TextoNormalizado(df['origem'])
+        cc = MotorAgregacaoDre.TextoNormalizado(df['Centro_Custo'])
+        filial = MotorAgregacaoDre.TextoNormalizado(df['Filial_Cliente'])
+        item = MotorAgregacaoDre.TextoNormalizado(df['Item'], maiusculo=False)
+        intergrupo = MotorAgregacaoDre.Verdadeiro(df['Is_Intergrupo_Auto'])
+        farma = origem == 'FARMA'
+
+        condicoes = [
+            intergrupo,
+            (item == '10190') & (origem == 'INTEC'),
+            item == '10190',
+            origem == 'INTEC',
+            origem == 'FARMADIST',
+            farma & MotorAgregacaoDre.Contem(cc, 'POLO'),
+            farma & MotorAgregacaoDre.Contem(filial, 'JANDIRA'),
+            farma & MotorAgregacaoDre.Contem(filial, 'ITAPEVI 15'),
+            farma,
+        ]
+        escolhas = ['INTERGRUPO', 'NAO_OPER_INTEC', 'NAO_OPER_FARMA', 'INTEC', 'FARMA_DIST', 'POLO', 'JANDIRA', 'CABREUVA', 'FARMA']
+        return pd.Series(np.select(condicoes, escolhas, default=''), index=df.index, dtype=object)
+
     # Contas manipuladas (B/C) e contas originais cujo INTERGRUPO vem exclusivamente de B/C
     CONTAS_INTERGRUPO_MANIPULADAS = {'60101010201B', '60101010201C', '60301020288C', '60301020290B'}
     CONTAS_INTERGRUPO_ORIGINAIS = {'60101010201', '60101010201A', '60301020288', '60301020290', '60101020201', '60101020202'}
@@ -247,6 +259,26 @@ class DreConsolidado:
         RegistrarLog("[INTERGRUPO] processarSaldosIntergrupo finalizado.", "INFO")
         return aggregatedData
 
+    def _AgregarLancamentos(self, motor, raw_rows):
+        """
+        Distribui os saldos do fato nas colunas do consolidado, via motor vetorizado.
+        Contas manipuladas (B/C) ficam de fora (tratadas em processarSaldosIntergrupo) e o INTERGRUPO
+        das contas originais correspondentes não é atribuído aqui.
+        """
+        df = MotorAgregacaoDre.CriarFrame(raw_rows, [
+            'origem', 'Conta', 'Titulo', 'Centro_Custo', 'Saldo', 'Is_Nao_Operacional',
+            'Is_Intergrupo_Auto', 'Filial_Cliente', 'Item'
+        ])
+        conta_atual = MotorAgregacaoDre.TextoNormalizado(df['Conta'], maiusculo=False)
+        df = df.loc[~conta_atual.isin(self.CONTAS_INTERGRUPO_MANIPULADAS)].reset_index(drop=True)
+
+        coluna = self._DeterminarColunaVetorizada(df)
+        saldo = df['Saldo'] = pd.to_numeric(df['Saldo'], errors='coerce')
+        sem_valor = saldo.isna() | (saldo == 0) | ((coluna == 'INTERGRUPO') & df['Conta'].isin(self.CONTAS_INTERGRUPO_ORIGINAIS))
+        df['Coluna'] = coluna.where(~sem_valor, '')
+
+        return motor.Agregar(df, self.colunas, 'Total_Geral')
+
     def _removerContasManipuladas(self, listaResultados):
         """Remove da lista final as linhas referentes às contas manipuladas.
 
@@ -267,123 +299,25 @@ class DreConsolidado:
 
     def ProcessarRelatorio(self, ano=None):
         try:
-            tree_map, definitions = self._ObterEstruturaHierarquia()
-            ordem_map = self._ObterOrdenamento()
-            ordem_subgrupos_contexto = self._ObterOrdemSubgruposPorContexto()
-            
-            sql_css = text('SELECT "Id", "Estilo_CSS" FROM "Dre_Schema"."Tb_CTL_Dre_No_Virtual"')
-            css_map = {row.Id: row.Estilo_CSS for row in self.session.execute(sql_css).fetchall() if row.Estilo_CSS}
-            
-            sql_nomes = text('SELECT DISTINCT "Conta", "Título Conta" FROM "Dre_Schema"."Tb_CTL_Razao_Consolidado"')
-            mapa_titulos = {row[0]: row[1] for row in self.session.execute(sql_nomes).fetchall()}
-
-            aggregated_data = {}
-
-            # PASSO 2: Adicionado 'item_cod' aos parâmetros
-            def ProcessRow(origem, conta, titulo, saldo, cc_original_str, is_nao_operacional=False, is_intergrupo=False, is_skeleton=False, forced_match=None, filial_cliente=None, item_cod=None):
-                
-                # PASSO 3: O bloco de código que transformava a conta em '00000000000' foi removido
-                # para que possas visualizar exatamente as contas originais.
-
-                match = forced_match
-                if not match:
-                    rules = definitions.get(conta, [])
-                    if not rules: return
-                    cc_int = None
-                    if cc_original_str:
-                        try: cc_int = int(''.join(filter(str.isdigit, str(cc_original_str))))
-                        except: pass
-                        if cc_int is not None:
-                            for rule in rules:
-                                if rule.CC_Alvo is not None and cc_int == rule.CC_Alvo:
-                                    match = rule; break
-                    if not match: match = rules[0]
-                
-                if not match: return
-
-                tipo_cc = match.Tipo_Principal or 'Outros'
-                root_virtual_id = match.Raiz_No_Virtual_Id
-                caminho = match.full_path or 'Não Classificado'
-                
-                ordem = 999
-                ordem_secundaria = 500
-                
-                if root_virtual_id: ordem = ordem_map.get(f"virtual:{root_virtual_id}", 999)
-                elif match.Is_Root_Group:
-                    if match.Id_Hierarquia: ordem = ordem_map.get(f"subgrupo:{match.Id_Hierarquia}", 0)
-                else: ordem = ordem_map.get(f"tipo_cc:{tipo_cc}", 999)
-                
-                if caminho and caminho not in ['Não Classificado', 'Direto', 'Calculado']:
-                    partes = caminho.split('||')
-                    if partes:
-                        chave_busca = (partes[0].strip(), str(tipo_cc).strip())
-                        ordem_secundaria = ordem_subgrupos_contexto.get(chave_busca, 999)
-
-                conta_display = conta 
-                titulo_para_exibicao = match.Nome_Personalizado_Def if match.Nome_Personalizado_Def else titulo
-                
-                group_key = (tipo_cc, root_virtual_id, caminho, match.full_ordem_path, titulo_para_exibicao, conta_display)
-
-                if group_key not in aggregated_data:
-                    css_style = css_map.get(root_virtual_id, None)
-                    item = {
-                        'Conta': conta_display, 'Titulo_Conta': titulo_para_exibicao,
-                        'Tipo_CC': tipo_cc, 'Root_Virtual_Id': root_virtual_id, 
-                        'Caminho_Subgrupos': caminho, 'Caminho_Ordem': match.full_ordem_path,
-                        'Ordem_Conta': match.Ordem_Conta, 'ordem_prioridade': ordem, 
-                        'ordem_secundaria': ordem_secundaria, 'Estilo_CSS': css_style 
-                    }
-                    for col in self.colunas: item[col] = 0.0
-                    aggregated_data[group_key] = item
-                else:
-                    if match.Ordem_Conta < aggregated_data[group_key]['Ordem_Conta']:
-                        aggregated_data[group_key]['Ordem_Conta'] = match.Ordem_Conta
-
-                if not is_skeleton and saldo != 0:
-                    # Passamos também o item_cod para _DeterminarColuna
-                    coluna_alvo = self._DeterminarColuna(origem, cc_original_str, conta, is_nao_operacional, is_intergrupo, filial_cliente, item_cod)
-
-                    # Contas originais cujo INTERGRUPO vem de B/C: ignora atribuicao a coluna INTERGRUPO aqui
-                    if coluna_alvo == 'INTERGRUPO' and conta in self.CONTAS_INTERGRUPO_ORIGINAIS:
-                        return
-
-                    if coluna_alvo and coluna_alvo in self.colunas:
-                        val_inv = saldo * -1 
-                        aggregated_data[group_key][coluna_alvo] += val_inv
-                        aggregated_data[group_key]['Total_Geral'] += val_inv
-
-            for conta_def, lista_regras in definitions.items():
-                titulo_conta = mapa_titulos.get(conta_def, "Conta Configurada")
-                for regra in lista_regras:
-                    ProcessRow("Config", conta_def, titulo_conta, 0.0, None, False, False, is_skeleton=True, forced_match=regra, filial_cliente=None, item_cod=None)
+            # Estrutura (hierarquia, regras, ordenamento, CSS e títulos) vem do cache versionado
+            motor = CacheEstruturaDre.ObterMotor(self.session)
 
+            # Fato mensal pré-agregado pela sincronização (já restrito a lançamentos válidos)
             params = {}
-            where_clause = 'WHERE "Invalido" = false'
+            where_clause = ''
             if ano:
                 params['ano'] = int(ano)
-                where_clause += ' AND EXTRACT(YEAR FROM "Data") = :ano'
+                where_clause = 'WHERE "Ano" = :ano'
 
             # PASSO 1: Adicionada a coluna "Item" à consulta SQL
             sql_raw = text(f"""
-                SELECT "origem", "Conta", "Título Conta", "Centro de Custo", "Saldo", "Is_Nao_Operacional", "Tipo_Operacao", "Filial Cliente", "Item"
-                FROM "Dre_Schema"."Tb_CTL_Razao_Consolidado" {where_clause}
+                SELECT "origem", "Conta", "Título Conta", "Centro de Custo", SUM("Saldo") AS "Saldo", "Is_Nao_Operacional", "Is_Intergrupo_Auto", "Filial Cliente", "Item"
+                FROM "Dre_Schema"."Tb_CTL_Razao_Fato_Mensal" {where_clause}
+                GROUP BY "origem", "Conta", "Título Conta", "Centro de Custo", "Is_Nao_Operacional", "Is_Intergrupo_Auto", "Filial Cliente", "Item"
             """)
             raw_rows = self.session.execute(sql_raw, params).fetchall()
 
-            for row in raw_rows:
-                # Ignora contas manipuladas (B/C) no loop principal; tratadas em processarSaldosIntergrupo
-                contaAtual = str(row.Conta).strip() if row.Conta else ''
-                if contaAtual in self.CONTAS_INTERGRUPO_MANIPULADAS:
-                    continue
-
-                is_intergrupo = (row.Tipo_Operacao == 'INTERGRUPO_AUTO')
-                # Enviando getattr(row, 'Item', None)
-                ProcessRow(
-                    row.origem, row.Conta, getattr(row, 'Título Conta'), row.Saldo, 
-                    getattr(row, 'Centro de Custo'), row.Is_Nao_Operacional, is_intergrupo, 
-                    is_skeleton=False, filial_cliente=getattr(row, 'Filial Cliente', None),
-                    item_cod=getattr(row, 'Item', None)
-                )
+            aggregated_data = self._AgregarLancamentos(motor, raw_rows)
 
             # Processa saldos intergrupo antes de montar a lista final
             aggregated_data = self.processarSaldosIntergrupo(aggregated_data, ano)
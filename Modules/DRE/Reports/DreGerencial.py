@@ -1,12 +1,16 @@
 import json
 import math
 from collections import defaultdict, namedtuple
+import numpy as np
+import pandas as pd
 from sqlalchemy import text
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
 from Utils.Utils import ReportUtils
 from Utils.Logger import RegistrarLog
+from Modules.DRE.Reports.MotorAgregacaoDre import MotorAgregacaoDre
+from Modules.DRE.Reports.CacheEstruturaDre import CacheEstruturaDre
 
 class DreGerencial:
     def __init__(self, session):
@@ -149,98 +153,16 @@ class DreGerencial:
         if not lista_empresas: return []
 
         try:
-            tree_map, definitions = self._ObterEstruturaHierarquia()
-            ordem_map = self._ObterOrdenamento()
-            ordem_subgrupos_contexto = self._ObterOrdemSubgruposPorContexto()
-            
-            sql_css = text('SELECT "Id", "Estilo_CSS" FROM "Dre_Schema"."Tb_CTL_Dre_No_Virtual"')
-            css_map = {row.Id: row.Estilo_CSS for row in self.session.execute(sql_css).fetchall() if row.Estilo_CSS}
-            
-            sql_nomes = text('SELECT DISTINCT "Conta", "Título Conta" FROM "Dre_Schema"."Tb_CTL_Razao_Consolidado"')
-            mapa_titulos = {row[0]: row[1] for row in self.session.execute(sql_nomes).fetchall()}
-
-            aggregated_data = {}
-
-            def ProcessRow(origem, conta, titulo, data, saldo, cc_original_str, is_nao_operacional=False, is_skeleton=False, forced_match=None):
-                if not is_skeleton and is_nao_operacional:
-                    conta = '00000000000'
-                    titulo = 'Não Operacionais'
-
-                match = forced_match
-                if not match:
-                    rules = definitions.get(conta, [])
-                    if not rules: return
-                    if cc_original_str:
-                        cc_int = None
-                        try: cc_int = int(''.join(filter(str.isdigit, str(cc_original_str))))
-                        except: pass
-                        if cc_int is not None:
-                            for rule in rules:
-                                if rule.CC_Alvo is not None and cc_int == rule.CC_Alvo:
-                                    match = rule; break
-                    if not match: match = rules[0]
-                
-                if not match: return
+            # Estrutura (hierarquia, regras, ordenamento, CSS e títulos) vem do cache versionado
+            motor = CacheEstruturaDre.ObterMotor(self.session, agrupar_por_cc)
 
-                tipo_cc = match.Tipo_Principal or 'Outros'
-                root_virtual_id = match.Raiz_No_Virtual_Id
-                caminho = match.full_path or 'Não Classificado'
-                
-                ordem = 999
-                ordem_secundaria = 500
-                
-                if root_virtual_id: ordem = ordem_map.get(f"virtual:{root_virtual_id}", 999)
-                elif match.Is_Root_Group:
-                    if match.Id_Hierarquia: ordem = ordem_map.get(f"subgrupo:{match.Id_Hierarquia}", 0)
-                else: ordem = ordem_map.get(f"tipo_cc:{tipo_cc}", 999)
-                
-                if caminho and caminho not in ['Não Classificado', 'Direto', 'Calculado']:
-                    partes = caminho.split('||')
-                    if partes:
-                        chave_busca = (partes[0].strip(), str(tipo_cc).strip())
-                        ordem_secundaria = ordem_subgrupos_contexto.get(chave_busca, 999) 
-
-                conta_display = conta 
-                titulo_para_exibicao = match.Nome_Personalizado_Def if match.Nome_Personalizado_Def else titulo
-                
-                group_key = (tipo_cc, root_virtual_id, caminho, match.full_ordem_path, titulo_para_exibicao, conta_display)
-                if agrupar_por_cc: group_key = group_key + (match.Raiz_Centro_Custo_Nome,)
-
-                if group_key not in aggregated_data:
-                    css_style = css_map.get(root_virtual_id, None)
-                    item = {
-                        'origem': origem, 'Conta': conta_display, 'Titulo_Conta': titulo_para_exibicao,
-                        'Tipo_CC': tipo_cc, 'Root_Virtual_Id': root_virtual_id, 
-                        'Caminho_Subgrupos': caminho, 'Caminho_Ordem': match.full_ordem_path,
-                        'Ordem_Conta': match.Ordem_Conta, 'ordem_prioridade': ordem, 
-                        'ordem_secundaria': ordem_secundaria, 'Total_Ano': 0.0, 'Estilo_CSS': css_style 
-                    }
-                    for m in self.meses[:-1]: item[m] = 0.0
-                    if agrupar_por_cc: item['Nome_CC'] = match.Raiz_Centro_Custo_Nome
-                    aggregated_data[group_key] = item
-                else:
-                    if match.Ordem_Conta < aggregated_data[group_key]['Ordem_Conta']:
-                        aggregated_data[group_key]['Ordem_Conta'] = match.Ordem_Conta
-
-                if not is_skeleton and data:
-                    try:
-                        mes_nome = self.meses[data.month - 1]
-                        val_inv = saldo * -1 
-                        aggregated_data[group_key][mes_nome] += val_inv
-                        aggregated_data[group_key]['Total_Ano'] += val_inv
-                    except: pass
-
-            for conta_def, lista_regras in definitions.items():
-                titulo_conta = mapa_titulos.get(conta_def, "Conta Configurada")
-                for regra in lista_regras:
-                    ProcessRow("Config", conta_def, titulo_conta, None, 0.0, None, is_skeleton=True, forced_match=regra)
-
-            where_clauses = ['"Invalido" = false', '"Status" = \'Aprovado\'']
+            # Fato mensal pré-agregado pela sincronização (já restrito a lançamentos válidos)
+            where_clauses = ['"Is_Aprovado" = true']
             params = {}
             
             if ano:
                 params['ano'] = int(ano)
-                where_clauses.append('EXTRACT(YEAR FROM "Data") = :ano')
+                where_clauses.append('"Ano" = :ano')
 
             orig_params_keys = []
             for i, emp in enumerate(lista_empresas):
@@ -261,18 +183,14 @@ class DreGerencial:
             where_final = "WHERE " + " AND ".join(where_clauses)
             
             sql_raw = text(f"""
-                SELECT "origem", "Conta", "Título Conta", "Data", "Numero", "Centro de Custo", "Saldo", "Is_Nao_Operacional"
-                FROM "Dre_Schema"."Tb_CTL_Razao_Consolidado" {where_final}
+                SELECT "origem", "Conta", "Título Conta", "Mes", "Centro de Custo", SUM("Saldo") AS "Saldo", "Is_Nao_Operacional"
+                FROM "Dre_Schema"."Tb_CTL_Razao_Fato_Mensal" {where_final}
+                GROUP BY "origem", "Conta", "Título Conta", "Mes", "Centro de Custo", "Is_Nao_Operacional"
             """)
             
             raw_rows = self.session.execute(sql_raw, params).fetchall()
 
-            for row in raw_rows:
-                ProcessRow(
-                    row.origem, row.Conta, getattr(row, 'Título Conta'), row.Data, row.Saldo, 
-                    getattr(row, 'Centro de Custo'), row.Is_Nao_Operacional, is_skeleton=False
-                )
-
+            aggregated_data = self._AgregarLancamentos(motor, raw_rows)
             final_list = list(aggregated_data.values())
             
             if agrupar_por_cc: 
@@ -286,6 +204,25 @@ class DreGerencial:
             RegistrarLog("Erro durante o processamento do Relatório DRE", "ERROR", e)
             raise e
         
+    def _AgregarLancamentos(self, motor, raw_rows):
+        """
+        Distribui os saldos do fato mensal nos meses, via motor vetorizado.
+        Lançamentos não operacionais são reclassificados para a conta sintética '00000000000'.
+        """
+        df = MotorAgregacaoDre.CriarFrame(raw_rows, ['origem', 'Conta', 'Titulo', 'Mes', 'Centro_Custo', 'Saldo', 'Is_Nao_Operacional'])
+
+        nao_operacional = MotorAgregacaoDre.Verdadeiro(df['Is_Nao_Operacional'])
+        df.loc[nao_operacional, 'Conta'] = '00000000000'
+        df.loc[nao_operacional, 'Titulo'] = 'Não Operacionais'
+
+        mes = pd.to_numeric(df['Mes'], errors='coerce')
+        df['Saldo'] = pd.to_numeric(df['Saldo'], errors='coerce')
+        com_valor = mes.between(1, 12) & df['Saldo'].notna()
+        df['Coluna'] = ''
+        df.loc[com_valor, 'Coluna'] = np.array(self.meses[:-1], dtype=object)[mes[com_valor].astype(int).to_numpy() - 1]
+
+        return motor.Agregar(df, self.meses, 'Total_Ano', incluir_origem=True)
+
     def CalcularNosVirtuais(self, data_rows):
         memoria = defaultdict(lambda: {m: 0.0 for m in self.meses})
 
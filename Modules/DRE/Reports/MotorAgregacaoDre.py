@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+
+
+class MotorAgregacaoDre:
+    """
+    Motor de agregação vetorizado compartilhado pelos relatórios DRE (Gerencial, Consolidado e Operação).
+    Substitui o laço linha a linha (ProcessRow): a escolha da regra de cada lançamento vira um lookup
+    contra tabelas de regras pré-calculadas (conta -> regra padrão e (conta, CC_Alvo) -> regra específica),
+    e a distribuição dos saldos nas colunas vira uma acumulação em lote por grupo.
+    A saída (dicionário ordenado de group_key -> item) é idêntica à do laço original, inclusive na ordem
+    de criação dos grupos e na ordem das somas em ponto flutuante.
+    """
+
+    CAMINHOS_SEM_SUBGRUPO = ['Não Classificado', 'Direto', 'Calculado']
+
+    def __init__(self, definitions, ordem_map, ordem_subgrupos_contexto, css_map, mapa_titulos, agrupar_por_cc=False):
+        """
+        Parâmetros:
+            definitions (dict): Conta -> lista de regras (Definition) de _ObterEstruturaHierarquia.
+            ordem_map (dict): Ordenamento por "tipo:id" de _ObterOrdenamento.
+            ordem_subgrupos_contexto (dict): (subgrupo raiz, tipo_cc) -> ordem.
+            css_map (dict): Id do nó virtual -> estilo CSS.
+            mapa_titulos (dict): Conta -> título (usado no esqueleto das contas configuradas).
+            agrupar_por_cc (bool): Inclui o nome do centro de custo raiz no agrupamento (DRE Gerencial).
+        """
+        self.definitions = definitions
+        self.mapa_titulos = mapa_titulos
+        self.agrupar_por_cc = agrupar_por_cc
+
+        self.regras = []
+        self.metadados_regras = []
+        self.assinaturas_regras = []
+        indices_por_conta = {}
+        assinaturas = {}
+
+        for conta, lista_regras in definitions.items():
+            indices_por_conta[conta] = []
+            for regra in lista_regras:
+                indice = len(self.regras)
+                meta = self._CalcularMetadadosRegra(regra, ordem_map, ordem_subgrupos_contexto, css_map)
+                chave = (meta['Tipo_CC'], meta['Root_Virtual_Id'], meta['Caminho_Subgrupos'], meta['Caminho_Ordem'])
+                if agrupar_por_cc:
+                    chave = chave + (regra.Raiz_Centro_Custo_Nome,)
+
+                self.regras.append(regra)
+                self.metadados_regras.append(meta)
+                self.assinaturas_regras.append(assinaturas.setdefault(chave, len(assinaturas)))
+                indices_por_conta[conta].append(indice)
+
+        # Lookup 1: conta -> primeira regra (fallback quando nenhum CC_Alvo coincide)
+        self.regra_padrao = {conta: indices[0] for conta, indices in indices_por_conta.items() if indices}
+
+        # Lookup 2: (conta, CC_Alvo) -> primeira regra com aquele centro de custo alvo
+        self.regras_por_cc = {}
+        for conta, indices in indices_por_conta.items():
+            for indice in indices:
+                cc_alvo = self.regras[indice].CC_Alvo
+                if cc_alvo is not None:
+                    self.regras_por_cc.setdefault((conta, cc_alvo), indice)
+
+        self.assinaturas_regras = np.array(self.assinaturas_regras, dtype=np.int64)
+        self.nomes_personalizados = np.array([regra.Nome_Personalizado_Def for regra in self.regras], dtype=object)
+        self.tem_nome_personalizado = np.array([bool(regra.Nome_Personalizado_Def) for regra in self.regras], dtype=bool)
+
+    def _CalcularMetadadosRegra(self, regra, ordem_map, ordem_subgrupos_contexto, css_map):
+        """Atributos de exibição e ordenação que dependem apenas da regra (calculados uma vez por regra)."""
+        tipo_cc = regra.Tipo_Principal or 'Outros'
+        root_virtual_id = regra.Raiz_No_Virtual_Id
+        caminho = regra.full_path or 'Não Classificado'
+
+        ordem = 999
+        ordem_secundaria = 500
+
+        if root_virtual_id: ordem = ordem_map.get(f"virtual:{root_virtual_id}", 999)
+        elif regra.Is_Root_Group:
+            if regra.Id_Hierarquia: ordem = ordem_map.get(f"subgrupo:{regra.Id_Hierarquia}", 0)
+        else: ordem = ordem_map.get(f"tipo_cc:{tipo_cc}", 999)
+
+        if caminho and caminho not in self.CAMINHOS_SEM_SUBGRUPO:
+            partes = caminho.split('||')
+            if partes:
+                chave_busca = (partes[0].strip(), str(tipo_cc).strip())
+                ordem_secundaria = ordem_subgrupos_contexto.get(chave_busca, 999)
+
+        return {
+            'Tipo_CC': tipo_cc, 'Root_Virtual_Id': root_virtual_id,
+            'Caminho_Subgrupos': caminho, 'Caminho_Ordem': regra.full_ordem_path,
+            'ordem_prioridade': ordem, 'ordem_secundaria': ordem_secundaria,
+            'Estilo_CSS': css_map.get(root_virtual_id, None)
+        }
+
+    # =========================================================================
+    # PREPARAÇÃO DO FRAME
+    # =========================================================================
+    @staticmethod
+    def CriarFrame(rows, colunas):
+        """
+        Carrega o resultado da consulta em um DataFrame colunar preservando os tipos Python
+        (dtype object), para que None/inteiros não sejam convertidos em NaN/float.
+        """
+        matriz = np.empty((len(rows), len(colunas)), dtype=object)
+        if len(rows): matriz[:] = [tuple(row) for row in rows]
+        return pd.DataFrame(matriz, columns=colunas)
+
+    @staticmethod
+    def _PorValoresUnicos(serie, funcao, padrao, dtype=object):
+        """
+        Aplica 'funcao' uma única vez por valor distinto e espalha o resultado pelas linhas (factorize).
+        As colunas textuais do razão têm baixa cardinalidade, então o custo Python fica proporcional
+        ao número de valores distintos e não ao de lançamentos. Nulos recebem 'padrao'.
+        """
+        codigos, unicos = pd.factorize(serie)
+        convertidos = np.array([funcao(valor) for valor in unicos] + [padrao], dtype=dtype)
+        return convertidos[codigos]
+
+    @classmethod
+    def Verdadeiro(cls, serie):
+        """Equivalente vetorizado de bool(valor) (None, '', 0 e False são falsos)."""
+        return pd.Series(cls._PorValoresUnicos(serie, bool, False, dtype=bool), index=serie.index)
+
+    @classmethod
+    def TextoNormalizado(cls, serie, maiusculo=True):
+        """
+        Equivalente vetorizado de str(valor).upper().strip() if valor else ''.
+        Retorna uma série categórica, para que as comparações seguintes operem sobre códigos inteiros.
+        """
+        funcao = (lambda v: str(v).upper().strip() if v else '') if maiusculo else (lambda v: str(v).strip() if v else '')
+        codigos, unicos = pd.factorize(serie)
+        codigos_texto, categorias = pd.factorize(np.array([funcao(v) for v in unicos] + [''], dtype=object))
+        return pd.Series(pd.Categorical.from_codes(codigos_texto[codigos], categories=categorias), index=serie.index)
+
+    @staticmethod
+    def Contem(serie, trecho):
+        """Equivalente vetorizado de 'trecho in valor' sobre uma série de TextoNormalizado."""
+        por_categoria = np.array([trecho in categoria for categoria in serie.cat.categories], dtype=bool)
+        return pd.Series(por_categoria[serie.cat.codes.to_numpy()], index=serie.index)
+
+    @staticmethod
+    def _ConverterCentroCusto(valor):
+        """Mesmo tratamento do laço original: int(''.join(filter(str.isdigit, str(cc)))) ou None."""
+        if not valor: return None
+        try: return int(''.join(filter(str.isdigit, str(valor))))
+        except: return None
+
+    def _ResolverRegras(self, df):
+        """
+        Retorna o índice da regra aplicada a cada lançamento (NaN quando a conta não tem regra).
+        O lookup é feito uma vez por par distinto (conta, centro de custo) e espalhado pelos códigos.
+        """
+        codigos_conta, contas_unicas = pd.factorize(df['Conta'], use_na_sentinel=False)
+        codigos_cc, ccs_unicos = pd.factorize(df['Centro_Custo'])
+        ccs_numericos = [self._ConverterCentroCusto(cc) for cc in ccs_unicos] + [None]
+
+        pares, pares_unicos = pd.factorize(codigos_conta * (len(ccs_unicos) + 1) + codigos_cc + 1)
+        regra_por_par = np.full(len(pares_unicos), np.nan)
+        for i, par in enumerate(pares_unicos.tolist()):
+            conta = contas_unicas[par // (len(ccs_unicos) + 1)]
+            cc_int = ccs_numericos[par % (len(ccs_unicos) + 1) - 1]
+            regra = self.regras_por_cc.get((conta, cc_int)) if cc_int is not None else None
+            if regra is None: regra = self.regra_padrao.get(conta)
+            if regra is not None: regra_por_par[i] = regra
+        return regra_por_par[pares]
+
+    def Agregar(self, df, colunas_valor, coluna_total, incluir_origem=False):
+        """
+        Agrega os lançamentos nas linhas do relatório.
+
+        Parâmetros:
+            df (DataFrame): Lançamentos com as colunas 'origem', 'Conta', 'Titulo', 'Centro_Custo', 'Saldo'
+                            e 'Coluna' (coluna de destino do saldo; '' quando o lançamento só cria a linha).
+            colunas_valor (list): Colunas numéricas de cada item (inclusive a de total), na ordem de exibição.
+            coluna_total (str): Coluna que acumula todos os valores distribuídos.
+            incluir_origem (bool): Inclui a chave 'origem' no item (DRE Gerencial).
+
+        Retorno:
+            dict: group_key -> item, na mesma ordem de criação do laço original (esqueleto primeiro).
+        """
+        # 1. Esqueleto: cada regra configurada gera sua linha, mesmo sem movimento
+        esqueleto = []
+        indice = 0
+        for conta_def, lista_regras in self.definitions.items():
+            titulo_conta = self.mapa_titulos.get(conta_def, "Conta Configurada")
+            for _ in lista_regras:
+                esqueleto.append(("Config", conta_def, titulo_conta, indice))
+                indice += 1
+
+        # 2. Lançamentos: regra resolvida por lookup (linhas sem regra são descartadas)
+        df = df.reset_index(drop=True)
+        indices_regra = self._ResolverRegras(df) if len(df) else np.array([], dtype='float64')
+        com_regra = ~np.isnan(indices_regra)
+        df = df.loc[com_regra].reset_index(drop=True)
+        indices_regra = indices_regra[com_regra].astype(np.int64)
+
+        origens = np.concatenate([np.array([linha[0] for linha in esqueleto], dtype=object), df['origem'].to_numpy(dtype=object)])
+        contas = np.concatenate([np.array([linha[1] for linha in esqueleto], dtype=object), df['Conta'].to_numpy(dtype=object)])
+        titulos = np.concatenate([np.array([linha[2] for linha in esqueleto], dtype=object), df['Titulo'].to_numpy(dtype=object)])
+        regras = np.concatenate([np.array([linha[3] for linha in esqueleto], dtype=np.int64), indices_regra])
+        colunas_destino = np.concatenate([np.full(len(esqueleto), '', dtype=object), df['Coluna'].to_numpy(dtype=object)])
+        saldos = np.concatenate([np.zeros(len(esqueleto)), pd.to_numeric(df['Saldo'], errors='coerce').fillna(0.0).to_numpy(dtype='float64')])
+
+        if len(regras) == 0:
+            return {}
+
+        # 3. Chave de agrupamento: assinatura da regra + título exibido + conta, combinadas em um
+        #    único inteiro; o factorize numera os grupos na ordem da primeira ocorrência
+        titulos_exibicao = np.where(self.tem_nome_personalizado[regras], self.nomes_personalizados[regras], titulos)
+        codigos_titulo, titulos_unicos = pd.factorize(titulos_exibicao, use_na_sentinel=False)
+        codigos_conta, contas_unicas = pd.factorize(contas, use_na_sentinel=False)
+        assinaturas = self.assinaturas_regras[regras]
+
+        chave = (assinaturas * len(titulos_unicos) + codigos_titulo) * len(contas_unicas) + codigos_conta
+        grupos, chaves_unicas = pd.factorize(chave)
+        qtd_grupos = len(chaves_unicas)
+        _, primeiras = np.unique(grupos, return_index=True)
+
+        # 4. Distribuição dos saldos: acumulação sequencial (np.add.at), na ordem das linhas
+        posicao_coluna = {col: i for i, col in enumerate(colunas_valor)}
+        destino = pd.Series(colunas_destino).map(posicao_coluna).fillna(-1).to_numpy(dtype=np.int64)
+        com_valor = destino >= 0
+        valores = np.zeros((qtd_grupos, len(colunas_valor)))
+        totais = np.zeros(qtd_grupos)
+        valores_invertidos = saldos[com_valor] * -1
+        np.add.at(valores, (grupos[com_valor], destino[com_valor]), valores_invertidos)
+        np.add.at(totais, grupos[com_valor], valores_invertidos)
+        indice_total = posicao_coluna[coluna_total]
+
+        # 5. Ordem_Conta: menor ordem entre as regras que caíram no grupo
+        ordem_conta = {}
+        pares = pd.unique(grupos * len(self.regras) + regras)
+        for grupo, regra in zip((pares // len(self.regras)).tolist(), (pares % len(self.regras)).tolist()):
+            ordem = self.regras[regra].Ordem_Conta
+            if grupo not in ordem_conta or ordem < ordem_conta[grupo]:
+                ordem_conta[grupo] = ordem
+
+        # 6. Monta os itens a partir da primeira linha de cada grupo
+        aggregated_data = {}
+        for grupo, posicao in enumerate(primeiras.tolist()):
+            regra = self.regras[regras[posicao]]
+            meta = self.metadados_regras[regras[posicao]]
+            titulo = titulos_exibicao[posicao]
+            conta = contas[posicao]
+
+            group_key = (meta['Tipo_CC'], meta['Root_Virtual_Id'], meta['Caminho_Subgrupos'], meta['Caminho_Ordem'], titulo, conta)
+            if self.agrupar_por_cc: group_key = group_key + (regra.Raiz_Centro_Custo_Nome,)
+
+            item = {'origem': origens[posicao]} if incluir_origem else {}
+            item.update({
+                'Conta': conta, 'Titulo_Conta': titulo,
+                'Tipo_CC': meta['Tipo_CC'], 'Root_Virtual_Id': meta['Root_Virtual_Id'],
+                'Caminho_Subgrupos': meta['Caminho_Subgrupos'], 'Caminho_Ordem': meta['Caminho_Ordem'],
+                'Ordem_Conta': ordem_conta[grupo], 'ordem_prioridade': meta['ordem_prioridade'],
+                'ordem_secundaria': meta['ordem_secundaria'], 'Estilo_CSS': meta['Estilo_CSS']
+            })
+            linha_valores = valores[grupo].tolist()
+            for i, col in enumerate(colunas_valor):
+                item[col] = float(totais[grupo]) if i == indice_total else linha_valores[i]
+            if self.agrupar_por_cc: item['Nome_CC'] = regra.Raiz_Centro_Custo_Nome
+            aggregated_data[group_key] = item
+
+        return aggregated_data
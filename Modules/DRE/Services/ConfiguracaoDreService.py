@@ -9,6 +9,7 @@ from sqlalchemy import text, func
 from sqlalchemy.orm import sessionmaker
 
 from Db.Connections import GetPostgresEngine
+from Modules.DRE.Reports.CacheEstruturaDre import CacheEstruturaDre
 from Models.Postgress.CTL_Dre_Estrutura import (
     CtlDreContaVinculo, 
     CtlDreNoVirtual, 
@@ -33,7 +34,8 @@ class ConfiguracaoDreService:
         """
         engine = GetPostgresEngine()
         Sessao = sessionmaker(bind=engine)
-        return Sessao()
+        # Todo commit de configuração invalida a estrutura em cache dos relatórios DRE
+        return CacheEstruturaDre.RegistrarInvalidacao(Sessao(), 'configuracao_dre')
 
     def limparOrdenamentoEmLote(self, sessao, itens: list):
         """
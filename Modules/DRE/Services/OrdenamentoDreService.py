@@ -2,6 +2,7 @@ import time
 from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from Db.Connections import GetPostgresEngine
+from Modules.DRE.Reports.CacheEstruturaDre import CacheEstruturaDre
 
 # --- NOVOS IMPORTS ---
 from Models.Postgress.CTL_Dre_Ordenamento import (
@@ -16,7 +17,8 @@ class OrdenamentoDreService:
 
     def _ObterSessao(self):
         engine = GetPostgresEngine()
-        return sessionmaker(bind=engine)()
+        # Todo commit de ordenamento invalida a estrutura em cache dos relatórios DRE
+        return CacheEstruturaDre.RegistrarInvalidacao(sessionmaker(bind=engine)(), 'ordenamento_dre')
 
     def InicializarOrdenamento(self, limpar=False):
         session = self._ObterSessao()
@@ -1,77 +1,159 @@
 from sqlalchemy import text
+import base64
+import json
 import os
 import sys
+import threading
+import time
+from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
 from Utils.Utils import ReportUtils
 from Utils.Logger import RegistrarLog
 
 class RazaoContabil:
+    TABELA_ORIGINAL = '"Dre_Schema"."Mv_CTL_Razao_Original"'
+
+    # Chave de ordenação/paginação (keyset): Data DESC, Conta, Numero e o desempate único da linha
+    # (origem + Id na visão original; Fonte + Id na Consolidada). Os COALESCE são os
+    # mesmos dos índices criados por Scripts/Code/CriarIndicesPaginacaoRazao.py.
+    EXPR_DATA = "COALESCE(\"Data\", TIMESTAMP '1900-01-01')"
+    EXPR_CONTA = "COALESCE(\"Conta\", '')"
+    EXPR_NUMERO = "COALESCE(\"Numero\", '')"
+
+    # Busca textual: uma única expressão (colunas concatenadas com um separador que não aparece em
+    # buscas digitadas) coberta por índice GIN pg_trgm, no lugar de cinco ILIKE em sequência.
+    # Termos terminados em '*' viram busca por prefixo de conta (btree text_pattern_ops).
+    # Índices: Scripts/Code/CriarIndicesBuscaRazao.py.
+    COLUNAS_BUSCA = ['"Conta"', '"Título Conta"', '"Descricao"', '"Numero"', '"origem"']
+
+    @classmethod
+    def ExpressaoBusca(cls):
+        return " || CHR(31) || ".join(f"COALESCE({c}, '')" for c in cls.COLUNAS_BUSCA)
+
+    @classmethod
+    def InvalidarCaches(cls):
+        """Descarta as contagens e os totais em cache (chamado pela sincronização quando o Razão muda)."""
+        with cls._lock_contagens:
+            cls._cache_contagens.clear()
+            cls._cache_resumos.clear()
+
+    # Contagem total do grid com busca: estimativa do planejador, cacheada por (visão, busca)
+    TTL_CONTAGEM_SEGUNDOS = int(os.getenv("RAZAO_CONTAGEM_TTL", "300"))
+    _cache_contagens = {}
+    _lock_contagens = threading.Lock()
+
+    # Totais do cabeçalho: lidos do resumo mensal mantido pela sincronização (Tb_CTL_Razao_Resumo_Mensal)
+    # e cacheados por visão; cada visão guarda o total geral e o de cada competência ('AAAA-MM').
+    # O TTL cobre as sincronizações feitas por outros processos, que não limpam o cache local.
+    TABELA_RESUMO = '"Dre_Schema"."Tb_CTL_Razao_Resumo_Mensal"'
+    TTL_RESUMO_SEGUNDOS = int(os.getenv("RAZAO_RESUMO_TTL", "300"))
+    _cache_resumos = {}
+
     def __init__(self, session):
         self.session = session
 
+    def _condicao_busca(self, termo_busca, params):
+        termo_busca = termo_busca.strip()
+        if len(termo_busca) > 1 and termo_busca.endswith('*'):
+            params['prefixo_conta'] = f"{termo_busca[:-1]}%"
+            return '"Conta" LIKE :prefixo_conta'
+
+        params['termo'] = f"%{termo_busca}%"
+        return f"({self.ExpressaoBusca()}) ILIKE :termo"
+
     def _get_tabela_e_filtros(self, tipo_visualizacao, termo_busca):
         """
         Retorna a string do FROM, a cláusula WHERE e os parâmetros baseados no tipo de visualização.
         """
         params = {}
         if tipo_visualizacao == 'original':
-            # Modo Original: Une as 3 tabelas puras dinamicamente e calcula o Saldo (Debito - Credito)
-            tabela = """(
-                SELECT 'FARMA' as origem, "Conta", "Título Conta", "Data", "Numero", "Descricao", 
-                       "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", 
-                       "Debito", "Credito", (COALESCE("Debito", 0) - COALESCE("Credito", 0)) as "Saldo", 'ORIGINAL' as "Tipo_Operacao"
-                FROM "Dre_Schema"."Tb_CTL_Razao_Farma"
-                UNION ALL
-                SELECT 'FARMADIST' as origem, "Conta", "Título Conta", "Data", "Numero", "Descricao", 
-                       "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", 
-                       "Debito", "Credito", (COALESCE("Debito", 0) - COALESCE("Credito", 0)) as "Saldo", 'ORIGINAL' as "Tipo_Operacao"
-                FROM "Dre_Schema"."Tb_CTL_Razao_FarmaDist"
-                UNION ALL
-                SELECT 'INTEC' as origem, "Conta", "Título Conta", "Data", "Numero", "Descricao", 
-                       "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", 
-                       "Debito", "Credito", (COALESCE("Debito", 0) - COALESCE("Credito", 0)) as "Saldo", 'ORIGINAL' as "Tipo_Operacao"
-                FROM "Dre_Schema"."Tb_CTL_Razao_Intec"
-            ) base"""
+            # Modo Original: visão materializada da união das 3 tabelas puras, com o Saldo (Debito - Credito)
+            # já calculado. Mantida pela sincronização (SincronizacaoConsolidadoRazaoService.atualizarRazaoOriginal).
+            tabela = f'{self.TABELA_ORIGINAL} base'
             
             filtro = ""
             if termo_busca:
-                filtro = "WHERE (\"Conta\"::TEXT ILIKE :termo OR \"Título Conta\" ILIKE :termo OR \"Descricao\" ILIKE :termo OR \"Numero\"::TEXT ILIKE :termo OR \"origem\" ILIKE :termo)"
-                params['termo'] = f"%{termo_busca}%"
+                filtro = f"WHERE {self._condicao_busca(termo_busca, params)}"
         else:
             # Modo Ajustado: Traz da Consolidada (que já possui a coluna Saldo)
             tabela = '"Dre_Schema"."Tb_CTL_Razao_Consolidado" base'
             filtro = 'WHERE base."Invalido" = false'
             
             if termo_busca:
-                filtro += " AND (base.\"Conta\"::TEXT ILIKE :termo OR base.\"Título Conta\" ILIKE :termo OR base.\"Descricao\" ILIKE :termo OR base.\"Numero\"::TEXT ILIKE :termo OR base.\"origem\" ILIKE :termo)"
-                params['termo'] = f"%{termo_busca}%"
+                filtro += f" AND {self._condicao_busca(termo_busca, params)}"
                 
         return tabela, filtro, params
 
-    def ObterDados(self, pagina=1, por_pagina=50, termo_busca='', tipo_visualizacao='adjusted'):
+    def _coluna_desempate(self, tipo_visualizacao):
+        return '"origem"' if tipo_visualizacao == 'original' else '"Fonte"'
+
+    @staticmethod
+    def _codificar_cursor(valores):
+        valores = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+        return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decodificar_cursor(cursor):
+        try:
+            data, conta, numero, desempate, id_linha = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(data), str(conta), str(numero), str(desempate), int(id_linha)
+        except Exception:
+            raise ValueError("Cursor de paginação inválido.")
+
+    def ObterDados(self, pagina=1, por_pagina=50, termo_busca='', tipo_visualizacao='adjusted', cursor=None):
+        """
+        Página do grid com paginação por chave (keyset): com o cursor da página anterior, a consulta
+        continua a partir da última linha vista, sem OFFSET (o custo não cresce com o número da página).
+        Sem cursor e com pagina > 1, cai no OFFSET (compatibilidade com chamadas antigas).
+        """
         offset = (pagina - 1) * por_pagina
         
         tabela, filtro, params = self._get_tabela_e_filtros(tipo_visualizacao, termo_busca)
-        params['limit'] = por_pagina
+        params_filtro = dict(params)
+        desempate = self._coluna_desempate(tipo_visualizacao)
+        # Busca uma linha a mais só para saber se existe próxima página
+        params['limit'] = por_pagina + 1
+
+        paginacao = 'OFFSET :offset'
         params['offset'] = offset
+        filtro_pagina = filtro
+        if cursor:
+            params.pop('offset')
+            paginacao = ''
+            params['c_data'], params['c_conta'], params['c_numero'], params['c_desempate'], params['c_id'] = self._decodificar_cursor(cursor)
+            # "Data" <= cursor limita o início do índice; o restante desempata dentro da mesma data
+            condicao = (
+                f'{self.EXPR_DATA} <= :c_data AND ({self.EXPR_DATA} < :c_data OR '
+                f'({self.EXPR_CONTA}, {self.EXPR_NUMERO}, {desempate}, "Id") > (:c_conta, :c_numero, :c_desempate, :c_id))'
+            )
+            filtro_pagina = f"{filtro} AND {condicao}" if filtro else f"WHERE {condicao}"
 
         # Monta a Query principal usando a tabela dinâmica
         sql_query = f"""
             SELECT "origem", "Conta", "Título Conta", "Data", "Numero", "Descricao", 
                    "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", 
-                   "Debito", "Credito", "Saldo", "Tipo_Operacao"
+                   "Debito", "Credito", "Saldo", "Tipo_Operacao",
+                   {self.EXPR_DATA} as "_k_data", {self.EXPR_CONTA} as "_k_conta", {self.EXPR_NUMERO} as "_k_numero",
+                   {desempate} as "_k_desempate", "Id" as "_k_id"
             FROM {tabela} 
-            {filtro} 
-            ORDER BY "Data" DESC, "Conta" ASC, "Numero" ASC 
-            LIMIT :limit OFFSET :offset
+            {filtro_pagina} 
+            ORDER BY {self.EXPR_DATA} DESC, {self.EXPR_CONTA} ASC, {self.EXPR_NUMERO} ASC, {desempate} ASC, "Id" ASC 
+            LIMIT :limit {paginacao}
         """
-        
-        sql_count = f'SELECT COUNT(*) FROM {tabela} {filtro}'
 
         try:
-            total_registros = self.session.execute(text(sql_count), params).scalar() or 0
+            total_registros, total_estimado = self._ContarRegistros(tabela, filtro, params_filtro, tipo_visualizacao, termo_busca)
             total_paginas = (total_registros // por_pagina) + (1 if total_registros % por_pagina > 0 else 0)
             rows = self.session.execute(text(sql_query), params).fetchall()
+
+            tem_proxima = len(rows) > por_pagina
+            rows = rows[:por_pagina]
+            proximo_cursor = None
+            if tem_proxima:
+                ultima = rows[-1]
+                proximo_cursor = self._codificar_cursor([ultima._k_data, ultima._k_conta, ultima._k_numero, ultima._k_desempate, ultima._k_id])
+                # A estimativa nunca deve esconder páginas que existem
+                total_paginas = max(total_paginas, pagina + 1)
             
             result_list = []
 
@@ -91,52 +173,136 @@ class RazaoContabil:
 
                 result_list.append(row_dict)
                 
-            return {'pagina_atual': pagina, 'total_paginas': total_paginas, 'total_registros': total_registros, 'dados': result_list}
+            return {
+                'pagina_atual': pagina, 'total_paginas': max(total_paginas, pagina if result_list else 1),
+                'total_registros': total_registros, 'total_estimado': total_estimado,
+                'tem_proxima': tem_proxima, 'proximo_cursor': proximo_cursor, 'dados': result_list
+            }
         except Exception as e:
             raise e
 
-    def ObterResumo(self, tipo_visualizacao='adjusted'):
-        tabela, filtro, params = self._get_tabela_e_filtros(tipo_visualizacao, '')
+    def _ContarRegistros(self, tabela, filtro, params, tipo_visualizacao, termo_busca):
+        """
+        Total do grid sem COUNT(*) a cada troca de página. Retorna (total, é_estimado).
+        Sem busca: contagem exata do resumo mensal (mesmo cache dos totais do cabeçalho).
+        Com busca: estimativa do planejador (EXPLAIN), cacheada por TTL_CONTAGEM_SEGUNDOS.
+        """
+        if not termo_busca:
+            return self.ObterResumo(tipo_visualizacao)['total_registros'], False
+
+        chave = (tipo_visualizacao, termo_busca)
+        agora = time.time()
+        with self._lock_contagens:
+            em_cache = self._cache_contagens.get(chave)
+            if em_cache and agora - em_cache[2] < self.TTL_CONTAGEM_SEGUNDOS:
+                return em_cache[0], em_cache[1]
+
+        plano = self.session.execute(text(f'EXPLAIN (FORMAT JSON) SELECT 1 FROM {tabela} {filtro}'), params).scalar()
+        if isinstance(plano, str): plano = json.loads(plano)
+        total, estimado = int(plano[0]['Plan']['Plan Rows']), True
+
+        with self._lock_contagens:
+            # Descarta entradas vencidas para o cache não crescer com cada termo buscado
+            for k in [k for k, v in self._cache_contagens.items() if agora - v[2] >= self.TTL_CONTAGEM_SEGUNDOS]:
+                del self._cache_contagens[k]
+            self._cache_contagens[chave] = (total, estimado, agora)
+        return total, estimado
+
+    def ObterResumo(self, tipo_visualizacao='adjusted', competencia=None):
+        """Totais do Razão da visão (geral ou de uma competência 'AAAA-MM')."""
+        totais = self._ObterResumosVisao(tipo_visualizacao)
+        if competencia is None:
+            return dict(totais['total'])
+        return dict(totais['competencias'].get(competencia) or self._montar_totais(0, 0, 0, 0))
+
+    def ObterResumoMensal(self, tipo_visualizacao='adjusted'):
+        """Totais do Razão da visão por competência ('AAAA-MM'; None para lançamentos sem data)."""
+        totais = self._ObterResumosVisao(tipo_visualizacao)
+        return [
+            {'competencia': competencia, **valores}
+            for competencia, valores in sorted(totais['competencias'].items(), key=lambda c: (c[0] is None, c[0] or ''))
+        ]
+
+    @staticmethod
+    def _montar_totais(qtd, debito, credito, saldo):
+        return {
+            'total_registros': int(qtd or 0), 'total_debito': float(debito or 0),
+            'total_credito': float(credito or 0), 'saldo_total': float(saldo or 0)
+        }
+
+    def _ObterResumosVisao(self, tipo_visualizacao):
+        visao = 'original' if tipo_visualizacao == 'original' else 'adjusted'
+        agora = time.time()
+        item = self._cache_resumos.get(visao)
+        if item is not None and agora - item[1] < self.TTL_RESUMO_SEGUNDOS:
+            return item[0]
+
         try:
-            sql = text(f"""
-                SELECT COUNT(*), SUM("Debito"), SUM("Credito"), SUM("Saldo") 
-                FROM {tabela} {filtro}
-            """)
-            base = self.session.execute(sql, params).fetchone()
-            return {
-                'total_registros': base[0] or 0, 'total_debito': float(base[1] or 0), 
-                'total_credito': float(base[2] or 0), 'saldo_total': float(base[3] or 0)
-            }
+            if self.session.execute(text("SELECT to_regclass(:nome)"), {"nome": self.TABELA_RESUMO}).scalar() is not None:
+                linhas = self.session.execute(text(f"""
+                    SELECT "Ano", "Mes", "Qtd_Lancamentos", "Debito", "Credito", "Saldo"
+                    FROM {self.TABELA_RESUMO} WHERE "Visao" = :visao
+                """), {'visao': visao}).fetchall()
+            else:
+                # Resumo ainda não criado (Scripts/Code/CriarResumoRazao.py): agrega direto das linhas
+                tabela, filtro, params = self._get_tabela_e_filtros(visao, '')
+                linhas = self.session.execute(text(f"""
+                    SELECT EXTRACT(YEAR FROM "Data")::int, EXTRACT(MONTH FROM "Data")::int,
+                           COUNT(*), SUM("Debito"), SUM("Credito"), SUM("Saldo")
+                    FROM {tabela} {filtro}
+                    GROUP BY 1, 2
+                """), params).fetchall()
         except Exception as e:
-            return {'total_registros': 0, 'total_debito': 0, 'total_credito': 0, 'saldo_total': 0}
+            RegistrarLog(f"Erro ao obter os totais do Razão ({visao})", "ERROR", e)
+            raise
 
-    def ExportarCompleto(self, termo_busca='', tipo_visualizacao='adjusted'):
+        competencias = {}
+        total = [0, 0.0, 0.0, 0.0]
+        for ano, mes, qtd, debito, credito, saldo in linhas:
+            chave = f"{ano:04d}-{mes:02d}" if ano is not None and mes is not None else None
+            competencias[chave] = self._montar_totais(qtd, debito, credito, saldo)
+            for i, valor in enumerate((qtd, debito, credito, saldo)):
+                total[i] += valor or 0
+
+        totais = {'total': self._montar_totais(*total), 'competencias': competencias}
+        with self._lock_contagens:
+            self._cache_resumos[visao] = (totais, agora)
+        return totais
+
+    COLUNAS_EXPORTACAO = [
+        'origem', 'Conta', 'Título Conta', 'Data', 'Numero', 'Descricao', 'Contra Partida',
+        'Filial', 'Centro de Custo', 'Item', 'Cod Cl. Valor', 'Debito', 'Credito', 'Saldo'
+    ]
+
+    def ExportarStream(self, termo_busca='', tipo_visualizacao='adjusted', tamanho_lote=5000):
+        """
+        Gera as linhas da exportação (tuplas na ordem de COLUNAS_EXPORTACAO) via cursor de servidor,
+        sem materializar o razão inteiro: o driver busca 'tamanho_lote' linhas por vez.
+        """
         tabela, filtro, params = self._get_tabela_e_filtros(tipo_visualizacao, termo_busca)
 
-        try:
-            sql = text(f"""
-                SELECT "origem", "Conta", "Título Conta", "Data", "Numero", "Descricao", "Contra Partida - Credito" as "Contra Partida", 
-                       "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", "Debito", "Credito", "Saldo", "Tipo_Operacao"
-                FROM {tabela} 
-                {filtro}
-                ORDER BY "Data", "Conta"
-            """)
-                
-            rows = self.session.execute(sql, params).fetchall()
-            final_data = []
+        sql = text(f"""
+            SELECT "origem", "Conta", "Título Conta", "Data", "Numero", "Descricao", "Contra Partida - Credito" as "Contra Partida", 
+                   "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", "Debito", "Credito", "Saldo", "Tipo_Operacao"
+            FROM {tabela} 
+            {filtro}
+            ORDER BY "Data", "Conta"
+        """)
 
-            for r in rows:
-                row_dict = dict(r._mapping)
-                tipo = row_dict.pop('Tipo_Operacao', 'ORIGINAL')
-                
-                if tipo == 'INCLUSAO': row_dict['origem'] = f"{row_dict['origem']} (NOVO)"
-                elif tipo != 'ORIGINAL': row_dict['origem'] = f"{row_dict['origem']} (AJUSTE)"
+        resultado = self.session.execute(
+            sql, params, execution_options={'stream_results': True, 'yield_per': tamanho_lote}
+        )
+        for r in resultado:
+            linha = list(r[:-1])
+            tipo = r[-1] or 'ORIGINAL'
 
-                final_data.append(row_dict)
-            
-            return final_data
-        except Exception as e:
-            raise e
+            if tipo == 'INCLUSAO': linha[0] = f"{linha[0]} (NOVO)"
+            elif tipo != 'ORIGINAL': linha[0] = f"{linha[0]} (AJUSTE)"
+
+            yield linha
+
+    def ExportarCompleto(self, termo_busca='', tipo_visualizacao='adjusted'):
+        return [dict(zip(self.COLUNAS_EXPORTACAO, linha)) for linha in self.ExportarStream(termo_busca, tipo_visualizacao)]
 
     def ListarCentrosCusto(self):
         try:
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from Db.Connections import GetPostgresEngine, GetPostgresSession
+from Modules.RAZAO.Services.SincronizacaoConsolidadoRazaoService import SincronizacaoConsolidadoRazaoService
+from Utils.Logger import RegistrarLog
+
+
+class AgendadorSincronizacaoConsolidado:
+    """
+    Agendador em background (dentro do processo da aplicação) da sincronização da Consolidada.
+    Substitui o disparo pelos navegadores: uma única thread por processo executa a sincronização
+    em intervalo fixo ou quando há gatilhos (importação, reversão, ajustes), e um advisory lock
+    do PostgreSQL (pg_try_advisory_lock) garante que apenas uma execução ocorra no cluster inteiro.
+    Vários gatilhos recebidos durante uma execução são aglutinados em uma única execução seguinte.
+    """
+
+    # Chave arbitrária e fixa do advisory lock (compartilhada por todos os processos/servidores)
+    CHAVE_ADVISORY_LOCK = 718_204_001
+    INTERVALO_SEGUNDOS = int(os.getenv("SYNC_CONSOLIDADO_INTERVALO", "60"))
+    ATIVO = os.getenv("SYNC_CONSOLIDADO_AGENDADOR", "True").lower() == "true"
+
+    _thread = None
+    _evento_gatilho = threading.Event()
+    _evento_parada = threading.Event()
+    _lock_estado = threading.Lock()
+    _motivos_pendentes = set()
+    _status = {
+        'status': 'aguardando',
+        'ultima_execucao': None,
+        'ultima_conclusao': None,
+        'duracao_ms': None,
+        'resumo': None,
+        'erro': None,
+        'motivos': [],
+        'execucoes': 0,
+        'ignoradas_lock': 0,
+    }
+
+    @classmethod
+    def Iniciar(cls):
+        """Sobe a thread do agendador (idempotente)."""
+        if not cls.ATIVO:
+            RegistrarLog("Agendador da sincronização consolidada desativado (SYNC_CONSOLIDADO_AGENDADOR).", "SYSTEM")
+            return
+        with cls._lock_estado:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._evento_parada.clear()
+            cls._thread = threading.Thread(
+                target=cls._Loop, name="AgendadorSincronizacaoConsolidado", daemon=True
+            )
+            cls._thread.start()
+        RegistrarLog(f"Agendador da sincronização consolidada iniciado (intervalo: {cls.INTERVALO_SEGUNDOS}s).", "SYSTEM")
+
+    @classmethod
+    def Parar(cls, timeout=10):
+        cls._evento_parada.set()
+        cls._evento_gatilho.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout)
+
+    @classmethod
+    def SolicitarSincronizacao(cls, motivo='manual'):
+        """
+        Registra um gatilho de sincronização. Não executa nada na thread chamadora:
+        o pedido é aglutinado e atendido pela próxima execução do agendador.
+        """
+        with cls._lock_estado:
+            cls._motivos_pendentes.add(motivo)
+        cls._evento_gatilho.set()
+
+    @classmethod
+    def ObterStatus(cls):
+        with cls._lock_estado:
+            status = dict(cls._status)
+            status['gatilhos_pendentes'] = sorted(cls._motivos_pendentes)
+        for campo in ('ultima_execucao', 'ultima_conclusao'):
+            if status[campo] is not None:
+                status[campo] = status[campo].strftime('%d/%m/%Y %H:%M:%S')
+        return status
+
+    @classmethod
+    def _Loop(cls):
+        while not cls._evento_parada.is_set():
+            cls._evento_gatilho.wait(cls.INTERVALO_SEGUNDOS)
+            if cls._evento_parada.is_set():
+                break
+            cls._evento_gatilho.clear()
+
+            with cls._lock_estado:
+                motivos = sorted(cls._motivos_pendentes) or ['intervalo']
+                cls._motivos_pendentes.clear()
+
+            try:
+                cls._ExecutarComLock(motivos)
+            except Exception as e:
+                # A thread nunca deve morrer: o erro fica registrado no status e no log
+                RegistrarLog("Falha inesperada no agendador da sincronização consolidada", "ERROR", e)
+
+    @classmethod
+    def ReconstruirCompleto(cls):
+        """
+        Ação administrativa: executa a reconstrução completa na thread chamadora, sob o mesmo
+        advisory lock da sincronização. Retorna False se outra execução estiver em andamento.
+        """
+        return cls._ExecutarComLock(['reconstrucao_completa'], completo=True)
+
+    @classmethod
+    def _ExecutarComLock(cls, motivos, completo=False):
+        """Executa a sincronização somente se conseguir o advisory lock do cluster."""
+        engine = GetPostgresEngine()
+        if engine is None:
+            return False
+
+        # O advisory lock é de sessão: fica preso à conexão dedicada abaixo até o unlock
+        with engine.connect() as conn_lock:
+            obteve_lock = conn_lock.execute(
+                text("SELECT pg_try_advisory_lock(:chave)"), {"chave": cls.CHAVE_ADVISORY_LOCK}
+            ).scalar()
+            conn_lock.commit()
+
+            if not obteve_lock:
+                with cls._lock_estado:
+                    cls._status['ignoradas_lock'] += 1
+                return False
+
+            try:
+                cls._Executar(motivos, completo)
+            finally:
+                conn_lock.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": cls.CHAVE_ADVISORY_LOCK})
+                conn_lock.commit()
+        return True
+
+    @classmethod
+    def _Executar(cls, motivos, completo=False):
+        inicio = datetime.now()
+        t0 = time.time()
+        with cls._lock_estado:
+            cls._status.update({'status': 'executando', 'ultima_execucao': inicio, 'motivos': motivos})
+
+        session_db = GetPostgresSession()
+        try:
+            servico = SincronizacaoConsolidadoRazaoService(session_db)
+            if completo:
+                servico.reconstruirCompleto()
+                resumo = {'modo': 'completo'}
+            else:
+                resumo = servico.sincronizarDados()
+            with cls._lock_estado:
+                cls._status.update({'status': 'success', 'resumo': resumo, 'erro': None})
+        except Exception as e:
+            with cls._lock_estado:
+                cls._status.update({'status': 'error', 'erro': str(e)})
+            if completo:
+                raise
+        finally:
+            session_db.close()
+            with cls._lock_estado:
+                cls._status['ultima_conclusao'] = datetime.now()
+                cls._status['duracao_ms'] = round((time.time() - t0) * 1000, 2)
+                cls._status['execucoes'] += 1
@@ -14,6 +14,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../.
 from Utils.Common import parse_bool
 from Utils.Logger import RegistrarLog
 from Db.Connections import GetPostgresEngine
+from Modules.RAZAO.Services.AgendadorSincronizacaoConsolidado import AgendadorSincronizacaoConsolidado
 
 class AjustesManuaisRazaoService:
     def __init__(self, session_db):
@@ -213,6 +214,7 @@ class AjustesManuaisRazaoService:
         )
         self.session.add(log)
         self.session.commit()
+        AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('ajuste')
         return novo_registro.Id
     
     def SalvarAjuste(self, payload, usuario):
@@ -278,6 +280,7 @@ class AjustesManuaisRazaoService:
         if 'Exibir_Saldo' in d: registro.Exibir_Saldo = parse_bool(d.get('Exibir_Saldo', True))
         
         self.session.commit()
+        AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('ajuste')
         return registro.Id
     
     def _ReverterEdicoesPendentes(self, registro):
@@ -368,6 +371,7 @@ class AjustesManuaisRazaoService:
         
         registro.Data_Aprovacao = datetime.datetime.now()
         self.session.commit()
+        AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('ajuste')
 
     def ToggleInvalido(self, reg_id, reg_fonte, acao, usuario):
         registro = self.session.query(CtlRazaoConsolidado).filter_by(Id=reg_id, Fonte=reg_fonte).first()
@@ -401,6 +405,7 @@ class AjustesManuaisRazaoService:
             registro.Aprovado_Por = 'Sistema'
             
         self.session.commit()
+        AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('ajuste')
 
     def ObterHistorico(self, reg_id, reg_fonte):
         logs = self.session.query(CtlAjusteLog).filter_by(Id_Registro=reg_id, Fonte_Registro=reg_fonte).order_by(CtlAjusteLog.Data_Acao.desc()).all()
@@ -412,16 +417,98 @@ class AjustesManuaisRazaoService:
     # =========================================================================
     # PROCESSAMENTO DE INTERGRUPOS (Lançam direto na Consolidada)
     # =========================================================================
+    # Colunas gravadas pelos geradores de intergrupo (atributos do modelo CtlRazaoConsolidado)
+    COLUNAS_INTERGRUPO = [
+        'Id', 'Fonte', 'origem', 'Conta', 'Titulo_Conta', 'Data', 'Descricao', 'Debito', 'Credito',
+        'Filial', 'Centro_Custo', 'Item', 'Is_Intergrupo', 'Is_Nao_Operacional', 'Tipo_Operacao',
+        'Status', 'Invalido', 'Criado_Por', 'Data_Aprovacao', 'Exibir_Saldo'
+    ]
+
+    def _CarregarIntergrupos(self, fonte, data_gravacao):
+        """
+        Carrega de uma vez os lançamentos já gerados da fonte de intergrupo na data da competência,
+        indexados em memória por (Fonte, origem, Conta, Data, Descricao), e o maior Id da fonte.
+
+        Retorno:
+            tuple: (dict de linhas indexadas, int com o Id máximo da fonte)
+        """
+        RegistrarLog(f"_CarregarIntergrupos: [QUERY DB] Carregando lançamentos {fonte} existentes...", "SERVICE")
+        colunas = [getattr(CtlRazaoConsolidado, c) for c in self.COLUNAS_INTERGRUPO]
+        linhas = self.session.query(*colunas).filter(
+            CtlRazaoConsolidado.Fonte == fonte,
+            CtlRazaoConsolidado.Data == data_gravacao
+        ).order_by(CtlRazaoConsolidado.Id).all()
+        max_id = self.session.query(func.max(CtlRazaoConsolidado.Id)).filter(CtlRazaoConsolidado.Fonte == fonte).scalar() or 0
+
+        existentes = {}
+        for linha in linhas:
+            reg = dict(zip(self.COLUNAS_INTERGRUPO, linha))
+            existentes.setdefault((reg['Fonte'], reg['origem'], reg['Conta'], reg['Data'], reg['Descricao']), reg)
+        return existentes, max_id
+
+    @staticmethod
+    def _LocalizarIntergrupo(existentes, fonte, conta, data, origem=None, descricao=None):
+        """Busca em memória um lançamento já gerado. origem/descricao None não restringem a busca."""
+        if origem is not None and descricao is not None:
+            return existentes.get((fonte, origem, conta, data, descricao))
+        for (f, o, c, d, desc), reg in existentes.items():
+            if f == fonte and c == conta and d == data and origem in (None, o) and descricao in (None, desc):
+                return reg
+        return None
+
+    def _GravarIntergrupos(self, linhas):
+        """
+        Aplica a diferença calculada (novos lançamentos e alterações) num único upsert pela chave
+        primária ("Id", "Fonte"): as linhas existentes só têm valores e a flag de intergrupo atualizados.
+        Data_Alteracao é carimbada nas duas situações para a sincronização incremental enxergar a mudança.
+        """
+        if not linhas:
+            return
+        colunas = self.COLUNAS_INTERGRUPO + ['Data_Alteracao']
+        mapa = CtlRazaoConsolidado.__mapper__.columns
+        nomes = [mapa[c].name for c in colunas]
+        agora = datetime.datetime.now()
+        RegistrarLog(f"_GravarIntergrupos: [QUERY DB] Gravando {len(linhas)} lançamentos em lote...", "SERVICE")
+        sql = text(f"""
+            INSERT INTO "{self.schema}"."Tb_CTL_Razao_Consolidado" ({', '.join(f'"{n}"' for n in nomes)})
+            VALUES ({', '.join(f':{c}' for c in colunas)})
+            ON CONFLICT ("Id", "Fonte") DO UPDATE SET
+                "Debito" = EXCLUDED."Debito",
+                "Credito" = EXCLUDED."Credito",
+                "Is_Intergrupo" = EXCLUDED."Is_Intergrupo",
+                "Data_Alteracao" = EXCLUDED."Data_Alteracao"
+        """)
+        self.session.execute(sql, [dict(linha, Data_Alteracao=agora) for linha in linhas])
+
+    def _NovoIntergrupo(self, **valores):
+        """Monta um novo lançamento automático de intergrupo (aprovado pelo sistema)."""
+        reg = dict.fromkeys(self.COLUNAS_INTERGRUPO)
+        reg.update(
+            Is_Intergrupo=True, Is_Nao_Operacional=False, Tipo_Operacao='INTERGRUPO_AUTO', Status='Aprovado',
+            Invalido=False, Criado_Por='SISTEMA_AUTO', Data_Aprovacao=datetime.datetime.now(), Exibir_Saldo=True
+        )
+        reg.update(valores)
+        return reg
+
+    @staticmethod
+    def _AtualizarIntergrupo(alteracoes, reg, **valores):
+        """Registra a alteração de um lançamento existente (sempre reativando a flag de intergrupo)."""
+        atual = alteracoes.get((reg['Id'], reg['Fonte']), reg)
+        novo = dict(atual, Is_Intergrupo=True, **valores)
+        if novo != reg:
+            alteracoes[(reg['Id'], reg['Fonte'])] = novo
+
     def processarIntergrupoIntec(self, ano, mes, data_gravacao):
         """
         Processa e gera os lançamentos de intergrupo para a fonte INTEC com base no arquivo CSV.
-        Utiliza bloqueio de autoflush para prevenir deadlocks durante atualizações em lote.
-        
+        Os lançamentos existentes da competência são carregados numa única consulta e a diferença
+        é gravada num único upsert.
+
         Parâmetros:
             ano (int): Ano de competência.
             mes (int): Mês de competência.
             data_gravacao (datetime): Data de registro contábil.
-            
+
         Retorno:
             list: Lista contendo os logs detalhados das operações executadas.
         """
@@ -430,7 +517,7 @@ class AjustesManuaisRazaoService:
             meses_map = {1: 'jan', 2: 'fev', 3: 'mar', 4: 'abr', 5: 'mai', 6: 'jun', 7: 'jul', 8: 'ago', 9: 'set', 10: 'out', 11: 'nov', 12: 'dez'}
             competencia_anomes = f"{ano}-{meses_map[mes]}"
             caminho_csv = os.path.join(BaseConfig().DataCSVPath(), "ValorFinanceiro.csv")
-            
+
             RegistrarLog("processarIntergrupoIntec: Validando existência do arquivo CSV.", "SERVICE")
             if not os.path.exists(caminho_csv):
                 RegistrarLog("processarIntergrupoIntec: Arquivo ValorFinanceiro.csv não encontrado.", "WARNING")
@@ -438,21 +525,21 @@ class AjustesManuaisRazaoService:
 
             RegistrarLog("processarIntergrupoIntec: Carregando CSV via Pandas.", "SERVICE")
             df_csv = pd.read_csv(caminho_csv, sep=';', encoding='utf-8-sig', low_memory=False)
-            if len(df_csv.columns) <= 1: 
+            if len(df_csv.columns) <= 1:
                 df_csv = pd.read_csv(caminho_csv, sep=',', encoding='utf-8-sig', low_memory=False)
 
             def limpar_coluna(col): return col.strip().replace('Ï»¿', '').replace('\ufeff', '').upper()
             df_csv.columns = [limpar_coluna(c) for c in df_csv.columns]
-            
-            if 'INTERGROUP' not in df_csv.columns: 
+
+            if 'INTERGROUP' not in df_csv.columns:
                 return ["Erro: Coluna INTERGROUP inexistente. Verifique o CSV."]
 
             RegistrarLog("processarIntergrupoIntec: Convertendo colunas de valores.", "SERVICE")
             if 'VALORFINANCEIRO' in df_csv.columns:
-                if df_csv['VALORFINANCEIRO'].dtype == object: 
+                if df_csv['VALORFINANCEIRO'].dtype == object:
                     df_csv['VALORFINANCEIRO'] = df_csv['VALORFINANCEIRO'].astype(str).str.replace('.', '').str.replace(',', '.')
                 df_csv['VALORFINANCEIRO'] = pd.to_numeric(df_csv['VALORFINANCEIRO'], errors='coerce').fillna(0.0)
-            
+
             # Filtra os dados para INTEC e calcula os somatórios necessários para os lançamentos
             """
                 Regra de Negócio:
@@ -468,13 +555,13 @@ class AjustesManuaisRazaoService:
             v_rodoviario = df_filtrado_s[df_filtrado_s['MODAL'].str.upper() == 'RODOVIARIO']['VALORFINANCEIRO'].sum()
             v_aereo = df_filtrado_s[df_filtrado_s['MODAL'].str.upper() == 'AEREO']['VALORFINANCEIRO'].sum()
 
-            if v_rodoviario == 0 and v_aereo == 0 and v_aereo_intec_especifico == 0: 
+            if v_rodoviario == 0 and v_aereo == 0 and v_aereo_intec_especifico == 0:
                 RegistrarLog("processarIntergrupoIntec: Valores de somatório zerados. Abortando criação Intec.", "SERVICE")
                 return []
 
             RegistrarLog("processarIntergrupoIntec: [QUERY DB] Buscando template Intec na base consolidada...", "SERVICE")
             template = self.session.query(CtlRazaoConsolidado).filter_by(origem='INTEC', Conta='60101010201').order_by(CtlRazaoConsolidado.Data.desc()).first()
-            if not template: 
+            if not template:
                 RegistrarLog("processarIntergrupoIntec: Template INTEC não encontrado no banco.", "WARNING")
                 return ["Template INTEC não encontrado"]
 
@@ -488,66 +575,59 @@ class AjustesManuaisRazaoService:
                 {'modal': 'AEREO', 'valor': v_aereo, 'conta': '60101010201C', 'tipo': 'C', 'sufixo': 'C'}
             ]
 
-            RegistrarLog("processarIntergrupoIntec: [QUERY DB] Consultando ID Máximo...", "SERVICE")
-            max_id = self.session.query(func.max(CtlRazaoConsolidado.Id)).filter(CtlRazaoConsolidado.Fonte == 'INTERGRUPO_INTEC').scalar() or 0
-
-            # Suspensão do Autoflush para evitar locks
-            with self.session.no_autoflush:
-                RegistrarLog("processarIntergrupoIntec: Iniciando loop de inserção/update com no_autoflush ativado.", "SERVICE")
-                for index, lanc in enumerate(lancamentos):
-                    if lanc['valor'] > 0:
-                        v_abs = round(abs(lanc['valor']), 2)
-                        val_debito = v_abs if lanc['tipo'] == 'D' else 0.0
-                        val_credito = v_abs if lanc['tipo'] == 'C' else 0.0
-                        desc_final = f"INTERGRUPO INTEC - {lanc['modal']} - {competencia_anomes} ({lanc['sufixo']})"
-
-                        RegistrarLog(f"processarIntergrupoIntec: [QUERY DB] Verificando existência (Item {index+1}/6) na conta {lanc['conta']}.", "SERVICE")
-                        reg_existente = self.session.query(CtlRazaoConsolidado).filter_by(
-                            Fonte='INTERGRUPO_INTEC', Conta=lanc['conta'], Descricao=desc_final, Data=data_gravacao
-                        ).first()
-
-                        if reg_existente:
-                            RegistrarLog(f"processarIntergrupoIntec: Atualizando registro existente na memória (Conta {lanc['conta']}).", "SERVICE")
-                            reg_existente.Is_Intergrupo = True
-                            valor_atual = reg_existente.Debito if lanc['tipo'] == 'D' else reg_existente.Credito
-                            if abs(valor_atual - v_abs) > 0.01:
-                                if lanc['tipo'] == 'D': reg_existente.Debito = v_abs
-                                else: reg_existente.Credito = v_abs
-                                logs_intec.append(f"[{competencia_anomes}] {lanc['modal']} {lanc['sufixo']}: Atualizado para {v_abs}")
+            existentes, max_id = self._CarregarIntergrupos('INTERGRUPO_INTEC', data_gravacao)
+            novos, alteracoes = [], {}
+
+            RegistrarLog("processarIntergrupoIntec: Calculando diferenças em memória.", "SERVICE")
+            for lanc in lancamentos:
+                if lanc['valor'] > 0:
+                    v_abs = round(abs(lanc['valor']), 2)
+                    val_debito = v_abs if lanc['tipo'] == 'D' else 0.0
+                    val_credito = v_abs if lanc['tipo'] == 'C' else 0.0
+                    desc_final = f"INTERGRUPO INTEC - {lanc['modal']} - {competencia_anomes} ({lanc['sufixo']})"
+
+                    reg_existente = self._LocalizarIntergrupo(
+                        existentes, 'INTERGRUPO_INTEC', lanc['conta'], data_gravacao, descricao=desc_final
+                    )
+
+                    if reg_existente:
+                        campo = 'Debito' if lanc['tipo'] == 'D' else 'Credito'
+                        if abs((reg_existente[campo] or 0.0) - v_abs) > 0.01:
+                            self._AtualizarIntergrupo(alteracoes, reg_existente, **{campo: v_abs})
+                            logs_intec.append(f"[{competencia_anomes}] {lanc['modal']} {lanc['sufixo']}: Atualizado para {v_abs}")
                         else:
-                            max_id += 1
-                            RegistrarLog(f"processarIntergrupoIntec: Criando novo objeto na memória (Conta {lanc['conta']} ID {max_id}).", "SERVICE")
-                            novo_reg = CtlRazaoConsolidado(
-                                Id=max_id, Fonte='INTERGRUPO_INTEC', origem='INTEC',
-                                Conta=lanc['conta'], Titulo_Conta=template.Titulo_Conta or 'VENDA DE FRETES',
-                                Data=data_gravacao, Descricao=desc_final, Debito=val_debito, Credito=val_credito,
-                                Filial=template.Filial, Centro_Custo=template.Centro_Custo, Item='INTERGRUPO',
-                                Is_Intergrupo=True,
-                                Tipo_Operacao='INTERGRUPO_AUTO', Status='Aprovado', Invalido=False,
-                                Criado_Por='SISTEMA_AUTO', Data_Aprovacao=datetime.datetime.now(), Exibir_Saldo=True
-                            )
-                            self.session.add(novo_reg)
-                            logs_intec.append(f"[{competencia_anomes}] {lanc['modal']} {lanc['sufixo']}: Criado {v_abs}")
-            
+                            self._AtualizarIntergrupo(alteracoes, reg_existente)
+                    else:
+                        max_id += 1
+                        novos.append(self._NovoIntergrupo(
+                            Id=max_id, Fonte='INTERGRUPO_INTEC', origem='INTEC',
+                            Conta=lanc['conta'], Titulo_Conta=template.Titulo_Conta or 'VENDA DE FRETES',
+                            Data=data_gravacao, Descricao=desc_final, Debito=val_debito, Credito=val_credito,
+                            Filial=template.Filial, Centro_Custo=template.Centro_Custo, Item='INTERGRUPO'
+                        ))
+                        logs_intec.append(f"[{competencia_anomes}] {lanc['modal']} {lanc['sufixo']}: Criado {v_abs}")
+
+            self._GravarIntergrupos(novos + list(alteracoes.values()))
             RegistrarLog("processarIntergrupoIntec: Operação finalizada com sucesso.", "SERVICE")
             return logs_intec
 
         except Exception as e:
             RegistrarLog(f"Erro Crítico Intec: {str(e)}", "ERROR")
             return [f"ERRO CRÍTICO INTEC: {str(e)}"]
-        
+
     def processarIntergrupoFarma(self, ano, mes, data_inicio, data_fim, data_gravacao):
         """
         Calcula e aplica os lançamentos de intergrupo para a FARMA cruzando os dados do banco e CSV.
-        Implementa proteção contra leitura suja (autoflush lock) e define chaves de aprovação automáticas.
-        
+        Os lançamentos existentes da competência são carregados numa única consulta, a diferença é
+        calculada em memória e gravada num único upsert, com aprovação automática.
+
         Parâmetros:
             ano (int): Ano de competência.
             mes (int): Mês de competência.
             data_inicio (datetime): Data de início da busca de movimentação.
             data_fim (datetime): Data final da busca de movimentação.
             data_gravacao (datetime): Data de registro contábil.
-            
+
         Retorno:
             list: Lista contendo os logs detalhados das operações executadas.
         """
@@ -558,164 +638,142 @@ class AjustesManuaisRazaoService:
                 '60301020290': {'destino': '60301020290B', 'descricao': 'ajuste intergrupo ( fretes Dist.)', 'titulo_origem': 'FRETE DISTRIBUIÇÃO', 'titulo_destino': 'FRETE DISTRIBUIÇÃO'},
                 '60301020288': {'destino': '60301020288C', 'descricao': 'ajuste intergrupo ( fretes Aéreo)', 'titulo_origem': 'FRETES AEREO', 'titulo_destino': 'FRETES AEREO'}
             }
-            
-            # Isolamento transacional de leitura
-            with self.session.no_autoflush:
-                RegistrarLog("processarIntergrupoFarma: [QUERY DB] Consultando ID Máximo Farma...", "SERVICE")
-                max_id = self.session.query(func.max(CtlRazaoConsolidado.Id)).filter(CtlRazaoConsolidado.Fonte == 'INTERGRUPO_FARMA').scalar() or 0
-
-                for conta_origem, config in config_contas_banco.items():
-                    RegistrarLog(f"processarIntergrupoFarma: [QUERY DB] Consultando registros base para conta {conta_origem}...", "SERVICE")
-                    registros = self.session.query(CtlRazaoConsolidado).filter(
-                        CtlRazaoConsolidado.Conta == conta_origem,
-                        CtlRazaoConsolidado.Data >= data_inicio,
-                        CtlRazaoConsolidado.Data <= data_fim,
-                        CtlRazaoConsolidado.origem != 'INTEC'
-                    ).all()
-
-                    agrupado_por_origem = {}
-                    RegistrarLog(f"processarIntergrupoFarma: Agrupando origens em {len(registros)} registros...", "SERVICE")
-
-                    for r in registros:
-                        descricao_texto = str(r.Descricao or '').upper()
-                        if "INTEC" in descricao_texto:
-                            orig = r.origem
-                            if orig not in agrupado_por_origem:
-                                agrupado_por_origem[orig] = { 'deb': 0.0, 'cred': 0.0, 'item': r.Item, 'filial': r.Filial, 'cc': r.Centro_Custo, 'origem': orig }
-                            
-                            agrupado_por_origem[orig]['deb'] += float(r.Debito or 0.0)
-                            agrupado_por_origem[orig]['cred'] += float(r.Credito or 0.0)
-                            
-                            if not agrupado_por_origem[orig]['filial'] and r.Filial: agrupado_por_origem[orig]['filial'] = r.Filial
-                            if not agrupado_por_origem[orig]['cc'] and r.Centro_Custo: agrupado_por_origem[orig]['cc'] = r.Centro_Custo
-                            if not agrupado_por_origem[orig]['item'] and r.Item: agrupado_por_origem[orig]['item'] = r.Item
-
-                    for orig, dados in agrupado_por_origem.items():
-                        if not dados['deb'] and not dados['cred']: continue
-                        
-                        valor_ajuste = round(abs(dados['deb'] - dados['cred']), 2)
-                        if valor_ajuste <= 0: continue
-                        
-                        RegistrarLog(f"processarIntergrupoFarma: [QUERY DB] Verificando existência de destino {config['destino']} para filial {orig}...", "SERVICE")
-                        reg_destino_existente = self.session.query(CtlRazaoConsolidado).filter_by(
-                            Fonte='INTERGRUPO_FARMA', origem=dados['origem'], Conta=config['destino'], Data=data_gravacao
-                        ).first()
-
-                        if reg_destino_existente:
-                            RegistrarLog("processarIntergrupoFarma: Atualizando destino e origem existentes na memória...", "SERVICE")
-                            
-                            # Correção 1: Ativando a flag na conta destino independente de mudança de valor
-                            reg_destino_existente.Is_Intergrupo = True
-                            
-                            # Correção 2: Buscando e ativando a flag na conta origem independente de mudança de valor
-                            reg_origem_existente = self.session.query(CtlRazaoConsolidado).filter_by(
-                                Fonte='INTERGRUPO_FARMA', origem=dados['origem'], Conta=conta_origem, Data=data_gravacao
-                            ).first()
-                            
-                            if reg_origem_existente: 
-                                reg_origem_existente.Is_Intergrupo = True
-                                
-                            # Agora sim, se o valor for diferente, a gente ajusta a parte financeira
-                            if abs(reg_destino_existente.Debito - valor_ajuste) > 0.01:
-                                reg_destino_existente.Debito = valor_ajuste
-                                if reg_origem_existente:
-                                    reg_origem_existente.Credito = valor_ajuste
-                                logs_farma.append(f"[{mes:02d}/{ano}] {dados['origem']}: Atualizado {config['destino']} v:{valor_ajuste}")
+
+            existentes, max_id = self._CarregarIntergrupos('INTERGRUPO_FARMA', data_gravacao)
+            novos, alteracoes = [], {}
+
+            RegistrarLog("processarIntergrupoFarma: [QUERY DB] Consultando registros base das contas de frete...", "SERVICE")
+            registros_base = self.session.query(CtlRazaoConsolidado).filter(
+                CtlRazaoConsolidado.Conta.in_(list(config_contas_banco)),
+                CtlRazaoConsolidado.Data >= data_inicio,
+                CtlRazaoConsolidado.Data <= data_fim,
+                CtlRazaoConsolidado.origem != 'INTEC'
+            ).all()
+
+            for conta_origem, config in config_contas_banco.items():
+                registros = [r for r in registros_base if r.Conta == conta_origem]
+                agrupado_por_origem = {}
+                RegistrarLog(f"processarIntergrupoFarma: Agrupando origens em {len(registros)} registros da conta {conta_origem}...", "SERVICE")
+
+                for r in registros:
+                    descricao_texto = str(r.Descricao or '').upper()
+                    if "INTEC" in descricao_texto:
+                        orig = r.origem
+                        if orig not in agrupado_por_origem:
+                            agrupado_por_origem[orig] = { 'deb': 0.0, 'cred': 0.0, 'item': r.Item, 'filial': r.Filial, 'cc': r.Centro_Custo, 'origem': orig }
+
+                        agrupado_por_origem[orig]['deb'] += float(r.Debito or 0.0)
+                        agrupado_por_origem[orig]['cred'] += float(r.Credito or 0.0)
+
+                        if not agrupado_por_origem[orig]['filial'] and r.Filial: agrupado_por_origem[orig]['filial'] = r.Filial
+                        if not agrupado_por_origem[orig]['cc'] and r.Centro_Custo: agrupado_por_origem[orig]['cc'] = r.Centro_Custo
+                        if not agrupado_por_origem[orig]['item'] and r.Item: agrupado_por_origem[orig]['item'] = r.Item
+
+                for orig, dados in agrupado_por_origem.items():
+                    if not dados['deb'] and not dados['cred']: continue
+
+                    valor_ajuste = round(abs(dados['deb'] - dados['cred']), 2)
+                    if valor_ajuste <= 0: continue
+
+                    reg_destino_existente = self._LocalizarIntergrupo(
+                        existentes, 'INTERGRUPO_FARMA', config['destino'], data_gravacao, origem=dados['origem']
+                    )
+
+                    if reg_destino_existente:
+                        # A flag de intergrupo é reativada no destino e na origem independente de mudança de valor
+                        reg_origem_existente = self._LocalizarIntergrupo(
+                            existentes, 'INTERGRUPO_FARMA', conta_origem, data_gravacao, origem=dados['origem']
+                        )
+
+                        if abs((reg_destino_existente['Debito'] or 0.0) - valor_ajuste) > 0.01:
+                            self._AtualizarIntergrupo(alteracoes, reg_destino_existente, Debito=valor_ajuste)
+                            if reg_origem_existente:
+                                self._AtualizarIntergrupo(alteracoes, reg_origem_existente, Credito=valor_ajuste)
+                            logs_farma.append(f"[{mes:02d}/{ano}] {dados['origem']}: Atualizado {config['destino']} v:{valor_ajuste}")
                         else:
-                            RegistrarLog("processarIntergrupoFarma: Criando novos ajustes de origem e destino na memória...", "SERVICE")
-                            max_id += 1
-                            aj_origem = CtlRazaoConsolidado(
-                                Id=max_id, Fonte='INTERGRUPO_FARMA', origem=dados['origem'],
-                                Conta=conta_origem, Titulo_Conta=config['titulo_origem'], Data=data_gravacao,
-                                Descricao=config['descricao'], Debito=0.0, Credito=valor_ajuste,
-                                Filial=dados['filial'], Centro_Custo=dados['cc'], Item=dados['item'],
-                                Is_Intergrupo=True,
-                                Tipo_Operacao='INTERGRUPO_AUTO', Status='Aprovado', Criado_Por='SISTEMA_AUTO', Exibir_Saldo=True,
-                                Data_Aprovacao=datetime.datetime.now() # <-- CORREÇÃO: Data Aprovacao Auto
-                            )
-                            max_id += 1
-                            aj_destino = CtlRazaoConsolidado(
-                                Id=max_id, Fonte='INTERGRUPO_FARMA', origem=dados['origem'],
-                                Conta=config['destino'], Titulo_Conta=config['titulo_destino'], Data=data_gravacao,
-                                Descricao=config['descricao'], Debito=valor_ajuste, Credito=0.0,
-                                Filial=dados['filial'], Centro_Custo=dados['cc'], Item=dados['item'],
-                                Is_Intergrupo=True,
-                                Tipo_Operacao='INTERGRUPO_AUTO', Status='Aprovado', Criado_Por='SISTEMA_AUTO', Exibir_Saldo=True,
-                                Data_Aprovacao=datetime.datetime.now() # <-- CORREÇÃO: Data Aprovacao Auto
+                            self._AtualizarIntergrupo(alteracoes, reg_destino_existente)
+                            if reg_origem_existente:
+                                self._AtualizarIntergrupo(alteracoes, reg_origem_existente)
+                    else:
+                        comuns = dict(
+                            Fonte='INTERGRUPO_FARMA', origem=dados['origem'], Data=data_gravacao, Descricao=config['descricao'],
+                            Filial=dados['filial'], Centro_Custo=dados['cc'], Item=dados['item']
+                        )
+                        novos.append(self._NovoIntergrupo(
+                            Id=max_id + 1, Conta=conta_origem, Titulo_Conta=config['titulo_origem'],
+                            Debito=0.0, Credito=valor_ajuste, **comuns
+                        ))
+                        novos.append(self._NovoIntergrupo(
+                            Id=max_id + 2, Conta=config['destino'], Titulo_Conta=config['titulo_destino'],
+                            Debito=valor_ajuste, Credito=0.0, **comuns
+                        ))
+                        max_id += 2
+                        logs_farma.append(f"[{mes:02d}/{ano}] {dados['origem']}: Criado {conta_origem} -> {config['destino']} v:{valor_ajuste}")
+
+            # PARTE 2: CSV
+            RegistrarLog("processarIntergrupoFarma: Iniciando processamento de CSV Farma...", "SERVICE")
+            meses_map = {1: 'jan', 2: 'fev', 3: 'mar', 4: 'abr', 5: 'mai', 6: 'jun', 7: 'jul', 8: 'ago', 9: 'set', 10: 'out', 11: 'nov', 12: 'dez'}
+            competencia_anomes = f"{ano}-{meses_map[mes]}"
+            caminho_csv = os.path.join(BaseConfig().DataCSVPath(), "ValorFinanceiro.csv")
+
+            if os.path.exists(caminho_csv):
+                df_csv = pd.read_csv(caminho_csv, sep=';', encoding='utf-8-sig', low_memory=False)
+                if len(df_csv.columns) <= 1: df_csv = pd.read_csv(caminho_csv, sep=',', encoding='utf-8-sig', low_memory=False)
+
+                def limpar_coluna(col): return col.strip().replace('Ï»¿', '').replace('\ufeff', '').upper()
+                df_csv.columns = [limpar_coluna(c) for c in df_csv.columns]
+
+                if 'VALORFINANCEIRO' in df_csv.columns:
+                    if df_csv['VALORFINANCEIRO'].dtype == object:
+                        df_csv['VALORFINANCEIRO'] = df_csv['VALORFINANCEIRO'].astype(str).str.replace('.', '').str.replace(',', '.')
+                    df_csv['VALORFINANCEIRO'] = pd.to_numeric(df_csv['VALORFINANCEIRO'], errors='coerce').fillna(0.0)
+
+                if all(c in df_csv.columns for c in ['MODAL', 'EMPRESA', 'ANOMES']):
+                    df_farma_aereo = df_csv[(df_csv['MODAL'].str.upper() == 'AEREO') & (df_csv['EMPRESA'].str.upper() == 'FARMA') & (df_csv['ANOMES'] == competencia_anomes)]
+                    valor_csv_farma = round(df_farma_aereo['VALORFINANCEIRO'].sum(), 2)
+
+                    if valor_csv_farma > 0:
+                        RegistrarLog("processarIntergrupoFarma: [QUERY DB] Buscando template Farma 60101010201...", "SERVICE")
+                        template = self.session.query(CtlRazaoConsolidado).filter_by(origem='FARMA', Conta='60101010201').first()
+                        desc_csv = 'VLR. CFE DIARIO AUXILIAR N/ DATA (aéreo)'
+
+                        lancamentos = [
+                            {'valor': valor_csv_farma, 'conta': '60101010201', 'tipo': 'D', 'sufixo': 'DEBITO'},
+                            {'valor': valor_csv_farma, 'conta': '60101010201A', 'tipo': 'C', 'sufixo': 'CREDITO'}
+                        ]
+
+                        for lanc in lancamentos:
+                            v_abs = round(abs(lanc['valor']), 2)
+                            val_debito = v_abs if lanc['tipo'] == 'D' else 0.0
+                            val_credito = v_abs if lanc['tipo'] == 'C' else 0.0
+
+                            reg_existente = self._LocalizarIntergrupo(
+                                existentes, 'INTERGRUPO_FARMA', lanc['conta'], data_gravacao, descricao=desc_csv
                             )
-                            self.session.add(aj_origem)
-                            self.session.add(aj_destino)
-                            logs_farma.append(f"[{mes:02d}/{ano}] {dados['origem']}: Criado {conta_origem} -> {config['destino']} v:{valor_ajuste}")
-
-                # PARTE 2: CSV
-                RegistrarLog("processarIntergrupoFarma: Iniciando processamento de CSV Farma...", "SERVICE")
-                meses_map = {1: 'jan', 2: 'fev', 3: 'mar', 4: 'abr', 5: 'mai', 6: 'jun', 7: 'jul', 8: 'ago', 9: 'set', 10: 'out', 11: 'nov', 12: 'dez'}
-                competencia_anomes = f"{ano}-{meses_map[mes]}"
-                caminho_csv = os.path.join(BaseConfig().DataCSVPath(), "ValorFinanceiro.csv")
-                
-                if os.path.exists(caminho_csv):
-                    df_csv = pd.read_csv(caminho_csv, sep=';', encoding='utf-8-sig', low_memory=False)
-                    if len(df_csv.columns) <= 1: df_csv = pd.read_csv(caminho_csv, sep=',', encoding='utf-8-sig', low_memory=False)
-
-                    def limpar_coluna(col): return col.strip().replace('Ï»¿', '').replace('\ufeff', '').upper()
-                    df_csv.columns = [limpar_coluna(c) for c in df_csv.columns]
-                    
-                    if 'VALORFINANCEIRO' in df_csv.columns:
-                        if df_csv['VALORFINANCEIRO'].dtype == object: 
-                            df_csv['VALORFINANCEIRO'] = df_csv['VALORFINANCEIRO'].astype(str).str.replace('.', '').str.replace(',', '.')
-                        df_csv['VALORFINANCEIRO'] = pd.to_numeric(df_csv['VALORFINANCEIRO'], errors='coerce').fillna(0.0)
-
-                    if all(c in df_csv.columns for c in ['MODAL', 'EMPRESA', 'ANOMES']):
-                        df_farma_aereo = df_csv[(df_csv['MODAL'].str.upper() == 'AEREO') & (df_csv['EMPRESA'].str.upper() == 'FARMA') & (df_csv['ANOMES'] == competencia_anomes)]
-                        valor_csv_farma = round(df_farma_aereo['VALORFINANCEIRO'].sum(), 2)
-                        
-                        if valor_csv_farma > 0:
-                            RegistrarLog("processarIntergrupoFarma: [QUERY DB] Buscando template Farma 60101010201...", "SERVICE")
-                            template = self.session.query(CtlRazaoConsolidado).filter_by(origem='FARMA', Conta='60101010201').first()
-                            desc_csv = 'VLR. CFE DIARIO AUXILIAR N/ DATA (aéreo)'
-
-                            lancamentos = [
-                                {'valor': valor_csv_farma, 'conta': '60101010201', 'tipo': 'D', 'sufixo': 'DEBITO'},
-                                {'valor': valor_csv_farma, 'conta': '60101010201A', 'tipo': 'C', 'sufixo': 'CREDITO'}
-                            ]
-
-                            for lanc in lancamentos:
-                                v_abs = round(abs(lanc['valor']), 2)
-                                val_debito = v_abs if lanc['tipo'] == 'D' else 0.0
-                                val_credito = v_abs if lanc['tipo'] == 'C' else 0.0
-
-                                RegistrarLog(f"processarIntergrupoFarma: [QUERY DB] Verificando destino CSV para conta {lanc['conta']}...", "SERVICE")
-                                reg_existente = self.session.query(CtlRazaoConsolidado).filter_by(
-                                    Fonte='INTERGRUPO_FARMA', Conta=lanc['conta'], Descricao=desc_csv, Data=data_gravacao
-                                ).first()
-
-                                if reg_existente:
-                                    RegistrarLog("processarIntergrupoFarma: Atualizando registro de CSV na memória...", "SERVICE")
-                                    reg_existente.Is_Intergrupo = True # <-- Ativando flag no update do CSV
-                                    valor_atual = reg_existente.Debito if lanc['tipo'] == 'D' else reg_existente.Credito
-                                    if abs(valor_atual - v_abs) > 0.01:
-                                        if lanc['tipo'] == 'D': reg_existente.Debito = v_abs
-                                        else: reg_existente.Credito = v_abs
-                                        logs_farma.append(f"[{mes:02d}/{ano}] FARMA (CSV) {lanc['sufixo']}: Atualizado {lanc['conta']} para {v_abs}")
-                                else:
-                                    RegistrarLog("processarIntergrupoFarma: Criando novo registro de CSV na memória...", "SERVICE")
-                                    max_id += 1
-                                    novo_ajuste = CtlRazaoConsolidado(
-                                        Id=max_id, Fonte='INTERGRUPO_FARMA', origem='FARMA',
-                                        Conta=lanc['conta'], Titulo_Conta='VENDA DE FRETES', Data=data_gravacao,
-                                        Descricao=desc_csv, Debito=val_debito, Credito=val_credito,
-                                        Filial=template.Filial if template else None, 
-                                        Centro_Custo=template.Centro_Custo if template else None, 
-                                        Is_Intergrupo=True,
-                                        Tipo_Operacao='INTERGRUPO_AUTO', Status='Aprovado', Criado_Por='SISTEMA_AUTO_CSV', Exibir_Saldo=True,
-                                        Data_Aprovacao=datetime.datetime.now() # <-- CORREÇÃO: Data Aprovacao Auto
-                                    )
-                                    self.session.add(novo_ajuste)
-                                    logs_farma.append(f"[{mes:02d}/{ano}] FARMA (CSV) {lanc['sufixo']}: Criado {lanc['conta']} v:{v_abs}")
 
+                            if reg_existente:
+                                campo = 'Debito' if lanc['tipo'] == 'D' else 'Credito'
+                                if abs((reg_existente[campo] or 0.0) - v_abs) > 0.01:
+                                    self._AtualizarIntergrupo(alteracoes, reg_existente, **{campo: v_abs})
+                                    logs_farma.append(f"[{mes:02d}/{ano}] FARMA (CSV) {lanc['sufixo']}: Atualizado {lanc['conta']} para {v_abs}")
+                                else:
+                                    self._AtualizarIntergrupo(alteracoes, reg_existente)
+                            else:
+                                max_id += 1
+                                novos.append(self._NovoIntergrupo(
+                                    Id=max_id, Fonte='INTERGRUPO_FARMA', origem='FARMA',
+                                    Conta=lanc['conta'], Titulo_Conta='VENDA DE FRETES', Data=data_gravacao,
+                                    Descricao=desc_csv, Debito=val_debito, Credito=val_credito,
+                                    Filial=template.Filial if template else None,
+                                    Centro_Custo=template.Centro_Custo if template else None,
+                                    Criado_Por='SISTEMA_AUTO_CSV'
+                                ))
+                                logs_farma.append(f"[{mes:02d}/{ano}] FARMA (CSV) {lanc['sufixo']}: Criado {lanc['conta']} v:{v_abs}")
+
+            self._GravarIntergrupos(novos + list(alteracoes.values()))
             RegistrarLog("processarIntergrupoFarma: Finalizado com sucesso.", "SERVICE")
             return logs_farma
-            
+
         except Exception as e:
             RegistrarLog(f"Erro no processarIntergrupoFarma", "ERROR", e)
             raise e
@@ -761,6 +819,7 @@ class AjustesManuaisRazaoService:
             # -> SEGUNDO PONTO CRÍTICO
             RegistrarLog("gerarIntergrupo: [ATENÇÃO] Solicitando COMMIT parcial da FARMA no banco de dados...", "SERVICE")
             self.session.commit()
+            AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('ajuste')
             RegistrarLog("gerarIntergrupo: [SUCESSO] Commit da FARMA finalizado sem travar o banco.", "SERVICE")
             
             # 3. Validação final
@@ -1,17 +1,20 @@
 import os
 import uuid
 import json
-import pandas as pd
 from datetime import datetime
 from werkzeug.utils import secure_filename
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 
 from Utils.ExcelUtils import (
     analyze_excel_sample, generate_preview_value, process_and_save_dynamic, 
-    delete_records_by_competencia, apply_transformations, get_competencia_from_df 
+    delete_records_by_competencia, apply_transformations, get_competencia_from_df,
+    ler_planilha_cache, remover_cache_planilha
 )
 from Utils.Logger import RegistrarLog
 from Db.Connections import GetPostgresEngine
+from Modules.RAZAO.Services.AgendadorSincronizacaoConsolidado import AgendadorSincronizacaoConsolidado
+from Modules.RAZAO.Services.JobsImportacaoRazao import JobsImportacaoRazao
 
 # --- NOVOS IMPORTS DE SISTEMA ---
 from Models.Postgress.CTL_Sistema import CtlSysHistImportacao, CtlSysConfigImportacao
@@ -26,6 +29,9 @@ class ImportacaoDadosRazaoService:
         'Tb_CTL_Razao_Farma',
     ]
 
+    # Classe (1ª chave) do advisory lock por tabela/competência; a 2ª chave é o hash de ambas
+    CHAVE_ADVISORY_LOCK_COMPETENCIA = 718_204_003
+
     def __init__(self):
         pass
 
@@ -37,6 +43,18 @@ class ImportacaoDadosRazaoService:
         if not os.path.exists(self.PASTA_TEMPORARIA):
             os.makedirs(self.PASTA_TEMPORARIA)
 
+    def _bloquear_competencia(self, session, tabela_destino, competencia):
+        """
+        Serializa importações e reversões da mesma tabela/competência no cluster inteiro
+        (pg_advisory_xact_lock). O lock fica preso à transação da sessão e é liberado no
+        commit/rollback, então a verificação de duplicidade e a gravação do histórico
+        acontecem sem outro job intercalado.
+        """
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:classe, hashtext(:chave))"),
+            {"classe": self.CHAVE_ADVISORY_LOCK_COMPETENCIA, "chave": f"{tabela_destino}:{competencia}"}
+        )
+
     def _verificar_importacao_existente(self, session, tabela_destino, competencia):
         # ATUALIZADO
         existe = session.query(CtlSysHistImportacao).filter_by(
@@ -92,20 +110,33 @@ class ImportacaoDadosRazaoService:
             return {"error": "Arquivo temporário expirou ou foi deletado."}
         return generate_preview_value(caminho_arquivo, mapeamento, transformacoes)
 
-    def ExecutarTransacaoImportacao(self, nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes=None):
+    def _validar_importacao(self, nome_arquivo, tabela_destino):
         if tabela_destino not in self.TABELAS_PERMITIDAS:
             raise Exception("Tabela de destino inválida ou não permitida.")
 
         caminho_arquivo = os.path.join(self.PASTA_TEMPORARIA, nome_arquivo)
         if not os.path.exists(caminho_arquivo):
             raise Exception("O arquivo temporário não foi encontrado.")
+        return caminho_arquivo
+
+    def IniciarImportacaoAssincrona(self, nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes=None):
+        """Valida a requisição e dispara a importação em background. Retorna o id do job."""
+        self._validar_importacao(nome_arquivo, tabela_destino)
+        return JobsImportacaoRazao.Enfileirar(nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes)
+
+    def ObterProgressoImportacao(self, id_job, nome_usuario):
+        return JobsImportacaoRazao.ObterProgresso(id_job, nome_usuario)
+
+    def ExecutarTransacaoImportacao(self, nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes=None, progresso=None):
+        caminho_arquivo = self._validar_importacao(nome_arquivo, tabela_destino)
+        # progresso (opcional): callback que recebe a etapa e os contadores do pipeline
+        progresso = progresso or (lambda **campos: None)
 
         engine = GetPostgresEngine()
         session = self._obter_sessao()
 
         try:
-            df_check = pd.read_excel(caminho_arquivo, engine='openpyxl', nrows=500)
-            df_check.columns = [str(c).replace('\n', ' ').strip() for c in df_check.columns]
+            df_check = ler_planilha_cache(caminho_arquivo, nrows=500)
             
             col_excel_data = next((k for k, v in mapeamento.items() if v == 'Data'), None)
             if not col_excel_data: raise Exception("Coluna obrigatória 'Data' não foi mapeada.")
@@ -114,13 +145,17 @@ class ImportacaoDadosRazaoService:
                 df_check = apply_transformations(df_check, {col_excel_data: transformacoes[col_excel_data]})
                 
             competencia_prevista = get_competencia_from_df(df_check, col_excel_data)
-            
+
+            # Jobs concorrentes da mesma competência esperam aqui até o commit do histórico deste
+            self._bloquear_competencia(session, tabela_destino, competencia_prevista)
             if self._verificar_importacao_existente(session, tabela_destino, competencia_prevista):
                 raise Exception(f"Já existe uma importação ATIVA para {tabela_destino} na competência {competencia_prevista}.")
                 
+            progresso(etapa='importando', competencia=competencia_prevista)
             linhas_inseridas, competencia_real = process_and_save_dynamic(
-                caminho_arquivo, mapeamento, tabela_destino, engine, transformacoes
+                caminho_arquivo, mapeamento, tabela_destino, engine, transformacoes, progresso=progresso
             )
+            progresso(etapa='finalizando')
 
             # ATUALIZADO
             novo_log = CtlSysHistImportacao(
@@ -134,6 +169,7 @@ class ImportacaoDadosRazaoService:
             self._salvar_configuracao_atual(session, tabela_destino, mapeamento, transformacoes)
 
             session.commit()
+            AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('importacao')
             return linhas_inseridas, competencia_real
 
         except Exception as e:
@@ -141,7 +177,7 @@ class ImportacaoDadosRazaoService:
             raise e
         finally:
             session.close()
-            if os.path.exists(caminho_arquivo): os.remove(caminho_arquivo)
+            remover_cache_planilha(caminho_arquivo)
 
     def ExecutarReversao(self, id_log, nome_usuario, motivo):
         session = self._obter_sessao()
@@ -152,6 +188,10 @@ class ImportacaoDadosRazaoService:
             entrada_log = session.query(CtlSysHistImportacao).get(id_log)
             if not entrada_log: raise Exception("Registro de histórico não encontrado.")
             if entrada_log.Status != 'Ativo': raise Exception("Esta importação já foi revertida anteriormente.")
+
+            self._bloquear_competencia(session, entrada_log.Tabela_Destino, entrada_log.Competencia)
+            session.refresh(entrada_log)
+            if entrada_log.Status != 'Ativo': raise Exception("Esta importação já foi revertida anteriormente.")
                 
             delta = datetime.now() - entrada_log.Data_Importacao
             if delta.days > 127: raise Exception(f"Prazo para reversão expirado ({delta.days} dias).")
@@ -164,6 +204,7 @@ class ImportacaoDadosRazaoService:
             entrada_log.Motivo_Reversao = motivo
             
             session.commit()
+            AgendadorSincronizacaoConsolidado.SolicitarSincronizacao('reversao')
             return qtd_deletada, entrada_log.Tabela_Destino
 
         except Exception as e:
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from Utils.Logger import RegistrarLog
+
+
+class JobsImportacaoRazao:
+    """
+    Execução das importações do Razão em background (dentro do processo da aplicação).
+    A requisição apenas registra o job e recebe o id; uma thread por job executa o pipeline em
+    blocos (ImportacaoDadosRazaoService.ExecutarTransacaoImportacao) e publica o progresso
+    (linhas lidas, rejeitadas e inseridas), que a tela de importação consulta por polling.
+    Um semáforo limita quantas importações rodam ao mesmo tempo; as excedentes aguardam na fila.
+    Jobs concluídos ficam disponíveis para consulta por RETENCAO_SEGUNDOS.
+    """
+
+    MAX_SIMULTANEAS = int(os.getenv("IMPORTACAO_MAX_SIMULTANEAS", "2"))
+    RETENCAO_SEGUNDOS = int(os.getenv("IMPORTACAO_RETENCAO_JOBS", "3600"))
+
+    _jobs = {}
+    _lock_estado = threading.Lock()
+    _semaforo = threading.BoundedSemaphore(MAX_SIMULTANEAS)
+
+    @classmethod
+    def Enfileirar(cls, nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes=None):
+        """Registra o job e dispara a thread de execução. Retorna o id do job."""
+        cls._RemoverExpirados()
+        id_job = uuid.uuid4().hex
+        with cls._lock_estado:
+            cls._jobs[id_job] = {
+                'id': id_job,
+                'usuario': nome_usuario,
+                'tabela_destino': tabela_destino,
+                'arquivo': nome_arquivo.split('_', 1)[-1],
+                'etapa': 'na_fila',
+                'linhas_lidas': 0,
+                'linhas_rejeitadas': 0,
+                'linhas_inseridas': 0,
+                'competencia': None,
+                'mensagem': None,
+                'criado_em': datetime.now(),
+                'iniciado_em': None,
+                'concluido_em': None,
+                'concluido_ts': None,
+            }
+
+        threading.Thread(
+            target=cls._Executar,
+            args=(id_job, nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes),
+            name=f"ImportacaoRazao-{id_job[:8]}",
+            daemon=True
+        ).start()
+        RegistrarLog(f"Importação {id_job} enfileirada para {tabela_destino} ({nome_usuario})", "SYSTEM")
+        return id_job
+
+    @classmethod
+    def ObterProgresso(cls, id_job, nome_usuario=None):
+        """Retorna uma cópia do estado do job (None se não existir ou pertencer a outro usuário)."""
+        with cls._lock_estado:
+            job = cls._jobs.get(id_job)
+            if job is None or (nome_usuario is not None and job['usuario'] != nome_usuario):
+                return None
+            progresso = dict(job)
+
+        progresso.pop('concluido_ts', None)
+        for campo in ('criado_em', 'iniciado_em', 'concluido_em'):
+            if progresso[campo] is not None:
+                progresso[campo] = progresso[campo].strftime('%d/%m/%Y %H:%M:%S')
+        progresso['finalizado'] = progresso['etapa'] in ('concluido', 'erro')
+        return progresso
+
+    @classmethod
+    def _Atualizar(cls, id_job, **campos):
+        with cls._lock_estado:
+            cls._jobs[id_job].update(campos)
+
+    @classmethod
+    def _Executar(cls, id_job, nome_arquivo, mapeamento, tabela_destino, nome_usuario, transformacoes):
+        # Import tardio: o serviço importa este módulo
+        from Modules.RAZAO.Services.ImportacaoDadosRazaoService import ImportacaoDadosRazaoService
+
+        with cls._semaforo:
+            cls._Atualizar(id_job, etapa='validando', iniciado_em=datetime.now())
+            try:
+                linhas, competencia = ImportacaoDadosRazaoService().ExecutarTransacaoImportacao(
+                    nome_arquivo, mapeamento, tabela_destino, nome_usuario,
+                    transformacoes=transformacoes,
+                    progresso=lambda **campos: cls._Atualizar(id_job, **campos)
+                )
+                cls._Atualizar(
+                    id_job, etapa='concluido', linhas_inseridas=linhas, competencia=competencia,
+                    mensagem=f'{linhas} registos importados em {tabela_destino} (Competência: {competencia}).'
+                )
+            except Exception as e:
+                RegistrarLog(f"Falha na importação {id_job} ({tabela_destino})", "ERROR", e)
+                cls._Atualizar(id_job, etapa='erro', mensagem=str(e))
+            finally:
+                cls._Atualizar(id_job, concluido_em=datetime.now(), concluido_ts=time.time())
+
+    @classmethod
+    def _RemoverExpirados(cls):
+        limite = time.time() - cls.RETENCAO_SEGUNDOS
+        with cls._lock_estado:
+            for id_job in [j for j, job in cls._jobs.items() if job['concluido_ts'] and job['concluido_ts'] < limite]:
+                del cls._jobs[id_job]
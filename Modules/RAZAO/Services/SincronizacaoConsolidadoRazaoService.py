@@ -1,5 +1,10 @@
-from sqlalchemy import text
+from datetime import datetime
+
+from sqlalchemy import func, text
 from Utils.Logger import RegistrarLog
+from Modules.DRE.Reports.CacheEstruturaDre import CacheEstruturaDre
+from Modules.RAZAO.Reports.RazaoContabil import RazaoContabil
+from Models.Postgress.CTL_Sistema import CtlSysHistImportacao, CtlSysControleSincronizacao
 
 class SincronizacaoConsolidadoRazaoService:
     """
@@ -23,17 +28,101 @@ class SincronizacaoConsolidadoRazaoService:
             {"tabela": "Tb_CTL_Razao_Intec", "fonte": "INTEC", "origem_txt": "INTEC"}
         ]
 
-    def atualizarChaves(self):
+    # =========================================================================
+    # MARCAS D'ÁGUA (Controle Incremental)
+    # =========================================================================
+    def _obterControle(self, chave):
+        controle = self.session.get(CtlSysControleSincronizacao, chave)
+        if controle is None:
+            controle = CtlSysControleSincronizacao(Chave=chave, Ultimo_Id=0, Ultima_Importacao_Id=0)
+            self.session.add(controle)
+        return controle
+
+    def _obterSnapshotCadastros(self):
+        """
+        Retrata os cadastros de domínio usados no cálculo das chaves (Centro de Custo e Plano Conta Filial).
+        Usa o mesmo DISTINCT ON do cálculo para que a comparação reflita exatamente o que vai para a Consolidada.
+        """
+        centros = self.session.execute(text(f"""
+            SELECT DISTINCT ON ("Codigo") "Codigo"::text, "Tipo", "Nome"
+            FROM "{self.schema}"."Tb_CTL_Cad_Centro_Custo" ORDER BY "Codigo"
+        """)).fetchall()
+        itens = self.session.execute(text(f"""
+            SELECT DISTINCT ON ("Item_Conta") "Item_Conta"::text, "Denominacao", "Filial"
+            FROM "{self.schema}"."Tb_CTL_Cad_Plano_Conta_Filial" ORDER BY "Item_Conta"
+        """)).fetchall()
+        return {
+            'centros_custo': {str(r[0]): [r[1], r[2]] for r in centros},
+            'itens_conta': {str(r[0]): [r[1], r[2]] for r in itens},
+        }
+
+    @staticmethod
+    def _diferencaSnapshot(anterior, atual):
+        """Retorna as chaves cujo mapeamento foi incluído, removido ou alterado entre dois retratos."""
+        chaves = set(anterior.keys()) | set(atual.keys())
+        return sorted(c for c in chaves if anterior.get(c) != atual.get(c))
+
+    def _montarCteAlvos(self, desde, centros_alterados, itens_alterados):
+        """
+        Monta a CTE com as linhas da Consolidada que precisam ter regras e chaves recalculadas:
+        - Linhas novas (ainda sem "Mes" calculado). Sem "Data" o "Mes" nunca é preenchido, então essas
+          linhas só entram quando criadas desde a última execução (senão voltariam em toda execução);
+        - Linhas gravadas pela aplicação (ajustes/intergrupos) desde a última execução ("Data_Alteracao");
+        - Linhas editadas pela tela de ajustes desde a última execução (Tb_CTL_Ajuste_Log);
+        - Linhas cujo Centro de Custo ou Item teve o mapeamento alterado no cadastro.
+        """
+        partes = [
+            f'SELECT "Id", "Fonte" FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" WHERE "Mes" IS NULL AND "Data" IS NOT NULL',
+        ]
+        params = {}
+
+        if desde is not None:
+            partes.append(
+                f'SELECT "Id", "Fonte" FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" WHERE "Mes" IS NULL AND "Data" IS NULL AND "Data_Criacao" >= :desde'
+            )
+            partes.append(
+                f'SELECT "Id", "Fonte" FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" WHERE "Data_Alteracao" >= :desde'
+            )
+            partes.append(
+                f'SELECT "Id_Registro", "Fonte_Registro" FROM "{self.schema}"."Tb_CTL_Ajuste_Log" WHERE "Data_Acao" >= :desde'
+            )
+            params["desde"] = desde
+
+        centros_numericos = [int(c) for c in centros_alterados if str(c).isdigit()]
+        if centros_numericos:
+            partes.append(
+                f'SELECT "Id", "Fonte" FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" WHERE "Centro de Custo" = ANY(:centros_alterados)'
+            )
+            params["centros_alterados"] = centros_numericos
+
+        if itens_alterados:
+            partes.append(
+                f'SELECT "Id", "Fonte" FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" WHERE "Item"::text = ANY(:itens_alterados)'
+            )
+            params["itens_alterados"] = list(itens_alterados)
+
+        return "Alvos AS (\n" + "\n UNION \n".join(partes) + "\n)", params
+
+    def atualizarChaves(self, cte_alvos=None, params=None):
         """
         Recalcula as chaves compostas, mês por extenso e vínculos de cadastros de domínio (Filial e Cliente).
         Opera utilizando CTEs (Common Table Expressions) para garantir performance e atualiza o banco
         exclusivamente quando constata divergências, minimizando custos de I/O.
         
+        Parâmetros:
+            cte_alvos (str, opcional): CTE "Alvos" ("Id", "Fonte") que restringe o recálculo às linhas tocadas.
+                                       Quando omitida, recalcula a tabela inteira (reconstrução completa).
+            params (dict, opcional): Parâmetros vinculados à CTE de alvos.
+        
         Retorno:
-            None
+            int: Quantidade de linhas cujas chaves foram efetivamente alteradas.
         """
+        prefixo_alvos = f"{cte_alvos}," if cte_alvos else ""
+        join_alvos = 'JOIN Alvos a ON a."Id" = r."Id" AND a."Fonte" = r."Fonte"' if cte_alvos else ""
+
         query_chaves = text(f"""
-            WITH Calc AS (
+            WITH {prefixo_alvos}
+            Calc AS (
                 SELECT
                     r."Id",
                     r."Fonte",
@@ -65,6 +154,7 @@ class SincronizacaoConsolidadoRazaoService:
                     END AS calc_saldo
                     
                 FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" r
+                {join_alvos}
                 LEFT JOIN (
                     SELECT DISTINCT ON ("Codigo") "Codigo", "Tipo", "Nome"
                     FROM "{self.schema}"."Tb_CTL_Cad_Centro_Custo" ORDER BY "Codigo"
@@ -110,18 +200,20 @@ class SincronizacaoConsolidadoRazaoService:
                   r."Saldo" IS DISTINCT FROM c.calc_saldo
               );
         """)
-        self.session.execute(query_chaves)
+        return self.session.execute(query_chaves, params or {}).rowcount or 0
 
-    def sincronizarDados(self):
+    def reconstruirCompleto(self):
         """
-        Executa o pipeline completo de sincronização de dados das tabelas subjacentes para a consolidada.
-        Processa em lotes e emite commits sequenciais para mitigar bloqueios em nível de tabela (RowExclusiveLock),
-        liberando o banco de dados rapidamente para interações concorrentes, como a geração de intergrupos.
+        Reconstrução completa (ação administrativa explícita): varre todas as tabelas de origem,
+        remove órfãos, insere faltantes, reaplica as regras e recalcula as chaves da Consolidada inteira.
+        Ao final, reinicia as marcas d'água para que as próximas execuções incrementais partam deste ponto.
+        Processa em lotes e emite commits sequenciais para mitigar bloqueios em nível de tabela (RowExclusiveLock).
         
         Retorno:
             None
         """
         try:
+            inicio_execucao = datetime.now()
             for config in self.tabelas_origem:
                 tabela_origem = config["tabela"]
                 fonte = config["fonte"]
@@ -137,55 +229,500 @@ class SincronizacaoConsolidadoRazaoService:
                 self.session.commit() # Libera o lock de exclusão
                 
                 # 2. INSERIR NOVOS REGISTROS (Processados automaticamente como Aprovados pelo Sistema)
-                query_insert = text(f"""
-                    INSERT INTO "{self.schema}"."Tb_CTL_Razao_Consolidado" (
-                        "Id", "Fonte", "origem", "Conta", "Título Conta", "Data", "Numero", "Descricao", 
-                        "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", 
-                        "Debito", "Credito", "Tipo_Operacao", "Status", "Is_Nao_Operacional", "Exibir_Saldo", 
-                        "Invalido", "Criado_Por", "Aprovado_Por", "Data_Aprovacao", "Data_Criacao"
-                    )
-                    SELECT 
-                        orig."Id", :fonte, :origem_txt, orig."Conta", orig."Título Conta", orig."Data", 
-                        orig."Numero", orig."Descricao", orig."Contra Partida - Credito", orig."Filial", 
-                        orig."Centro de Custo", orig."Item", orig."Cod Cl. Valor", orig."Debito", orig."Credito",
-                        'ORIGINAL', 'Aprovado', FALSE, TRUE, FALSE, 'Sistema', 'Sistema', NOW(), NOW()
-                    FROM "{self.schema}"."{tabela_origem}" orig
-                    LEFT JOIN "{self.schema}"."Tb_CTL_Razao_Consolidado" cons 
-                        ON cons."Id" = orig."Id" AND cons."Fonte" = :fonte
-                    WHERE cons."Id" IS NULL
-                """)
-                self.session.execute(query_insert, {"fonte": fonte, "origem_txt": origem_txt})
+                controle = self._obterControle(fonte)
+                controle.Ultimo_Id = self.session.execute(
+                    text(f'SELECT COALESCE(MAX("Id"), 0) FROM "{self.schema}"."{tabela_origem}"')
+                ).scalar() or 0
+                controle.Ultima_Importacao_Id = self.session.query(
+                    func.coalesce(func.max(CtlSysHistImportacao.Id), 0)
+                ).filter(CtlSysHistImportacao.Tabela_Destino == tabela_origem).scalar() or 0
+                self._inserirNovosRegistros(config)
                 self.session.commit() # Libera o lock de inserção
             
-            # 3. CORREÇÃO AUTOMÁTICA: Padronização de status preexistentes
-            query_limpeza = text(f"""
-                UPDATE "{self.schema}"."Tb_CTL_Razao_Consolidado"
-                SET "Status" = 'Aprovado',
-                    "Aprovado_Por" = 'Sistema',
-                    "Criado_Por" = 'Sistema'
-                WHERE "Tipo_Operacao" = 'ORIGINAL' AND ("Status" IS NULL OR "Status" = 'Pendente')
-            """)
-            self.session.execute(query_limpeza)
-            self.session.commit() # Libera o lock de atualização estrutural
-
-            # 4. APLICAÇÃO DE REGRA AUTOMÁTICA (Item 10190)
-            query_update_10190 = text(f"""
-                UPDATE "{self.schema}"."Tb_CTL_Razao_Consolidado"
-                SET "Tipo_Operacao" = 'NO-OPER_AUTO',
-                    "Status" = 'Aprovado',
-                    "Is_Nao_Operacional" = TRUE,
-                    "Aprovado_Por" = 'Sistema',
-                    "Data_Aprovacao" = NOW()
-                WHERE "Item" = '10190' AND "Tipo_Operacao" != 'NO-OPER_AUTO'
-            """)
-            self.session.execute(query_update_10190)
-            self.session.commit() # Libera o lock de regra de negócios
-            
+            # 3 e 4. Regras automáticas sobre a tabela inteira
+            self._aplicarRegrasAutomaticas()
+
             # 5. ATUALIZAR CHAVES
             self.atualizarChaves()
             self.session.commit() # Libera o lock de chaves relacionais
+
+            # 6. RECONSTRÓI O FATO MENSAL DO DRE E OS TOTAIS DO RAZÃO AJUSTADO
+            self.atualizarFatoMensal()
+            self.atualizarResumoRazao('adjusted')
+            self.session.commit()
+            RazaoContabil.InvalidarCaches()
+            CacheEstruturaDre.Invalidar('fato_mensal')
+
+            # 7. REINICIA AS MARCAS D'ÁGUA (com a visão original marcada como pendente, na mesma transação)
+            self._registrarMarcas(inicio_execucao, self._obterSnapshotCadastros())
+            self._marcarRazaoOriginalPendente(None)
+            self.session.commit()
+
+            # 8. VISÃO ORIGINAL DO RAZÃO (e os seus totais)
+            self._atualizarRazaoOriginalPendente()
             
+        except Exception as e:
+            self.session.rollback()
+            RegistrarLog("Erro na reconstrução completa dos dados consolidados", "ERROR", e)
+            raise e
+
+    def sincronizarDados(self):
+        """
+        Sincronização incremental guiada por marcas d'água (padrão do agendamento).
+        - Insere apenas lançamentos com Id acima da última marca de cada origem e, para os lotes de
+          importação confirmados desde a última execução, os que ainda faltam nas suas competências;
+        - Remove apenas linhas das competências revertidas desde a última execução;
+        - Recalcula regras e chaves só das linhas tocadas ou com mapeamento de cadastro alterado.
+        Sem marcas registradas (primeira execução), delega para a reconstrução completa.
+        
+        Retorno:
+            dict: Resumo da execução (modo, inseridos, removidos e chaves recalculadas).
+        """
+        controle_geral = self.session.get(CtlSysControleSincronizacao, 'GERAL')
+        if controle_geral is None or controle_geral.Data_Referencia is None:
+            RegistrarLog("Sincronização sem marcas d'água registradas. Executando reconstrução completa.", "SYSTEM")
+            self.reconstruirCompleto()
+            return {'modo': 'completo'}
+
+        try:
+            inicio_execucao = datetime.now()
+            desde = controle_geral.Data_Referencia
+            resumo = {'modo': 'incremental', 'inseridos': 0, 'removidos': 0, 'chaves_recalculadas': 0, 'meses_fato': 0}
+            competencias_afetadas = set()
+
+            for config in self.tabelas_origem:
+                controle = self._obterControle(config["fonte"])
+
+                # 1. REMOVER linhas de competências revertidas desde a última execução
+                resumo['removidos'] += self._removerCompetenciasRevertidas(config, desde, competencias_afetadas)
+                self.session.commit()
+
+                # 2. INSERIR apenas o que está acima da marca d'água
+                maior_id = self.session.execute(
+                    text(f'SELECT COALESCE(MAX("Id"), 0) FROM "{self.schema}"."{config["tabela"]}"')
+                ).scalar() or 0
+
+                if maior_id > (controle.Ultimo_Id or 0):
+                    competencias_afetadas |= self._obterCompetenciasInseridas(config, controle.Ultimo_Id or 0, maior_id)
+                    resumo['inseridos'] += self._inserirNovosRegistros(config, controle.Ultimo_Id or 0, maior_id)
+                    controle.Ultimo_Id = maior_id
+
+                # 3. Lotes de importação novos (marca no histórico): importações concorrentes na mesma
+                # tabela podem confirmar Ids menores depois que a marca da origem já passou deles
+                resumo['inseridos'] += self._inserirLotesImportados(config, controle, competencias_afetadas)
+                self.session.commit()
+
+            # 4. Mapeamentos de cadastro alterados desde a última execução
+            snapshot_atual = self._obterSnapshotCadastros()
+            snapshot_anterior = controle_geral.get_snapshot()
+            centros_alterados = self._diferencaSnapshot(snapshot_anterior.get('centros_custo', {}), snapshot_atual['centros_custo'])
+            itens_alterados = self._diferencaSnapshot(snapshot_anterior.get('itens_conta', {}), snapshot_atual['itens_conta'])
+
+            # 5. Regras e chaves apenas sobre as linhas tocadas
+            cte_alvos, params = self._montarCteAlvos(desde, centros_alterados, itens_alterados)
+            self._aplicarRegrasAutomaticas(cte_alvos, params)
+            resumo['chaves_recalculadas'] = self.atualizarChaves(cte_alvos, params)
+            self.session.commit()
+
+            # 6. Fato mensal do DRE e totais do Razão ajustado: reagrega somente as competências tocadas
+            competencias_afetadas |= self._obterCompetenciasAfetadas(cte_alvos, params)
+            resumo['meses_fato'] = len(competencias_afetadas)
+            if competencias_afetadas:
+                self.atualizarFatoMensal(competencias_afetadas)
+                self.atualizarResumoRazao('adjusted', competencias_afetadas)
+                self.session.commit()
+                RazaoContabil.InvalidarCaches()
+                # Contas novas no fato mudam os títulos do esqueleto do DRE
+                CacheEstruturaDre.Invalidar('fato_mensal')
+
+            # 7. Visão original do Razão: só muda quando as tabelas puras mudam (importação ou reversão).
+            # A pendência é gravada junto com as marcas d'água, então um REFRESH que falhe é
+            # refeito na próxima execução mesmo que ela não traga nada novo.
+            self._registrarMarcas(inicio_execucao, snapshot_atual)
+            if resumo['inseridos'] or resumo['removidos']:
+                self._marcarRazaoOriginalPendente(competencias_afetadas)
+            self.session.commit()
+
+            self._atualizarRazaoOriginalPendente()
+            return resumo
+
         except Exception as e:
             self.session.rollback()
             RegistrarLog("Erro na sincronização de dados consolidados", "ERROR", e)
-            raise e
\ No newline at end of file
+            raise e
+
+    def atualizarRazaoOriginal(self, competencias=None):
+        """
+        Atualiza a visão materializada da união das tabelas puras (modo 'original' do grid do Razão)
+        e os seus totais por competência. O REFRESH CONCURRENTLY não bloqueia as leituras do grid.
+        Sem a visão criada (Scripts/Code/CriarRazaoOriginalMaterializado.py), apenas registra e segue.
+        
+        Parâmetros:
+            competencias (iterable, opcional): Pares (ano, mês) cujos totais devem ser reagregados.
+                                               Quando omitido, reagrega todos.
+        """
+        if not self._existeRelacao(RazaoContabil.TABELA_ORIGINAL):
+            RegistrarLog("Visão materializada do Razão original inexistente. Atualização ignorada.", "WARNING")
+            return
+
+        self.session.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {RazaoContabil.TABELA_ORIGINAL}"))
+        self.session.commit()
+        self.atualizarResumoRazao('original', competencias)
+        self.session.commit()
+        RazaoContabil.InvalidarCaches()
+
+    def _marcarRazaoOriginalPendente(self, competencias):
+        """
+        Registra na linha 'RAZAO_ORIGINAL' do controle que a visão original precisa ser atualizada,
+        acumulando as competências com as de pendências anteriores (None = todas).
+        Data_Referencia guarda desde quando há pendência; o commit fica a cargo de quem chama.
+        """
+        controle = self._obterControle('RAZAO_ORIGINAL')
+        pendencia = controle.get_snapshot() if controle.Data_Referencia is not None else {}
+        if competencias is None or pendencia.get('todas'):
+            controle.set_snapshot({'todas': True})
+        else:
+            acumuladas = {tuple(c) for c in pendencia.get('competencias', [])} | set(competencias)
+            controle.set_snapshot({'competencias': sorted(acumuladas, key=lambda c: (c[0] is None, c))})
+        if controle.Data_Referencia is None:
+            controle.Data_Referencia = datetime.now()
+
+    def _atualizarRazaoOriginalPendente(self):
+        """Atualiza a visão original se houver pendência registrada e só então a baixa."""
+        controle = self.session.get(CtlSysControleSincronizacao, 'RAZAO_ORIGINAL')
+        if controle is None or controle.Data_Referencia is None:
+            return
+
+        pendencia = controle.get_snapshot()
+        competencias = None if pendencia.get('todas') else {tuple(c) for c in pendencia.get('competencias', [])}
+        self.atualizarRazaoOriginal(competencias)
+
+        controle = self._obterControle('RAZAO_ORIGINAL')
+        controle.Data_Referencia = None
+        controle.set_snapshot({})
+        self.session.commit()
+
+    def _existeRelacao(self, nome):
+        return self.session.execute(text("SELECT to_regclass(:nome)"), {"nome": nome}).scalar() is not None
+
+    # =========================================================================
+    # ETAPAS DO PIPELINE
+    # =========================================================================
+    def _inserirNovosRegistros(self, config, id_minimo=None, id_maximo=None, data_inicio=None, data_fim=None):
+        """
+        Insere na Consolidada os lançamentos da origem ainda inexistentes nela.
+        Com id_minimo/id_maximo, restringe a leitura à faixa acima da marca d'água (range scan na PK);
+        com data_inicio/data_fim, às linhas de uma competência.
+        """
+        filtro_faixa = ""
+        params = {"fonte": config["fonte"], "origem_txt": config["origem_txt"]}
+        if id_minimo is not None:
+            filtro_faixa = 'AND orig."Id" > :id_minimo AND orig."Id" <= :id_maximo'
+            params.update({"id_minimo": id_minimo, "id_maximo": id_maximo})
+        if data_inicio is not None:
+            filtro_faixa += ' AND orig."Data" >= :data_inicio AND orig."Data" < :data_fim'
+            params.update({"data_inicio": data_inicio, "data_fim": data_fim})
+
+        query_insert = text(f"""
+            INSERT INTO "{self.schema}"."Tb_CTL_Razao_Consolidado" (
+                "Id", "Fonte", "origem", "Conta", "Título Conta", "Data", "Numero", "Descricao", 
+                "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor", 
+                "Debito", "Credito", "Tipo_Operacao", "Status", "Is_Nao_Operacional", "Exibir_Saldo", 
+                "Invalido", "Criado_Por", "Aprovado_Por", "Data_Aprovacao", "Data_Criacao"
+            )
+            SELECT 
+                orig."Id", :fonte, :origem_txt, orig."Conta", orig."Título Conta", orig."Data", 
+                orig."Numero", orig."Descricao", orig."Contra Partida - Credito", orig."Filial", 
+                orig."Centro de Custo", orig."Item", orig."Cod Cl. Valor", orig."Debito", orig."Credito",
+                'ORIGINAL', 'Aprovado', FALSE, TRUE, FALSE, 'Sistema', 'Sistema', NOW(), NOW()
+            FROM "{self.schema}"."{config["tabela"]}" orig
+            LEFT JOIN "{self.schema}"."Tb_CTL_Razao_Consolidado" cons 
+                ON cons."Id" = orig."Id" AND cons."Fonte" = :fonte
+            WHERE cons."Id" IS NULL
+            {filtro_faixa}
+        """)
+        return self.session.execute(query_insert, params).rowcount or 0
+
+    def _inserirLotesImportados(self, config, controle, competencias_afetadas):
+        """
+        Para cada lote ativo do histórico acima de Ultima_Importacao_Id, insere na Consolidada as
+        linhas da competência do lote que ainda não estão nela (anti-junção restrita ao mês) e avança a marca.
+        Retorna a quantidade de linhas inseridas.
+        """
+        lotes = self.session.query(CtlSysHistImportacao.Id, CtlSysHistImportacao.Competencia).filter(
+            CtlSysHistImportacao.Tabela_Destino == config["tabela"],
+            CtlSysHistImportacao.Status == 'Ativo',
+            CtlSysHistImportacao.Id > (controle.Ultima_Importacao_Id or 0)
+        ).all()
+        if not lotes:
+            return 0
+
+        inseridos = 0
+        for competencia in sorted({competencia for _, competencia in lotes if competencia}):
+            periodo = self._periodoCompetencia(competencia)
+            if periodo is None:
+                continue
+            ano, mes, data_inicio, data_fim = periodo
+            quantidade = self._inserirNovosRegistros(config, data_inicio=data_inicio, data_fim=data_fim)
+            if quantidade:
+                RegistrarLog(f"Sincronização: {quantidade} linhas do lote {competencia} de {config['tabela']} recuperadas abaixo da marca d'água.", "DATABASE")
+                competencias_afetadas.add((ano, mes))
+                inseridos += quantidade
+
+        controle.Ultima_Importacao_Id = max(id_lote for id_lote, _ in lotes)
+        return inseridos
+
+    @staticmethod
+    def _periodoCompetencia(competencia):
+        """'AAAA-MM' -> (ano, mês, início, fim exclusivo); None se a competência for inválida."""
+        if not competencia or '-' not in competencia:
+            return None
+        ano, mes = map(int, competencia.split('-'))
+        data_inicio = datetime(ano, mes, 1)
+        data_fim = datetime(ano + 1, 1, 1) if mes == 12 else datetime(ano, mes + 1, 1)
+        return ano, mes, data_inicio, data_fim
+
+    def _removerCompetenciasRevertidas(self, config, desde, competencias_afetadas=None):
+        """
+        Remove da Consolidada apenas as linhas das competências revertidas após 'desde'
+        que não existem mais na tabela de origem (evita o NOT IN sobre a tabela inteira).
+        As competências processadas são acumuladas em 'competencias_afetadas' (ano, mês).
+        """
+        revertidas = self.session.query(CtlSysHistImportacao.Competencia).filter(
+            CtlSysHistImportacao.Tabela_Destino == config["tabela"],
+            CtlSysHistImportacao.Status == 'Revertido',
+            CtlSysHistImportacao.Data_Reversao >= desde
+        ).distinct().all()
+
+        removidos = 0
+        for (competencia,) in revertidas:
+            periodo = self._periodoCompetencia(competencia)
+            if periodo is None:
+                continue
+            ano, mes, data_inicio, data_fim = periodo
+            if competencias_afetadas is not None:
+                competencias_afetadas.add((ano, mes))
+
+            query_delete = text(f"""
+                DELETE FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" cons
+                WHERE cons."Fonte" = :fonte
+                  AND cons."Data" >= :data_inicio AND cons."Data" < :data_fim
+                  AND NOT EXISTS (
+                      SELECT 1 FROM "{self.schema}"."{config["tabela"]}" orig WHERE orig."Id" = cons."Id"
+                  )
+            """)
+            resultado = self.session.execute(query_delete, {
+                "fonte": config["fonte"], "data_inicio": data_inicio, "data_fim": data_fim
+            })
+            removidos += resultado.rowcount or 0
+            RegistrarLog(f"Sincronização: competência {competencia} revertida em {config['tabela']} ({resultado.rowcount} linhas removidas).", "DATABASE")
+        return removidos
+
+    def _aplicarRegrasAutomaticas(self, cte_alvos=None, params=None):
+        """
+        Padroniza status de lançamentos originais e aplica a regra automática do Item 10190.
+        Com a CTE de alvos, restringe as atualizações às linhas tocadas.
+        """
+        prefixo = f"WITH {cte_alvos}" if cte_alvos else ""
+        filtro_alvos = 'AND ("Id", "Fonte") IN (SELECT "Id", "Fonte" FROM Alvos)' if cte_alvos else ""
+
+        # 3. CORREÇÃO AUTOMÁTICA: Padronização de status preexistentes
+        query_limpeza = text(f"""
+            {prefixo}
+            UPDATE "{self.schema}"."Tb_CTL_Razao_Consolidado"
+            SET "Status" = 'Aprovado',
+                "Aprovado_Por" = 'Sistema',
+                "Criado_Por" = 'Sistema'
+            WHERE "Tipo_Operacao" = 'ORIGINAL' AND ("Status" IS NULL OR "Status" = 'Pendente')
+            {filtro_alvos}
+        """)
+        self.session.execute(query_limpeza, params or {})
+        self.session.commit() # Libera o lock de atualização estrutural
+
+        # 4. APLICAÇÃO DE REGRA AUTOMÁTICA (Item 10190)
+        query_update_10190 = text(f"""
+            {prefixo}
+            UPDATE "{self.schema}"."Tb_CTL_Razao_Consolidado"
+            SET "Tipo_Operacao" = 'NO-OPER_AUTO',
+                "Status" = 'Aprovado',
+                "Is_Nao_Operacional" = TRUE,
+                "Aprovado_Por" = 'Sistema',
+                "Data_Aprovacao" = NOW()
+            WHERE "Item" = '10190' AND "Tipo_Operacao" != 'NO-OPER_AUTO'
+            {filtro_alvos}
+        """)
+        self.session.execute(query_update_10190, params or {})
+        self.session.commit() # Libera o lock de regra de negócios
+
+    def _registrarMarcas(self, inicio_execucao, snapshot_cadastros):
+        """Grava a data de referência e o retrato dos cadastros após uma execução bem-sucedida."""
+        for config in self.tabelas_origem:
+            self._obterControle(config["fonte"]).Data_Referencia = inicio_execucao
+
+        controle_geral = self._obterControle('GERAL')
+        controle_geral.Data_Referencia = inicio_execucao
+        controle_geral.set_snapshot(snapshot_cadastros)
+
+    # =========================================================================
+    # FATO MENSAL DO DRE (Pré-agregação)
+    # =========================================================================
+    def _obterCompetenciasInseridas(self, config, id_minimo, id_maximo):
+        """
+        Competências (ano, mês) dos lançamentos da origem na faixa acima da marca d'água.
+        Precisa ser lida antes da inserção: depois do recálculo das chaves essas linhas
+        deixam de constar na CTE de alvos ("Mes" preenchido).
+        """
+        query = text(f"""
+            SELECT DISTINCT EXTRACT(YEAR FROM "Data")::int, EXTRACT(MONTH FROM "Data")::int
+            FROM "{self.schema}"."{config["tabela"]}"
+            WHERE "Id" > :id_minimo AND "Id" <= :id_maximo
+        """)
+        params = {"id_minimo": id_minimo, "id_maximo": id_maximo}
+        return {(row[0], row[1]) for row in self.session.execute(query, params).fetchall()}
+
+    def _obterCompetenciasAfetadas(self, cte_alvos, params):
+        """
+        Identifica as competências (ano, mês) cujo fato mensal precisa ser reagregado:
+        as datas atuais das linhas tocadas e as datas antigas de lançamentos que mudaram de mês
+        (registradas no log de ajustes). Linhas sem data entram como (None, None).
+        """
+        filtro_log = ""
+        if "desde" in params:
+            filtro_log = f"""
+                UNION
+                SELECT EXTRACT(YEAR FROM TO_DATE(LEFT(l."Valor_Antigo", 10), 'YYYY-MM-DD'))::int,
+                       EXTRACT(MONTH FROM TO_DATE(LEFT(l."Valor_Antigo", 10), 'YYYY-MM-DD'))::int
+                FROM "{self.schema}"."Tb_CTL_Ajuste_Log" l
+                WHERE l."Data_Acao" >= :desde
+                  AND l."Campo_Alterado" = 'Data'
+                  AND l."Valor_Antigo" ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}'
+            """
+
+        query = text(f"""
+            WITH {cte_alvos}
+            SELECT DISTINCT EXTRACT(YEAR FROM r."Data")::int, EXTRACT(MONTH FROM r."Data")::int
+            FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" r
+            JOIN Alvos a ON a."Id" = r."Id" AND a."Fonte" = r."Fonte"
+            {filtro_log}
+        """)
+        return {(row[0], row[1]) for row in self.session.execute(query, params).fetchall()}
+
+    def atualizarFatoMensal(self, competencias=None):
+        """
+        Reagrega o fato mensal do DRE (Tb_CTL_Razao_Fato_Mensal) a partir da Consolidada.
+        Cada competência é substituída por inteiro (DELETE + INSERT ... GROUP BY), de modo
+        que o resultado é idempotente e independe do que estava gravado antes.
+        
+        Parâmetros:
+            competencias (iterable, opcional): Pares (ano, mês) a reagregar. Quando omitido,
+                                               reconstrói o fato inteiro (reconstrução completa).
+        
+        Retorno:
+            None
+        """
+        tabela_fato = f'"{self.schema}"."Tb_CTL_Razao_Fato_Mensal"'
+        query_insert = f"""
+            INSERT INTO {tabela_fato} (
+                "Ano", "Mes", "origem", "Conta", "Título Conta", "Centro de Custo", "Item", "Filial Cliente",
+                "Is_Nao_Operacional", "Is_Intergrupo_Auto", "Is_Aprovado", "Saldo", "Qtd_Lancamentos"
+            )
+            SELECT
+                EXTRACT(YEAR FROM r."Data")::int,
+                EXTRACT(MONTH FROM r."Data")::int,
+                r."origem", r."Conta", r."Título Conta", r."Centro de Custo", r."Item", r."Filial Cliente",
+                COALESCE(r."Is_Nao_Operacional", FALSE),
+                COALESCE(r."Tipo_Operacao" = 'INTERGRUPO_AUTO', FALSE),
+                COALESCE(r."Status" = 'Aprovado', FALSE),
+                SUM(COALESCE(r."Saldo", 0)),
+                COUNT(*)
+            FROM "{self.schema}"."Tb_CTL_Razao_Consolidado" r
+            WHERE r."Invalido" = false
+            {{filtro}}
+            GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11
+        """
+
+        if competencias is None:
+            self.session.execute(text(f"DELETE FROM {tabela_fato}"))
+            self.session.execute(text(query_insert.format(filtro="")))
+            return
+
+        for ano, mes in sorted(competencias, key=lambda c: (c[0] is None, c)):
+            if ano is None or mes is None:
+                self.session.execute(text(f'DELETE FROM {tabela_fato} WHERE "Ano" IS NULL'))
+                self.session.execute(text(query_insert.format(filtro='AND r."Data" IS NULL')))
+                continue
+
+            data_inicio = datetime(ano, mes, 1)
+            data_fim = datetime(ano + 1, 1, 1) if mes == 12 else datetime(ano, mes + 1, 1)
+            self.session.execute(
+                text(f'DELETE FROM {tabela_fato} WHERE "Ano" = :ano AND "Mes" = :mes'),
+                {"ano": ano, "mes": mes}
+            )
+            self.session.execute(
+                text(query_insert.format(filtro='AND r."Data" >= :data_inicio AND r."Data" < :data_fim')),
+                {"data_inicio": data_inicio, "data_fim": data_fim}
+            )
+
+    # =========================================================================
+    # TOTAIS DO RAZÃO (Resumo mensal por visão)
+    # =========================================================================
+    def atualizarResumoRazao(self, visao, competencias=None):
+        """
+        Reagrega os totais do grid do Razão (Tb_CTL_Razao_Resumo_Mensal) de uma visão:
+        'original' a partir da visão materializada das tabelas puras e 'adjusted' a partir da
+        Consolidada (somente lançamentos válidos). Cada competência é substituída por inteiro,
+        como no fato mensal. Sem a tabela criada (Scripts/Code/CriarResumoRazao.py), não faz nada.
+        
+        Parâmetros:
+            visao (str): 'original' ou 'adjusted'.
+            competencias (iterable, opcional): Pares (ano, mês) a reagregar. Quando omitido,
+                                               reconstrói todos os totais da visão.
+        """
+        tabela_resumo = f'"{self.schema}"."Tb_CTL_Razao_Resumo_Mensal"'
+        if not self._existeRelacao(tabela_resumo):
+            return
+
+        if visao == 'original':
+            origem, filtro_base = RazaoContabil.TABELA_ORIGINAL, "WHERE TRUE"
+        else:
+            origem, filtro_base = f'"{self.schema}"."Tb_CTL_Razao_Consolidado"', 'WHERE r."Invalido" = false'
+
+        query_insert = f"""
+            INSERT INTO {tabela_resumo} ("Visao", "Ano", "Mes", "Qtd_Lancamentos", "Debito", "Credito", "Saldo")
+            SELECT
+                :visao,
+                EXTRACT(YEAR FROM r."Data")::int,
+                EXTRACT(MONTH FROM r."Data")::int,
+                COUNT(*),
+                SUM(COALESCE(r."Debito", 0)),
+                SUM(COALESCE(r."Credito", 0)),
+                SUM(COALESCE(r."Saldo", 0))
+            FROM {origem} r
+            {filtro_base}
+            {{filtro}}
+            GROUP BY 2, 3
+        """
+
+        if competencias is None:
+            self.session.execute(text(f'DELETE FROM {tabela_resumo} WHERE "Visao" = :visao'), {"visao": visao})
+            self.session.execute(text(query_insert.format(filtro="")), {"visao": visao})
+            return
+
+        for ano, mes in sorted(competencias, key=lambda c: (c[0] is None, c)):
+            if ano is None or mes is None:
+                self.session.execute(
+                    text(f'DELETE FROM {tabela_resumo} WHERE "Visao" = :visao AND "Ano" IS NULL'), {"visao": visao}
+                )
+                self.session.execute(text(query_insert.format(filtro='AND r."Data" IS NULL')), {"visao": visao})
+                continue
+
+            data_inicio = datetime(ano, mes, 1)
+            data_fim = datetime(ano + 1, 1, 1) if mes == 12 else datetime(ano, mes + 1, 1)
+            self.session.execute(
+                text(f'DELETE FROM {tabela_resumo} WHERE "Visao" = :visao AND "Ano" = :ano AND "Mes" = :mes'),
+                {"visao": visao, "ano": ano, "mes": mes}
+            )
+            self.session.execute(
+                text(query_insert.format(filtro='AND r."Data" >= :data_inicio AND r."Data" < :data_fim')),
+                {"visao": visao, "data_inicio": data_inicio, "data_fim": data_fim}
+            )
@@ -1,6 +1,8 @@
 from sqlalchemy.orm import sessionmaker
-import pandas as pd
-import io
+import itertools
+import os
+import uuid
+import xlsxwriter
 
 # --- Imports de Banco de Dados ---
 from Db.Connections import GetPostgresEngine
@@ -19,6 +21,15 @@ class RelatoriosService:
     Gerencia o ciclo de vida da sessão do banco e executa as lógicas de negócio.
     """
     
+    PASTA_TEMPORARIA = os.path.abspath(
+        os.path.join(os.path.dirname(__file__), '../../..', 'Data', 'Temp', 'RazaoExportacao')
+    )
+    TAMANHO_LOTE_EXPORTACAO = 5000
+    TAMANHO_AMOSTRA_LARGURA = 1000
+    TAMANHO_BLOCO_DOWNLOAD = 1024 * 1024
+    # Limite de linhas de uma planilha .xlsx (inclui o cabeçalho)
+    MAX_LINHAS_PLANILHA = 1048576
+
     def __init__(self):
         pass
 
@@ -31,21 +42,30 @@ class RelatoriosService:
     # MÉTODOS DO RAZÃO CONTÁBIL
     # ============================================================
 
-    def ObterDadosRazao(self, pagina, por_pagina, termo_busca, tipo_visualizacao):
+    def ObterDadosRazao(self, pagina, por_pagina, termo_busca, tipo_visualizacao, cursor=None):
         """Wrapper para ObterDados do RazaoContabil."""
         session = self._ObterSessao()
         try:
             relatorio = RazaoContabil(session)
-            return relatorio.ObterDados(pagina, por_pagina, termo_busca, tipo_visualizacao)
+            return relatorio.ObterDados(pagina, por_pagina, termo_busca, tipo_visualizacao, cursor)
         finally:
             session.close()
 
-    def ObterResumoRazao(self, tipo_visualizacao):
+    def ObterResumoRazao(self, tipo_visualizacao, competencia=None):
         """Wrapper para ObterResumo do RazaoContabil."""
         session = self._ObterSessao()
         try:
             relatorio = RazaoContabil(session)
-            return relatorio.ObterResumo(tipo_visualizacao)
+            return relatorio.ObterResumo(tipo_visualizacao, competencia)
+        finally:
+            session.close()
+
+    def ObterResumoMensalRazao(self, tipo_visualizacao):
+        """Wrapper para ObterResumoMensal do RazaoContabil."""
+        session = self._ObterSessao()
+        try:
+            relatorio = RazaoContabil(session)
+            return relatorio.ObterResumoMensal(tipo_visualizacao)
         finally:
             session.close()
 
@@ -60,39 +80,99 @@ class RelatoriosService:
 
     def GerarExcelRazao(self, termo_busca, tipo_visualizacao):
         """
-        Serviço que gera o binário do Excel para download.
-        Reutiliza a lógica de ExportarCompleto do relatório.
+        Gera o Excel completo do Razão num arquivo temporário e retorna o seu caminho
+        (ou None se não houver dados).
+
+        As linhas vêm de um cursor de servidor (RazaoContabil.ExportarStream) direto para o
+        xlsxwriter em modo constant_memory, que descarrega cada linha em disco; as larguras das
+        colunas são estimadas por uma amostra inicial. Acima do limite de linhas de uma planilha,
+        o restante continua em novas abas com o cabeçalho repetido. O .xlsx (zip) só é fechado
+        ao final, então o arquivo é montado em Data/Temp e a sessão é encerrada aqui mesmo.
+        Quem chama envia o arquivo com LerArquivoExcelRazao e o remove com RemoverArquivoExcelRazao
+        (Response.call_on_close, que roda mesmo se o cliente desconectar).
         """
         session = self._ObterSessao()
         try:
             relatorio = RazaoContabil(session)
-            data_rows = relatorio.ExportarCompleto(termo_busca, tipo_visualizacao)
-            
-            if not data_rows:
+            linhas = relatorio.ExportarStream(termo_busca, tipo_visualizacao, self.TAMANHO_LOTE_EXPORTACAO)
+            amostra = list(itertools.islice(linhas, self.TAMANHO_AMOSTRA_LARGURA))
+            if not amostra:
                 return None
-
-            # Conversão para DataFrame (Lógica trazida da Rota para o Service)
-            df = pd.DataFrame(data_rows)
-            if 'Data' in df.columns:
-                df['Data'] = pd.to_datetime(df['Data']).dt.strftime('%d/%m/%Y')
-
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Razão Full')
-                worksheet = writer.sheets['Razão Full']
-                for idx, col in enumerate(df.columns):
-                    # Ajuste automático de largura de coluna
-                    max_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                    worksheet.set_column(idx, idx, min(max_len, 60))
-            
-            output.seek(0)
-            return output
+            return self._GravarExcelRazao(RazaoContabil.COLUNAS_EXPORTACAO, amostra, linhas)
         except Exception as e:
             RegistrarLog("Erro no serviço de geração de Excel", "ERROR", e)
             raise e
         finally:
             session.close()
 
+    def _GravarExcelRazao(self, colunas, amostra, linhas):
+        os.makedirs(self.PASTA_TEMPORARIA, exist_ok=True)
+        caminho = os.path.join(self.PASTA_TEMPORARIA, f"razao_{uuid.uuid4().hex}.xlsx")
+        indice_data = colunas.index('Data')
+        # Larguras pela amostra (no constant_memory não dá para medir o arquivo inteiro)
+        larguras = [
+            min(max([len(col)] + [len(self._FormatarCelulaRazao(linha[idx], idx == indice_data)) for linha in amostra]) + 2, 60)
+            for idx, col in enumerate(colunas)
+        ]
+        try:
+            workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'tmpdir': self.PASTA_TEMPORARIA})
+            try:
+                numero_aba = 1
+                worksheet = self._AdicionarAbaRazao(workbook, colunas, larguras, numero_aba)
+                numero_linha = 1
+                total_linhas = 0
+                for linha in itertools.chain(amostra, linhas):
+                    if numero_linha >= self.MAX_LINHAS_PLANILHA:
+                        numero_aba += 1
+                        worksheet = self._AdicionarAbaRazao(workbook, colunas, larguras, numero_aba)
+                        numero_linha = 1
+                    if linha[indice_data] is not None:
+                        linha[indice_data] = linha[indice_data].strftime('%d/%m/%Y')
+                    if worksheet.write_row(numero_linha, 0, linha) == -1:
+                        raise ValueError(f"Falha ao gravar a linha {total_linhas + 1} do Razão na planilha (fora dos limites).")
+                    numero_linha += 1
+                    total_linhas += 1
+            finally:
+                workbook.close()
+        except Exception:
+            self.RemoverArquivoExcelRazao(caminho)
+            raise
+
+        RegistrarLog(f"Excel do Razão gerado em streaming: {total_linhas} linhas em {numero_aba} aba(s)", "WEB_EXPORT")
+        return caminho
+
+    @staticmethod
+    def _AdicionarAbaRazao(workbook, colunas, larguras, numero_aba):
+        nome = 'Razão Full' if numero_aba == 1 else f'Razão Full ({numero_aba})'
+        worksheet = workbook.add_worksheet(nome)
+        for idx, largura in enumerate(larguras):
+            worksheet.set_column(idx, idx, largura)
+        worksheet.write_row(0, 0, colunas)
+        return worksheet
+
+    def LerArquivoExcelRazao(self, caminho):
+        """Gerador com o conteúdo do arquivo gerado, em blocos de TAMANHO_BLOCO_DOWNLOAD bytes."""
+        with open(caminho, 'rb') as arquivo:
+            while True:
+                bloco = arquivo.read(self.TAMANHO_BLOCO_DOWNLOAD)
+                if not bloco:
+                    break
+                yield bloco
+
+    @staticmethod
+    def RemoverArquivoExcelRazao(caminho):
+        """Remove o arquivo temporário da exportação (ignora se já não existir)."""
+        if caminho and os.path.exists(caminho):
+            os.remove(caminho)
+
+    @staticmethod
+    def _FormatarCelulaRazao(valor, is_data=False):
+        if valor is None:
+            return ''
+        if is_data:
+            return valor.strftime('%d/%m/%Y')
+        return str(valor)
+
     # ============================================================
     # MÉTODOS DO DRE GERENCIAL
     # ============================================================
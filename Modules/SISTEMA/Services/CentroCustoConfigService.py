@@ -1,5 +1,6 @@
 import json
 import os
+import time
 from datetime import datetime
 from decimal import Decimal
 
@@ -17,6 +18,12 @@ class CentroCustoConfigService:
     ARQUIVO_CONFIGURACAO_LEGADO = os.path.join(PASTA_CONFIGURACAO, 'gestores_centro_custo.json')
 
     _cache = {'mtime': None, 'data': None}
+    # (versão, códigos OFF): a versão sobe quando a lista de centros OFF muda; consumidores quentes (filtro ORM)
+    # remontam seus artefatos só quando ela muda. O stat do arquivo é feito no máximo a cada
+    # INTERVALO_VERIFICACAO_SEGUNDOS nesse caminho (gravações pelo próprio processo são imediatas).
+    _codigos_off_versionados = (0, ())
+    _ultima_verificacao = 0.0
+    INTERVALO_VERIFICACAO_SEGUNDOS = 2.0
 
     def __init__(self):
         self._garantir_arquivo_configuracao()
@@ -26,6 +33,15 @@ class CentroCustoConfigService:
         dados = cls._carregar_configuracao_cache()
         return [centro['codigo'] for centro in dados.get('centros_custo_off', [])]
 
+    @classmethod
+    def obterCodigosCentrosOffVersionados(cls):
+        """Retorna (versão, tupla de códigos OFF) sem cópia profunda da configuração."""
+        agora = time.monotonic()
+        if cls._cache['data'] is None or agora - cls._ultima_verificacao >= cls.INTERVALO_VERIFICACAO_SEGUNDOS:
+            cls._ultima_verificacao = agora
+            cls._carregar_configuracao_cache(copiar=False)
+        return cls._codigos_off_versionados
+
     def listarUsuariosDisponiveis(self):
         sessao = GetSqlServerSession(ignore_centro_custo_off=True)
         try:
@@ -233,7 +249,7 @@ class CentroCustoConfigService:
         return None
 
     @classmethod
-    def _carregar_configuracao_cache(cls, force_refresh=False):
+    def _carregar_configuracao_cache(cls, force_refresh=False, copiar=True):
         cls._garantir_arquivo_configuracao()
         try:
             mtime = os.path.getmtime(cls.ARQUIVO_CONFIGURACAO)
@@ -242,12 +258,21 @@ class CentroCustoConfigService:
             mtime = os.path.getmtime(cls.ARQUIVO_CONFIGURACAO)
 
         if not force_refresh and cls._cache['mtime'] == mtime and cls._cache['data'] is not None:
-            return json.loads(json.dumps(cls._cache['data']))
+            return json.loads(json.dumps(cls._cache['data'])) if copiar else cls._cache['data']
 
         dados = cls._ler_arquivo_json(cls.ARQUIVO_CONFIGURACAO)
         configuracao = cls._normalizar_configuracao(dados)
+        cls._definir_cache(mtime, configuracao)
+        return json.loads(json.dumps(configuracao)) if copiar else configuracao
+
+    @classmethod
+    def _definir_cache(cls, mtime, configuracao):
+        codigos_off = tuple(centro['codigo'] for centro in configuracao.get('centros_custo_off', []))
         cls._cache = {'mtime': mtime, 'data': configuracao}
-        return json.loads(json.dumps(configuracao))
+        versao, codigos_atuais = cls._codigos_off_versionados
+        if codigos_off != codigos_atuais:
+            # Troca atômica do par (versão, códigos)
+            cls._codigos_off_versionados = (versao + 1, codigos_off)
 
     @classmethod
     def _garantir_arquivo_configuracao(cls):
@@ -266,10 +291,7 @@ class CentroCustoConfigService:
         with open(cls.ARQUIVO_CONFIGURACAO, 'w', encoding='utf-8') as arquivo_configuracao:
             json.dump(dados, arquivo_configuracao, ensure_ascii=False, indent=2)
 
-        cls._cache = {
-            'mtime': os.path.getmtime(cls.ARQUIVO_CONFIGURACAO),
-            'data': cls._normalizar_configuracao(dados),
-        }
+        cls._definir_cache(os.path.getmtime(cls.ARQUIVO_CONFIGURACAO), cls._normalizar_configuracao(dados))
 
     @classmethod
     def _ler_arquivo_json(cls, caminho):
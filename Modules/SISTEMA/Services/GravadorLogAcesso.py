@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from Db.Connections import GetSqlServerSession
+from Models.SqlServer.Permissoes import Tb_LogAcesso
+from Settings import settings
+from Utils.Logger import RegistrarLog
+
+
+class GravadorLogAcesso:
+    """
+    Gravação assíncrona e em lote do Tb_LogAcesso (ERP).
+    A requisição apenas enfileira o registro (fila limitada, sem I/O); uma thread por processo
+    drena a fila e insere em lote quando atinge TAMANHO_LOTE ou a cada INTERVALO_SEGUNDOS.
+    Se o ERP estiver indisponível, o lote vai para um arquivo local (JSON Lines) que é
+    reenviado na próxima gravação bem-sucedida. Com a fila cheia, o registro é descartado
+    e contabilizado (a requisição nunca espera pelo log).
+    """
+
+    TAMANHO_FILA = int(os.getenv("LOG_ACESSO_TAMANHO_FILA", "10000"))
+    TAMANHO_LOTE = int(os.getenv("LOG_ACESSO_TAMANHO_LOTE", "200"))
+    INTERVALO_SEGUNDOS = float(os.getenv("LOG_ACESSO_INTERVALO", "2"))
+    ESPERA_REENVIO_SEGUNDOS = 30
+    ARQUIVO_PENDENTES = os.path.join(settings.FULL_LOG_PATH, "LogAcesso_Pendentes.jsonl")
+
+    _fila = queue.Queue(maxsize=TAMANHO_FILA)
+    _thread = None
+    _evento_parada = threading.Event()
+    _lock_estado = threading.Lock()
+    _lock_arquivo = threading.Lock()
+    _proximo_reenvio = 0.0
+    _status = {
+        'enfileirados': 0,
+        'gravados': 0,
+        'descartados': 0,
+        'lotes': 0,
+        'falhas_erp': 0,
+        'derramados_arquivo': 0,
+        'reenviados_arquivo': 0,
+        'ultimo_lote': None,
+        'ultimo_erro': None,
+    }
+
+    @classmethod
+    def Iniciar(cls):
+        """Sobe a thread de gravação (idempotente) e registra o flush no encerramento do processo."""
+        with cls._lock_estado:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._evento_parada.clear()
+            cls._thread = threading.Thread(target=cls._Loop, name="GravadorLogAcesso", daemon=True)
+            cls._thread.start()
+            atexit.register(cls.Parar)
+
+    @classmethod
+    def Parar(cls, timeout=10):
+        """Sinaliza a parada e aguarda o último flush da fila."""
+        cls._evento_parada.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout)
+
+    @classmethod
+    def Enfileirar(cls, registro):
+        """Enfileira um registro (dict com as colunas do Tb_LogAcesso) sem bloquear a requisição."""
+        if cls._thread is None or not cls._thread.is_alive():
+            cls.Iniciar()
+        registro.setdefault('Data_Hora', datetime.now())
+        try:
+            cls._fila.put_nowait(registro)
+            with cls._lock_estado:
+                cls._status['enfileirados'] += 1
+        except queue.Full:
+            with cls._lock_estado:
+                cls._status['descartados'] += 1
+
+    @classmethod
+    def ObterStatus(cls):
+        with cls._lock_estado:
+            status = dict(cls._status)
+        status['profundidade_fila'] = cls._fila.qsize()
+        status['capacidade_fila'] = cls.TAMANHO_FILA
+        status['arquivo_pendente'] = os.path.exists(cls.ARQUIVO_PENDENTES)
+        if status['ultimo_lote'] is not None:
+            status['ultimo_lote'] = status['ultimo_lote'].strftime('%d/%m/%Y %H:%M:%S')
+        return status
+
+    @classmethod
+    def _Loop(cls):
+        while True:
+            lote = cls._ColetarLote()
+            if lote:
+                cls._GravarLote(lote)
+            elif time.time() >= cls._proximo_reenvio and os.path.exists(cls.ARQUIVO_PENDENTES):
+                cls._ReenviarPendentes()
+
+            if cls._evento_parada.is_set() and cls._fila.empty():
+                break
+
+    @classmethod
+    def _ColetarLote(cls):
+        """Aguarda até INTERVALO_SEGUNDOS pelo primeiro item e completa o lote até TAMANHO_LOTE."""
+        lote = []
+        limite = time.time() + cls.INTERVALO_SEGUNDOS
+        while len(lote) < cls.TAMANHO_LOTE:
+            restante = limite - time.time()
+            if restante <= 0 or (cls._evento_parada.is_set() and cls._fila.empty()):
+                break
+            try:
+                lote.append(cls._fila.get(timeout=min(restante, 0.5)))
+            except queue.Empty:
+                continue
+        return lote
+
+    @classmethod
+    def _Inserir(cls, registros):
+        Sessao = GetSqlServerSession()
+        try:
+            Sessao.execute(insert(Tb_LogAcesso), registros)
+            Sessao.commit()
+        except Exception:
+            Sessao.rollback()
+            raise
+        finally:
+            Sessao.close()
+
+    @classmethod
+    def _GravarLote(cls, lote):
+        try:
+            cls._Inserir(lote)
+        except Exception as e:
+            with cls._lock_estado:
+                cls._status['falhas_erp'] += 1
+                cls._status['ultimo_erro'] = str(e)
+            RegistrarLog(f"ERP indisponível para o log de acesso; {len(lote)} registro(s) salvos em arquivo local", "WARNING")
+            cls._DerramarEmArquivo(lote)
+            return
+
+        with cls._lock_estado:
+            cls._status['gravados'] += len(lote)
+            cls._status['lotes'] += 1
+            cls._status['ultimo_lote'] = datetime.now()
+            cls._status['ultimo_erro'] = None
+
+        if os.path.exists(cls.ARQUIVO_PENDENTES):
+            cls._ReenviarPendentes()
+
+    @classmethod
+    def _DerramarEmArquivo(cls, lote):
+        try:
+            with cls._lock_arquivo:
+                os.makedirs(os.path.dirname(cls.ARQUIVO_PENDENTES), exist_ok=True)
+                with open(cls.ARQUIVO_PENDENTES, 'a', encoding='utf-8') as arquivo:
+                    for registro in lote:
+                        linha = dict(registro, Data_Hora=registro['Data_Hora'].isoformat())
+                        arquivo.write(json.dumps(linha, ensure_ascii=False) + '\n')
+            with cls._lock_estado:
+                cls._status['derramados_arquivo'] += len(lote)
+        except Exception as e:
+            with cls._lock_estado:
+                cls._status['descartados'] += len(lote)
+            RegistrarLog("Falha ao salvar log de acesso pendente em arquivo local", "ERROR", e)
+
+    @classmethod
+    def _ReenviarPendentes(cls):
+        """Reenvia o arquivo de pendentes em lotes; o arquivo só é removido após gravar tudo."""
+        with cls._lock_arquivo:
+            try:
+                with open(cls.ARQUIVO_PENDENTES, 'r', encoding='utf-8') as arquivo:
+                    registros = [json.loads(linha) for linha in arquivo if linha.strip()]
+            except FileNotFoundError:
+                return
+            for registro in registros:
+                registro['Data_Hora'] = datetime.fromisoformat(registro['Data_Hora'])
+
+            try:
+                for i in range(0, len(registros), cls.TAMANHO_LOTE):
+                    cls._Inserir(registros[i:i + cls.TAMANHO_LOTE])
+            except Exception as e:
+                # Regrava apenas o que não foi enviado, preservando a ordem
+                restantes = registros[i:]
+                with open(cls.ARQUIVO_PENDENTES, 'w', encoding='utf-8') as arquivo:
+                    for registro in restantes:
+                        linha = dict(registro, Data_Hora=registro['Data_Hora'].isoformat())
+                        arquivo.write(json.dumps(linha, ensure_ascii=False) + '\n')
+                with cls._lock_estado:
+                    cls._status['reenviados_arquivo'] += i
+                    cls._status['gravados'] += i
+                    cls._status['ultimo_erro'] = str(e)
+                # Sem lotes novos, o ERP só é testado de novo após o intervalo de espera
+                cls._proximo_reenvio = time.time() + cls.ESPERA_REENVIO_SEGUNDOS
+                return
+
+            os.remove(cls.ARQUIVO_PENDENTES)
+            with cls._lock_estado:
+                cls._status['reenviados_arquivo'] += len(registros)
+                cls._status['gravados'] += len(registros)
+        RegistrarLog(f"Log de acesso: {len(registros)} registro(s) pendentes reenviados ao ERP", "SYSTEM")
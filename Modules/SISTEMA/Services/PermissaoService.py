@@ -1,13 +1,16 @@
 import os
+import threading
+import time
 import unicodedata
-from functools import wraps
+from functools import lru_cache, wraps
 from flask import request, jsonify
 import json
 from flask_login import current_user
 from Db.Connections import GetSqlServerSession 
 
 from luftcore.extensions.flask_extension import api_error, render_no_permission, render_403
-from Models.SqlServer.Permissoes import Tb_Permissao, Tb_PermissaoGrupo, Tb_PermissaoUsuario, Tb_LogAcesso
+from Models.SqlServer.Permissoes import Tb_Permissao, Tb_PermissaoGrupo, Tb_PermissaoUsuario
+from Modules.SISTEMA.Services.GravadorLogAcesso import GravadorLogAcesso
 from Models.SqlServer.Usuario import Usuario as ModeloUsuario
 from Utils.Logger import RegistrarLog
 
@@ -16,9 +19,18 @@ SISTEMA_ID = int(os.getenv("SISTEMA_ID", 2))
 # --- NOVA VARIÁVEL GLOBAL DE DEBUG ---
 DEBUG_PERMISSIONS = os.getenv("DEBUG_PERMISSIONS", "False").lower() == "true"
 
+# Validade (segundos) do conjunto de permissões efetivas em cache por usuário
+TTL_CACHE_PERMISSOES = int(os.getenv("PERMISSAO_CACHE_TTL", "60"))
+
 class PermissaoService:
+
+    # Cache de permissões efetivas: id do usuário -> {'permitidas': frozenset, 'expira_em': timestamp}
+    _cache_permissoes = {}
+    _geracao_cache = 0
+    _lock_cache = threading.Lock()
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _Normalizar(texto):
         if not texto: return ""
         return "".join(c for c in unicodedata.normalize('NFD', texto.upper().strip())
@@ -44,32 +56,59 @@ class PermissaoService:
         if getattr(Usuario, 'Grupo', '') == 'ADM_SISTEMA':
             return {chave: True for chave in chaves}
 
+        permitidas = PermissaoService.ObterPermissoesEfetivas(Usuario.get_id())
+        if permitidas is None:
+            return {chave: False for chave in chaves}
+
+        return {chave: PermissaoService._Normalizar(chave) in permitidas for chave in chaves}
+
+    @staticmethod
+    def ObterPermissoesEfetivas(IdUsuario):
+        """
+        Retorna o conjunto (chaves normalizadas) de permissões efetivas do usuário no sistema:
+        herança do grupo + overrides do usuário. O conjunto fica em cache por TTL_CACHE_PERMISSOES
+        segundos; edições em ConfiguracaoSeguranca invalidam o cache explicitamente.
+        Retorna None quando o usuário não existe ou a consulta falha (nada é cacheado nesse caso).
+        """
+        chave_cache = str(IdUsuario)
+        agora = time.time()
+        with PermissaoService._lock_cache:
+            entrada = PermissaoService._cache_permissoes.get(chave_cache)
+            if entrada and entrada['expira_em'] > agora:
+                return entrada['permitidas']
+            geracao = PermissaoService._geracao_cache
+
+        permitidas = PermissaoService._CarregarPermissoesEfetivas(IdUsuario)
+        if permitidas is None:
+            return None
+
+        with PermissaoService._lock_cache:
+            # Uma invalidação durante a carga torna o resultado suspeito: devolve, mas não guarda
+            if geracao == PermissaoService._geracao_cache:
+                PermissaoService._cache_permissoes[chave_cache] = {
+                    'permitidas': permitidas,
+                    'expira_em': agora + TTL_CACHE_PERMISSOES
+                }
+        return permitidas
+
+    @staticmethod
+    def _CarregarPermissoesEfetivas(IdUsuario):
         Sessao = GetSqlServerSession()
         try:
-            id_usuario_logado = Usuario.get_id()
-            user_db = Sessao.query(ModeloUsuario).filter_by(Codigo_Usuario=id_usuario_logado).first()
+            user_db = Sessao.query(ModeloUsuario).filter_by(Codigo_Usuario=IdUsuario).first()
             
             if not user_db:
-                return {chave: False for chave in chaves}
+                return None
 
             id_grupo = user_db.codigo_usuariogrupo
-            chaves_normalizadas = {
-                PermissaoService._Normalizar(chave): chave
-                for chave in chaves
+            chaves_por_id = {
+                permissao.Id_Permissao: PermissaoService._Normalizar(permissao.Chave_Permissao)
+                for permissao in Sessao.query(Tb_Permissao.Id_Permissao, Tb_Permissao.Chave_Permissao).filter_by(Id_Sistema=SISTEMA_ID).all()
             }
-            permissoes_por_id = {}
-
-            for permissao in Sessao.query(Tb_Permissao).filter_by(Id_Sistema=SISTEMA_ID).all():
-                chave_normalizada = PermissaoService._Normalizar(permissao.Chave_Permissao)
-                chave_original = chaves_normalizadas.get(chave_normalizada)
-                if chave_original:
-                    permissoes_por_id[permissao.Id_Permissao] = chave_original
-
-            resultado = {chave: False for chave in chaves}
-            if not permissoes_por_id:
-                return resultado
+            if not chaves_por_id:
+                return frozenset()
 
-            ids_permissoes = list(permissoes_por_id.keys())
+            ids_permissoes = list(chaves_por_id.keys())
             permissoes_grupo = set()
             if id_grupo:
                 permissoes_grupo = {
@@ -83,53 +122,57 @@ class PermissaoService:
             overrides = {
                 registro.Id_Permissao: registro.Conceder
                 for registro in Sessao.query(Tb_PermissaoUsuario.Id_Permissao, Tb_PermissaoUsuario.Conceder).filter(
-                    Tb_PermissaoUsuario.Codigo_Usuario == id_usuario_logado,
+                    Tb_PermissaoUsuario.Codigo_Usuario == IdUsuario,
                     Tb_PermissaoUsuario.Id_Permissao.in_(ids_permissoes)
                 ).all()
             }
 
-            for id_permissao, chave in permissoes_por_id.items():
-                tem_acesso = id_permissao in permissoes_grupo
-                resultado[chave] = overrides[id_permissao] if id_permissao in overrides else tem_acesso
-
-            return resultado
+            return frozenset(
+                chave for id_permissao, chave in chaves_por_id.items()
+                if (overrides[id_permissao] if id_permissao in overrides else id_permissao in permissoes_grupo)
+            )
 
         except Exception as e:
             print(f"[ERRO] {str(e)}")
-            return {chave: False for chave in chaves}
+            return None
         finally:
             Sessao.close()
 
+    @staticmethod
+    def InvalidarCachePermissoes(IdUsuario=None):
+        """Remove do cache um usuário (override individual) ou todos (grupo/nova permissão)."""
+        with PermissaoService._lock_cache:
+            PermissaoService._geracao_cache += 1
+            if IdUsuario is None:
+                PermissaoService._cache_permissoes.clear()
+            else:
+                PermissaoService._cache_permissoes.pop(str(IdUsuario), None)
+
     @staticmethod
     def VerificarPermissao(Usuario, ChavePermissao):
         return PermissaoService.VerificarPermissoes(Usuario, [ChavePermissao]).get(ChavePermissao, False)
 
     @staticmethod
     def RegistrarLogAcesso(Usuario, Rota, Metodo, Ip, Chave, Permitido, Parametros=None, Retorno=None):
-        Sessao = GetSqlServerSession()
+        """Enfileira o registro no gravador assíncrono; a gravação no ERP ocorre em lote, fora da requisição."""
         try:
             nome = getattr(Usuario, 'Nome_Usuario', 'Anonimo')
             if nome == 'Anonimo': nome = getattr(Usuario, 'nome', 'Anonimo')
             
-            NovoLog = Tb_LogAcesso(
-                Id_Sistema=SISTEMA_ID,
-                Id_Usuario=Usuario.get_id() if Usuario.is_authenticated else None,
-                Nome_Usuario=nome,
-                Rota_Acessada=Rota,
-                Metodo_Http=Metodo, 
-                Ip_Origem=Ip,
-                Permissao_Exigida=Chave.upper(),
-                Acesso_Permitido=Permitido,
-                Parametros_Requisicao=Parametros, # Passando os parâmetros
-                Resposta_Acao=Retorno             # Passando o retorno
-            )
-            Sessao.add(NovoLog)
-            Sessao.commit()
+            GravadorLogAcesso.Enfileirar({
+                'Id_Sistema': SISTEMA_ID,
+                'Id_Usuario': Usuario.get_id() if Usuario.is_authenticated else None,
+                'Nome_Usuario': nome,
+                'Rota_Acessada': Rota,
+                'Metodo_Http': Metodo,
+                'Ip_Origem': Ip,
+                'Permissao_Exigida': Chave.upper(),
+                'Acesso_Permitido': Permitido,
+                'Parametros_Requisicao': Parametros, # Passando os parâmetros
+                'Resposta_Acao': Retorno             # Passando o retorno
+            })
         except Exception as e: 
             print(f"[ERRO NO LOG] {str(e)}")
-        finally: 
-            Sessao.close()
-
 
 def RequerPermissao(Chave):
     def Decorator(F):
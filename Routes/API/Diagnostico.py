@@ -0,0 +1,51 @@
+from flask import jsonify
+from flask_login import login_required
+
+from Db.Connections import ObterEstatisticasPool
+from Modules.BUDGET.Services.RelatoriosService import RelatoriosService as BudgetRelatoriosService
+from Modules.DRE.Reports.CacheEstruturaDre import CacheEstruturaDre
+from Modules.SISTEMA.Services.GravadorLogAcesso import GravadorLogAcesso
+from Modules.SISTEMA.Services.PermissaoService import RequerPermissao
+
+from . import api_bp
+
+
+@api_bp.route('/diagnostico/pool-conexoes', methods=['GET'])
+@login_required
+@RequerPermissao('CONFIGURACOES.VISUALIZAR')
+def EstatisticasPoolConexoes():
+    """
+    Retorna o uso atual dos pools de conexão (Postgres e ERP).
+    Serve para dimensionar POOL_SIZE/MAX_OVERFLOW frente às threads do Waitress.
+    """
+    return jsonify({'status': 'success', 'pools': ObterEstatisticasPool()}), 200
+
+
+@api_bp.route('/diagnostico/cache-estrutura-dre', methods=['GET'])
+@login_required
+@RequerPermissao('CONFIGURACOES.VISUALIZAR')
+def StatusCacheEstruturaDre():
+    """
+    Retorna versão, acertos e reconstruções do cache da estrutura do DRE.
+    """
+    return jsonify({'status': 'success', 'cache': CacheEstruturaDre.ObterStatus()}), 200
+
+
+@api_bp.route('/diagnostico/cache-relatorios-budget', methods=['GET'])
+@login_required
+@RequerPermissao('CONFIGURACOES.VISUALIZAR')
+def StatusCacheRelatoriosBudget():
+    """
+    Retorna acertos, faltas, despejos e ocupação do cache de resultados dos relatórios de Budget.
+    """
+    return jsonify({'status': 'success', 'cache': BudgetRelatoriosService.ObterStatusCache()}), 200
+
+
+@api_bp.route('/diagnostico/log-acesso', methods=['GET'])
+@login_required
+@RequerPermissao('CONFIGURACOES.VISUALIZAR')
+def StatusGravadorLogAcesso():
+    """
+    Retorna profundidade da fila, descartes e pendências em arquivo do gravador do log de acesso.
+    """
+    return jsonify({'status': 'success', 'gravador': GravadorLogAcesso.ObterStatus()}), 200
@@ -1,19 +1,13 @@
 from flask import jsonify
-from sqlalchemy.orm import sessionmaker
 from flask_login import login_required
 
-from Db.Connections import GetPostgresEngine
-from Modules.RAZAO.Services.SincronizacaoConsolidadoRazaoService import SincronizacaoConsolidadoRazaoService
+from Modules.RAZAO.Services.AgendadorSincronizacaoConsolidado import AgendadorSincronizacaoConsolidado
+from Modules.SISTEMA.Services.PermissaoService import RequerPermissao
 from luftcore.extensions.flask_extension import require_ajax
 
 from . import api_bp
 
 
-def GetSession():
-    engine = GetPostgresEngine()
-    return sessionmaker(bind=engine)()
-
-
 @api_bp.route('/sincronizar-consolidado', methods=['POST'])
 @login_required
 # @RequerPermissao('API.CONSOLIDAR.SINCRONIZAR')
@@ -22,15 +16,31 @@ def GetSession():
 @require_ajax
 def SincronizarConsolidado():
     """
-    Rota invisível para o utilizador, chamada em background a cada 10 segundos
-    para manter os dados perfeitamente sincronizados.
+    Rota invisível para o utilizador, chamada em background pelo layout.
+    A sincronização roda no agendador do servidor (single-flight via advisory lock);
+    aqui apenas devolvemos o status e o horário da última execução.
+    """
+    status = AgendadorSincronizacaoConsolidado.ObterStatus()
+    return jsonify({
+        'status': 'error' if status['status'] == 'error' else 'success',
+        'msg': status['erro'] or f"Última sincronização: {status['ultima_conclusao'] or 'pendente'}",
+        'sincronizacao': status
+    }), 200
+
+
+@api_bp.route('/sincronizar-consolidado/completo', methods=['POST'])
+@login_required
+@RequerPermissao('API.CONSOLIDAR.SINCRONIZAR')
+@require_ajax
+def ReconstruirConsolidado():
+    """
+    Ação administrativa: reconstrução completa da Consolidada (varredura de todas as origens)
+    e reinício das marcas d'água da sincronização incremental.
     """
-    session_db = GetSession()
     try:
-        servico = SincronizacaoConsolidadoRazaoService(session_db)
-        servico.sincronizarDados()
-        return jsonify({'status': 'success', 'msg': 'Sincronização concluída com sucesso!'}), 200
+        executou = AgendadorSincronizacaoConsolidado.ReconstruirCompleto()
+        if not executou:
+            return jsonify({'status': 'error', 'msg': 'Já existe uma sincronização em andamento. Tente novamente em instantes.'}), 409
+        return jsonify({'status': 'success', 'msg': 'Reconstrução completa concluída com sucesso!'}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'msg': str(e)}), 500
-    finally:
-        session_db.close()
\ No newline at end of file
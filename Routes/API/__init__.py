@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api_bp = Blueprint('Api', __name__)
 
-from . import SincronizacaoConsolidado
\ No newline at end of file
+from . import SincronizacaoConsolidado, Diagnostico
\ No newline at end of file
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 
 # Importa o Serviço de Autenticação
 from Modules.CORE.Services.AutenticacaoService import AutenticacaoService
+from Modules.SISTEMA.Services.PermissaoService import PermissaoService
 
 # Import do Logger
 from Utils.Logger import RegistrarLog
@@ -43,6 +44,9 @@ def Login():
                 user_db = auth_service.ObterUsuarioPorLogin(username)
 
                 if user_db:
+                    # Login sempre parte de permissões frescas; a verificação abaixo já pré-carrega o cache
+                    PermissaoService.InvalidarCachePermissoes(user_db.Codigo_Usuario)
+
                     # Carrega objeto completo (Wrapper)
                     usuario_flask = auth_service.CarregarUsuarioCompleto(user_db.Codigo_Usuario)
 
@@ -121,7 +121,9 @@ def ObterPrevia():
 @RequerPermissao('IMPORTACAO.CRIAR')
 def Confirmar():
     """
-    Processa o formulário de mapeamento e dispara a importação real.
+    Processa o formulário de mapeamento e dispara a importação real em background.
+    Via AJAX devolve o id do job (a tela acompanha pela rota de progresso); sem JS, redireciona
+    para o histórico, que exibe o resultado do job.
     """
     try:
         nome_arquivo = request.form.get('filename')
@@ -147,25 +149,51 @@ def Confirmar():
                 if val and val != 'none':
                     transformacoes[coluna_excel] = val
 
+        eh_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
         if not mapeamento:
+            if eh_ajax:
+                return jsonify({'status': 'error', 'message': 'Nenhuma coluna foi mapeada.'}), 400
             flash('Nenhuma coluna foi mapeada.', 'warning')
             return redirect(url_for('ImportacaoDadosRazao.Inicio'))
 
         svc = ImportacaoDadosRazaoService()
 
-        # Executa a transação completa via serviço
-        linhas, competencia = svc.ExecutarTransacaoImportacao(
+        # A transação completa roda em background; a requisição só recebe o id do job
+        id_job = svc.IniciarImportacaoAssincrona(
             nome_arquivo, mapeamento, origem,
             nome_usuario,
             transformacoes=transformacoes
         )
-        flash(f'Sucesso! {linhas} registos importados em {origem} (Competência: {competencia}).', 'success')
-        return redirect(url_for('ImportacaoDadosRazao.Historico'))
+        if eh_ajax:
+            return jsonify({
+                'status': 'success',
+                'job_id': id_job,
+                'progress_url': url_for('ImportacaoDadosRazao.ObterProgresso', id_job=id_job),
+                'redirect_url': url_for('ImportacaoDadosRazao.Historico', job=id_job)
+            }), 202
+        return redirect(url_for('ImportacaoDadosRazao.Historico', job=id_job))
     except Exception as e:
         RegistrarLog(f"Erro fatal na rota Confirmar para {origem}", 'ERROR', e)
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'status': 'error', 'message': str(e)}), 500
         flash(f'Erro na importação: {str(e)}', 'danger')
         return redirect(url_for('ImportacaoDadosRazao.Inicio'))
 
+@importacao_dados_razao_bp.route('/importacao/api/progresso/<id_job>', methods=['GET'])
+@login_required
+@RequerPermissao('IMPORTACAO.CRIAR')
+@require_ajax
+def ObterProgresso(id_job):
+    """
+    Rota AJAX: Progresso de uma importação em background (linhas lidas, rejeitadas e inseridas).
+    """
+    svc = ImportacaoDadosRazaoService()
+    progresso = svc.ObterProgressoImportacao(id_job, current_user.get_id())
+    if progresso is None:
+        return jsonify({'status': 'error', 'message': 'Importação não encontrada ou expirada.'}), 404
+    return jsonify({'status': 'success', 'progresso': progresso}), 200
+
 @importacao_dados_razao_bp.route('/importacao/historico', methods=['GET'])
 @login_required
 @RequerPermissao('IMPORTACAO.HISTORICO.VISUALIZAR')
@@ -174,6 +202,20 @@ def Historico():
     Exibe o log de todas as importações feitas e permite Reversão.
     """
     svc = ImportacaoDadosRazaoService()
+
+    # Resultado da importação em background que redirecionou para cá
+    id_job = request.args.get('job')
+    if id_job:
+        progresso = svc.ObterProgressoImportacao(id_job, current_user.get_id())
+        if progresso is None:
+            flash('Importação não encontrada ou expirada.', 'warning')
+        elif progresso['etapa'] == 'concluido':
+            flash(f"Sucesso! {progresso['mensagem']}", 'success')
+        elif progresso['etapa'] == 'erro':
+            flash(f"Erro na importação: {progresso['mensagem']}", 'danger')
+        else:
+            flash('A importação está em andamento. Atualize a página em instantes para ver o resultado.', 'info')
+
     logs = svc.ObterHistoricoImportacao()
     return render_template('Pages/Import/ImportHistory.html', logs=logs)
 
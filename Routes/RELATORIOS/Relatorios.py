@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from flask import Blueprint, request, render_template, send_file
+from flask import Blueprint, Response, request, render_template, stream_with_context
 from flask_login import login_required, current_user
 
 # --- Imports do LuftCore (Segurança e Padronização de API) ---
@@ -64,6 +64,8 @@ def ObterDadosRazao():
         pagina = int(request.args.get('page', 1))
         termo_busca = request.args.get('search', '').strip()
         tipo_visualizacao = request.args.get('view_type', 'original')
+        # Cursor (keyset) devolvido pela página anterior; sem ele, a paginação usa o número da página
+        cursor = request.args.get('cursor') or None
         por_pagina = 1000
 
         usuario_id = current_user.get_id() if current_user else 'Anonimo'
@@ -71,7 +73,7 @@ def ObterDadosRazao():
             RegistrarLog(f"Relatório Razão solicitado por {usuario_id}. Filtro: '{termo_busca}'", 'WEB_REPORT')
 
         svc = RelatoriosService()
-        dados = svc.ObterDadosRazao(pagina, por_pagina, termo_busca, tipo_visualizacao)
+        dados = svc.ObterDadosRazao(pagina, por_pagina, termo_busca, tipo_visualizacao, cursor)
 
         return api_success(data=dados, message='Dados do Razão carregados.')
     except Exception as e:
@@ -87,14 +89,31 @@ def ObterResumoRazao():
     """API: Retorna os totais do rodapé do Razão."""
     try:
         tipo_visualizacao = request.args.get('view_type', 'original')
+        competencia = request.args.get('competencia') or None
         svc = RelatoriosService()
-        resumo = svc.ObterResumoRazao(tipo_visualizacao)
+        resumo = svc.ObterResumoRazao(tipo_visualizacao, competencia)
 
         return api_success(data=resumo)
     except Exception as e:
         return api_error(message='Falha ao calcular os totais do Razão.', details=str(e), status=500)
 
 
+@relatorios_bp.route('/razao/resumo/mensal', methods=['GET'])
+@login_required
+@RequerPermissao('RELATORIOS.RAZAO.VISUALIZAR')
+@require_ajax
+def ObterResumoMensalRazao():
+    """API: Retorna os totais do Razão por competência."""
+    try:
+        tipo_visualizacao = request.args.get('view_type', 'original')
+        svc = RelatoriosService()
+        resumo = svc.ObterResumoMensalRazao(tipo_visualizacao)
+
+        return api_success(data=resumo)
+    except Exception as e:
+        return api_error(message='Falha ao calcular os totais mensais do Razão.', details=str(e), status=500)
+
+
 @relatorios_bp.route('/razao/centros-custo', methods=['GET'])
 @login_required
 @RequerPermissao('RELATORIOS.VISUALIZAR')
@@ -261,7 +280,19 @@ def GerarRelatorioBudget():
         )
 
         svc = BudgetRelatoriosService()
-        dados = svc.gerarRelatorioBudget(int(ano), centro_custo, conta_contabil, empresa, codigo_usuario=current_user.get_id())
+        if request.args.get('incluir_filtros', 'false').lower() in ('1', 'true'):
+            # Carga da tela: relatório e opções de filtro saem da mesma consulta (uma ida ao ERP)
+            dados = svc.gerarRelatorioBudgetComFiltros(
+                int(ano),
+                centro_custo,
+                conta_contabil,
+                empresa,
+                request.args.get('filtro_centro_custo'),
+                request.args.get('filtro_conta_contabil'),
+                codigo_usuario=current_user.get_id(),
+            )
+        else:
+            dados = svc.gerarRelatorioBudget(int(ano), centro_custo, conta_contabil, empresa, codigo_usuario=current_user.get_id())
 
         return api_success(data=dados, message='Relatório de Budget processado com sucesso.')
     except Exception as e:
@@ -269,6 +300,24 @@ def GerarRelatorioBudget():
         return api_error(message='Falha ao gerar o relatório de Budget.', details=str(e), status=500)
 
 
+@relatorios_bp.route('/budget/cache/limpar', methods=['POST'])
+@login_required
+@RequerPermissao('SISTEMA.ADMIN.DEPURAR')
+@require_ajax
+def LimparCacheRelatoriosBudget():
+    """API: Descarta os resultados de Budget em cache (ex.: logo após um lote de aprovações no ERP)."""
+    try:
+        usuario_id = current_user.get_id() if current_user else 'Anonimo'
+        removidos = BudgetRelatoriosService.LimparCacheResultados(f'manual ({usuario_id})')
+        return api_success(
+            data={'removidos': removidos, 'cache': BudgetRelatoriosService.ObterStatusCache()},
+            message='Cache dos relatórios de Budget limpo. A próxima consulta lê os dados atualizados.',
+        )
+    except Exception as e:
+        RegistrarLog('Erro ao limpar o cache dos relatórios de Budget', 'ERROR', e)
+        return api_error(message='Falha ao limpar o cache dos relatórios de Budget.', details=str(e), status=500)
+
+
 @relatorios_bp.route('/budget/analitico/dados', methods=['GET'])
 @login_required
 @RequerPermissao('RELATORIOS.BUDGET.VISUALIZAR')
@@ -348,20 +397,23 @@ def BaixarRazaoExcel():
         RegistrarLog(f'Download Excel Razão iniciado por {usuario_id}', 'WEB_EXPORT')
 
         svc = RelatoriosService()
-        arquivo_binario = svc.GerarExcelRazao(termo_busca, tipo_visualizacao)
+        caminho_arquivo = svc.GerarExcelRazao(termo_busca, tipo_visualizacao)
 
-        if not arquivo_binario:
+        if caminho_arquivo is None:
             # Caso chamem via fetch Blob, o api_error responde em json formatado.
             return api_error(message='Sem dados para exportar.', status=404)
 
         nome_arquivo = f"Razao_Analitico_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
 
-        return send_file(
-            arquivo_binario,
+        # Resposta em streaming: o arquivo é enviado em blocos, sem ficar inteiro em memória.
+        # O call_on_close remove o temporário também quando o cliente desconecta no meio do envio.
+        resposta = Response(
+            stream_with_context(svc.LerArquivoExcelRazao(caminho_arquivo)),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=nome_arquivo
+            headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'}
         )
+        resposta.call_on_close(lambda: svc.RemoverArquivoExcelRazao(caminho_arquivo))
+        return resposta
 
     except Exception as e:
         RegistrarLog('Erro no Download Excel', 'ERROR', e)
@@ -118,6 +118,8 @@ def SalvarVinculo():
                 else:
                     Vinculo.Conceder = Estado
         Sessao.commit()
+        # Vínculo de grupo afeta todos os usuários do grupo; override afeta só o usuário alvo
+        PermissaoService.InvalidarCachePermissoes(None if Tipo == 'Grupo' else IdAlvo)
         return jsonify({'sucesso': True})
     except Exception as e:
         Sessao.rollback()
@@ -151,6 +153,7 @@ def CriarNovaPermissao():
                 Categoria_Permissao=Modulo
             ))
             Sessao.commit()
+            PermissaoService.InvalidarCachePermissoes()
             flash('Permissão criada com sucesso!', 'success')
     except Exception as e:
         Sessao.rollback()
@@ -0,0 +1,35 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine
+from Models.Postgress.CTL_Sistema import Base, CtlSysControleSincronizacao
+
+def criar_controle_sincronizacao():
+    engine = GetPostgresEngine()
+    print("🛠️  Criando tabela 'Tb_CTL_Sys_Controle_Sincronizacao'...")
+    Base.metadata.create_all(engine, tables=[CtlSysControleSincronizacao.__table__])
+
+    # Índices que sustentam a CTE de alvos da sincronização incremental
+    sqls = [
+        'ALTER TABLE "Dre_Schema"."Tb_CTL_Razao_Consolidado" ADD COLUMN IF NOT EXISTS "Data_Alteracao" TIMESTAMP;',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Data_Alteracao" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Data_Alteracao") WHERE "Data_Alteracao" IS NOT NULL;',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Mes_Pendente" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Fonte", "Id") WHERE "Mes" IS NULL;',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Fonte" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Fonte");',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Centro_Custo" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Centro de Custo");',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Item" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Item");',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Fonte_Data" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Fonte", "Data");',
+        'CREATE INDEX IF NOT EXISTS "Ix_Ajuste_Log_Data_Acao" ON "Dre_Schema"."Tb_CTL_Ajuste_Log" ("Data_Acao");',
+    ]
+    with engine.begin() as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+    print("✅ Controle de sincronização incremental criado!")
+    print("   -> A primeira execução fará a reconstrução completa e gravará as marcas d'água.")
+
+if __name__ == "__main__":
+    criar_controle_sincronizacao()
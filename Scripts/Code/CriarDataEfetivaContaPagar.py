@@ -0,0 +1,66 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetSqlServerEngine
+
+# Data efetiva = última digitação de nota fiscal ou, sem nota, a digitação da conta (mesma regra do RelatorioBudget).
+# Não dá para usar coluna computada persistida (não pode ler outra tabela) nem view indexada (não aceita MAX
+# nem LEFT JOIN): fica uma tabela indexada, atualizada por este MERGE em um job do SQL Agent.
+SQL_ATUALIZAR = """
+    MERGE [Luftinforma].[dbo].[ContaPagarDataEfetiva] AS destino
+    USING (
+        SELECT cp.Codigo_ContaPagar, COALESCE(nf.Data_Digitacao, cp.Data_Digitacao) AS Data_DigitacaoEfetiva
+        FROM [Luftinforma].[dbo].[ContaPagar] cp
+        LEFT JOIN (
+            SELECT Codigo_ContaPagar, MAX(Data_Digitacao) AS Data_Digitacao
+            FROM [Luftinforma].[dbo].[ContaPagarNotaFiscal]
+            GROUP BY Codigo_ContaPagar
+        ) nf ON nf.Codigo_ContaPagar = cp.Codigo_ContaPagar
+    ) AS origem
+    ON destino.Codigo_ContaPagar = origem.Codigo_ContaPagar
+    WHEN MATCHED AND (destino.Data_DigitacaoEfetiva <> origem.Data_DigitacaoEfetiva
+                      OR (destino.Data_DigitacaoEfetiva IS NULL AND origem.Data_DigitacaoEfetiva IS NOT NULL)
+                      OR (destino.Data_DigitacaoEfetiva IS NOT NULL AND origem.Data_DigitacaoEfetiva IS NULL))
+        THEN UPDATE SET Data_DigitacaoEfetiva = origem.Data_DigitacaoEfetiva
+    WHEN NOT MATCHED BY TARGET
+        THEN INSERT (Codigo_ContaPagar, Data_DigitacaoEfetiva) VALUES (origem.Codigo_ContaPagar, origem.Data_DigitacaoEfetiva)
+    WHEN NOT MATCHED BY SOURCE
+        THEN DELETE;
+"""
+
+def criar_data_efetiva_conta_pagar():
+    engine = GetSqlServerEngine()
+    print("🛠️  Criando 'ContaPagarDataEfetiva' no ERP (data efetiva de digitação materializada)...")
+
+    sqls = [
+        """IF OBJECT_ID('[Luftinforma].[dbo].[ContaPagarDataEfetiva]') IS NULL
+           CREATE TABLE [Luftinforma].[dbo].[ContaPagarDataEfetiva] (
+               Codigo_ContaPagar INT NOT NULL PRIMARY KEY,
+               Data_DigitacaoEfetiva DATETIME NULL
+           );""",
+        """IF NOT EXISTS (SELECT 1 FROM [Luftinforma].sys.indexes WHERE name = 'Ix_ContaPagarDataEfetiva_Data')
+           CREATE INDEX Ix_ContaPagarDataEfetiva_Data ON [Luftinforma].[dbo].[ContaPagarDataEfetiva] (Data_DigitacaoEfetiva);""",
+        # Pré-seleção indexável usada quando a data materializada não está habilitada
+        """IF NOT EXISTS (SELECT 1 FROM [Luftinforma].sys.indexes WHERE name = 'Ix_ContaPagarNotaFiscal_Digitacao')
+           CREATE INDEX Ix_ContaPagarNotaFiscal_Digitacao ON [Luftinforma].[dbo].[ContaPagarNotaFiscal] (Data_Digitacao) INCLUDE (Codigo_ContaPagar);""",
+        """IF NOT EXISTS (SELECT 1 FROM [Luftinforma].sys.indexes WHERE name = 'Ix_ContaPagar_Digitacao')
+           CREATE INDEX Ix_ContaPagar_Digitacao ON [Luftinforma].[dbo].[ContaPagar] (Data_Digitacao);""",
+    ]
+    with engine.begin() as conn:
+        for sql in sqls:
+            print(f"Executando: {' '.join(sql.split())}")
+            conn.execute(text(sql))
+
+    print("📥 Populando a data efetiva...")
+    with engine.begin() as conn:
+        conn.execute(text(SQL_ATUALIZAR))
+
+    print("✅ ContaPagarDataEfetiva criada!")
+    print("   -> Agende o MERGE (SQL_ATUALIZAR) em um job do SQL Agent junto da importação de contas a pagar")
+    print("   -> e ative BUDGET_DATA_EFETIVA_MATERIALIZADA_ERP=True para o relatório lê-la.")
+
+if __name__ == "__main__":
+    criar_data_efetiva_conta_pagar()
@@ -0,0 +1,39 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine, GetPostgresSession
+from Models.Postgress.CTL_Razao import Base, CtlRazaoFatoMensal
+from Modules.RAZAO.Services.SincronizacaoConsolidadoRazaoService import SincronizacaoConsolidadoRazaoService
+
+def criar_fato_mensal_dre():
+    engine = GetPostgresEngine()
+    print("🛠️  Criando tabela 'Tb_CTL_Razao_Fato_Mensal'...")
+    Base.metadata.create_all(engine, tables=[CtlRazaoFatoMensal.__table__])
+
+    # Índices do refresh por competência e das leituras dos relatórios DRE (filtro por ano/origem)
+    sqls = [
+        'CREATE INDEX IF NOT EXISTS "Ix_Fato_Mensal_Ano_Mes" ON "Dre_Schema"."Tb_CTL_Razao_Fato_Mensal" ("Ano", "Mes");',
+        'CREATE INDEX IF NOT EXISTS "Ix_Fato_Mensal_Ano_Origem" ON "Dre_Schema"."Tb_CTL_Razao_Fato_Mensal" ("Ano", "origem");',
+        'CREATE INDEX IF NOT EXISTS "Ix_Consolidado_Data" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Data");',
+    ]
+    with engine.begin() as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+    print("📊 Populando o fato mensal a partir da Consolidada...")
+    session = GetPostgresSession()
+    try:
+        SincronizacaoConsolidadoRazaoService(session).atualizarFatoMensal()
+        session.commit()
+    finally:
+        session.close()
+
+    print("✅ Fato mensal do DRE criado!")
+    print("   -> A sincronização da Consolidada passa a mantê-lo atualizado por competência.")
+
+if __name__ == "__main__":
+    criar_fato_mensal_dre()
@@ -0,0 +1,42 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine
+from Modules.RAZAO.Reports.RazaoContabil import RazaoContabil
+
+def criar_indices_busca_razao():
+    engine = GetPostgresEngine()
+    print("🛠️  Criando índices da busca textual do Razão (pg_trgm)...")
+
+    # Mesma expressão da busca (RazaoContabil.ExpressaoBusca): o índice só é usado se for idêntica
+    expr_busca = RazaoContabil.ExpressaoBusca()
+
+    sqls = [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+        # Visão original: visão materializada (Scripts/Code/CriarRazaoOriginalMaterializado.py)
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "Ix_Razao_Original_Busca_Trgm" ON "Dre_Schema"."Mv_CTL_Razao_Original" USING gin (({expr_busca}) gin_trgm_ops);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "Ix_Razao_Original_Conta_Prefixo" ON "Dre_Schema"."Mv_CTL_Razao_Original" ("Conta" text_pattern_ops);',
+        # Visão ajustada: só lançamentos válidos (índices parciais)
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "Ix_Consolidado_Busca_Trgm" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" USING gin (({expr_busca}) gin_trgm_ops) WHERE "Invalido" = false;',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "Ix_Consolidado_Conta_Prefixo" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ("Conta" text_pattern_ops) WHERE "Invalido" = false;',
+    ]
+    # Índices da antiga união dinâmica: o grid não lê mais as tabelas puras (só encarecem a importação)
+    for sufixo in ('Farma', 'FarmaDist', 'Intec'):
+        sqls += [
+            f'DROP INDEX CONCURRENTLY IF EXISTS "Dre_Schema"."Ix_Razao_{sufixo}_Busca_Trgm";',
+            f'DROP INDEX CONCURRENTLY IF EXISTS "Dre_Schema"."Ix_Razao_{sufixo}_Conta_Prefixo";',
+        ]
+
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação e não bloqueia escritas nem o REFRESH CONCURRENTLY
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+    print("✅ Índices de busca do Razão criados!")
+
+if __name__ == "__main__":
+    criar_indices_busca_razao()
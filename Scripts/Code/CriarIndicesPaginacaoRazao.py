@@ -0,0 +1,39 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine
+
+# Mesmas expressões da ordenação do grid (RazaoContabil.EXPR_*): o índice só é usado se forem idênticas
+CHAVE_ORDENACAO = """(COALESCE("Data", TIMESTAMP '1900-01-01') DESC), (COALESCE("Conta", '')), (COALESCE("Numero", ''))"""
+
+def criar_indices_paginacao_razao():
+    engine = GetPostgresEngine()
+    print("🛠️  Criando índices da paginação por chave (keyset) do Razão...")
+
+    sqls = [
+        # Visão original: índice na visão materializada (Scripts/Code/CriarRazaoOriginalMaterializado.py)
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "Ix_Razao_Original_Paginacao" ON "Dre_Schema"."Mv_CTL_Razao_Original" ({CHAVE_ORDENACAO}, "origem", "Id");',
+        # Visão ajustada: só lançamentos válidos (índice parcial)
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "Ix_Consolidado_Paginacao" ON "Dre_Schema"."Tb_CTL_Razao_Consolidado" ({CHAVE_ORDENACAO}, "Fonte", "Id") WHERE "Invalido" = false;',
+        # Índices da antiga união dinâmica: o grid não lê mais as tabelas puras (só encarecem a importação)
+        'DROP INDEX CONCURRENTLY IF EXISTS "Dre_Schema"."Ix_Razao_Farma_Paginacao";',
+        'DROP INDEX CONCURRENTLY IF EXISTS "Dre_Schema"."Ix_Razao_FarmaDist_Paginacao";',
+        'DROP INDEX CONCURRENTLY IF EXISTS "Dre_Schema"."Ix_Razao_Intec_Paginacao";',
+    ]
+
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação e não bloqueia escritas nas tabelas
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+        for tabela in ('Mv_CTL_Razao_Original', 'Tb_CTL_Razao_Consolidado'):
+            conn.execute(text(f'ANALYZE "Dre_Schema"."{tabela}"'))
+
+    print("✅ Índices de paginação do Razão criados!")
+
+if __name__ == "__main__":
+    criar_indices_paginacao_razao()
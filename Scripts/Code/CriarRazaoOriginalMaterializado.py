@@ -0,0 +1,42 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine
+
+ORIGENS = [
+    ('FARMA', 'Tb_CTL_Razao_Farma'),
+    ('FARMADIST', 'Tb_CTL_Razao_FarmaDist'),
+    ('INTEC', 'Tb_CTL_Razao_Intec'),
+]
+
+def criar_razao_original_materializado():
+    engine = GetPostgresEngine()
+    print("🛠️  Criando visão materializada do Razão original (Mv_CTL_Razao_Original)...")
+
+    # Mesma união que o grid do Razão montava a cada consulta, com o Saldo já calculado
+    uniao = "\n        UNION ALL\n".join(f"""
+        SELECT '{origem}' AS "origem", "Id", "Conta", "Título Conta", "Data", "Numero", "Descricao",
+               "Contra Partida - Credito", "Filial", "Centro de Custo", "Item", "Cod Cl. Valor",
+               "Debito", "Credito", (COALESCE("Debito", 0) - COALESCE("Credito", 0)) AS "Saldo", 'ORIGINAL' AS "Tipo_Operacao"
+        FROM "Dre_Schema"."{tabela}\"""" for origem, tabela in ORIGENS)
+
+    sqls = [
+        f'CREATE MATERIALIZED VIEW IF NOT EXISTS "Dre_Schema"."Mv_CTL_Razao_Original" AS {uniao};',
+        # Índice único exigido pelo REFRESH MATERIALIZED VIEW CONCURRENTLY
+        'CREATE UNIQUE INDEX IF NOT EXISTS "Ux_Razao_Original_Origem_Id" ON "Dre_Schema"."Mv_CTL_Razao_Original" ("origem", "Id");',
+        'ANALYZE "Dre_Schema"."Mv_CTL_Razao_Original";',
+    ]
+
+    with engine.begin() as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+    print("✅ Visão materializada do Razão original criada!")
+    print("ℹ️  Execute CriarIndicesPaginacaoRazao.py e CriarIndicesBuscaRazao.py para indexá-la.")
+
+if __name__ == "__main__":
+    criar_razao_original_materializado()
@@ -0,0 +1,42 @@
+import sys
+import os
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine, GetPostgresSession
+from Models.Postgress.CTL_Razao import Base, CtlRazaoResumoMensal
+from Modules.RAZAO.Reports.RazaoContabil import RazaoContabil
+from Modules.RAZAO.Services.SincronizacaoConsolidadoRazaoService import SincronizacaoConsolidadoRazaoService
+
+def criar_resumo_razao():
+    engine = GetPostgresEngine()
+    print("🛠️  Criando tabela 'Tb_CTL_Razao_Resumo_Mensal'...")
+    Base.metadata.create_all(engine, tables=[CtlRazaoResumoMensal.__table__])
+
+    # Índices da leitura por visão e do refresh por competência (na Consolidada já existe o Ix_Consolidado_Data).
+    # Requer a visão materializada do Razão original (Scripts/Code/CriarRazaoOriginalMaterializado.py).
+    sqls = [
+        'CREATE INDEX IF NOT EXISTS "Ix_Resumo_Razao_Visao_Ano_Mes" ON "Dre_Schema"."Tb_CTL_Razao_Resumo_Mensal" ("Visao", "Ano", "Mes");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Razao_Original_Data" ON {RazaoContabil.TABELA_ORIGINAL} ("Data");',
+    ]
+    with engine.begin() as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+    print("📊 Populando os totais do Razão (visões original e ajustada)...")
+    session = GetPostgresSession()
+    try:
+        servico = SincronizacaoConsolidadoRazaoService(session)
+        servico.atualizarResumoRazao('original')
+        servico.atualizarResumoRazao('adjusted')
+        session.commit()
+    finally:
+        session.close()
+
+    print("✅ Resumo do Razão criado!")
+    print("   -> A sincronização da Consolidada passa a mantê-lo atualizado por competência.")
+
+if __name__ == "__main__":
+    criar_resumo_razao()
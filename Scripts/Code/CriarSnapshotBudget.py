@@ -0,0 +1,57 @@
+import sys
+import os
+from sqlalchemy import MetaData, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Db.Connections import GetPostgresEngine, SCHEMA_SNAPSHOT_BUDGET
+from Modules.BUDGET.Services.AgendadorReplicacaoBudget import AgendadorReplicacaoBudget
+from Modules.BUDGET.Services.ReplicacaoBudgetService import ReplicacaoBudgetService
+
+def criar_snapshot_budget():
+    engine = GetPostgresEngine()
+    print(f"🛠️  Criando schema '{SCHEMA_SNAPSHOT_BUDGET}' com a réplica do Budget/Contas a Pagar...")
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{SCHEMA_SNAPSHOT_BUDGET}"'))
+
+    metadata = MetaData()
+    ReplicacaoBudgetService.MontarTabelasSnapshot(metadata)
+    metadata.create_all(engine)
+
+    # Índices dos joins e filtros do RelatorioBudget (as tabelas de recarga não têm chave primária)
+    s = f'"{SCHEMA_SNAPSHOT_BUDGET}"'
+    sqls = [
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_Budget_Ano" ON {s}."Budget" ("Ano_Vigencia", "Codigo_Budget");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_BudgetItem_Budget" ON {s}."BudgetItem" ("Codigo_Budget");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_BudgetItem_Item" ON {s}."BudgetItem" ("Codigo_BudgetItem");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_BudgetGrupo" ON {s}."BudgetGrupo" ("Codigo_BudgetGrupo");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_CentroCusto" ON {s}."CentroCusto" ("Codigo_CentroCusto");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_PlanoConta" ON {s}."PlanoConta" ("Codigo_ContaContabil");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_Fornecedor" ON {s}."Fornecedor" ("Codigo_Fornecedor");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_Empresa" ON {s}."Empresa" ("Codigo_Empresa");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_ContaPagar_Digitacao" ON {s}."ContaPagar" ("Data_Digitacao");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_ContaPagar_BudgetItem" ON {s}."ContaPagar" ("Codigo_BudgetItem");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_ContaPagar_Centro" ON {s}."ContaPagar" ("Codigo_CentroCusto", "Codigo_ContaContabil");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_NotaFiscal_Digitacao" ON {s}."ContaPagarNotaFiscal" ("Data_Digitacao");',
+        f'CREATE INDEX IF NOT EXISTS "Ix_Snap_DataEfetiva" ON {s}."ContaPagarDataEfetiva" ("Data_DigitacaoEfetiva", "Codigo_ContaPagar");',
+    ]
+    with engine.begin() as conn:
+        for sql in sqls:
+            print(f"Executando: {sql}")
+            conn.execute(text(sql))
+
+    print("📥 Carga inicial a partir do ERP (recarga completa)...")
+    if not AgendadorReplicacaoBudget.ExecutarComLock(completo=True):
+        print("⚠️  Já existe uma replicação em andamento; a carga fica a cargo do agendador.")
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for tabela in metadata.sorted_tables:
+            conn.execute(text(f'ANALYZE {s}."{tabela.name}"'))
+
+    print("✅ Réplica do Budget criada!")
+    print("   -> Ative BUDGET_REPLICACAO_AGENDADOR=True para mantê-la atualizada")
+    print("   -> e BUDGET_ORIGEM_DADOS=snapshot para o relatório ler da réplica.")
+
+if __name__ == "__main__":
+    criar_snapshot_budget()
@@ -1,22 +1,13 @@
 import pandas as pd
 import sys
 import os
-from datetime import datetime, timedelta
 from sqlalchemy import text
 
 # Setup de diretórios: Adiciona a raiz do projeto ao path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from Db.Connections import GetPostgresEngine
-
-def excel_date_to_datetime(serial):
-    """Converte serial de data do Excel (int) para datetime do Python"""
-    try:
-        if pd.isna(serial): return None
-        # Excel base date é 1899-12-30 para sistemas Windows
-        return datetime(1899, 12, 30) + timedelta(days=float(serial))
-    except:
-        return None
+from Utils.ExcelUtils import ler_excel_em_blocos, resolver_motor_leitura, _sanitizar_data_auto
 
 def importar_intec(caminho_arquivo):
     engine = GetPostgresEngine()
@@ -27,20 +18,7 @@ def importar_intec(caminho_arquivo):
         print(f"❌ Erro: Arquivo não encontrado no caminho: {caminho_arquivo}")
         return
 
-    try:
-        # Lê especificamente como Excel
-        df = pd.read_excel(caminho_arquivo, engine='openpyxl')
-    except Exception as e:
-        print(f"❌ Erro ao ler o Excel: {e}")
-        print("💡 Dica: Verifique se instalou o suporte a xlsx: pip install openpyxl")
-        return
-
-    print(f"   -> Linhas encontradas: {len(df)}")
-
-    # 1. Normalizar nomes das colunas (remover quebras de linha e espaços extras)
-    df.columns = [str(c).replace('\n', ' ').strip() for c in df.columns]
-    
-    # 2. Mapeamento De -> Para (Excel -> Banco de Dados)
+    # 1. Mapeamento De -> Para (Excel -> Banco de Dados)
     mapa_colunas = {
         'Conta': 'Conta',
         'Título Conta': 'Título Conta',
@@ -55,7 +33,36 @@ def importar_intec(caminho_arquivo):
         'Débito': 'Debito',
         'Crédito': 'Credito'
     }
-    
+
+    print(f"⚙️  Lendo e tratando em blocos (motor: {resolver_motor_leitura()})...")
+    total_linhas = 0
+
+    try:
+        # Uma única transação: ou o arquivo entra inteiro, ou nada entra
+        with engine.begin() as conexao:
+            # Os blocos já vêm com os nomes das colunas normalizados (sem quebras de linha e espaços extras)
+            for df in ler_excel_em_blocos(caminho_arquivo):
+                df_db = tratar_bloco(df, mapa_colunas)
+                df_db.to_sql(
+                    'Razao_Dados_Origem_INTEC',
+                    conexao,
+                    schema='Dre_Schema',
+                    if_exists='append', 
+                    index=False,
+                    chunksize=1000
+                )
+                total_linhas += len(df_db)
+                print(f"   -> Linhas gravadas: {total_linhas}")
+
+        print("🎉 Importação INTEC concluída com sucesso!")
+
+    except ImportError as e:
+        print(f"❌ Erro ao ler o Excel: {e}")
+        print("💡 Dica: Verifique se instalou o suporte a xlsx: pip install openpyxl")
+    except Exception as e:
+        print(f"❌ Erro na importação: {e}")
+
+def tratar_bloco(df, mapa_colunas):
     # Renomeia as colunas
     df_db = df.rename(columns=mapa_colunas)
     
@@ -63,39 +70,20 @@ def importar_intec(caminho_arquivo):
     colunas_validas = [col for col in mapa_colunas.values() if col in df_db.columns]
     df_db = df_db[colunas_validas]
 
-    print("⚙️  Tratando dados...")
-    
-    # 3. Tratamento de Data
+    # Tratamento de Data: célula a célula (serial do Excel ou dd/mm/aaaa), sem inferir o formato
+    # pelo bloco, para que todos os blocos do arquivo sejam lidos do mesmo jeito
     if 'Data' in df_db.columns:
-        if pd.api.types.is_numeric_dtype(df_db['Data']):
-            df_db['Data'] = df_db['Data'].apply(excel_date_to_datetime)
-        else:
-            df_db['Data'] = pd.to_datetime(df_db['Data'], errors='coerce')
+        df_db['Data'] = pd.to_datetime(_sanitizar_data_auto(df_db['Data']), errors='coerce')
 
-    # 4. Tratamento de Valores Numéricos
+    # Tratamento de Valores Numéricos: só os textos vêm no formato brasileiro ('1.234,56');
+    # células numéricas ficam como estão, independente do tipo do restante do bloco
     cols_valor = ['Debito', 'Credito']
     for col in cols_valor:
         if col in df_db.columns:
-            if df_db[col].dtype == object:
-                 df_db[col] = df_db[col].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-            df_db[col] = pd.to_numeric(df_db[col], errors='coerce').fillna(0.0)
+            valores = df_db[col].map(lambda v: v.replace('.', '').replace(',', '.') if isinstance(v, str) else v)
+            df_db[col] = pd.to_numeric(valores, errors='coerce').fillna(0.0)
 
-    # 5. Inserção no Banco
-    print("💾 Salvando no banco de dados...")
-    
-    try:
-        df_db.to_sql(
-            'Razao_Dados_Origem_INTEC',
-            engine,
-            schema='Dre_Schema',
-            if_exists='append', 
-            index=False,
-            chunksize=1000
-        )
-        print("🎉 Importação INTEC concluída com sucesso!")
-        
-    except Exception as e:
-        print(f"❌ Erro ao inserir no banco: {e}")
+    return df_db
 
 if __name__ == "__main__":
     # Caminho absoluto conforme solicitado, usando 'r' para raw string (evita erro com barras invertidas)
@@ -0,0 +1,98 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import text
+
+from Db.Connections import GetPostgresEngine
+from Modules.RAZAO.Reports.RazaoContabil import RazaoContabil
+
+"""
+    Benchmark da busca textual do Razão: os cinco ILIKE anteriores (varredura sequencial) contra a
+    expressão única coberta por GIN pg_trgm (RazaoContabil.ExpressaoBusca) e a busca por prefixo de
+    conta (btree text_pattern_ops). Monta um razão sintético em tabela TEMPORÁRIA (some ao fechar a
+    conexão, não toca nas tabelas reais) e mede COUNT(*) e a primeira página de cada termo.
+    Requer a extensão pg_trgm no banco. Uso: python Scripts/DEV/BenchmarkBuscaRazao.py [linhas] [repeticoes]
+"""
+
+TERMOS = ['FORNECEDOR 0042', 'energia', 'NF 123', '60101', 'INTEC', 'zzz-inexistente']
+PREFIXOS = ['6010101%', '3%', '2.1.1%']
+
+SQL_CRIAR = """
+    CREATE TEMP TABLE razao_bench AS
+    SELECT g AS "Id",
+           (ARRAY['FARMA', 'FARMADIST', 'INTEC'])[1 + g % 3] AS "origem",
+           (60100000000 + (g * 7919) % 40000)::text AS "Conta",
+           (ARRAY['DESPESAS COM ENERGIA', 'SALARIOS E ORDENADOS', 'FRETES SOBRE VENDAS',
+                  'ALUGUEIS', 'SERVICOS DE TERCEIROS', 'RECEITA BRUTA'])[1 + g % 6] AS "Título Conta",
+           'PGTO FORNECEDOR ' || lpad((g % 5000)::text, 4, '0') || ' REF NF ' || (g % 99991)::text AS "Descricao",
+           (g % 250000)::text AS "Numero",
+           TIMESTAMP '2024-01-01' + (g % 730) * INTERVAL '1 day' AS "Data"
+    FROM generate_series(1, :linhas) g
+"""
+
+def Medir(conn, sql, params, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = conn.execute(text(sql), params).fetchall()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos), resultado
+
+def Executar(qtd_linhas=1000000, repeticoes=3):
+    engine = GetPostgresEngine()
+    expr = RazaoContabil.ExpressaoBusca()
+    legado = ('("Conta"::TEXT ILIKE :termo OR "Título Conta" ILIKE :termo OR "Descricao" ILIKE :termo '
+              'OR "Numero"::TEXT ILIKE :termo OR "origem" ILIKE :termo)')
+    novo = f"({expr}) ILIKE :termo"
+
+    with engine.connect() as conn:
+        print(f"Montando razão sintético com {qtd_linhas:,} linhas...")
+        t0 = time.perf_counter()
+        conn.execute(text(SQL_CRIAR), {'linhas': qtd_linhas})
+        conn.execute(text('ANALYZE razao_bench'))
+        print(f"  tabela: {time.perf_counter() - t0:.1f}s")
+
+        casos = []
+        for termo in TERMOS:
+            p = {'termo': f"%{termo}%"}
+            casos.append((f"'{termo}'", legado, novo, p))
+        for prefixo in PREFIXOS:
+            p = {'termo': prefixo}
+            casos.append((f"conta {prefixo}", '"Conta"::TEXT ILIKE :termo', '"Conta" LIKE :termo', p))
+
+        # Linha de base: sem índices de busca
+        base = {}
+        for nome, sql_legado, _, p in casos:
+            base[nome] = (
+                Medir(conn, f'SELECT COUNT(*) FROM razao_bench WHERE {sql_legado}', p, repeticoes),
+                Medir(conn, f'SELECT * FROM razao_bench WHERE {sql_legado} ORDER BY "Data" DESC, "Conta", "Numero" LIMIT 1000', p, repeticoes)[0],
+            )
+
+        t0 = time.perf_counter()
+        conn.execute(text(f'CREATE INDEX ON razao_bench USING gin (({expr}) gin_trgm_ops)'))
+        conn.execute(text('CREATE INDEX ON razao_bench ("Conta" text_pattern_ops)'))
+        conn.execute(text('ANALYZE razao_bench'))
+        print(f"  índices: {time.perf_counter() - t0:.1f}s")
+
+        ok = True
+        print(f"\n{'caso':<24} {'count antes':>12} {'count depois':>13} {'página antes':>13} {'página depois':>14} {'ganho':>7}")
+        for nome, _, sql_novo, p in casos:
+            (t_count_ant, res_ant), t_pag_ant = base[nome]
+            t_count, res = Medir(conn, f'SELECT COUNT(*) FROM razao_bench WHERE {sql_novo}', p, repeticoes)
+            t_pag = Medir(conn, f'SELECT * FROM razao_bench WHERE {sql_novo} ORDER BY "Data" DESC, "Conta", "Numero" LIMIT 1000', p, repeticoes)[0]
+            igual = res_ant[0][0] == res[0][0]
+            ok &= igual
+            print(f"{nome:<24} {t_count_ant:10.1f}ms {t_count:11.1f}ms {t_pag_ant:11.1f}ms {t_pag:12.1f}ms "
+                  f"{t_count_ant / max(t_count, 1e-3):6.1f}x  {'OK' if igual else f'DIVERGENTE ({res_ant[0][0]} != {res[0][0]})'}")
+
+    print("\nRESULTADO:", "mesmas contagens" if ok else "DIVERGENTE")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if Executar(*args) else 1)
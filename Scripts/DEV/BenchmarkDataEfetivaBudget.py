@@ -0,0 +1,151 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import MetaData, extract, func, text
+from sqlalchemy.orm import Session
+
+from Db.Connections import GetPostgresEngine
+from Models.SqlServer.Base import SQLSERVER_SCHEMA
+from Models.SqlServer.ContaPagar import ContaPagar
+from Modules.BUDGET.Reports.RelatorioBudget import RelatorioBudget
+from Modules.BUDGET.Services.ReplicacaoBudgetService import ReplicacaoBudgetService
+
+"""
+    Benchmark do filtro de competência do realizado do Budget (data efetiva de digitação).
+    Compara, sobre contas a pagar e notas fiscais sintéticas com o formato do ERP:
+      - legado: extract(year/month) sobre o COALESCE da subconsulta agrupada de notas;
+      - intervalos: intervalos semiabertos + pré-seleção indexável pelas colunas de origem (RelatorioBudget);
+      - materializada: intervalos sobre ContaPagarDataEfetiva indexada (RelatorioBudget com dataEfetivaMaterializada).
+    As consultas saem do próprio RelatorioBudget (schema_translate_map para um schema de rascunho, apagado ao
+    final). Mostra o topo de cada plano, a mediana dos tempos e confere se os totais por mês são idênticos.
+    Roda no PostgreSQL (a réplica usa o mesmo SQL). Uso: python Scripts/DEV/BenchmarkDataEfetivaBudget.py [contas] [repeticoes]
+"""
+
+SCHEMA_BENCH = 'Budget_Bench'
+CASOS = [('ano', 2025, None), ('mês', 2025, [6]), ('acumulado', 2025, range(1, 4)), ('meses soltos', 2025, [1, 7, 12])]
+
+SQL_CONTAS = f"""
+    INSERT INTO "{SCHEMA_BENCH}"."ContaPagar" ("Codigo_ContaPagar", "Data_Digitacao", "Valor_ContaPagar", "Opcao_StatusContaPagar")
+    SELECT g, TIMESTAMP '2023-01-01' + (g * 7919 % 1095) * INTERVAL '1 day' + (g % 86400) * INTERVAL '1 second',
+           (g % 10000) / 10.0, 1 + g % 5
+    FROM generate_series(1, :contas) g
+"""
+# ~70% das contas com 1 a 3 notas, digitadas de 0 a 60 dias depois da conta (algumas viram de mês/ano)
+SQL_NOTAS = f"""
+    INSERT INTO "{SCHEMA_BENCH}"."ContaPagarNotaFiscal" ("Codigo_ContaPagar", "Numero_NotaFiscal", "Serie_NotaFiscal", "Data_Digitacao")
+    SELECT cp."Codigo_ContaPagar", n::text, '1', cp."Data_Digitacao" + ((cp."Codigo_ContaPagar" * n) % 61) * INTERVAL '1 day'
+    FROM "{SCHEMA_BENCH}"."ContaPagar" cp
+    CROSS JOIN generate_series(1, 3) n
+    WHERE cp."Codigo_ContaPagar" % 10 < 7 AND n <= 1 + cp."Codigo_ContaPagar" % 3
+"""
+
+def MontarConsulta(relatorio, ano, meses, legado=False):
+    subconsulta = relatorio._obterSubconsultaDataDigitacaoNotaFiscal()
+    dataEfetiva = relatorio._obterDataDigitacaoEfetivaContaPagar(subconsulta)
+    query = (
+        relatorio.session.query(
+            extract('month', dataEfetiva).label('mes'),
+            func.count().label('quantidade'),
+            func.sum(relatorio._obterValorEfetivoContaPagar()).label('total'),
+        )
+        .select_from(ContaPagar)
+        .outerjoin(subconsulta, ContaPagar.Codigo_ContaPagar == subconsulta.c.codigoContaPagar)
+        .group_by(extract('month', dataEfetiva))
+        .order_by(extract('month', dataEfetiva))
+    )
+    if legado:
+        query = query.filter(extract('year', dataEfetiva) == ano)
+        if meses:
+            query = query.filter(extract('month', dataEfetiva).in_(list(meses)))
+        return query
+    return query.filter(relatorio._obterCondicaoPeriodoEfetivo(dataEfetiva, ano, meses))
+
+def Medir(sessao, query, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = [tuple(linha) for linha in query.all()]
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos), resultado
+
+def Plano(sessao, query, linhas=4):
+    sql = query.statement.compile(
+        dialect=sessao.get_bind().dialect,
+        compile_kwargs={'literal_binds': True},
+        schema_translate_map={SQLSERVER_SCHEMA: SCHEMA_BENCH},
+    )
+    plano = sessao.execute(text(f'EXPLAIN {sql}')).scalars().all()
+    return [linha.strip() for linha in plano[:linhas]]
+
+def Executar(qtd_contas=500000, repeticoes=3):
+    engine = GetPostgresEngine()
+    metadata = MetaData()
+    for tabela in ReplicacaoBudgetService.MontarTabelasSnapshot():
+        if tabela.name in ('ContaPagar', 'ContaPagarNotaFiscal', 'ContaPagarDataEfetiva'):
+            tabela.to_metadata(metadata, schema=SCHEMA_BENCH)
+
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS "{SCHEMA_BENCH}" CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA "{SCHEMA_BENCH}"'))
+    metadata.create_all(engine)
+
+    ok = True
+    try:
+        print(f"Montando {qtd_contas:,} contas a pagar sintéticas...")
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text(SQL_CONTAS), {'contas': qtd_contas})
+            conn.execute(text(SQL_NOTAS))
+            # Mesmo cálculo da replicação, apontado para o schema de rascunho
+            conn.execute(text(f"""
+                INSERT INTO "{SCHEMA_BENCH}"."ContaPagarDataEfetiva" ("Codigo_ContaPagar", "Data_DigitacaoEfetiva")
+                SELECT cp."Codigo_ContaPagar", COALESCE(MAX(nf."Data_Digitacao"), cp."Data_Digitacao")
+                FROM "{SCHEMA_BENCH}"."ContaPagar" cp
+                LEFT JOIN "{SCHEMA_BENCH}"."ContaPagarNotaFiscal" nf ON nf."Codigo_ContaPagar" = cp."Codigo_ContaPagar"
+                GROUP BY cp."Codigo_ContaPagar", cp."Data_Digitacao"
+            """))
+            conn.execute(text(f'CREATE INDEX ON "{SCHEMA_BENCH}"."ContaPagar" ("Data_Digitacao")'))
+            conn.execute(text(f'CREATE INDEX ON "{SCHEMA_BENCH}"."ContaPagarNotaFiscal" ("Data_Digitacao")'))
+            conn.execute(text(f'CREATE INDEX ON "{SCHEMA_BENCH}"."ContaPagarDataEfetiva" ("Data_DigitacaoEfetiva", "Codigo_ContaPagar")'))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for tabela in metadata.sorted_tables:
+                conn.execute(text(f'ANALYZE "{SCHEMA_BENCH}"."{tabela.name}"'))
+        print(f"  dados e índices: {time.perf_counter() - t0:.1f}s")
+
+        sessao = Session(bind=engine.execution_options(schema_translate_map={SQLSERVER_SCHEMA: SCHEMA_BENCH}))
+        try:
+            variantes = [
+                ('legado', RelatorioBudget(sessao), True),
+                ('intervalos', RelatorioBudget(sessao), False),
+                ('materializada', RelatorioBudget(sessao, dataEfetivaMaterializada=True), False),
+            ]
+            for nome_caso, ano, meses in CASOS:
+                print(f"\n=== {nome_caso} ({ano}, meses={list(meses) if meses else 'todos'}) ===")
+                referencia = None
+                for nome, relatorio, legado in variantes:
+                    query = MontarConsulta(relatorio, ano, meses, legado)
+                    tempo, resultado = Medir(sessao, query, repeticoes)
+                    if referencia is None:
+                        referencia = resultado
+                    igual = resultado == referencia
+                    ok &= igual
+                    print(f"{nome:<14} {tempo:10.1f}ms  {'OK' if igual else 'DIVERGENTE'}")
+                    for linha in Plano(sessao, query):
+                        print(f"{'':<16}{linha}")
+        finally:
+            sessao.close()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS "{SCHEMA_BENCH}" CASCADE'))
+
+    print("\nRESULTADO:", "mesmos totais por mês" if ok else "DIVERGENTE")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if Executar(*args) else 1)
@@ -0,0 +1,182 @@
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Utils.ExcelUtils import (
+    excel_date_to_datetime, _sanitizar_data_auto, _sanitizar_moeda_br, _sanitizar_codigo,
+    _sanitizar_texto_id, _sanitizar_inteiro_id
+)
+
+"""
+    Golden test + benchmark dos sanitizadores vetorizados do ExcelUtils.
+    Compara, célula a célula e dtype a dtype, a saída vetorizada com as funções por célula anteriores
+    (Series.apply + re.sub, reproduzidas abaixo como referência) sobre amostras "sujas" de razão
+    e mede o ganho de tempo. Não acessa o banco.
+    Uso: python Scripts/DEV/BenchmarkSanitizacaoExcel.py [linhas] [sementes]
+"""
+
+
+# =========================================================================
+# REFERÊNCIA (implementação por célula anterior)
+# =========================================================================
+def RefDataAuto(serie):
+    def parse_dt(x):
+        if pd.isna(x) or str(x).strip() == '': return pd.NaT
+        if isinstance(x, (int, float)): return excel_date_to_datetime(x)
+        return pd.to_datetime(x, errors='coerce', dayfirst=True)
+    return serie.apply(parse_dt)
+
+def RefMoedaBr(serie):
+    def clean_currency(x):
+        if isinstance(x, (int, float)) and not pd.isna(x):
+            return abs(float(x))
+        if pd.isna(x): return 0.0
+        s = str(x).strip()
+        if not s: return 0.0
+        s_clean = re.sub(r'[^\d,\.]', '', s)
+        if not s_clean: return 0.0
+        if ',' in s_clean: s_clean = s_clean.replace('.', '').replace(',', '.')
+        try:
+            return abs(float(s_clean))
+        except:
+            return 0.0
+    return serie.apply(clean_currency)
+
+def RefCodigo(serie):
+    def only_numbers(x):
+        if pd.isna(x): return 0
+        s_clean = re.sub(r'\D', '', str(x))
+        if not s_clean: return 0
+        return s_clean
+    return serie.apply(only_numbers)
+
+def RefTextoId(serie):
+    def clean_text_id(x):
+        if pd.isna(x) or x == '': return None
+        s = str(x).strip()
+        if s.endswith('.0'): s = s[:-2]
+        return s
+    return serie.apply(clean_text_id).astype(str).replace('None', None)
+
+def RefInteiroId(serie):
+    def clean_and_int(x):
+        if pd.isna(x): return None
+        s_clean = re.sub(r'\D', '', str(x).strip())
+        if not s_clean: return None
+        return int(s_clean)
+    return serie.apply(clean_and_int).astype('Int64')
+
+
+# =========================================================================
+# AMOSTRAS "SUJAS"
+# =========================================================================
+def GerarDatas(rnd, n):
+    base = datetime(2025, 1, 1)
+    opcoes = [
+        lambda: (base + timedelta(days=rnd.randint(0, 360))).strftime('%d/%m/%Y'),
+        lambda: (base + timedelta(days=rnd.randint(0, 360))).strftime('%d/%m/%Y %H:%M:%S'),
+        lambda: (base + timedelta(days=rnd.randint(0, 360))).strftime('%Y-%m-%d'),
+        lambda: f"{rnd.randint(1, 28)}/{rnd.randint(1, 12)}/2025",
+        lambda: float(rnd.randint(45000, 46000)) + rnd.choice([0, 0.5, 0.25, 0.123456789]),
+        lambda: rnd.randint(45000, 46000),
+        lambda: base + timedelta(days=rnd.randint(0, 360), seconds=rnd.randint(0, 86399)),
+        lambda: pd.Timestamp(base + timedelta(days=rnd.randint(0, 360))),
+        lambda: rnd.choice(['', '   ', None, np.nan, pd.NaT, 'SALDO ANTERIOR', '31/02/2025', ' 05/03/2025 ', '13/25/2025', 'abc']),
+    ]
+    pesos = [40, 5, 5, 5, 15, 10, 10, 5, 5]
+    return pd.Series([rnd.choices(opcoes, pesos)[0]() for _ in range(n)], dtype=object)
+
+def GerarValores(rnd, n):
+    opcoes = [
+        lambda: f"{rnd.randint(0, 99999):,}".replace(',', '.') + f",{rnd.randint(0, 99):02d}",
+        lambda: f"-{rnd.randint(0, 9999)},{rnd.randint(0, 99):02d}",
+        lambda: f"R$ {rnd.randint(0, 9999)}.{rnd.randint(0, 99):02d}",
+        lambda: rnd.uniform(-1e6, 1e6),
+        lambda: rnd.randint(-50000, 50000),
+        lambda: rnd.choice(['', ' ', None, np.nan, '-', '1.2.3', '.', ',', '1,2,3', 'abc', '12,', ',5', True, '١٢٣,٤']),
+    ]
+    pesos = [35, 10, 10, 25, 10, 10]
+    return pd.Series([rnd.choices(opcoes, pesos)[0]() for _ in range(n)], dtype=object)
+
+def GerarCodigos(rnd, n):
+    opcoes = [
+        lambda: f"{rnd.randint(1, 9)}.{rnd.randint(1, 9)}.{rnd.randint(1, 9)}.{rnd.randint(1, 99):02d}",
+        lambda: float(rnd.randint(1000, 99999999)),
+        lambda: rnd.randint(1000, 99999999),
+        lambda: f"  {rnd.randint(10000000000, 99999999999)}  ",
+        lambda: f"CC-{rnd.randint(100, 999)}/A",
+        lambda: '9' * rnd.choice([19, 25]),
+        lambda: rnd.choice(['', ' ', None, np.nan, 'None', 'sem código', '0', '.0', '12.0', 1.5e20]),
+    ]
+    pesos = [25, 20, 15, 15, 10, 2, 13]
+    return pd.Series([rnd.choices(opcoes, pesos)[0]() for _ in range(n)], dtype=object)
+
+
+# =========================================================================
+# COMPARAÇÃO E EXECUÇÃO
+# =========================================================================
+def Comparar(nome, referencia, vetorizado):
+    if str(referencia.dtype) != str(vetorizado.dtype):
+        print(f"  [FALHA] {nome}: dtype {referencia.dtype} != {vetorizado.dtype}")
+        return False
+    ref_obj = referencia.astype(object).to_numpy()
+    vet_obj = vetorizado.astype(object).to_numpy()
+    for i, (a, b) in enumerate(zip(ref_obj, vet_obj)):
+        if pd.isna(a) and pd.isna(b) and type(a) is type(b):
+            continue
+        if type(a) is not type(b) or a != b:
+            print(f"  [FALHA] {nome}: linha {i}: {a!r} != {b!r}")
+            return False
+    return True
+
+def Medir(funcao, serie, repeticoes=3):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = funcao(serie.copy())
+        melhor = min(melhor, time.perf_counter() - t0)
+    return resultado, melhor
+
+def Executar(qtd_linhas=200000, sementes=3):
+    casos = [
+        ('date_auto', GerarDatas, RefDataAuto, _sanitizar_data_auto),
+        ('currency_br', GerarValores, RefMoedaBr, _sanitizar_moeda_br),
+        ('clean_code', GerarCodigos, RefCodigo, _sanitizar_codigo),
+        ('clean_text_id', GerarCodigos, RefTextoId, _sanitizar_texto_id),
+        ('clean_and_int', lambda rnd, n: GerarCodigos(rnd, n).where(lambda s: s.map(lambda v: not (isinstance(v, str) and len(v) > 18)), None), RefInteiroId, _sanitizar_inteiro_id),
+    ]
+    ok = True
+    for semente in range(sementes):
+        rnd = random.Random(semente)
+        print(f"Semente {semente} ({qtd_linhas} linhas)")
+        for nome, gerador, referencia, vetorizado in casos:
+            serie = gerador(rnd, qtd_linhas)
+            # Também valida colunas tipadas (como o read_excel entrega colunas homogêneas)
+            variantes = [('object', serie)]
+            numericas = pd.to_numeric(serie, errors='coerce')
+            if nome != 'date_auto':
+                variantes.append(('float64', numericas))
+
+            for tipo, amostra in variantes:
+                saida_ref, t_ref = Medir(referencia, amostra)
+                saida_vet, t_vet = Medir(vetorizado, amostra)
+                igual = Comparar(f"{nome}/{tipo}", saida_ref, saida_vet)
+                ok &= igual
+                print(f"  {nome:<14} {tipo:<8} ref {t_ref * 1000:9.1f}ms  vetorizado {t_vet * 1000:8.1f}ms  "
+                      f"ganho {t_ref / max(t_vet, 1e-9):6.1f}x  {'OK' if igual else 'DIVERGENTE'}")
+
+    print("RESULTADO:", "equivalente" if ok else "DIVERGENTE")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if Executar(*args) else 1)
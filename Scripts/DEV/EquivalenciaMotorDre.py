@@ -0,0 +1,271 @@
+import os
+import random
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Modules.DRE.Reports.DreGerencial import DreGerencial
+from Modules.DRE.Reports.DreConsolidado import DreConsolidado
+from Modules.DRE.Reports.DreOperacao import DreOperacao
+from Modules.DRE.Reports.MotorAgregacaoDre import MotorAgregacaoDre
+
+"""
+    Harness de equivalência do motor vetorizado do DRE (MotorAgregacaoDre).
+    Gera razões sintéticos (estrutura de regras + lançamentos) e compara, chave a chave e valor a valor,
+    a saída do motor com a implementação linha a linha anterior (ProcessRow), reproduzida abaixo como referência.
+    Não acessa o banco. Uso: python Scripts/DEV/EquivalenciaMotorDre.py [cenarios] [linhas]
+"""
+
+Definition = namedtuple('Definition', ['Conta_Contabil', 'CC_Alvo', 'Id_Hierarquia', 'Id_No_Virtual', 'Nome_Personalizado_Def', 'full_path', 'full_ordem_path', 'Tipo_Principal', 'Raiz_Centro_Custo_Nome', 'Raiz_No_Virtual_Id', 'Is_Root_Group', 'Ordem_Conta'])
+
+CENTROS = [25110501, 25110502, 30120101, 40110101, 50110201]
+
+
+# =========================================================================
+# GERAÇÃO DE DADOS SINTÉTICOS
+# =========================================================================
+def GerarEstrutura(rnd, qtd_contas=80):
+    contas = [f"601{rnd.randint(10000000, 99999999)}" for _ in range(qtd_contas)]
+    contas += ['00000000000', '60101010201', '60101010201A', '60301020288', '60101020201']
+
+    definitions = defaultdict(list)
+    for conta in contas:
+        if rnd.random() < 0.15: continue
+        for _ in range(rnd.choice([1, 1, 2, 3])):
+            tipo = rnd.choice(['Adm', 'Oper', 'Coml', None])
+            caminho = rnd.choice(['Receita||Bruta', 'Custos||Pessoal||Salarios', 'Despesas', 'Direto', None])
+            definitions[conta].append(Definition(
+                Conta_Contabil=conta,
+                CC_Alvo=rnd.choice(CENTROS + [None, None]),
+                Id_Hierarquia=rnd.choice([None, 1, 2, 3, 4]),
+                Id_No_Virtual=rnd.choice([None, 10]),
+                Nome_Personalizado_Def=rnd.choice([None, None, '', 'Nome Personalizado']),
+                full_path=caminho,
+                full_ordem_path=rnd.choice(['1||2', '3', '999', None]),
+                Tipo_Principal=tipo,
+                Raiz_Centro_Custo_Nome=rnd.choice(['CC Matriz', 'CC Filial', None]),
+                Raiz_No_Virtual_Id=rnd.choice([None, None, 1, 2]),
+                Is_Root_Group=rnd.random() < 0.3,
+                Ordem_Conta=rnd.randint(1, 50),
+            ))
+
+    ordem_map = {}
+    for i in range(1, 5):
+        ordem_map[f"virtual:{i}"] = rnd.randint(1, 20)
+        ordem_map[f"subgrupo:{i}"] = rnd.randint(1, 20)
+    for tipo in ['Adm', 'Oper', 'Outros']:
+        ordem_map[f"tipo_cc:{tipo}"] = rnd.randint(1, 20)
+
+    ordem_ctx = {('Receita', 'Oper'): 1, ('Custos', 'Adm'): 2, ('Despesas', 'Coml'): 3}
+    css_map = {1: 'font-weight: bold;', 2: 'color: red;'}
+    mapa_titulos = {conta: f"Título {conta}" for conta in contas if rnd.random() < 0.8}
+    return contas, definitions, ordem_map, ordem_ctx, css_map, mapa_titulos
+
+
+def GerarLancamentos(rnd, contas, qtd):
+    contas_extras = ['99999999999', '60101010201B', '60301020290B', None]
+    linhas = []
+    for _ in range(qtd):
+        conta = rnd.choice(contas + contas_extras)
+        linhas.append({
+            'origem': rnd.choice(['FARMA', 'FARMA', 'FARMADIST', 'INTEC', 'intec ', 'OUTRA', None]),
+            'Conta': conta,
+            'Titulo': rnd.choice([f"Título {conta}", None, 'Outro título']),
+            'Mes': rnd.choice(list(range(1, 13)) + [None]),
+            'Centro_Custo': rnd.choice(CENTROS + [None, 0, 99999999]),
+            'Saldo': rnd.choice([0.0, round(rnd.uniform(-50000, 50000), 2), rnd.uniform(-1, 1)]),
+            'Is_Nao_Operacional': rnd.random() < 0.1,
+            'Is_Intergrupo_Auto': rnd.random() < 0.1,
+            'Filial_Cliente': rnd.choice([None, 'JANDIRA', 'ITAPEVI 15', 'SAO PAULO', 'polo sul']),
+            'Item': rnd.choice([None, '10190', '10190 ', '20000']),
+        })
+    return linhas
+
+
+# =========================================================================
+# IMPLEMENTAÇÃO DE REFERÊNCIA (laço linha a linha anterior ao motor)
+# =========================================================================
+def _CriarReferencia(definitions, ordem_map, ordem_ctx, css_map, agrupar_por_cc, aggregated_data, criar_item, somar):
+    def ProcessRow(origem, conta, titulo, cc_original_str, linha, is_skeleton=False, forced_match=None):
+        match = forced_match
+        if not match:
+            rules = definitions.get(conta, [])
+            if not rules: return
+            if cc_original_str:
+                cc_int = None
+                try: cc_int = int(''.join(filter(str.isdigit, str(cc_original_str))))
+                except: pass
+                if cc_int is not None:
+                    for rule in rules:
+                        if rule.CC_Alvo is not None and cc_int == rule.CC_Alvo:
+                            match = rule; break
+            if not match: match = rules[0]
+
+        if not match: return
+
+        tipo_cc = match.Tipo_Principal or 'Outros'
+        root_virtual_id = match.Raiz_No_Virtual_Id
+        caminho = match.full_path or 'Não Classificado'
+
+        ordem = 999
+        ordem_secundaria = 500
+
+        if root_virtual_id: ordem = ordem_map.get(f"virtual:{root_virtual_id}", 999)
+        elif match.Is_Root_Group:
+            if match.Id_Hierarquia: ordem = ordem_map.get(f"subgrupo:{match.Id_Hierarquia}", 0)
+        else: ordem = ordem_map.get(f"tipo_cc:{tipo_cc}", 999)
+
+        if caminho and caminho not in ['Não Classificado', 'Direto', 'Calculado']:
+            partes = caminho.split('||')
+            if partes:
+                chave_busca = (partes[0].strip(), str(tipo_cc).strip())
+                ordem_secundaria = ordem_ctx.get(chave_busca, 999)
+
+        titulo_para_exibicao = match.Nome_Personalizado_Def if match.Nome_Personalizado_Def else titulo
+
+        group_key = (tipo_cc, root_virtual_id, caminho, match.full_ordem_path, titulo_para_exibicao, conta)
+        if agrupar_por_cc: group_key = group_key + (match.Raiz_Centro_Custo_Nome,)
+
+        if group_key not in aggregated_data:
+            item = {
+                'Conta': conta, 'Titulo_Conta': titulo_para_exibicao,
+                'Tipo_CC': tipo_cc, 'Root_Virtual_Id': root_virtual_id,
+                'Caminho_Subgrupos': caminho, 'Caminho_Ordem': match.full_ordem_path,
+                'Ordem_Conta': match.Ordem_Conta, 'ordem_prioridade': ordem,
+                'ordem_secundaria': ordem_secundaria, 'Estilo_CSS': css_map.get(root_virtual_id, None)
+            }
+            criar_item(item, origem, match)
+            aggregated_data[group_key] = item
+        else:
+            if match.Ordem_Conta < aggregated_data[group_key]['Ordem_Conta']:
+                aggregated_data[group_key]['Ordem_Conta'] = match.Ordem_Conta
+
+        if not is_skeleton:
+            somar(aggregated_data[group_key], conta, linha)
+
+    return ProcessRow
+
+
+def ReferenciaGerencial(dre, estrutura, linhas, agrupar_por_cc):
+    definitions, ordem_map, ordem_ctx, css_map, mapa_titulos = estrutura
+    aggregated_data = {}
+
+    def criar_item(item, origem, match):
+        item['origem'] = origem
+        for m in dre.meses: item[m] = 0.0
+        if agrupar_por_cc: item['Nome_CC'] = match.Raiz_Centro_Custo_Nome
+
+    def somar(item, conta, linha):
+        mes = linha['Mes']
+        if mes:
+            try:
+                val_inv = linha['Saldo'] * -1
+                item[dre.meses[mes - 1]] += val_inv
+                item['Total_Ano'] += val_inv
+            except: pass
+
+    ProcessRow = _CriarReferencia(definitions, ordem_map, ordem_ctx, css_map, agrupar_por_cc, aggregated_data, criar_item, somar)
+    for conta_def, lista_regras in definitions.items():
+        for regra in lista_regras:
+            ProcessRow("Config", conta_def, mapa_titulos.get(conta_def, "Conta Configurada"), None, None, is_skeleton=True, forced_match=regra)
+    for linha in linhas:
+        conta, titulo = linha['Conta'], linha['Titulo']
+        if linha['Is_Nao_Operacional']:
+            conta, titulo = '00000000000', 'Não Operacionais'
+        ProcessRow(linha['origem'], conta, titulo, linha['Centro_Custo'], linha)
+    return aggregated_data
+
+
+def ReferenciaColunas(dre, estrutura, linhas, coluna_total, ignorar_manipuladas):
+    definitions, ordem_map, ordem_ctx, css_map, mapa_titulos = estrutura
+    aggregated_data = {}
+
+    def criar_item(item, origem, match):
+        for col in dre.colunas: item[col] = 0.0
+
+    def somar(item, conta, linha):
+        if linha['Saldo'] == 0: return
+        coluna_alvo = dre._DeterminarColuna(
+            linha['origem'], linha['Centro_Custo'], conta, linha['Is_Nao_Operacional'],
+            bool(linha['Is_Intergrupo_Auto']), linha['Filial_Cliente'], linha['Item']
+        )
+        if ignorar_manipuladas and coluna_alvo == 'INTERGRUPO' and conta in dre.CONTAS_INTERGRUPO_ORIGINAIS:
+            return
+        if coluna_alvo and coluna_alvo in dre.colunas:
+            val_inv = linha['Saldo'] * -1
+            item[coluna_alvo] += val_inv
+            item[coluna_total] += val_inv
+
+    ProcessRow = _CriarReferencia(definitions, ordem_map, ordem_ctx, css_map, False, aggregated_data, criar_item, somar)
+    for conta_def, lista_regras in definitions.items():
+        for regra in lista_regras:
+            ProcessRow("Config", conta_def, mapa_titulos.get(conta_def, "Conta Configurada"), None, None, is_skeleton=True, forced_match=regra)
+    for linha in linhas:
+        if ignorar_manipuladas:
+            conta_atual = str(linha['Conta']).strip() if linha['Conta'] else ''
+            if conta_atual in dre.CONTAS_INTERGRUPO_MANIPULADAS:
+                continue
+        ProcessRow(linha['origem'], linha['Conta'], linha['Titulo'], linha['Centro_Custo'], linha)
+    return aggregated_data
+
+
+# =========================================================================
+# COMPARAÇÃO
+# =========================================================================
+def Comparar(nome, referencia, motor):
+    if list(referencia.keys()) != list(motor.keys()):
+        faltando = [k for k in referencia if k not in motor][:3]
+        sobrando = [k for k in motor if k not in referencia][:3]
+        print(f"❌ {nome}: chaves/ordem divergentes (faltando: {faltando}, sobrando: {sobrando})")
+        return False
+    for chave, item_ref in referencia.items():
+        if item_ref != motor[chave]:
+            divergentes = {c: (item_ref.get(c), motor[chave].get(c)) for c in set(item_ref) | set(motor[chave]) if item_ref.get(c) != motor[chave].get(c)}
+            print(f"❌ {nome}: item {chave} divergente: {divergentes}")
+            return False
+    return True
+
+
+def Executar(cenarios=20, qtd_linhas=5000):
+    gerencial, consolidado, operacao = DreGerencial(None), DreConsolidado(None), DreOperacao(None)
+    tempos = defaultdict(float)
+    falhas = 0
+
+    for semente in range(cenarios):
+        rnd = random.Random(semente)
+        contas, *estrutura = GerarEstrutura(rnd)
+        linhas = GerarLancamentos(rnd, contas, qtd_linhas)
+        definitions, ordem_map, ordem_ctx, css_map, mapa_titulos = estrutura
+
+        linhas_gerencial = [tuple(l[c] for c in ['origem', 'Conta', 'Titulo', 'Mes', 'Centro_Custo', 'Saldo', 'Is_Nao_Operacional']) for l in linhas]
+        linhas_colunas = [tuple(l[c] for c in ['origem', 'Conta', 'Titulo', 'Centro_Custo', 'Saldo', 'Is_Nao_Operacional', 'Is_Intergrupo_Auto', 'Filial_Cliente', 'Item']) for l in linhas]
+
+        casos = [
+            ('Gerencial', lambda: ReferenciaGerencial(gerencial, estrutura, linhas, False),
+             lambda: gerencial._AgregarLancamentos(MotorAgregacaoDre(*estrutura), linhas_gerencial)),
+            ('Gerencial por CC', lambda: ReferenciaGerencial(gerencial, estrutura, linhas, True),
+             lambda: gerencial._AgregarLancamentos(MotorAgregacaoDre(*estrutura, agrupar_por_cc=True), linhas_gerencial)),
+            ('Consolidado', lambda: ReferenciaColunas(consolidado, estrutura, linhas, 'Total_Geral', True),
+             lambda: consolidado._AgregarLancamentos(MotorAgregacaoDre(*estrutura), linhas_colunas)),
+            ('Operacao', lambda: ReferenciaColunas(operacao, estrutura, linhas, 'CONSOLIDADO', False),
+             lambda: operacao._AgregarLancamentos(MotorAgregacaoDre(*estrutura), linhas_colunas)),
+        ]
+
+        for nome, referencia, vetorizado in casos:
+            t0 = time.perf_counter(); resultado_ref = referencia(); tempos[(nome, 'referencia')] += time.perf_counter() - t0
+            t0 = time.perf_counter(); resultado_motor = vetorizado(); tempos[(nome, 'motor')] += time.perf_counter() - t0
+            if not Comparar(f"{nome} (semente {semente})", resultado_ref, resultado_motor):
+                falhas += 1
+
+    print(f"\nCenários: {cenarios} | Lançamentos por cenário: {qtd_linhas}")
+    for nome in ['Gerencial', 'Gerencial por CC', 'Consolidado', 'Operacao']:
+        print(f"  {nome:<18} referência: {tempos[(nome, 'referencia')]:.3f}s | motor: {tempos[(nome, 'motor')]:.3f}s")
+    print("✅ Saídas idênticas." if falhas == 0 else f"❌ {falhas} divergência(s).")
+    return falhas == 0
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if Executar(*args) else 1)
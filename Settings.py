@@ -33,6 +33,21 @@ class BaseConfig:
     SQL_DB   = os.getenv("SQLDB_NAME")
     SQL_USER = os.getenv("SQLDB_USER")
     SQL_PASS = os.getenv("SQLDB_PASS")
+
+    # Pool de Conexões (Engines compartilhadas pelo processo)
+    # Dimensionar pelo número de threads do Waitress: POOL_SIZE + MAX_OVERFLOW >= threads ativas.
+    PG_POOL_SIZE = int(os.getenv("PGDB_POOL_SIZE", "8"))
+    PG_POOL_MAX_OVERFLOW = int(os.getenv("PGDB_POOL_MAX_OVERFLOW", "8"))
+    PG_POOL_TIMEOUT = int(os.getenv("PGDB_POOL_TIMEOUT", "30"))
+    PG_POOL_RECYCLE = int(os.getenv("PGDB_POOL_RECYCLE", "1800"))
+    PG_POOL_PRE_PING = os.getenv("PGDB_POOL_PRE_PING", "True").lower() == "true"
+
+    # ERP: pool pequeno e limitado (sem overflow por padrão) para respeitar o limite de conexões do LuftInforma
+    SQL_POOL_SIZE = int(os.getenv("SQLDB_POOL_SIZE", "4"))
+    SQL_POOL_MAX_OVERFLOW = int(os.getenv("SQLDB_POOL_MAX_OVERFLOW", "0"))
+    SQL_POOL_TIMEOUT = int(os.getenv("SQLDB_POOL_TIMEOUT", "15"))
+    SQL_POOL_RECYCLE = int(os.getenv("SQLDB_POOL_RECYCLE", "600"))
+    SQL_POOL_PRE_PING = os.getenv("SQLDB_POOL_PRE_PING", "True").lower() == "true"
     
     # Outras Configs
     SECRET_KEY = os.getenv("SECRET_PASSPHRASE")
@@ -11,6 +11,9 @@ class RelatorioRazao {
         this.summary = null; 
         this.page = 1;
         this.totalPages = 1;
+        this.hasNext = false;
+        // cursors[n] = cursor (keyset) que carrega a página n + 1; a página 1 não tem cursor
+        this.cursors = [null];
         this.search = '';
         this.searchTimer = null;
         this.viewType = 'original'; 
@@ -20,6 +23,7 @@ class RelatorioRazao {
     async loadReport(page = 1) {
         // Usa o wrapper novo que criamos no orquestrador
         if (!this.modal) this.modal = new LuftModalWrapper('modalRelatorio');         
+        if (page === 1) this.cursors = [null];
         this.page = page;
         
         const titleSuffix = this.viewType === 'adjusted' ? 'Visão Ajustada' : 'Original';
@@ -37,14 +41,18 @@ class RelatorioRazao {
 
             const term = encodeURIComponent(this.search);
             const viewType = this.viewType;
+            const cursor = this.cursors[page - 1] ? `&cursor=${encodeURIComponent(this.cursors[page - 1])}` : '';
             
             const [respData, respSummary] = await Promise.all([
-                APIUtils.get(`${urlData}?page=${page}&search=${term}&view_type=${viewType}`),
+                APIUtils.get(`${urlData}?page=${page}&search=${term}&view_type=${viewType}${cursor}`),
                 APIUtils.get(`${urlSummary}?view_type=${viewType}`)
             ]);
 
             this.data = respData.dados || [];
             this.totalPages = respData.total_paginas || 1;
+            this.hasNext = !!respData.tem_proxima;
+            this.totalEstimated = !!respData.total_estimado;
+            if (respData.proximo_cursor) this.cursors[page] = respData.proximo_cursor;
             this.summary = respSummary;
 
             this.renderView(respData, respSummary);
@@ -79,7 +87,7 @@ class RelatorioRazao {
                         <i class="fas fa-search luft-hub-search-icon"></i>
                         <input type="text" id="razaoSearchInput" class="luft-hub-search-input" 
                             style="padding-top: 8px; padding-bottom: 8px;"
-                            placeholder="Busca Global (Server-side)..." value="${this.search}">
+                            placeholder="Busca Global (Server-side)..." title="Use * no fim para buscar contas por prefixo (ex.: 60101*)" value="${this.search}">
                     </div>
                     
                     <div class="luft-separator-vertical"></div>
@@ -101,11 +109,11 @@ class RelatorioRazao {
                     
                     <div class="luft-separator-vertical"></div>
                     
-                    <span class="text-sm text-muted" style="font-weight: 600;">Página ${this.page} de ${this.totalPages}</span>
+                    <span class="text-sm text-muted" style="font-weight: 600;">Página ${this.page} de ${this.totalEstimated ? '~' : ''}${this.totalPages}</span>
                     
                     <div class="d-flex gap-1">
                         <button class="luft-dre-btn" style="padding: 8px 12px;" onclick="relatorioSystem.razao.loadReport(${this.page - 1})" ${this.page <= 1 ? 'disabled' : ''}><i class="fas fa-chevron-left m-0"></i></button>
-                        <button class="luft-dre-btn" style="padding: 8px 12px;" onclick="relatorioSystem.razao.loadReport(${this.page + 1})" ${this.page >= this.totalPages ? 'disabled' : ''}><i class="fas fa-chevron-right m-0"></i></button>
+                        <button class="luft-dre-btn" style="padding: 8px 12px;" onclick="relatorioSystem.razao.loadReport(${this.page + 1})" ${!this.hasNext ? 'disabled' : ''}><i class="fas fa-chevron-right m-0"></i></button>
                     </div>
                 </div>
             </div>
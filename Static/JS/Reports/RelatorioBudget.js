@@ -180,11 +180,8 @@ function inicializarRelatorioBudget() {
         selectMes.dataset.filterBound = 'true';
     }
 
-    // Carrega filtros e dispara a busca inicial
-    sincronizarFiltrosBudget().then(() => {
-        atualizarChipsBudget();
-        carregarDadosBudget();
-    });
+    // Carrega filtros e dados iniciais na mesma requisição
+    carregarDadosBudget({ incluirFiltros: true });
 }
 
 function abrirPainelFiltroBudget(chave) {
@@ -445,49 +442,14 @@ function configurarFiltroBudget(chaveFiltro) {
     }
 }
 
-function sincronizarFiltrosBudget() {
-    const inputAno = document.getElementById('inputAnoBudget');
-    const selectEmpresa = document.getElementById('selectEmpresaBudget');
-
-    if (!inputAno) {
-        return Promise.resolve();
-    }
-
-    const ano = inputAno.value || new Date().getFullYear();
-    const empresa = selectEmpresa ? selectEmpresa.value : 'Todos';
-    const centroCusto = obterParametroFiltroBudget('centrosCusto', { ignorarVazio: true });
-    const contaContabil = obterParametroFiltroBudget('contasContabeis', { ignorarVazio: true });
-    const requestToken = ++budgetFilterState.requestToken;
-
-    definirEstadoCarregandoFiltrosBudget(true);
-
-    return obterJsonBudget(construirUrlBudget('filtros', {
-        ano,
-        empresa,
-        centro_custo: centroCusto,
-        conta_contabil: contaContabil
-    }), {
-        method: 'GET',
-        headers: { 'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest' }
-    })
-    .then((retorno) => {
-        definirEstadoCarregandoFiltrosBudget(false);
-
-        if (requestToken !== budgetFilterState.requestToken) {
-            return;
-        }
-
-        const centroAutoSelecionado = renderizarOpcoesFiltroBudget('centrosCusto', retorno.data?.centrosCusto || []);
-        renderizarOpcoesFiltroBudget('contasContabeis', retorno.data?.contasContabeis || []);
-
-        if (centroAutoSelecionado) {
-            agendarSincronizacaoFiltrosBudget();
-        }
-    })
-    .catch((erro) => {
-        definirEstadoCarregandoFiltrosBudget(false);
-        console.error('Erro ao carregar os filtros:', erro);
-    });
+/**
+ * Aplica as opções de filtro devolvidas junto com o relatório gerencial.
+ * Retorna true quando a seleção mudou (auto seleção) e os dados precisam ser recarregados.
+ */
+function aplicarOpcoesFiltrosBudget(filtros) {
+    const centroAutoSelecionado = renderizarOpcoesFiltroBudget('centrosCusto', filtros?.centrosCusto || []);
+    renderizarOpcoesFiltroBudget('contasContabeis', filtros?.contasContabeis || []);
+    return centroAutoSelecionado;
 }
 
 function renderizarOpcoesFiltroBudget(chaveFiltro, listaOpcoes) {
@@ -722,16 +684,16 @@ function obterParametroFiltroBudget(chaveFiltro, { ignorarVazio = false } = {})
 
 function agendarSincronizacaoFiltrosBudget() {
     clearTimeout(budgetFilterState.syncTimer);
-    budgetFilterState.syncTimer = setTimeout(async () => {
-        await sincronizarFiltrosBudget();
-        carregarDadosBudget();
+    budgetFilterState.syncTimer = setTimeout(() => {
+        carregarDadosBudget({ incluirFiltros: true });
     }, 350);
 }
 
 /**
  * Coleta os filtros e consulta a API de dados.
+ * Com incluirFiltros, a mesma resposta traz as opções de centro de custo e conta (uma consulta só no servidor).
  */
-function carregarDadosBudget() {
+function carregarDadosBudget({ incluirFiltros = false } = {}) {
     const inputAno = document.getElementById('inputAnoBudget');
     const selectEmpresa = document.getElementById('selectEmpresaBudget');
     const selectModoSaldo = document.getElementById('selectModoSaldoBudget');
@@ -760,16 +722,46 @@ function carregarDadosBudget() {
             </td>
         </tr>`;
 
-    obterJsonBudget(construirUrlBudget('gerencial', {
+    const parametros = {
         ano,
         empresa,
         centro_custo: ccParam,
         conta_contabil: conta
-    }), {
+    };
+    const requestToken = incluirFiltros ? ++budgetFilterState.requestToken : null;
+
+    if (incluirFiltros) {
+        // Para as opções, seleção vazia equivale a 'Todos' (mesma regra da antiga rota de filtros)
+        parametros.incluir_filtros = 'true';
+        parametros.filtro_centro_custo = obterParametroFiltroBudget('centrosCusto', { ignorarVazio: true });
+        parametros.filtro_conta_contabil = obterParametroFiltroBudget('contasContabeis', { ignorarVazio: true });
+        definirEstadoCarregandoFiltrosBudget(true);
+    }
+
+    obterJsonBudget(construirUrlBudget('gerencial', parametros), {
         method: 'GET',
         headers: { 'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest' }
     })
     .then(retorno => {
+        if (incluirFiltros) {
+            definirEstadoCarregandoFiltrosBudget(false);
+
+            if (requestToken !== budgetFilterState.requestToken) {
+                return;
+            }
+
+            const centroAutoSelecionado = aplicarOpcoesFiltrosBudget(retorno.data?.filtros);
+            atualizarChipsBudget();
+
+            // Se as novas opções mudaram a seleção, os dados recebidos não correspondem mais a ela
+            const selecaoAlterada = obterParametroFiltroBudget('centrosCusto') !== ccParam
+                || obterParametroFiltroBudget('contasContabeis') !== conta;
+            if (centroAutoSelecionado || selecaoAlterada) {
+                agendarSincronizacaoFiltrosBudget();
+                return;
+            }
+        }
+
         const selectMes = document.getElementById('selectMesBudget');
         const mesSelecionado = selectMes ? parseInt(selectMes.value, 10) : 0;
         const meses = Array.isArray(retorno.data?.meses) ? retorno.data.meses : [];
@@ -777,6 +769,9 @@ function carregarDadosBudget() {
         renderizarTabelaBudget(mesesFiltrados, corpoTabela);
     })
     .catch(erro => {
+        if (incluirFiltros) {
+            definirEstadoCarregandoFiltrosBudget(false);
+        }
         console.error('Falha ao obter dados:', erro);
         corpoTabela.innerHTML = `<tr><td colspan="${COLSPAN_TABELA_BUDGET}" class="text-center text-danger py-6 font-bold">${escaparHtml(erro.message || 'Falha na comunicação com o servidor.')}</td></tr>`;
     });
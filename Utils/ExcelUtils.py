@@ -1,8 +1,12 @@
+import numpy as np
 import pandas as pd
 # from qvd import qvd_reader
+import io
 import os
+import pickle
 import re
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 from sqlalchemy import text
 
 # --- Import do Logger ---
@@ -60,6 +64,194 @@ def find_best_sample_row_index(df):
             
     return best_idx
 
+# =========================================================================
+# SANITIZADORES VETORIZADOS
+# Equivalentes às antigas funções por célula (Series.apply + re.sub); a equivalência e o ganho
+# são verificados por Scripts/DEV/BenchmarkSanitizacaoExcel.py.
+# =========================================================================
+_TIPOS_NUMERICOS = [int, float, bool, np.float64]
+_EXCEL_EPOCH = np.datetime64('1899-12-30', 'ns')
+_SERIAL_EXCEL_MAX_RAPIDO = 100000  # ~2173: mantém o caminho rápido dentro do limite do datetime64[ns]
+_FORMATOS_DATA_RAPIDOS = ('%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M')
+
+def _mascara_numerica(valores):
+    """Equivalente vetorial de isinstance(x, (int, float)) para um array de objetos."""
+    return pd.Series(valores, dtype=object).map(type).isin(_TIPOS_NUMERICOS).to_numpy()
+
+def _como_texto(valores):
+    """str(x) de cada célula, preservando a formatação do Python (ex.: 1234.0 -> '1234.0')."""
+    return pd.Series(valores, dtype=object).astype(str)
+
+def _parse_dt_celula(x):
+    if pd.isna(x) or str(x).strip() == '': return pd.NaT
+    if isinstance(x, (int, float)): return excel_date_to_datetime(x)
+    return pd.to_datetime(x, errors='coerce', dayfirst=True)
+
+def _sanitizar_data_auto(serie):
+    """
+    'date_auto': serial do Excel (numérico) ou texto/data em formato brasileiro.
+    Seriais usam aritmética vetorial; textos são convertidos por valor único, com formatos
+    explícitos (dd/mm/aaaa) no caminho rápido e o parser do pandas (dayfirst) no restante.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        return serie.copy()
+
+    valores = serie.to_numpy(dtype=object)
+    nulos = pd.isna(valores)
+    numericos = _mascara_numerica(valores) & ~nulos
+    resultado = np.full(len(valores), np.datetime64('NaT'), dtype='datetime64[ns]')
+    pendentes = {}  # posição -> valor calculado pelo caminho escalar
+
+    if numericos.any():
+        seriais = valores[numericos].astype(np.float64)
+        rapidos = np.isfinite(seriais) & (seriais >= 0) & (seriais <= _SERIAL_EXCEL_MAX_RAPIDO)
+        posicoes = np.flatnonzero(numericos)
+        # Mesma decomposição de timedelta(days=x): dias inteiros, segundos inteiros e fração
+        # de segundo arredondada (half-even) em microssegundos
+        dias = np.trunc(seriais[rapidos])
+        segundos = (seriais[rapidos] - dias) * 86400.0
+        segundos_inteiros = np.trunc(segundos)
+        micros = (dias.astype(np.int64) * 86400000000 + segundos_inteiros.astype(np.int64) * 1000000
+                  + np.round((segundos - segundos_inteiros) * 1e6).astype(np.int64))
+        resultado[posicoes[rapidos]] = _EXCEL_EPOCH + micros.astype('timedelta64[us]')
+        for pos in posicoes[~rapidos]:
+            pendentes[pos] = excel_date_to_datetime(valores[pos])
+
+    outros = ~nulos & ~numericos
+    if outros.any():
+        posicoes = np.flatnonzero(outros)
+        codigos, unicos = pd.factorize(valores[outros])
+        convertidos = np.full(len(unicos), np.datetime64('NaT'), dtype='datetime64[ns]')
+        resolvidos = np.zeros(len(unicos), dtype=bool)
+
+        eh_texto = np.array([type(u) is str for u in unicos], dtype=bool)
+        textos = pd.Series(unicos[eh_texto], dtype=object)
+        em_branco = np.zeros(len(unicos), dtype=bool)
+        em_branco[eh_texto] = (textos.str.strip() == '').to_numpy()
+        resolvidos |= em_branco
+
+        indices_texto = np.flatnonzero(eh_texto & ~em_branco)
+        for formato in _FORMATOS_DATA_RAPIDOS:
+            faltantes = indices_texto[~resolvidos[indices_texto]]
+            if not len(faltantes): break
+            datas = pd.to_datetime(pd.Series(unicos[faltantes], dtype=object), format=formato, errors='coerce').to_numpy()
+            ok = ~np.isnat(datas)
+            convertidos[faltantes[ok]] = datas[ok]
+            resolvidos[faltantes[ok]] = True
+
+        valores_unicos = {}
+        for idx in np.flatnonzero(~resolvidos):
+            valores_unicos[idx] = _parse_dt_celula(unicos[idx])
+
+        for idx, valor in valores_unicos.items():
+            if valor is None or valor is pd.NaT:
+                resolvidos[idx] = valor is pd.NaT
+                continue
+            try:
+                convertidos[idx] = pd.Timestamp(valor).as_unit('ns').to_datetime64()
+                resolvidos[idx] = True
+            except (OverflowError, ValueError):
+                pass
+
+        if not resolvidos.all():
+            # Casos raros (datas fora do limite do datetime64[ns] ou None): caminho escalar original
+            return serie.apply(_parse_dt_celula)
+        resultado[posicoes] = convertidos[codigos]
+
+    if pendentes:
+        nones = 0
+        for pos, valor in pendentes.items():
+            if valor is None:
+                nones += 1
+                continue
+            try:
+                resultado[pos] = pd.Timestamp(valor).as_unit('ns').to_datetime64()
+            except (OverflowError, ValueError):
+                return serie.apply(_parse_dt_celula)
+        if nones == len(valores):
+            return serie.apply(_parse_dt_celula)
+
+    return pd.Series(resultado, index=serie.index)
+
+def _sanitizar_moeda_br(serie):
+    """'currency_br': valor absoluto; texto aceita '1.234,56' e '1234.56'; inválidos/vazios viram 0.0."""
+    valores = serie.to_numpy(dtype=object)
+    nulos = pd.isna(valores)
+    numericos = _mascara_numerica(valores) & ~nulos
+    resultado = np.zeros(len(valores), dtype=np.float64)
+
+    if numericos.any():
+        resultado[numericos] = np.abs(valores[numericos].astype(np.float64))
+
+    textos = ~nulos & ~numericos
+    if textos.any():
+        # Mantém só dígitos, vírgula e ponto (o sinal '-' é removido propositalmente)
+        limpos = _como_texto(valores[textos]).str.replace(r'[^\d,\.]', '', regex=True)
+        com_virgula = limpos.str.contains(',', regex=False)
+        limpos = limpos.where(~com_virgula, limpos.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+        # float() só aceita o texto com ao menos um dígito e no máximo um ponto
+        validos = (limpos.str.contains(r'\d', regex=True) & (limpos.str.count(r'\.') <= 1)).to_numpy()
+        convertidos = np.zeros(len(limpos), dtype=np.float64)
+        convertidos[validos] = limpos.to_numpy(dtype=object)[validos].astype(np.float64)
+        resultado[textos] = np.abs(convertidos)
+
+    return pd.Series(resultado, index=serie.index)
+
+def _sanitizar_codigo(serie):
+    """'clean_code': mantém só os dígitos (como texto); vazios e nulos viram 0."""
+    valores = serie.to_numpy(dtype=object)
+    nulos = pd.isna(valores)
+    resultado = np.zeros(len(valores), dtype=object)
+
+    if (~nulos).any():
+        digitos = _como_texto(valores[~nulos]).str.replace(r'\D', '', regex=True).to_numpy(dtype=object)
+        digitos[digitos == ''] = 0
+        resultado[~nulos] = digitos
+
+    return pd.Series(resultado, index=serie.index).infer_objects()
+
+def _sanitizar_texto_id(serie):
+    """Identificadores textuais (VARCHAR): remove o '.0' de números lidos como float; vazios viram None."""
+    valores = serie.to_numpy(dtype=object)
+    vazios = pd.isna(valores) | (valores == '')
+    resultado = np.full(len(valores), None, dtype=object)
+
+    if (~vazios).any():
+        textos = _como_texto(valores[~vazios]).str.strip()
+        com_decimal = textos.str.endswith('.0')
+        resultado[~vazios] = textos.where(~com_decimal, textos.str[:-2]).to_numpy(dtype=object)
+
+    return pd.Series(resultado, index=serie.index).astype(str).replace('None', None)
+
+def _normalizar_codigo_numerico(serie):
+    """Códigos só com dígitos perdem os zeros à esquerda ('0101001' -> '101001'); demais valores ficam como estão."""
+    mascara = serie.str.fullmatch(r'[0-9]+', na=False).astype(bool)
+    if not mascara.any():
+        return serie
+    normalizados = serie[mascara].str.lstrip('0').replace('', '0')
+    return serie.where(~mascara, normalizados)
+
+def _sanitizar_inteiro_id(serie):
+    """Identificadores inteiros (BIGINT): remove tudo que não for dígito ('2.1.1.01' -> 21101)."""
+    valores = serie.to_numpy(dtype=object)
+    nulos = pd.isna(valores)
+    numeros = np.zeros(len(valores), dtype=np.int64)
+    presentes = np.zeros(len(valores), dtype=bool)
+
+    if (~nulos).any():
+        posicoes = np.flatnonzero(~nulos)
+        digitos = _como_texto(valores[~nulos]).str.replace(r'\D', '', regex=True)
+        validos = (digitos != '').to_numpy()
+        # Até 18 dígitos ASCII cabem em int64 e convertem direto; o restante usa int() (Unicode/overflow)
+        curtos = digitos.str.fullmatch(r'[0-9]{1,18}').to_numpy(dtype=bool)
+        numeros[posicoes[curtos]] = digitos[curtos].astype(np.int64).to_numpy()
+        longos = validos & ~curtos
+        if longos.any():
+            numeros[posicoes[longos]] = pd.array([int(d) for d in digitos[longos]], dtype='Int64').to_numpy(dtype=np.int64)
+        presentes[posicoes[validos]] = True
+
+    return pd.Series(pd.arrays.IntegerArray(numeros, ~presentes), index=serie.index)
+
 def apply_transformations(df, transformations):
     """Aplica transformações específicas nas colunas do DataFrame."""
     if not transformations:
@@ -77,46 +269,11 @@ def apply_transformations(df, transformations):
             elif trans_type == 'lower':
                 df[col] = df[col].astype(str).str.lower()
             elif trans_type == 'date_auto':
-                def parse_dt(x):
-                    if pd.isna(x) or str(x).strip() == '': return pd.NaT
-                    if isinstance(x, (int, float)): return excel_date_to_datetime(x)
-                    return pd.to_datetime(x, errors='coerce', dayfirst=True)
-                df[col] = df[col].apply(parse_dt)
-            
+                df[col] = _sanitizar_data_auto(df[col])
             elif trans_type == 'currency_br':
-                def clean_currency(x):
-                    # 1. Se já for numérico (float/int), garante ABSOLUTO
-                    if isinstance(x, (int, float)) and not pd.isna(x):
-                        return abs(float(x))
-                    
-                    if pd.isna(x): return 0.0
-                    s = str(x).strip()
-                    if not s: return 0.0
-                    
-                    # 2. REMOVE SINAL DE MENOS, letras e espaços. 
-                    # Regex mantem apenas digitos, virgula e ponto.
-                    # O sinal '-' é removido aqui propositalmente.
-                    s_clean = re.sub(r'[^\d,\.]', '', s)
-                    
-                    if not s_clean: return 0.0
-
-                    if ',' in s_clean: s_clean = s_clean.replace('.', '').replace(',', '.')
-                    
-                    try: 
-                        return abs(float(s_clean))
-                    except: 
-                        return 0.0
-                
-                df[col] = df[col].apply(clean_currency)
-
+                df[col] = _sanitizar_moeda_br(df[col])
             elif trans_type == 'clean_code':
-                def only_numbers(x):
-                    if pd.isna(x): return 0
-                    s = str(x)
-                    s_clean = re.sub(r'\D', '', s)
-                    if not s_clean: return 0
-                    return s_clean
-                df[col] = df[col].apply(only_numbers)
+                df[col] = _sanitizar_codigo(df[col])
             elif trans_type == 'clean_spaces':
                 df[col] = df[col].astype(str).str.strip()
             elif trans_type == 'to_int':
@@ -129,6 +286,200 @@ def apply_transformations(df, transformations):
     
     return df
 
+# =========================================================================
+# LEITURA DO EXCEL EM BLOCOS (MOTORES PLUGÁVEIS)
+# Em vez de pd.read_excel (que monta a planilha inteira em memória), as linhas são lidas em
+# streaming e entregues em blocos de DataFrame. Motores disponíveis:
+#   - 'openpyxl': modo read_only (padrão, sempre instalado);
+#   - 'calamine': python-calamine, bem mais rápido, usado quando instalado.
+# EXCEL_MOTOR_LEITURA escolhe o motor ('auto' = calamine se disponível, senão openpyxl).
+# A conversão das células segue a do pandas para cada motor (inteiros em float viram int, vazios
+# viram NaN etc.). Os blocos mantêm o tipo de cada célula (dtype object) sem inferência por bloco,
+# para que o resultado não dependa de onde caem os limites dos blocos. Diferente do read_excel,
+# colunas de texto com cara de número NÃO viram número ('0101001' continua texto): quem precisa
+# do valor numérico normaliza no sanitizador (ver _sanitizar_bloco_razao).
+# =========================================================================
+MOTOR_LEITURA_EXCEL = os.getenv('EXCEL_MOTOR_LEITURA', 'auto').lower()
+TAMANHO_BLOCO_EXCEL = int(os.getenv('EXCEL_TAMANHO_BLOCO', '50000'))
+_ERROS_EXCEL = {'#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A', '#GETTING_DATA'}
+
+def _linhas_openpyxl(file_path):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        for linha in ws.iter_rows(values_only=True):
+            convertida = []
+            for valor in linha:
+                if valor is None: valor = ""
+                elif isinstance(valor, float) and valor.is_integer(): valor = int(valor)
+                elif isinstance(valor, str) and valor in _ERROS_EXCEL: valor = np.nan
+                convertida.append(valor)
+            yield convertida
+    finally:
+        wb.close()
+
+def _linhas_calamine(file_path):
+    from python_calamine import CalamineWorkbook
+
+    sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+    linhas = sheet.iter_rows() if hasattr(sheet, 'iter_rows') else sheet.to_python(skip_empty_area=False)
+    for linha in linhas:
+        convertida = []
+        for valor in linha:
+            if isinstance(valor, float) and valor.is_integer(): valor = int(valor)
+            elif isinstance(valor, date): valor = pd.Timestamp(valor)
+            elif isinstance(valor, timedelta): valor = pd.Timedelta(valor)
+            convertida.append(valor)
+        yield convertida
+
+_LEITORES_EXCEL = {'openpyxl': _linhas_openpyxl, 'calamine': _linhas_calamine}
+
+def resolver_motor_leitura(motor=None):
+    """Motor efetivo: o informado, o de EXCEL_MOTOR_LEITURA ou, em 'auto', calamine quando instalado."""
+    motor = (motor or MOTOR_LEITURA_EXCEL).lower()
+    if motor == 'auto':
+        try:
+            import python_calamine  # noqa: F401
+            return 'calamine'
+        except ImportError:
+            return 'openpyxl'
+    if motor not in _LEITORES_EXCEL:
+        raise ValueError(f"Motor de leitura de Excel desconhecido: {motor}")
+    return motor
+
+def ler_excel_em_blocos(file_path, tamanho_bloco=None, motor=None):
+    """
+    Gera DataFrames de até tamanho_bloco linhas da primeira aba, com as colunas já normalizadas.
+    Linhas em branco no fim da planilha são descartadas (como no read_excel).
+    """
+    from pandas.io.parsers import TextParser
+
+    tamanho_bloco = tamanho_bloco or TAMANHO_BLOCO_EXCEL
+    linhas = _LEITORES_EXCEL[resolver_motor_leitura(motor)](file_path)
+
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return
+    while cabecalho and cabecalho[-1] == "": cabecalho.pop()
+    colunas = TextParser([cabecalho], header=0, dtype=object).read().columns
+    colunas = [str(c).replace('\n', ' ').strip() for c in colunas]
+    largura = len(colunas)
+
+    def montar(bloco):
+        df = TextParser(bloco, names=colunas, header=None, skip_blank_lines=False, dtype=object).read()
+        return df.reset_index(drop=True)
+
+    bloco, em_branco, entregues = [], [], 0
+    for linha in linhas:
+        while linha and linha[-1] == "": linha.pop()
+        if not linha:
+            # Só entram no bloco se houver dados depois (descarta o rodapé vazio)
+            em_branco.append([""] * largura)
+            continue
+        if em_branco:
+            bloco.extend(em_branco)
+            em_branco = []
+        # Colunas sem cabeçalho além da última nomeada são ignoradas
+        bloco.append((linha + [""] * (largura - len(linha)))[:largura])
+        if len(bloco) >= tamanho_bloco:
+            yield montar(bloco)
+            bloco = []
+            entregues += 1
+
+    if bloco or not entregues:
+        yield montar(bloco)
+
+# =========================================================================
+# CACHE DA PLANILHA LIDA (SIDECAR)
+# O upload é lido uma única vez; as etapas seguintes do assistente de importação (amostra,
+# prévia, checagem de competência e processamento) leem os blocos serializados ao lado do
+# arquivo temporário. Usa pickle do pandas (e não Parquet/Feather) porque preserva as colunas de
+# tipos mistos exatamente como vieram do Excel, que é o que os sanitizadores esperam. Os blocos são
+# gravados em sequência no mesmo arquivo, então a leitura também é feita bloco a bloco.
+# =========================================================================
+_SUFIXO_CACHE_PLANILHA = '.cache.pkl'
+
+def caminho_cache_planilha(file_path):
+    """Caminho do sidecar com os blocos já lidos do arquivo temporário."""
+    return file_path + _SUFIXO_CACHE_PLANILHA
+
+def _cache_planilha_valido(file_path):
+    caminho_cache = caminho_cache_planilha(file_path)
+    return os.path.exists(caminho_cache) and os.path.getmtime(caminho_cache) >= os.path.getmtime(file_path)
+
+def _ler_blocos_cache(caminho_cache):
+    with open(caminho_cache, 'rb') as arquivo:
+        while True:
+            try:
+                yield pickle.load(arquivo)
+            except EOFError:
+                return
+
+def iterar_planilha_cache(file_path, tamanho_bloco=None):
+    """
+    Gera os blocos do upload: do sidecar, se já existir, ou lendo o Excel e gravando o sidecar
+    enquanto os blocos são entregues (o sidecar só passa a valer se a leitura for até o fim).
+    """
+    caminho_cache = caminho_cache_planilha(file_path)
+    if _cache_planilha_valido(file_path):
+        try:
+            yield from _ler_blocos_cache(caminho_cache)
+            return
+        except Exception as e:
+            RegistrarLog(f"Cache da planilha inválido, relendo o Excel: {os.path.basename(file_path)}", "WARNING", e)
+
+    t0 = time.time()
+    motor = resolver_motor_leitura()
+    total_linhas = 0
+    # Grava em arquivo temporário e troca de uma vez, para leituras concorrentes nunca verem um cache parcial
+    caminho_parcial = f"{caminho_cache}.{os.getpid()}.{time.time_ns()}.tmp"
+    arquivo = open(caminho_parcial, 'wb')
+    try:
+        for bloco in ler_excel_em_blocos(file_path, tamanho_bloco, motor):
+            pickle.dump(bloco, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            total_linhas += len(bloco)
+            yield bloco
+        arquivo.close()
+        os.replace(caminho_parcial, caminho_cache)
+        RegistrarLog(f"Planilha lida ({motor}) e armazenada em cache: {os.path.basename(file_path)} ({total_linhas} linhas, {round(time.time() - t0, 2)}s)", "EXCEL_READ")
+    finally:
+        if not arquivo.closed: arquivo.close()
+        if os.path.exists(caminho_parcial): os.remove(caminho_parcial)
+
+def ler_planilha_cache(file_path, nrows=None):
+    """
+    Retorna o DataFrame do upload (colunas já normalizadas). Na primeira chamada o Excel é lido
+    inteiro para montar o cache. Com nrows, devolve só as primeiras linhas com os tipos inferidos
+    sobre elas (como o read_excel com nrows).
+    """
+    # Com o cache pronto basta ler os primeiros blocos; sem ele, a leitura vai até o fim para gravá-lo
+    cache_pronto = _cache_planilha_valido(file_path)
+    blocos, linhas = [], 0
+    for bloco in iterar_planilha_cache(file_path):
+        if nrows is None or linhas < nrows:
+            blocos.append(bloco)
+            linhas += len(bloco)
+        elif cache_pronto:
+            break
+
+    if not blocos:
+        return pd.DataFrame()
+    df = pd.concat(blocos, ignore_index=True) if len(blocos) > 1 else blocos[0]
+    if nrows is not None:
+        return df.head(nrows).copy().infer_objects()
+    return df.infer_objects()
+
+def remover_cache_planilha(file_path):
+    """Remove o arquivo temporário do upload junto com o seu sidecar."""
+    for caminho in (file_path, caminho_cache_planilha(file_path)):
+        try:
+            if os.path.exists(caminho): os.remove(caminho)
+        except OSError as e:
+            RegistrarLog(f"Não foi possível remover o arquivo temporário {os.path.basename(caminho)}", "WARNING", e)
+
 def analyze_excel_sample(file_path):
     """Lê o ficheiro e retorna colunas, tipos e a MELHOR linha de amostra."""
     if not os.path.exists(file_path):
@@ -138,8 +489,7 @@ def analyze_excel_sample(file_path):
     try:
         # RegistrarLog(f"Iniciando análise de amostra: {os.path.basename(file_path)}", "EXCEL_READ")
         
-        df_preview = pd.read_excel(file_path, engine='openpyxl', nrows=50)
-        df_preview.columns = [str(c).replace('\n', ' ').strip() for c in df_preview.columns]
+        df_preview = ler_planilha_cache(file_path, nrows=50)
         columns = df_preview.columns.tolist()
         
         types = {}
@@ -171,8 +521,7 @@ def analyze_excel_sample(file_path):
 def generate_preview_value(file_path, mapping, transformations):
     """Gera o preview final."""
     try:
-        df = pd.read_excel(file_path, engine='openpyxl', nrows=50)
-        df.columns = [str(c).replace('\n', ' ').strip() for c in df.columns]
+        df = ler_planilha_cache(file_path, nrows=50)
         df = apply_transformations(df, transformations)
 
         if not df.empty:
@@ -234,119 +583,227 @@ def delete_records_by_competencia(engine, table_name, competencia):
         result = conn.execute(sql, {"year": year, "month": month})
         return result.rowcount
 
-def process_and_save_dynamic(file_path, column_mapping, table_destination, engine, transformations=None):
+def _valores_para_copy(df):
+    """Itera as linhas do DataFrame como tuplas de tipos Python (NaN/NaT/NA viram None)."""
+    colunas = []
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            valores = serie.dt.to_pydatetime()
+        else:
+            valores = serie.astype(object).to_numpy()
+        colunas.append(pd.Series(valores, dtype=object).where(serie.notna().to_numpy(), None).tolist())
+    return zip(*colunas)
+
+def _campo_copy_texto(valor):
+    """Formata um valor para o COPY em formato texto (NULL = \\N, com escape de barra, tab e quebras)."""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    return str(valor).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def _copiar_linhas(cursor, comando_copy, linhas):
+    """
+    Envia as linhas pelo COPY FROM STDIN do driver em uso: cursor.copy() no psycopg 3 ou,
+    no psycopg2, copy_expert a partir de um buffer em memória (um bloco por vez).
+    """
+    if hasattr(cursor, 'copy'):
+        with cursor.copy(comando_copy) as copy:
+            for linha in linhas:
+                copy.write_row(linha)
+        return
+
+    buffer = io.StringIO()
+    for linha in linhas:
+        buffer.write('\t'.join(_campo_copy_texto(valor) for valor in linha))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(comando_copy.as_string(cursor), buffer)
+
+def copy_dataframe_to_table(engine, df, table_name, schema='Dre_Schema'):
+    """
+    Carga em massa via COPY FROM STDIN (cursor.copy() no psycopg 3, copy_expert no psycopg2).
+    O DataFrame é copiado para uma tabela temporária de staging (mesmos tipos do destino, sem
+    constraints) e promovido ao destino por um único INSERT ... SELECT na mesma transação:
+    ou entram todas as linhas, ou nenhuma. Registra o throughput (linhas/s) no log.
+    """
+    return copy_dataframes_to_table(engine, [df], table_name, schema)
+
+def copy_dataframes_to_table(engine, blocos, table_name, schema='Dre_Schema'):
+    """
+    Mesmo fluxo do copy_dataframe_to_table para uma sequência de DataFrames (ex.: blocos lidos em
+    streaming): todos passam pelo mesmo COPY/staging e são promovidos numa única transação.
+    As colunas são as do primeiro bloco. O driver segue o da engine (PGDB_DRIVER).
+    """
+    if engine.dialect.driver == 'psycopg2':
+        from psycopg2 import sql as pg_sql
+    else:
+        from psycopg import sql as pg_sql
+
+    inicio = time.time()
+    linhas = 0
+    conexao = engine.raw_connection()
+    try:
+        conexao_pg = conexao.driver_connection
+        with conexao_pg.cursor() as cursor:
+            colunas = None
+            for df in blocos:
+                if colunas is None:
+                    colunas = [str(c) for c in df.columns]
+                    tabela_destino = pg_sql.Identifier(schema, table_name)
+                    tabela_staging = pg_sql.Identifier(f"stg_{table_name}")
+                    lista_colunas = pg_sql.SQL(', ').join(pg_sql.Identifier(c) for c in colunas)
+                    cursor.execute(pg_sql.SQL(
+                        "CREATE TEMP TABLE {stg} ON COMMIT DROP AS SELECT {cols} FROM {dest} WITH NO DATA"
+                    ).format(stg=tabela_staging, cols=lista_colunas, dest=tabela_destino))
+                if df.empty:
+                    continue
+
+                comando_copy = pg_sql.SQL("COPY {stg} ({cols}) FROM STDIN").format(stg=tabela_staging, cols=lista_colunas)
+                _copiar_linhas(cursor, comando_copy, _valores_para_copy(df[colunas]))
+
+            if colunas is not None:
+                cursor.execute(pg_sql.SQL(
+                    "INSERT INTO {dest} ({cols}) SELECT {cols} FROM {stg}"
+                ).format(dest=tabela_destino, cols=lista_colunas, stg=tabela_staging))
+                linhas = cursor.rowcount
+        conexao_pg.commit()
+    except Exception:
+        conexao.rollback()
+        raise
+    finally:
+        conexao.close()
+
+    duracao = max(time.time() - inicio, 1e-6)
+    RegistrarLog(
+        f"COPY em {table_name}: {linhas} linhas em {duracao:.2f}s ({linhas / duracao:,.0f} linhas/s)",
+        "DB_QUERY"
+    )
+    return linhas
+
+def _sanitizar_bloco_razao(df, final_mapping, transformations):
+    """
+    Aplica transformações, mapeamento e regras de negócio a um bloco da planilha.
+    Retorna (bloco pronto para o banco, datas válidas do bloco antes dos filtros de linha).
+    """
+    # 1. Aplica Transformações de Usuário (se houver)
+    if transformations:
+        df = apply_transformations(df, transformations)
+
+    # 2. Renomeia Colunas usando o mapeamento
+    df_db = df.rename(columns=final_mapping)
+    cols_destino = list(final_mapping.values())
+    cols_existentes = [c for c in cols_destino if c in df_db.columns]
+    df_db = df_db[cols_existentes]
+
+    # Regra: Validação Data (Obrigatória)
+    if 'Data' not in df_db.columns: raise Exception("A coluna 'Data' é obrigatória.")
+    # Mesma conversão do 'date_auto' (serial do Excel, dd/mm/aaaa explícito e dayfirst no restante):
+    # nada de inferir o formato a cada bloco, que poderia ler blocos da mesma planilha de jeitos diferentes
+    df_db['Data'] = pd.to_datetime(_sanitizar_data_auto(df_db['Data']), errors='coerce')
+    # Remove linhas onde a Data é inválida (NaT) antes de pegar a competência
+    df_db = df_db.dropna(subset=['Data'])
+    datas_validas = df_db['Data']
+
+    # Regra: Remover linha de 'SALDO ANTERIOR' se existir
+    if 'Descricao' in df_db.columns:
+        # Converte para string antes de comparar para evitar erro
+        df_db = df_db[df_db['Descricao'].astype(str).str.strip().str.upper() != 'SALDO ANTERIOR']
+
+    # -------------------------------------------------------------------
+    # TRATAMENTO DE TIPOS BLINDADO
+    # -------------------------------------------------------------------
+
+    # GRUPO 1: Colunas de IDENTIFICAÇÃO TEXTUAL (VARCHAR no Banco)
+    # Evita erro de conversão de números gigantes (overflow) e preserva zeros à esquerda.
+    cols_text_ids = ['Conta', 'Numero', 'Cod Cl Valor', 'Descricao', 'Contra Partida - Credito']
+
+    for col in cols_text_ids:
+        if col in df_db.columns:
+            df_db[col] = _sanitizar_texto_id(df_db[col])
+
+    # Códigos só com dígitos sem zeros à esquerda: é como o pd.read_excel gravava as competências
+    # já existentes (a coluna inteira virava número) e a Conta é chave de junção do DRE/intergrupo
+    cols_codigo_numerico = ['Conta', 'Numero', 'Cod Cl Valor', 'Contra Partida - Credito']
+    for col in cols_codigo_numerico:
+        if col in df_db.columns:
+            df_db[col] = _normalizar_codigo_numerico(df_db[col])
+
+    # GRUPO 2: Colunas de INTEIROS (BIGINT no Banco)
+    # Remove pontos e traços (ex: '2.1.1.01' -> 21101) para o banco aceitar.
+    cols_int_ids = ['Filial', 'Item', 'Centro de Custo']
+
+    for col in cols_int_ids:
+        if col in df_db.columns:
+            # Int64 permite NaN/Null, int normal não
+            df_db[col] = _sanitizar_inteiro_id(df_db[col])
+
+    # GRUPO 3: Colunas de VALOR (DECIMAL/FLOAT)
+    # Garante valor absoluto (sem sinal negativo) e trata nulos como 0.0
+    cols_valor = ['Debito', 'Credito']
+    for col in cols_valor:
+        if col in df_db.columns:
+            df_db[col] = pd.to_numeric(df_db[col], errors='coerce').fillna(0.0).abs()
+        else:
+            df_db[col] = 0.0
+
+    # Regra: Filtro de Linhas Zeradas (ignora registros sem valor financeiro)
+    mask_valor = (df_db['Debito'] != 0) | (df_db['Credito'] != 0)
+    return df_db[mask_valor], datas_validas
+
+def process_and_save_dynamic(file_path, column_mapping, table_destination, engine, transformations=None, progresso=None):
     """
     Processa o arquivo completo, aplica transformações, filtra regras de negócio e salva.
-    Versão Corrigida: Tratamento robusto de Tipos (Texto vs Inteiro) e Limpeza de Dados.
+    A planilha é processada em blocos (leitura em streaming ou cache do upload), que seguem
+    direto para o COPY: a memória usada depende do tamanho do bloco, não do arquivo.
+    progresso (opcional) recebe os contadores a cada bloco: linhas_lidas, linhas_rejeitadas e linhas_inseridas.
     """
     try:
         RegistrarLog(f"Iniciando leitura e processamento Pandas: {os.path.basename(file_path)}", "EXCEL_CORE")
-        
-        df = pd.read_excel(file_path, engine='openpyxl')
-        # Normaliza nomes das colunas (remove quebras de linha e espaços extras)
-        df.columns = [str(c).replace('\n', ' ').strip() for c in df.columns]
 
-        # 1. Aplica Transformações de Usuário (se houver)
-        if transformations:
-            df = apply_transformations(df, transformations)
-        
-        # 2. Renomeia Colunas usando o mapeamento
         final_mapping = {k: v for k, v in column_mapping.items() if v and v != 'IGNORE'}
         if not final_mapping: raise Exception("Nenhum mapeamento válido encontrado.")
-            
-        df_db = df.rename(columns=final_mapping)
-        cols_destino = list(final_mapping.values())
-        cols_existentes = [c for c in cols_destino if c in df_db.columns]
-        df_db = df_db[cols_existentes]
-
-        # Regra: Validação Data (Obrigatória)
-        if 'Data' not in df_db.columns: raise Exception("A coluna 'Data' é obrigatória.")
-        df_db['Data'] = pd.to_datetime(df_db['Data'], errors='coerce')
-        # Remove linhas onde a Data é inválida (NaT) antes de pegar a competência
-        initial_rows = len(df_db)
-        df_db = df_db.dropna(subset=['Data'])
-        if df_db.empty: raise Exception("Arquivo sem datas válidas.")
-        
-        competencia = get_competencia_from_df(df_db, 'Data')
-        RegistrarLog(f"Competência calculada: {competencia}. Linhas válidas (data): {len(df_db)}/{initial_rows}", "INFO")
-
-        # Regra: Remover linha de 'SALDO ANTERIOR' se existir
-        if 'Descricao' in df_db.columns:
-            # Converte para string antes de comparar para evitar erro
-            df_db = df_db[df_db['Descricao'].astype(str).str.strip().str.upper() != 'SALDO ANTERIOR']
 
-        # -------------------------------------------------------------------
-        # TRATAMENTO DE TIPOS BLINDADO
-        # -------------------------------------------------------------------
-        
-        RegistrarLog("Iniciando sanitização de tipos...", "DEBUG")
-
-        # GRUPO 1: Colunas de IDENTIFICAÇÃO TEXTUAL (VARCHAR no Banco)
-        # Evita erro de conversão de números gigantes (overflow) e preserva zeros à esquerda.
-        cols_text_ids = ['Conta', 'Numero', 'Cod Cl Valor', 'Descricao', 'Contra Partida - Credito']
-        
-        for col in cols_text_ids:
-            if col in df_db.columns:
-                def clean_text_id(x):
-                    if pd.isna(x) or x == '': return None
-                    s = str(x).strip()
-                    # Se o Excel leu como float (ex: '1234.0'), remove o decimal
-                    if s.endswith('.0'): s = s[:-2]
-                    # Retorna limpo. Para 'Numero' e 'Conta', mantemos carateres numéricos e separadores comuns
-                    return s 
-                
-                df_db[col] = df_db[col].apply(clean_text_id).astype(str).replace('None', None)
-
-        # GRUPO 2: Colunas de INTEIROS (BIGINT no Banco)
-        # Remove pontos e traços (ex: '2.1.1.01' -> 21101) para o banco aceitar.
-        cols_int_ids = ['Filial', 'Item', 'Centro de Custo']
-        
-        for col in cols_int_ids:
-            if col in df_db.columns:
-                def clean_and_int(x):
-                    if pd.isna(x): return None
-                    s = str(x).strip()
-                    # Remove tudo que NÃO for dígito (0-9)
-                    s_clean = re.sub(r'\D', '', s)
-                    if not s_clean: return None
-                    return int(s_clean)
-                
-                # Converte para numérico (Int64 permite NaN/Null, int normal não)
-                df_db[col] = df_db[col].apply(clean_and_int).astype('Int64')
-
-        # GRUPO 3: Colunas de VALOR (DECIMAL/FLOAT)
-        # Garante valor absoluto (sem sinal negativo) e trata nulos como 0.0
-        cols_valor = ['Debito', 'Credito']
-        for col in cols_valor:
-            if col in df_db.columns:
-                df_db[col] = pd.to_numeric(df_db[col], errors='coerce').fillna(0.0).abs()
-            else:
-                df_db[col] = 0.0
-
-        # Regra: Filtro de Linhas Zeradas (ignora registros sem valor financeiro)
-        mask_valor = (df_db['Debito'] != 0) | (df_db['Credito'] != 0)
-        df_db = df_db[mask_valor]
-
-        if df_db.empty: raise Exception("Nenhum registro válido encontrado após filtros.")
-
-        RegistrarLog(f"Dados sanitizados. Preparando para inserir {len(df_db)} registros em {table_destination}", "INFO")
-
-        # Inserção no Banco
-        df_db.to_sql(
-            table_destination,
-            engine,
-            schema='Dre_Schema',
-            if_exists='append', 
-            index=False,
-            chunksize=1000 # Lotes menores para evitar timeout
-        )
-        
-        return len(df_db), competencia
+        # A competência é a moda dos meses de todas as datas válidas do arquivo
+        contagens_competencia = []
+        totais = {'lidas': 0, 'datas_validas': 0, 'gravadas': 0}
+
+        def blocos_sanitizados():
+            for bloco in iterar_planilha_cache(file_path):
+                totais['lidas'] += len(bloco)
+                df_db, datas_validas = _sanitizar_bloco_razao(bloco, final_mapping, transformations)
+                totais['datas_validas'] += len(datas_validas)
+                contagens_competencia.append(datas_validas.dt.to_period('M').astype(str).value_counts())
+                totais['gravadas'] += len(df_db)
+                if progresso:
+                    progresso(linhas_lidas=totais['lidas'], linhas_rejeitadas=totais['lidas'] - totais['gravadas'])
+                yield df_db
+                # O consumidor só pede o próximo bloco depois de enviar este ao COPY
+                if progresso:
+                    progresso(linhas_inseridas=totais['gravadas'])
+
+            # Validações finais: levantar aqui desfaz o COPY (a transação ainda está aberta)
+            if not totais['datas_validas']: raise Exception("Arquivo sem datas válidas.")
+            if not totais['gravadas']: raise Exception("Nenhum registro válido encontrado após filtros.")
+            RegistrarLog(f"Dados sanitizados. {totais['gravadas']} registros inseridos em {table_destination} "
+                         f"(linhas válidas (data): {totais['datas_validas']}/{totais['lidas']})", "INFO")
+
+        # Inserção no Banco (COPY em massa via tabela de staging, bloco a bloco)
+        copy_dataframes_to_table(engine, blocos_sanitizados(), table_destination)
+
+        # Empate na moda: o menor período, como em Series.mode()
+        contagem = pd.concat(contagens_competencia).groupby(level=0).sum().sort_index()
+        competencia = contagem.idxmax()
+        RegistrarLog(f"Competência calculada: {competencia}", "INFO")
+
+        return totais['gravadas'], competencia
 
     except Exception as e:
         # Adiciona contexto ao erro para facilitar debug
         RegistrarLog("Erro durante o processamento do Excel (Pandas)", "ERROR", e)
         raise Exception(f"Erro no processamento final: {str(e)}")
+
 """    
 def ler_qvd_para_dataframe(caminho_relativo):
 